@@ -0,0 +1,87 @@
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, Query
+from psycopg import AsyncConnection
+
+from app.core.auth import CurrentUser, get_current_user
+from app.core.errors import ValidationError
+from app.db.session import get_read_db
+from app.schemas.base import ResponseSchema
+from app.services.analytics import (
+    Period, RankBy, get_overview, get_revenue_series, get_top_categories, get_top_products,
+)
+
+router = APIRouter(dependencies=[Depends(get_current_user)])
+
+# Intervallo massimo interrogabile in una richiesta
+MAX_RANGE_DAYS = 366 * 3
+
+
+class DateRange:
+    """Dependency con l'intervallo di date del dashboard (default: ultimo mese)."""
+
+    def __init__(
+        self,
+        date_from: Optional[date] = Query(None),
+        date_to: Optional[date] = Query(None),
+    ):
+        self.date_to = date_to or date.today()
+        self.date_from = date_from or self.date_to - timedelta(days=30)
+        if self.date_from > self.date_to:
+            raise ValidationError("date_from deve precedere date_to")
+        if (self.date_to - self.date_from).days > MAX_RANGE_DAYS:
+            raise ValidationError(f"L'intervallo non può superare {MAX_RANGE_DAYS} giorni")
+
+
+def analytics_scope(
+    user_id: Optional[int] = Query(None, description="Solo amministratori: utente da consultare (vuoto: tutti)"),
+    user: CurrentUser = Depends(get_current_user),
+) -> Optional[int]:
+    """Utente dei dati del dashboard: quello del token, o quello chiesto da un amministratore."""
+    return user.scope(user_id)
+
+
+@router.get("/overview", response_model=ResponseSchema[Dict[str, Any]])
+async def analytics_overview(
+    dates: DateRange = Depends(),
+    user_id: Optional[int] = Depends(analytics_scope),
+    conn: AsyncConnection = Depends(get_read_db),
+):
+    """Totali del periodo per le card del dashboard."""
+    return ResponseSchema(data=await get_overview(conn, dates.date_from, dates.date_to, user_id))
+
+
+@router.get("/revenue", response_model=ResponseSchema[List[Dict[str, Any]]])
+async def analytics_revenue(
+    dates: DateRange = Depends(),
+    period: Period = Query(Period.DAY),
+    user_id: Optional[int] = Depends(analytics_scope),
+    conn: AsyncConnection = Depends(get_read_db),
+):
+    """Serie di ricavi e profitto per il grafico."""
+    return ResponseSchema(data=await get_revenue_series(conn, dates.date_from, dates.date_to, period, user_id))
+
+
+@router.get("/top-products", response_model=ResponseSchema[List[Dict[str, Any]]])
+async def analytics_top_products(
+    dates: DateRange = Depends(),
+    limit: int = Query(5, ge=1, le=100),
+    rank_by: RankBy = Query(RankBy.REVENUE),
+    user_id: Optional[int] = Depends(analytics_scope),
+    conn: AsyncConnection = Depends(get_read_db),
+):
+    """Prodotti migliori per ricavi, profitto o quantità."""
+    return ResponseSchema(data=await get_top_products(conn, dates.date_from, dates.date_to, limit, rank_by, user_id))
+
+
+@router.get("/top-categories", response_model=ResponseSchema[List[Dict[str, Any]]])
+async def analytics_top_categories(
+    dates: DateRange = Depends(),
+    limit: int = Query(5, ge=1, le=100),
+    rank_by: RankBy = Query(RankBy.REVENUE),
+    user_id: Optional[int] = Depends(analytics_scope),
+    conn: AsyncConnection = Depends(get_read_db),
+):
+    """Categorie migliori del periodo."""
+    return ResponseSchema(data=await get_top_categories(conn, dates.date_from, dates.date_to, limit, rank_by, user_id))
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends
+from psycopg import AsyncConnection
+
+from app.core.auth import create_access_token
+from app.core.config import settings
+from app.core.firebase_auth import get_firebase_certificates, verify_firebase_token
+from app.db.session import get_db
+from app.schemas.auth import FirebaseTokenExchange, SessionToken
+from app.schemas.base import ResponseSchema
+from app.services.users import resolve_firebase_user
+
+router = APIRouter()
+
+
+@router.post("/firebase", response_model=ResponseSchema[SessionToken])
+async def exchange_firebase_token(body: FirebaseTokenExchange, conn: AsyncConnection = Depends(get_db)):
+    """
+    Scambia un ID token Firebase con un token di sessione dell'API.
+
+    L'ID token viene verificato in locale con le chiavi pubbliche di Google
+    in cache; il token di sessione (HS256, breve durata) vale per tutti gli
+    endpoint protetti da get_current_user. Il suo `sub` è l'id interno
+    dell'utente (registrato al primo login), lo stesso di ordini e
+    abbonamenti: va passato come metadata.user_id al checkout Stripe.
+    """
+    claims = verify_firebase_token(body.id_token, get_firebase_certificates())
+    email = claims.get("email") or None
+    user_id = await resolve_firebase_user(conn, claims["sub"], email)
+    extra = {"email": email} if email else {}
+    expires_in = settings.SESSION_TOKEN_EXPIRE_MINUTES * 60
+    token = create_access_token(
+        user_id, expires_in, {**extra, "firebase_uid": claims["sub"], "auth_provider": "firebase"},
+    )
+    return ResponseSchema(data=SessionToken(access_token=token, expires_in=expires_in, user_id=user_id))
@@ -0,0 +1,46 @@
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, status
+from psycopg import AsyncConnection
+
+from app.core.auth import get_current_user
+from app.core.errors import EntityNotFoundError
+from app.db.session import get_db
+from app.schemas.base import ResponseSchema
+from app.schemas.inventory import Reservation, ReservationCreate, ReservationItem
+from app.services.inventory import get_inventory
+
+router = APIRouter(dependencies=[Depends(get_current_user)])
+
+
+@router.post("/reservations", response_model=ResponseSchema[Reservation], status_code=status.HTTP_201_CREATED)
+async def create_reservation(body: ReservationCreate):
+    """Prenota lo stock di un carrello (tutto o niente) per la durata del checkout."""
+    reservation = await get_inventory().reserve(
+        {item.product_id: item.quantity for item in body.items}, ttl=body.ttl,
+    )
+    return ResponseSchema(data=Reservation(
+        reservation_id=reservation.id,
+        items=[ReservationItem(product_id=pid, quantity=q) for pid, q in reservation.items.items()],
+        expires_at=reservation.expires_at,
+    ))
+
+
+@router.post("/reservations/{reservation_id}/confirm", response_model=ResponseSchema[dict])
+async def confirm_reservation(reservation_id: UUID, conn: AsyncConnection = Depends(get_db)):
+    """
+    Conferma la prenotazione a checkout completato, senza creare un ordine.
+
+    Per registrare la vendita insieme all'ordine passare invece `reservation_id`
+    all'import degli ordini (POST /orders/bulk), che la conferma nella stessa transazione.
+    """
+    await get_inventory().confirm(str(reservation_id), conn)
+    return ResponseSchema(data={"reservation_id": reservation_id}, message="Prenotazione confermata")
+
+
+@router.delete("/reservations/{reservation_id}", response_model=ResponseSchema[dict])
+async def release_reservation(reservation_id: UUID):
+    """Annulla la prenotazione (carrello abbandonato)."""
+    if not await get_inventory().release(str(reservation_id)):
+        raise EntityNotFoundError("Prenotazione", str(reservation_id))
+    return ResponseSchema(data={"reservation_id": reservation_id}, message="Prenotazione annullata")
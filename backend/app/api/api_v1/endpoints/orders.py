@@ -0,0 +1,93 @@
+from typing import AsyncIterator, Optional
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from psycopg import AsyncConnection
+
+from app.core.auth import CurrentUser, get_current_user
+from app.core.config import settings
+from app.db.session import get_db
+from app.schemas.base import ResponseSchema
+from app.schemas.order import OrderBatchReport, OrderBulkCreate, OrderStatusUpdate
+from app.services.order_events import get_order_broadcaster
+from app.services.orders import create_orders, update_order_status
+
+router = APIRouter()
+
+
+@router.post("/bulk", response_model=ResponseSchema[OrderBatchReport])
+async def create_orders_bulk(
+    body: OrderBulkCreate,
+    user: CurrentUser = Depends(get_current_user),
+    conn: AsyncConnection = Depends(get_db),
+):
+    """
+    Crea fino a 5000 ordini in una chiamata (sync degli ordini dai marketplace).
+
+    Gli ordini già importati (stesso `external_ref`) vengono ignorati, quelli
+    con prodotti inesistenti o stock insufficiente vengono scartati e riportati
+    nella risposta senza bloccare gli altri. Gli ordini creati da un utente
+    sono sempre suoi (`user_id` viene ignorato); solo gli amministratori
+    creano ordini per altri utenti.
+    """
+    owner_id = user.scope(None)
+    orders = body.orders if owner_id is None else [order.copy(update={"user_id": owner_id}) for order in body.orders]
+    report = await create_orders(conn, orders, body.status)
+    return ResponseSchema(
+        data=report,
+        message=f"{len(report.created)} ordini creati, {len(report.rejected)} scartati, "
+                f"{len(report.duplicates)} già presenti",
+    )
+
+
+@router.patch("/status", response_model=ResponseSchema[dict])
+async def update_orders_status(
+    body: OrderStatusUpdate,
+    user: CurrentUser = Depends(get_current_user),
+    conn: AsyncConnection = Depends(get_db),
+):
+    """
+    Cambia lo stato di uno o più ordini (i rollup analitici vengono aggiornati nella stessa transazione).
+
+    Gli utenti cambiano solo i propri ordini: quelli di altri utenti vengono
+    riportati in `not_found` come gli id inesistenti.
+    """
+    updated, not_found = await update_order_status(conn, body.order_ids, body.status, user_id=user.scope(None))
+    return ResponseSchema(
+        data={"updated": updated, "not_found": not_found},
+        message=f"{len(updated)} ordini aggiornati, {len(not_found)} non trovati",
+    )
+
+
+@router.get("/events")
+async def order_events(
+    user_id: Optional[int] = Query(None, description="Solo amministratori: utente da seguire"),
+    user: CurrentUser = Depends(get_current_user),
+):
+    """
+    Stream Server-Sent Events dei cambi di stato degli ordini.
+
+    Sostituisce il polling di /orders?user_id=: ogni evento `order_status`
+    contiene order_id, status e previous_status. Un evento `resync` indica che
+    alcuni eventi sono andati persi e lo stato va ricaricato. L'utente riceve
+    solo gli eventi dei propri ordini (quello del token); gli amministratori
+    possono seguire un utente con user_id o, senza, tutti gli utenti.
+    """
+    broadcaster = get_order_broadcaster()
+    subscription = broadcaster.subscribe(user.scope(user_id))
+
+    async def stream() -> AsyncIterator[str]:
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                chunk = await subscription.next_chunk(settings.ORDER_EVENTS_HEARTBEAT)
+                # Il commento tiene viva la connessione attraverso proxy e load balancer
+                yield chunk if chunk is not None else ": ping\n\n"
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
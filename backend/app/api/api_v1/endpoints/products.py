@@ -0,0 +1,170 @@
+from decimal import Decimal
+from typing import List, Optional
+
+from fastapi import APIRouter, Body, Depends, Query, Request
+from fastapi.responses import FileResponse
+from psycopg import AsyncConnection
+
+from app.core.auth import CurrentUser, get_current_user
+from app.core.errors import EntityNotFoundError, PermissionDeniedError
+from app.db.session import get_db, get_read_db, mark_request_write
+from app.schemas.product import Product
+from app.services.content_generation import ContentGenerationReport, generate_product_content, get_content_generator
+from app.services.dedup import DuplicateCandidate, DuplicateClusters, DuplicateMatch, cluster_catalogue, find_duplicates
+from app.services.product_import import ImportFormat, ImportReport, import_products, reject_file_path
+from app.services.products import get_product
+from app.services.repricing import RepricingReport, RepricingRules, default_rules, reprice_catalogue
+from app.services.search import SearchResults, Suggestion, autocomplete, search_products
+
+router = APIRouter()
+
+
+@router.get("/search", response_model=SearchResults, dependencies=[Depends(get_current_user)])
+async def search_catalogue(
+    q: str = Query(..., min_length=1, max_length=200),
+    category_id: Optional[int] = Query(None),
+    min_price: Optional[Decimal] = Query(None, ge=0),
+    max_price: Optional[Decimal] = Query(None, ge=0),
+    in_stock: bool = Query(False),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+    conn: AsyncConnection = Depends(get_read_db),
+):
+    """
+    Ricerca full-text nel catalogo, per rilevanza, con facet per categoria.
+
+    Se il testo non trova nulla (es. un refuso) i risultati vengono da una
+    ricerca per somiglianza sul nome e `fuzzy` è true.
+    """
+    return await search_products(
+        conn, q, category_id=category_id, min_price=min_price, max_price=max_price,
+        in_stock=in_stock, limit=limit, offset=offset,
+    )
+
+
+@router.get("/autocomplete", response_model=List[Suggestion], dependencies=[Depends(get_current_user)])
+async def autocomplete_products(
+    q: str = Query(..., min_length=2, max_length=100),
+    limit: int = Query(10, ge=1, le=20),
+    conn: AsyncConnection = Depends(get_read_db),
+):
+    """Suggerimenti mentre l'utente digita: l'ultima parola vale come prefisso."""
+    return await autocomplete(conn, q, limit)
+
+
+@router.post("/import", response_model=ImportReport)
+async def import_products_endpoint(
+    request: Request,
+    fmt: ImportFormat = Query(ImportFormat.CSV, alias="format"),
+    user: CurrentUser = Depends(get_current_user),
+    conn: AsyncConnection = Depends(get_db),
+):
+    """
+    Import massivo dei prodotti di un fornitore.
+
+    Il corpo della richiesta è il file grezzo (CSV con intestazione o NDJSON),
+    letto in streaming senza caricarlo in memoria. Gli SKU nuovi sono
+    dell'utente e contano per il limite `max_skus` del suo piano
+    (gli amministratori importano senza limite).
+    """
+    owner_id = user.scope(None)
+    max_skus = None if user.is_admin else user.limits.max_skus
+    return await import_products(conn, request.stream(), fmt, owner_id=owner_id, max_skus=max_skus)
+
+
+@router.get("/import/rejects/{reject_id}", dependencies=[Depends(get_current_user)])
+async def download_import_rejects(reject_id: str):
+    """Scarica il file NDJSON con le righe scartate da un import."""
+    path = reject_file_path(reject_id)
+    if path is None:
+        raise EntityNotFoundError("File di scarto", reject_id)
+    return FileResponse(path, media_type="application/x-ndjson", filename=f"rejects-{reject_id}.ndjson")
+
+
+@router.post("/reprice", response_model=RepricingReport)
+async def reprice_products(
+    rules: Optional[RepricingRules] = Body(None),
+    dry_run: bool = Query(True),
+    diff_limit: int = Query(100, ge=0, le=10000),
+    user: CurrentUser = Depends(get_current_user),
+    conn: AsyncConnection = Depends(get_db),
+):
+    """
+    Ricalcola i prezzi del catalogo (margine minimo, undercut sul concorrente, .99).
+
+    Di default è un dry run: restituisce le modifiche senza scriverle.
+    Gli utenti ricalcolano i propri prodotti con le regole delle impostazioni;
+    gli amministratori tutto il catalogo, anche con regole proprie nel corpo.
+    """
+    if rules is not None and not user.is_admin:
+        raise PermissionDeniedError("Solo gli amministratori possono indicare le regole di repricing")
+    return await reprice_catalogue(
+        conn, rules or default_rules(), dry_run=dry_run, diff_limit=diff_limit, owner_id=user.scope(None),
+    )
+
+
+@router.post("/content", response_model=ContentGenerationReport)
+async def generate_products_content(
+    request: Request,
+    product_ids: List[int] = Body(..., embed=True, min_items=1, max_items=5000),
+    apply: bool = Query(False),
+    user: CurrentUser = Depends(get_current_user),
+):
+    """
+    Genera con l'AI titolo e descrizione dei prodotti indicati.
+
+    I testi già generati per lo stesso contenuto di origine vengono riusati.
+    Con apply=true sostituiscono nome e descrizione dei prodotti. Gli utenti
+    lavorano solo sui propri prodotti: gli altri risultano in `not_found`.
+    Niente get_db: la generazione dura secondi e usa transazioni brevi proprie.
+    """
+    report = await generate_product_content(
+        get_content_generator(), product_ids, apply=apply, owner_id=user.scope(None),
+    )
+    if report.applied:
+        mark_request_write(request)
+    return report
+
+
+@router.post(
+    "/duplicates/check",
+    response_model=List[List[DuplicateMatch]],
+    dependencies=[Depends(get_current_user)],
+)
+async def check_duplicates(
+    candidates: List[DuplicateCandidate] = Body(..., min_items=1, max_items=1000),
+    limit: int = Query(10, ge=1, le=100),
+    threshold: Optional[float] = Query(None, gt=0, le=1),
+    conn: AsyncConnection = Depends(get_read_db),
+):
+    """
+    Cerca nel catalogo i quasi duplicati dei prodotti indicati (es. prima di un import).
+
+    Restituisce, nello stesso ordine, i prodotti simili a ciascuno.
+    """
+    return await find_duplicates(conn, candidates, limit=limit, threshold=threshold)
+
+
+@router.get(
+    "/duplicates",
+    response_model=DuplicateClusters,
+    dependencies=[Depends(get_current_user)],
+)
+async def list_duplicate_clusters(threshold: Optional[float] = Query(None, gt=0, le=1)):
+    """
+    Raggruppa i prodotti quasi duplicati dell'intero catalogo.
+
+    Il risultato viene da una cache di DEDUP_CLUSTERS_TTL secondi; `elapsed_seconds`
+    è la durata del calcolo che l'ha prodotto.
+    """
+    return await cluster_catalogue(threshold)
+
+
+# Dopo le altre route GET: "/{product_id}" accetta qualsiasi segmento
+@router.get("/{product_id}", response_model=Product, dependencies=[Depends(get_current_user)])
+async def read_product(product_id: int):
+    """Scheda di un prodotto (servita dalla cache dei dati, caricata dal primario)."""
+    product = await get_product(product_id)
+    if product is None:
+        raise EntityNotFoundError("Prodotto", product_id)
+    return product
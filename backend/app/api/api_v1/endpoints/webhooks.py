@@ -0,0 +1,29 @@
+from typing import Optional
+
+from fastapi import APIRouter, Header, Request
+
+from app.db.session import db_router
+from app.schemas.base import ResponseSchema
+from app.services.stripe_events import enqueue_event, get_stripe_processor, verify_event
+
+# Nessuna autenticazione JWT: le richieste sono autenticate dalla firma del mittente
+router = APIRouter()
+
+
+@router.post("/stripe", response_model=ResponseSchema[dict])
+async def stripe_webhook(request: Request, stripe_signature: Optional[str] = Header(None)):
+    """
+    Riceve un webhook Stripe.
+
+    Verifica la firma e accoda l'evento, poi risponde subito: l'elaborazione
+    avviene in background (vedi app.services.stripe_events). Le consegne
+    ripetute dello stesso evento vengono accettate e ignorate.
+    """
+    payload = await request.body()
+    event = verify_event(payload, stripe_signature)
+    # Connessione esplicita: il worker va svegliato dopo il commit, non prima
+    async with db_router.connection() as conn:
+        queued = await enqueue_event(conn, event, payload)
+    if queued:
+        get_stripe_processor().notify()
+    return ResponseSchema(data={"id": event["id"], "duplicate": not queued}, message="Evento ricevuto")
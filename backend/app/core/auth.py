@@ -0,0 +1,133 @@
+import time
+import uuid
+from typing import Any, Dict, Optional, Union
+
+import jwt
+from fastapi import Depends, Request
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from app.core.config import settings
+from app.core.config_snapshot import get_config
+from app.core.errors import AuthenticationError, ErrorCode, PermissionDeniedError, TokenExpiredError
+from app.services.entitlements import PlanLimits, get_entitlements
+from jwt_middleware import SECRET_KEY
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+class CurrentUser:
+    """Utente autenticato della richiesta, con i limiti del suo piano."""
+
+    __slots__ = ("user_id", "claims", "limits", "is_admin")
+
+    def __init__(self, user_id: str, claims: Dict[str, Any], limits: PlanLimits, is_admin: bool = False):
+        self.user_id = user_id
+        self.claims = claims
+        self.limits = limits
+        self.is_admin = is_admin
+
+    @property
+    def plan(self) -> str:
+        return self.limits.plan
+
+    @property
+    def account_id(self) -> Optional[int]:
+        """Id numerico dell'utente (colonne user_id BIGINT), None se il token non ne ha uno."""
+        return int(self.user_id) if self.user_id.isdigit() else None
+
+    def scope(self, user_id: Optional[int]) -> Optional[int]:
+        """
+        Utente i cui dati la richiesta può leggere.
+
+        Gli amministratori possono chiedere qualunque utente o, con None, i
+        dati di tutti; gli altri vedono solo i propri.
+
+        Raises:
+            PermissionDeniedError: se si chiedono i dati di un altro utente
+        """
+        if self.is_admin:
+            return user_id
+        if self.account_id is None or (user_id is not None and user_id != self.account_id):
+            raise PermissionDeniedError("Puoi consultare solo i tuoi dati")
+        return self.account_id
+
+
+def create_access_token(
+    subject: Union[str, int],
+    expires_in: Optional[int] = None,
+    extra_claims: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Emette un token di accesso, accettato da JWTMiddleware e get_current_user.
+
+    Args:
+        subject: Utente (claim `sub`)
+        expires_in: Durata in secondi (default: SESSION_TOKEN_EXPIRE_MINUTES)
+        extra_claims: Claim aggiuntivi (es. email)
+    """
+    now = int(time.time())
+    claims = {
+        **(extra_claims or {}),
+        "sub": str(subject),
+        "iat": now,
+        "exp": now + (settings.SESSION_TOKEN_EXPIRE_MINUTES * 60 if expires_in is None else expires_in),
+        "jti": uuid.uuid4().hex,
+    }
+    return jwt.encode(claims, SECRET_KEY, algorithm="HS256")
+
+
+def decode_token(token: str) -> Dict[str, Any]:
+    """
+    Verifica un token di accesso e ne restituisce i claim.
+
+    Raises:
+        TokenExpiredError: se il token è scaduto
+        AuthenticationError: se il token non è valido o non ha il claim `sub`
+    """
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+    except jwt.ExpiredSignatureError:
+        raise TokenExpiredError()
+    except jwt.InvalidTokenError:
+        raise AuthenticationError(ErrorCode.TOKEN_INVALID, "Token di autenticazione non valido")
+    if claims.get("sub") is None:
+        raise AuthenticationError(ErrorCode.TOKEN_INVALID, "Token di autenticazione non valido")
+    return claims
+
+
+async def get_current_user(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+) -> CurrentUser:
+    """
+    Dependency dell'utente autenticato.
+
+    Riusa i claim già verificati dal RateLimitMiddleware, se presenti; i
+    limiti del piano vengono dalla cache in memoria (nessun accesso al
+    database). Imposta request.state.user_id, usato dalla finestra
+    read-your-writes del db_router.
+
+    Raises:
+        AuthenticationError: se manca il token o non è valido
+        TokenExpiredError: se il token è scaduto
+    """
+    claims = getattr(request.state, "token_claims", None)
+    if claims is None:
+        if credentials is None:
+            raise AuthenticationError()
+        claims = decode_token(credentials.credentials)
+    user_id = str(claims["sub"])
+    request.state.user_id = user_id
+    return CurrentUser(user_id, claims, get_entitlements().get(user_id), user_id in get_config().ADMIN_USER_IDS)
+
+
+async def get_admin_user(user: CurrentUser = Depends(get_current_user)) -> CurrentUser:
+    """
+    Dependency degli endpoint riservati agli amministratori (ADMIN_USER_IDS).
+
+    Raises:
+        PermissionDeniedError: se l'utente non è un amministratore
+    """
+    if not user.is_admin:
+        raise PermissionDeniedError()
+    return user
@@ -0,0 +1,248 @@
+import os
+import secrets
+from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, BaseSettings, PostgresDsn, StrictInt, validator
+
+
+class HostLimitSettings(BaseModel):
+    """Limiti di un host del marketplace; i campi mancanti usano i default globali."""
+    concurrency: Optional[StrictInt] = None  # va a un asyncio.Semaphore: intero
+    rate: Optional[float] = None
+    burst: Optional[float] = None
+
+    @validator("concurrency")
+    def positive_concurrency(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v < 1:
+            raise ValueError("concurrency deve essere almeno 1")
+        return v
+
+    @validator("rate", "burst")
+    def positive_rate(cls, v: Optional[float]) -> Optional[float]:
+        if v is not None and v <= 0:
+            raise ValueError("deve essere positivo")
+        return v
+
+
+class Settings(BaseSettings):
+    """Configurazioni dell'applicazione."""
+    # Informazioni di base
+    PROJECT_NAME: str = "Drop Evolution"
+    PROJECT_DESCRIPTION: str = "E-commerce API"
+    VERSION: str = "1.0.0"
+    API_V1_STR: str = "/api/v1"
+    PRODUCTION: bool = os.getenv("ENVIRONMENT", "development").lower() == "production"
+
+    # JWT
+    SECRET_KEY: str = os.getenv("SECRET_KEY", secrets.token_urlsafe(32))
+    JWT_ALGORITHM: str = "HS256"
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 30  # 30 minuti
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 7     # 7 giorni
+    # Utenti (claim `sub`) con accesso ai dati di tutti gli utenti (analytics globali, eventi di tutti)
+    ADMIN_USER_IDS: List[str] = []
+
+    # CORS: origini esatte, con jolly per i sottodomini (es. "https://*.shop.example.com") o "*" per tutte
+    ALLOWED_ORIGINS: List[str] = [
+        "http://localhost:3000",
+        "http://localhost:8000",
+    ]
+    CORS_ALLOW_METHODS: List[str] = ["GET", "POST", "PUT", "PATCH", "DELETE"]
+    CORS_ALLOW_HEADERS: List[str] = ["*"]  # "*": tutti quelli chiesti dal preflight
+    CORS_EXPOSE_HEADERS: List[str] = ["Retry-After", "X-RateLimit-Limit", "X-RateLimit-Remaining", "X-RateLimit-Reset"]
+    CORS_MAX_AGE: int = 86400              # secondi in cui il browser riusa la risposta al preflight
+
+    # Configurazione database (primario, usato per le scritture)
+    DATABASE_URI: Optional[PostgresDsn] = None
+
+    @validator("DATABASE_URI", pre=True)
+    def assemble_db_connection(cls, v: Optional[str], values: Dict[str, Any]) -> Any:
+        if isinstance(v, str):
+            return v
+
+        # Costruisce l'URI di connessione al database
+        return PostgresDsn.build(
+            scheme="postgresql",
+            user=os.getenv("POSTGRES_USER", "postgres"),
+            password=os.getenv("POSTGRES_PASSWORD", "postgres"),
+            host=os.getenv("POSTGRES_HOST", "localhost"),
+            port=os.getenv("POSTGRES_PORT", "5432"),
+            path=f"/{os.getenv('POSTGRES_DB', 'dropevolution')}",
+        )
+
+    # Repliche in sola lettura (JSON list nel .env, es. '["postgresql://..."]')
+    DATABASE_REPLICA_URIS: List[str] = []
+
+    # Pool di connessioni
+    DB_POOL_MIN_SIZE: int = 1
+    DB_POOL_MAX_SIZE: int = 10
+
+    # Finestra (secondi) in cui un utente che ha appena scritto legge dal primario
+    DB_READ_YOUR_WRITES_SECONDS: float = 5.0
+    # Ritardo massimo tollerato per una replica prima di escluderla
+    DB_REPLICA_MAX_LAG_SECONDS: float = 2.0
+    # Intervallo di controllo del ritardo delle repliche
+    DB_REPLICA_LAG_CHECK_INTERVAL: float = 1.0
+    # Attesa massima di una connessione da una replica prima di passare al primario
+    DB_REPLICA_CONNECT_TIMEOUT: float = 0.5
+
+    # Import massivo dei prodotti
+    IMPORT_BATCH_SIZE: int = 5000
+    IMPORT_REJECTS_DIR: str = "imports/rejects"
+    IMPORT_MAX_RECORD_CHARS: int = 65536  # record CSV su più righe (campi tra virgolette)
+
+    # Marketplace (client HTTP condiviso)
+    MARKETPLACE_MAX_CONNECTIONS: int = 100
+    MARKETPLACE_TIMEOUT: float = 10.0
+    MARKETPLACE_MAX_RETRIES: int = 3
+    MARKETPLACE_HOST_CONCURRENCY: int = 8
+    MARKETPLACE_HOST_RATE: float = 5.0  # richieste al secondo per host
+    # Limiti specifici per host, es. {"api.ebay.com": {"concurrency": 16, "rate": 20}}
+    MARKETPLACE_HOST_LIMITS: Dict[str, HostLimitSettings] = {}
+
+    AMAZON_API_URL: str = "https://webservices.amazon.it/paapi5"
+    AMAZON_PARTNER_TAG: str = os.getenv("AMAZON_PARTNER_TAG", "")
+    AMAZON_MARKETPLACE: str = "www.amazon.it"
+    AMAZON_REGION: str = "eu-west-1"
+    AMAZON_ACCESS_KEY: str = os.getenv("AMAZON_ACCESS_KEY", "")
+    AMAZON_SECRET_KEY: str = os.getenv("AMAZON_SECRET_KEY", "")
+
+    EBAY_API_URL: str = "https://api.ebay.com/buy/browse/v1"
+    EBAY_OAUTH_TOKEN: str = os.getenv("EBAY_OAUTH_TOKEN", "")
+    EBAY_MARKETPLACE_ID: str = "EBAY_IT"
+    EBAY_SITE_URL: str = "https://www.ebay.it"
+
+    # Pool di browser Selenium
+    SELENIUM_POOL_SIZE: int = 2
+    SELENIUM_MAX_USES: int = 50  # pagine prima di riavviare un browser
+    SELENIUM_ACQUIRE_TIMEOUT: float = 30.0
+    SELENIUM_PAGE_LOAD_TIMEOUT: float = 20.0
+    SELENIUM_HEADLESS: bool = True
+    # Risorse non scaricate: image, font, stylesheet, media
+    SELENIUM_BLOCK_RESOURCES: List[str] = ["image", "font", "stylesheet", "media"]
+
+    # Scraping a livelli (HTTP prima, browser se serve)
+    SCRAPER_MIN_SAMPLES: int = 5       # tentativi HTTP prima di abbandonare il livello
+    SCRAPER_HTTP_THRESHOLD: float = 0.5
+    SCRAPER_EXPLORE_EVERY: int = 50    # ogni quante richieste riprovare l'HTTP
+
+    # Monitoraggio prezzi e disponibilità
+    # Avvia il monitoraggio all'avvio dell'app: va attivato in un solo processo,
+    # altrimenti ogni worker di uvicorn controllerebbe gli stessi prodotti
+    MONITOR_ENABLED: bool = False
+    MONITOR_RELOAD_INTERVAL: float = 600.0  # secondi tra due letture del catalogo monitorato
+    MONITOR_MIN_INTERVAL: float = 300.0     # 5 minuti per i prodotti più volatili
+    MONITOR_MAX_INTERVAL: float = 86400.0   # 1 giorno per quelli stabili
+    MONITOR_CONCURRENCY: int = 200
+    MONITOR_DEFAULT_SOURCE_CONCURRENCY: int = 20
+    MONITOR_SOURCE_CONCURRENCY: Dict[str, int] = {}
+    MONITOR_JITTER: float = 0.1
+    MONITOR_CHECK_TIMEOUT: float = 60.0
+
+    # Storico prezzi/disponibilità (change detection)
+    SNAPSHOT_FLUSH_THRESHOLD: int = 10000   # punti in memoria prima di forzare la scrittura
+    SNAPSHOT_FLUSH_INTERVAL: float = 30.0   # secondi tra due scritture periodiche
+
+    # Repricing
+    REPRICING_MIN_MARGIN: float = 0.15      # margine netto minimo, in frazione del prezzo
+    REPRICING_FIXED_FEE: float = 0.0        # costo fisso per vendita, in euro
+    REPRICING_FEE_RATES: Dict[str, float] = {"amazon": 0.15, "ebay": 0.12}
+
+    # Analytics
+    ANALYTICS_CACHE_TTL: float = 60.0       # secondi di validità delle risposte in cache
+    ANALYTICS_CACHE_SIZE: int = 1024
+    ANALYTICS_DAILY_SHARDS: int = 8
+
+    # Prenotazione dello stock
+    INVENTORY_HOLD_TTL: float = 600.0           # durata di una prenotazione non confermata (secondi)
+    INVENTORY_MIN_LEASE: int = 5                # unità minime prese in carico dal processo per SKU
+    INVENTORY_MAX_LEASE: int = 500
+    INVENTORY_FLUSH_INTERVAL: float = 1.0       # secondi tra due scritture dei contatori
+    INVENTORY_LEASE_STALE_AFTER: float = 300.0  # lease di processi senza heartbeat da restituire
+
+    # Eventi degli ordini (SSE)
+    ORDER_EVENTS_BUFFER_SIZE: int = 100     # messaggi massimi in coda per client
+    ORDER_EVENTS_HEARTBEAT: float = 15.0    # secondi tra due commenti keep-alive
+
+    # Generazione AI di titoli e descrizioni (API compatibile OpenAI)
+    OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
+    OPENAI_BASE_URL: str = "https://api.openai.com/v1"
+    CONTENT_MODEL: str = "gpt-4o-mini"
+    CONTENT_LANGUAGE: str = "it"
+    CONTENT_BATCH_SIZE: int = 20            # prodotti per richiesta al modello
+    CONTENT_BATCH_WAIT: float = 0.05        # attesa massima per riempire un batch (secondi)
+    CONTENT_CONCURRENCY: int = 4            # richieste contemporanee al provider
+    CONTENT_RATE: float = 5.0               # richieste al secondo verso il provider
+    CONTENT_TIMEOUT: float = 120.0
+    CONTENT_MAX_RETRIES: int = 4
+    CONTENT_CACHE_SIZE: int = 50000         # testi generati tenuti in memoria
+
+    # Rilevamento dei prodotti quasi duplicati (MinHash/LSH)
+    DEDUP_THRESHOLD: float = 0.6            # somiglianza di Jaccard minima tra duplicati
+    DEDUP_NUM_PERM: int = 128               # lunghezza della firma MinHash
+    DEDUP_BANDS: int = 32                   # bande LSH (più bande: più richiamo, più candidati)
+    DEDUP_SYNC_OVERLAP: float = 60.0        # secondi riletti a ogni sincronizzazione col catalogo
+    DEDUP_RECONCILE_INTERVAL: float = 300.0 # secondi tra due controlli dei prodotti cancellati
+    DEDUP_CLUSTERS_TTL: float = 300.0       # secondi di validità dei cluster del catalogo in cache
+
+    # Ricerca full-text sul catalogo
+    SEARCH_MAX_CANDIDATES: int = 20000      # risultati ordinati per rilevanza al massimo per ricerca
+    SEARCH_CACHE_TTL: float = 30.0          # secondi di validità di facet e suggerimenti in cache
+    SEARCH_CACHE_SIZE: int = 4096
+
+    # Webhook Stripe
+    STRIPE_WEBHOOK_SECRET: str = os.getenv("STRIPE_WEBHOOK_SECRET", "")
+    STRIPE_WEBHOOK_TOLERANCE: int = 300         # età massima della firma (secondi)
+    STRIPE_EVENTS_BATCH_SIZE: int = 500         # eventi elaborati per transazione
+    STRIPE_EVENTS_POLL_INTERVAL: float = 1.0    # secondi tra due controlli della coda
+    STRIPE_EVENTS_MAX_ATTEMPTS: int = 10
+    STRIPE_EVENTS_RETRY_BACKOFF: float = 5.0    # attesa prima del primo nuovo tentativo, poi raddoppia
+    STRIPE_EVENTS_RETENTION_DAYS: int = 30      # conservazione degli id già elaborati
+
+    # Piani degli abbonamenti: limiti per piano, dal più basso al più alto
+    ENTITLEMENT_PLANS: Dict[str, Dict[str, float]] = {
+        "free": {"max_skus": 100, "monitor_interval": 86400, "rate_limit": 60},
+        "pro": {"max_skus": 5000, "monitor_interval": 3600, "rate_limit": 600},
+        "business": {"max_skus": 100000, "monitor_interval": 300, "rate_limit": 3000},
+    }
+    ENTITLEMENT_DEFAULT_PLAN: str = "free"        # piano di chi non ha un abbonamento valido
+    ENTITLEMENT_REFRESH_INTERVAL: float = 300.0   # secondi tra due ricaricamenti completi
+    # Piano di ogni prezzo Stripe, es. {"price_1Ov...": "pro"}
+    STRIPE_PRICE_PLANS: Dict[str, str] = {}
+
+    # Firebase Auth: verifica locale degli ID token e scambio con un token di sessione
+    FIREBASE_PROJECT_ID: str = os.getenv("FIREBASE_PROJECT_ID", "")
+    FIREBASE_CERTS_URL: str = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+    FIREBASE_CERTS_MIN_REFRESH: float = 60.0    # secondi minimi tra due download dei certificati
+    FIREBASE_CLOCK_SKEW: float = 10.0           # tolleranza sugli orari dei token (secondi)
+    SESSION_TOKEN_EXPIRE_MINUTES: int = 15      # durata dei token di sessione emessi in cambio
+
+    # Cache dei dati: LRU in processo più livello condiviso opzionale
+    CACHE_MAX_SIZE: int = 10000             # voci nel livello in processo
+    CACHE_TTL: float = 30.0                 # secondi di freschezza di default
+    CACHE_STALE_TTL: float = 300.0          # secondi in cui un valore scaduto viene servito mentre si ricarica
+    CACHE_SHARED: bool = False              # livello condiviso sulla tabella UNLOGGED cache_entries
+    CACHE_PURGE_INTERVAL: float = 300.0     # secondi tra due pulizie del livello condiviso
+
+    # Sicurezza e Rate Limiting
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_DEFAULT: int = 60  # richieste per minuto
+    RATE_LIMIT_LOGIN: int = 5     # tentativi di login per minuto
+
+    # Security Headers
+    SECURITY_HEADERS: Dict[str, str] = {
+        "X-Frame-Options": "DENY",
+        "X-Content-Type-Options": "nosniff",
+        "X-XSS-Protection": "1; mode=block",
+        "Content-Security-Policy": "default-src 'self'; img-src 'self' data:; style-src 'self' 'unsafe-inline'; script-src 'self' 'unsafe-inline';",
+        "Strict-Transport-Security": "max-age=31536000; includeSubDomains",
+        "Referrer-Policy": "strict-origin-when-cross-origin",
+        "Permissions-Policy": "accelerometer=(), camera=(), geolocation=(), gyroscope=(), magnetometer=(), microphone=(), payment=(), usb=()",
+    }
+
+    class Config:
+        env_file = ".env"
+        env_file_encoding = "utf-8"
+        case_sensitive = True
+
+
+# Singleton delle impostazioni
+settings = Settings()
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import re
+import signal
+from types import MappingProxyType
+from typing import Any, Iterable, Mapping, Optional, Tuple
+
+from psycopg.conninfo import conninfo_to_dict
+
+from app.core.config import Settings, settings
+
+logger = logging.getLogger(__name__)
+
+# Un `*` in un'origine consentita vale per uno o più livelli di sottodominio
+_WILDCARD = r"[a-z0-9-]+(?:\.[a-z0-9-]+)*"
+
+
+class OriginMatcher:
+    """
+    Origini CORS consentite, compilate una volta.
+
+    Le origini esatte finiscono in un insieme (una ricerca per richiesta),
+    quelle con `*` (es. "https://*.shop.example.com") in un'unica regex;
+    "*" da solo consente tutte le origini. Il confronto ignora le maiuscole
+    e la "/" finale.
+    """
+
+    __slots__ = ("allow_all", "exact", "pattern")
+
+    def __init__(self, origins: Iterable[str]):
+        exact, wildcards, allow_all = set(), [], False
+        for origin in origins:
+            origin = origin.strip().rstrip("/").lower()
+            if origin == "*":
+                allow_all = True
+            elif "*" in origin:
+                wildcards.append(re.escape(origin).replace(r"\*", _WILDCARD))
+            else:
+                exact.add(origin)
+        self.allow_all = allow_all
+        self.exact = frozenset(exact)
+        self.pattern = re.compile("|".join(wildcards)) if wildcards else None
+
+    def __call__(self, origin: str) -> bool:
+        if self.allow_all:
+            return True
+        origin = origin.lower()
+        return origin in self.exact or (self.pattern is not None and self.pattern.fullmatch(origin) is not None)
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, set, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class ConfigSnapshot:
+    """
+    Copia immutabile delle impostazioni, per i percorsi eseguiti a ogni richiesta.
+
+    Ha gli stessi attributi di Settings (liste come tuple, dizionari in sola
+    lettura) più i valori derivati calcolati una volta: header di sicurezza
+    già codificati per ASGI, matcher delle origini CORS e parametri del DSN
+    del database. Con reload_config() si sostituisce l'intera copia, quindi
+    chi legge `get_config()` una volta per richiesta vede sempre valori
+    coerenti tra loro.
+    """
+
+    __slots__ = (*Settings.__fields__, "security_headers", "cors_origins", "database")
+
+    def __init__(self, source: Settings):
+        for name in Settings.__fields__:
+            object.__setattr__(self, name, _freeze(getattr(source, name)))
+        derived = {
+            "security_headers": tuple(
+                (name.lower().encode("latin-1"), value.encode("latin-1"))
+                for name, value in source.SECURITY_HEADERS.items()
+            ),
+            "cors_origins": OriginMatcher(source.ALLOWED_ORIGINS),
+            "database": MappingProxyType(conninfo_to_dict(str(source.DATABASE_URI)) if source.DATABASE_URI else {}),
+        }
+        for name, value in derived.items():
+            object.__setattr__(self, name, value)
+
+    security_headers: Tuple[Tuple[bytes, bytes], ...]
+    cors_origins: OriginMatcher
+    database: Mapping[str, Any]
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("ConfigSnapshot è immutabile: usa reload_config()")
+
+
+_config = ConfigSnapshot(settings)
+
+
+def get_config() -> ConfigSnapshot:
+    """Copia corrente delle impostazioni (nessuna allocazione)."""
+    return _config
+
+
+def reload_config() -> ConfigSnapshot:
+    """
+    Rilegge variabili d'ambiente e .env e sostituisce la copia corrente.
+
+    Aggiorna anche il singleton `settings`, letto dai percorsi meno caldi.
+    I componenti che hanno letto un valore alla costruzione (pool, client
+    HTTP, task in background) non cambiano fino al riavvio.
+
+    Raises:
+        pydantic.ValidationError: se la nuova configurazione non è valida (resta quella precedente)
+    """
+    global _config
+    fresh = Settings()
+    snapshot = ConfigSnapshot(fresh)
+    settings.__dict__.update(fresh.__dict__)
+    _config = snapshot
+    return snapshot
+
+
+def install_reload_handler(sig: int = getattr(signal, "SIGHUP", 0), loop: Optional[asyncio.AbstractEventLoop] = None) -> bool:
+    """
+    Ricarica la configurazione alla ricezione di un segnale (default SIGHUP).
+
+    Con più worker uvicorn il segnale va inviato a ognuno (es. `pkill -HUP -f uvicorn`).
+
+    Returns:
+        False se la piattaforma non supporta il segnale (es. Windows)
+    """
+    def handle() -> None:
+        try:
+            reload_config()
+        except Exception as e:
+            logger.error("Ricaricamento della configurazione fallito, resta quella precedente: %s", e)
+        else:
+            logger.info("Configurazione ricaricata")
+
+    try:
+        (loop or asyncio.get_running_loop()).add_signal_handler(sig, handle)
+    except (NotImplementedError, RuntimeError, ValueError):
+        return False
+    return True
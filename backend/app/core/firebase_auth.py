@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Any, Dict, Mapping, Optional
+
+import httpx
+import jwt
+from cryptography import x509
+from fastapi import Request
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from app.core.config import settings
+from app.core.config_snapshot import get_config
+from app.core.errors import AuthenticationError, ErrorCode, ServiceUnavailableError, TokenExpiredError
+
+logger = logging.getLogger(__name__)
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+def cache_max_age(cache_control: Optional[str], default: float) -> float:
+    """Durata (secondi) indicata da un header Cache-Control, o `default` se manca."""
+    match = _MAX_AGE.search(cache_control or "")
+    return float(match.group(1)) if match else default
+
+
+class FirebaseCertificates:
+    """
+    Chiavi pubbliche con cui Google firma gli ID token di Firebase Auth.
+
+    I certificati x509 vengono scaricati e convertiti in chiavi una volta sola
+    e tenuti in memoria per il max-age dichiarato dal Cache-Control della
+    risposta; un task in background li riscarica prima della scadenza
+    (all'80% della durata), quindi la verifica di un token non fa mai
+    richieste di rete. Se un download fallisce restano valide le chiavi
+    precedenti: Google pubblica le nuove chiavi con molto anticipo.
+    """
+
+    def __init__(
+        self,
+        url: str = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com",
+        min_refresh: float = 60.0,
+        default_max_age: float = 3600.0,
+        timeout: float = 10.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        """
+        Args:
+            url: Endpoint dei certificati ({kid: certificato PEM})
+            min_refresh: Secondi minimi tra due download (anche dopo un errore)
+            default_max_age: Durata se la risposta non ha Cache-Control
+            timeout: Timeout del download
+            transport: Transport httpx alternativo (es. MockTransport nei test)
+        """
+        self.url = url
+        self.min_refresh = min_refresh
+        self.default_max_age = default_max_age
+        self._client = httpx.AsyncClient(timeout=timeout, transport=transport)
+        self._keys: Dict[str, Any] = {}
+        self.expires_at = 0.0
+        self._last_fetch = 0.0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"fetches": 0, "errors": 0}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def ready(self) -> bool:
+        return bool(self._keys)
+
+    def key(self, kid: str) -> Optional[Any]:
+        """
+        Chiave pubblica con questo kid, senza I/O.
+
+        Un kid sconosciuto anticipa il prossimo download (al più uno ogni
+        `min_refresh` secondi), senza attenderlo.
+        """
+        key = self._keys.get(kid)
+        if key is None and self._keys:
+            self._wakeup.set()
+        return key
+
+    def load(self, certificates: Mapping[str, str], max_age: Optional[float] = None) -> None:
+        """Sostituisce le chiavi con quelle dei certificati PEM {kid: certificato}."""
+        self._keys = {
+            kid: x509.load_pem_x509_certificate(pem.encode()).public_key()
+            for kid, pem in certificates.items()
+        }
+        self.expires_at = time.monotonic() + (self.default_max_age if max_age is None else max_age)
+
+    async def fetch(self) -> float:
+        """Scarica i certificati; restituisce il max-age della risposta."""
+        self._last_fetch = time.monotonic()
+        self.stats["fetches"] += 1
+        response = await self._client.get(self.url)
+        response.raise_for_status()
+        max_age = cache_max_age(response.headers.get("cache-control"), self.default_max_age)
+        self.load(response.json(), max_age)
+        return max_age
+
+    async def run(self) -> None:
+        """Riscarica i certificati prima della scadenza, o subito se compare un kid sconosciuto."""
+        while True:
+            try:
+                max_age = await self.fetch()
+                delay = max(self.min_refresh, max_age * 0.8)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning("Download dei certificati Firebase fallito: %s", e)
+                delay = self.min_refresh
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            # Un kid sconosciuto sveglia prima, ma mai più spesso di min_refresh
+            await asyncio.sleep(max(0.0, self._last_fetch + self.min_refresh - time.monotonic()))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._client.aclose()
+
+
+def verify_firebase_token(
+    token: str,
+    certificates: FirebaseCertificates,
+    project_id: Optional[str] = None,
+    leeway: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Verifica in locale un ID token di Firebase Auth (RS256).
+
+    Controlla firma, scadenza, emissione, audience (il progetto), issuer e
+    soggetto come prescritto dalla documentazione di Firebase.
+
+    Args:
+        token: ID token emesso da Firebase Auth
+        certificates: Chiavi pubbliche di Google
+        project_id: Progetto Firebase (default: FIREBASE_PROJECT_ID)
+        leeway: Tolleranza sugli orari in secondi (default: FIREBASE_CLOCK_SKEW)
+
+    Returns:
+        I claim del token (uid in `sub`)
+
+    Raises:
+        ServiceUnavailableError: se il progetto non è configurato o le chiavi non sono ancora caricate
+        TokenExpiredError: se il token è scaduto
+        AuthenticationError: se il token non è valido
+    """
+    config = get_config()
+    project_id = project_id or config.FIREBASE_PROJECT_ID
+    leeway = config.FIREBASE_CLOCK_SKEW if leeway is None else leeway
+    if not project_id or not certificates.ready:
+        raise ServiceUnavailableError("Autenticazione Firebase non disponibile")
+    invalid = AuthenticationError(ErrorCode.TOKEN_INVALID, "Token Firebase non valido")
+    try:
+        header = jwt.get_unverified_header(token)
+    except jwt.InvalidTokenError:
+        raise invalid
+    key = certificates.key(header.get("kid", ""))
+    if header.get("alg") != "RS256" or key is None:
+        raise invalid
+    try:
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=["RS256"],
+            audience=project_id,
+            issuer=f"https://securetoken.google.com/{project_id}",
+            leeway=leeway,
+            options={"require": ["exp", "iat", "sub", "aud", "iss"]},
+        )
+    except jwt.ExpiredSignatureError:
+        raise TokenExpiredError()
+    except jwt.InvalidTokenError:
+        raise invalid
+    sub = claims.get("sub")
+    if not isinstance(sub, str) or not 0 < len(sub) <= 128:
+        raise invalid
+    if claims.get("auth_time", 0) > time.time() + leeway:
+        raise invalid
+    return claims
+
+
+class FirebaseBearer(HTTPBearer):
+    """
+    Dependency che autentica la richiesta con un ID token Firebase.
+
+    Alternativa a get_current_user per gli endpoint chiamati direttamente dal
+    frontend con il token di Firebase Auth; restituisce i claim e imposta
+    request.state.user_id (uid Firebase). L'uid non è l'id interno dell'utente:
+    gli endpoint che usano piani o dati per utente richiedono get_current_user.
+    """
+
+    def __init__(self, certificates: Optional[FirebaseCertificates] = None):
+        super().__init__(auto_error=False)
+        self._certificates = certificates
+
+    async def __call__(self, request: Request) -> Dict[str, Any]:
+        credentials: Optional[HTTPAuthorizationCredentials] = await super().__call__(request)
+        if credentials is None:
+            raise AuthenticationError()
+        claims = verify_firebase_token(credentials.credentials, self._certificates if self._certificates is not None else get_firebase_certificates())
+        request.state.user_id = claims["sub"]
+        return claims
+
+
+_certificates: Optional[FirebaseCertificates] = None
+
+
+def get_firebase_certificates() -> FirebaseCertificates:
+    """Certificati Firebase del processo."""
+    global _certificates
+    if _certificates is None:
+        _certificates = FirebaseCertificates(settings.FIREBASE_CERTS_URL, min_refresh=settings.FIREBASE_CERTS_MIN_REFRESH)
+    return _certificates
+
+
+async def close_firebase_certificates() -> None:
+    global _certificates
+    if _certificates is not None:
+        await _certificates.close()
+        _certificates = None
@@ -0,0 +1,226 @@
+from typing import List
+
+from psycopg import AsyncConnection
+
+# DDL delle tabelle usate dai servizi (idempotente, eseguibile a ogni avvio)
+SCHEMA_STATEMENTS: List[str] = [
+    """
+    CREATE TABLE IF NOT EXISTS products (
+        id BIGSERIAL PRIMARY KEY,
+        sku VARCHAR(64) UNIQUE,
+        name VARCHAR(100) NOT NULL,
+        description VARCHAR(1000),
+        price NUMERIC(12, 2) NOT NULL CHECK (price >= 0),
+        stock INTEGER NOT NULL CHECK (stock >= 0),
+        category_id INTEGER,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_products_category_id ON products (category_id)",
+    # Input del repricing (app.services.repricing)
+    "ALTER TABLE products ADD COLUMN IF NOT EXISTS supplier_cost NUMERIC(12, 2)",
+    "ALTER TABLE products ADD COLUMN IF NOT EXISTS competitor_price NUMERIC(12, 2)",
+    # Utente che ha importato lo SKU: conta per il limite max_skus del suo piano (NULL: nessun limite)
+    "ALTER TABLE products ADD COLUMN IF NOT EXISTS owner_id BIGINT",
+    "CREATE INDEX IF NOT EXISTS ix_products_owner_id ON products (owner_id)",
+    # Ricerca full-text (app.services.search): il vettore è una colonna generata,
+    # quindi resta allineato a ogni scrittura sui prodotti
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('italian', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('italian', coalesce(description, '')), 'B')
+        ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING gin (lower(name) gin_trgm_ops)",
+    """
+    CREATE TABLE IF NOT EXISTS orders (
+        id BIGSERIAL PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        status VARCHAR(20) NOT NULL DEFAULT 'pending',
+        shipping_address VARCHAR(255) NOT NULL,
+        notes VARCHAR(1000),
+        total_amount NUMERIC(12, 2) NOT NULL DEFAULT 0,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_orders_user_id ON orders (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_orders_created_at ON orders (created_at)",
+    # Riferimento dell'ordine sul marketplace: rende idempotente la sync massiva
+    "ALTER TABLE orders ADD COLUMN IF NOT EXISTS external_ref VARCHAR(128) UNIQUE",
+    # unit_cost: costo fornitore al momento dell'ordine, per il calcolo del profitto
+    """
+    CREATE TABLE IF NOT EXISTS order_items (
+        id BIGSERIAL PRIMARY KEY,
+        order_id BIGINT NOT NULL REFERENCES orders (id) ON DELETE CASCADE,
+        product_id BIGINT NOT NULL REFERENCES products (id),
+        quantity INTEGER NOT NULL CHECK (quantity > 0),
+        unit_price NUMERIC(12, 2) NOT NULL CHECK (unit_price >= 0),
+        unit_cost NUMERIC(12, 2),
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_order_items_order_id ON order_items (order_id)",
+    # Stock preso in carico dai processi (app.services.inventory): products.stock è la
+    # quota non assegnata, ogni processo vende dalla propria lease senza toccare la riga del prodotto
+    """
+    CREATE TABLE IF NOT EXISTS stock_leases (
+        worker_id VARCHAR(64) NOT NULL,
+        product_id BIGINT NOT NULL REFERENCES products (id),
+        quantity INTEGER NOT NULL CHECK (quantity >= 0),
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (worker_id, product_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stock_holds (
+        reservation_id UUID NOT NULL,
+        product_id BIGINT NOT NULL,
+        worker_id VARCHAR(64) NOT NULL,
+        quantity INTEGER NOT NULL CHECK (quantity > 0),
+        state VARCHAR(10) NOT NULL DEFAULT 'held',
+        expires_at TIMESTAMPTZ NOT NULL,
+        PRIMARY KEY (reservation_id, product_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_stock_holds_worker_id ON stock_holds (worker_id)",
+    # Unità in lease per prodotto: giacenza nelle letture e import (app.services.inventory.PRODUCT_STOCK)
+    "CREATE INDEX IF NOT EXISTS ix_stock_leases_product_id ON stock_leases (product_id)",
+    # Rollup analitici mantenuti in modo incrementale (vedi app.services.analytics).
+    # Il totale giornaliero è diviso in shard per non serializzare gli aggiornamenti su una riga
+    """
+    CREATE TABLE IF NOT EXISTS analytics_daily (
+        day DATE NOT NULL,
+        shard SMALLINT NOT NULL,
+        orders INTEGER NOT NULL DEFAULT 0,
+        items INTEGER NOT NULL DEFAULT 0,
+        revenue NUMERIC(14, 2) NOT NULL DEFAULT 0,
+        cost NUMERIC(14, 2) NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, shard)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS analytics_product_daily (
+        day DATE NOT NULL,
+        product_id BIGINT NOT NULL,
+        orders INTEGER NOT NULL DEFAULT 0,
+        quantity INTEGER NOT NULL DEFAULT 0,
+        revenue NUMERIC(14, 2) NOT NULL DEFAULT 0,
+        cost NUMERIC(14, 2) NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, product_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS analytics_user_daily (
+        user_id BIGINT NOT NULL,
+        day DATE NOT NULL,
+        orders INTEGER NOT NULL DEFAULT 0,
+        items INTEGER NOT NULL DEFAULT 0,
+        revenue NUMERIC(14, 2) NOT NULL DEFAULT 0,
+        cost NUMERIC(14, 2) NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, day)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS analytics_user_product_daily (
+        user_id BIGINT NOT NULL,
+        day DATE NOT NULL,
+        product_id BIGINT NOT NULL,
+        orders INTEGER NOT NULL DEFAULT 0,
+        quantity INTEGER NOT NULL DEFAULT 0,
+        revenue NUMERIC(14, 2) NOT NULL DEFAULT 0,
+        cost NUMERIC(14, 2) NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, day, product_id)
+    )
+    """,
+    # Storico prezzo/disponibilità: una riga per SKU e mese, punti codificati delta + varint
+    # (vedi app.services.snapshot_store)
+    """
+    CREATE TABLE IF NOT EXISTS product_price_history (
+        sku VARCHAR(64) NOT NULL,
+        month DATE NOT NULL,
+        last_ts BIGINT NOT NULL,
+        last_price_cents BIGINT NOT NULL,
+        last_in_stock SMALLINT NOT NULL,
+        state_hash BIGINT NOT NULL,
+        points INTEGER NOT NULL,
+        data BYTEA NOT NULL,
+        PRIMARY KEY (sku, month)
+    )
+    """,
+    # Testi generati dal modello, indicizzati per hash del contenuto di origine
+    # (vedi app.services.content_generation)
+    """
+    CREATE TABLE IF NOT EXISTS generated_content (
+        content_hash BYTEA PRIMARY KEY,
+        model VARCHAR(64) NOT NULL,
+        title VARCHAR(100) NOT NULL,
+        description VARCHAR(1000) NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    # Utenti registrati con Firebase Auth: l'id è quello delle colonne user_id e
+    # il `sub` dei token di sessione (vedi app.services.users)
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id BIGSERIAL PRIMARY KEY,
+        firebase_uid VARCHAR(128) NOT NULL UNIQUE,
+        email VARCHAR(320),
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        last_login_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    # Coda dei webhook Stripe: l'id dell'evento rende idempotenti consegne e ritentativi
+    # (vedi app.services.stripe_events)
+    """
+    CREATE TABLE IF NOT EXISTS stripe_events (
+        id VARCHAR(255) PRIMARY KEY,
+        type VARCHAR(100) NOT NULL,
+        created BIGINT NOT NULL,
+        payload JSONB NOT NULL,
+        received_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        available_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        processed_at TIMESTAMPTZ,
+        outcome VARCHAR(20),
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_stripe_events_pending ON stripe_events (created, id) WHERE processed_at IS NULL",
+    """
+    CREATE TABLE IF NOT EXISTS stripe_subscriptions (
+        id VARCHAR(255) PRIMARY KEY,
+        customer_id VARCHAR(255) NOT NULL,
+        user_id BIGINT,
+        status VARCHAR(30) NOT NULL,
+        price_id VARCHAR(255),
+        current_period_end TIMESTAMPTZ,
+        cancel_at_period_end BOOLEAN NOT NULL DEFAULT false,
+        event_created BIGINT NOT NULL,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_stripe_subscriptions_user_id ON stripe_subscriptions (user_id)",
+    # Livello condiviso della cache dei dati: UNLOGGED, il contenuto è ricostruibile
+    # (vedi app.services.cache)
+    """
+    CREATE UNLOGGED TABLE IF NOT EXISTS cache_entries (
+        key TEXT PRIMARY KEY,
+        value BYTEA NOT NULL,
+        tags TEXT[] NOT NULL DEFAULT '{}',
+        fresh_until TIMESTAMPTZ NOT NULL,
+        stale_until TIMESTAMPTZ NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_cache_entries_tags ON cache_entries USING gin (tags)",
+]
+
+
+async def create_schema(conn: AsyncConnection) -> None:
+    """Crea le tabelle mancanti."""
+    for statement in SCHEMA_STATEMENTS:
+        await conn.execute(statement)
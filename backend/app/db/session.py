@@ -0,0 +1,427 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+import math
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import Request
+from psycopg import AsyncConnection
+from psycopg_pool import AsyncConnectionPool
+
+from app.core.config import settings
+from jwt_middleware import SECRET_KEY
+
+logger = logging.getLogger(__name__)
+
+# Metodi HTTP che non modificano lo stato: non attivano la stickiness sul primario
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+# Cookie firmato con la fine della finestra read-your-writes, valido su tutti i worker
+STICKY_COOKIE = "db_rw"
+
+# Ritardo di replica in secondi; 0 se la replica ha già applicato tutto il WAL ricevuto
+REPLICA_LAG_QUERY = """
+SELECT CASE
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+END
+"""
+
+PoolFactory = Callable[[str, int, int], AsyncConnectionPool]
+LagProbe = Callable[[AsyncConnection], Awaitable[Optional[float]]]
+
+
+def default_pool_factory(dsn: str, min_size: int, max_size: int) -> AsyncConnectionPool:
+    """Crea un pool psycopg non ancora aperto."""
+    return AsyncConnectionPool(dsn, min_size=min_size, max_size=max_size, open=False)
+
+
+async def query_replica_lag(conn: AsyncConnection) -> Optional[float]:
+    """
+    Legge il ritardo di replica dal server.
+
+    Returns:
+        Il ritardo in secondi, oppure None se il server non è in recovery
+    """
+    cursor = await conn.execute(REPLICA_LAG_QUERY)
+    row = await cursor.fetchone()
+    if not row or row[0] is None:
+        return None
+    return float(row[0])
+
+
+class ReplicaNode:
+    """Stato di una replica: pool, ultimo ritardo misurato e salute."""
+
+    def __init__(self, dsn: str, pool: AsyncConnectionPool):
+        self.dsn = dsn
+        self.pool = pool
+        self.lag: float = 0.0
+        self.healthy: bool = True
+
+    def is_available(self, max_lag: float) -> bool:
+        return self.healthy and self.lag <= max_lag
+
+
+class DatabaseRouter:
+    """
+    Instrada le connessioni tra il primario e le repliche in sola lettura.
+
+    Le letture vanno su una replica disponibile, le scritture sul primario.
+    Dopo una scrittura, le letture dello stesso utente restano sul primario per
+    `sticky_seconds` (read-your-writes). La finestra è registrata nel processo
+    e, per le letture servite da un altro worker, in un token firmato
+    (sticky_token) che DatabaseCommitMiddleware invia come cookie. Un task in
+    background misura il ritardo delle repliche, esclude quelle troppo indietro
+    o irraggiungibili e ripulisce le finestre scadute; se nessuna replica è
+    disponibile le letture ricadono sul primario.
+    """
+
+    def __init__(
+        self,
+        primary_dsn: str,
+        replica_dsns: List[str],
+        *,
+        min_size: int = 1,
+        max_size: int = 10,
+        sticky_seconds: float = 5.0,
+        max_lag: float = 2.0,
+        check_interval: float = 1.0,
+        replica_timeout: float = 0.5,
+        pool_factory: PoolFactory = default_pool_factory,
+        lag_probe: LagProbe = query_replica_lag,
+        clock: Callable[[], float] = time.monotonic,
+        sticky_secret: str = "",
+        wall_clock: Callable[[], float] = time.time,
+    ):
+        """
+        Inizializza il router.
+
+        Args:
+            primary_dsn: DSN del database primario
+            replica_dsns: DSN delle repliche in sola lettura
+            min_size: Connessioni minime per pool
+            max_size: Connessioni massime per pool
+            sticky_seconds: Durata della finestra read-your-writes
+            max_lag: Ritardo massimo tollerato per una replica (secondi)
+            check_interval: Intervallo del controllo di ritardo (secondi)
+            replica_timeout: Attesa massima di una connessione da una replica (secondi)
+            pool_factory: Factory dei pool (sostituibile nei test)
+            lag_probe: Funzione che misura il ritardo su una connessione
+            clock: Orologio monotono (sostituibile nei test)
+            sticky_secret: Chiave HMAC dei token read-your-writes (vuota: nessun token)
+            wall_clock: Orologio di sistema dei token, condiviso tra i worker (sostituibile nei test)
+        """
+        self.sticky_seconds = sticky_seconds
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.replica_timeout = replica_timeout
+        self._lag_probe = lag_probe
+        self._clock = clock
+        self._sticky_secret = sticky_secret.encode()
+        self._wall_clock = wall_clock
+
+        self.primary = pool_factory(primary_dsn, min_size, max_size)
+        self.replicas = [
+            ReplicaNode(dsn, pool_factory(dsn, min_size, max_size))
+            for dsn in replica_dsns
+        ]
+
+        self._sticky_until: Dict[str, float] = {}
+        self._monitor_task: Optional[asyncio.Task] = None
+
+    async def open(self) -> None:
+        """Apre i pool e avvia il monitoraggio del ritardo delle repliche."""
+        await self.primary.open()
+        for node in self.replicas:
+            try:
+                await node.pool.open()
+            except Exception:
+                node.healthy = False
+                logger.warning("Replica %s non raggiungibile all'avvio", node.dsn)
+
+        if self.replicas and self._monitor_task is None:
+            self._monitor_task = asyncio.create_task(self._monitor_lag())
+
+    async def close(self) -> None:
+        """Ferma il monitoraggio e chiude tutti i pool."""
+        if self._monitor_task is not None:
+            self._monitor_task.cancel()
+            try:
+                await self._monitor_task
+            except asyncio.CancelledError:
+                pass
+            self._monitor_task = None
+
+        for node in self.replicas:
+            await node.pool.close()
+        await self.primary.close()
+
+    def mark_write(self, key: Optional[str]) -> None:
+        """
+        Registra una scrittura: le letture di `key` restano sul primario per la finestra.
+
+        Senza repliche non serve: le letture vanno comunque sul primario. Le
+        voci scadute vengono rimosse dal task di controllo delle repliche
+        (prune_sticky), non qui.
+        """
+        if not key or self.sticky_seconds <= 0 or not self.replicas:
+            return
+        self._sticky_until[key] = self._clock() + self.sticky_seconds
+
+    def prune_sticky(self) -> int:
+        """Rimuove le finestre scadute; restituisce quante."""
+        now = self._clock()
+        expired = [key for key, until in self._sticky_until.items() if until <= now]
+        for key in expired:
+            del self._sticky_until[key]
+        return len(expired)
+
+    def _sign(self, until: str) -> str:
+        return hmac.new(self._sticky_secret, until.encode(), hashlib.sha256).hexdigest()
+
+    def sticky_token(self) -> Optional[str]:
+        """
+        Token firmato con la fine della finestra read-your-writes (ora di sistema).
+
+        Restituisce None se non serve (niente repliche o finestra nulla) o se
+        manca la chiave. Gli orologi dei worker vanno tenuti sincronizzati
+        (NTP): uno scarto riduce o allunga la finestra della stessa quantità.
+        """
+        if not self._sticky_secret or self.sticky_seconds <= 0 or not self.replicas:
+            return None
+        until = f"{self._wall_clock() + self.sticky_seconds:.3f}"
+        return f"{until}.{self._sign(until)}"
+
+    def token_is_sticky(self, token: Optional[str]) -> bool:
+        """Indica se un token di sticky_token è autentico e la sua finestra è ancora aperta."""
+        if not token or not self._sticky_secret:
+            return False
+        until, _, signature = token.rpartition(".")
+        if not hmac.compare_digest(signature, self._sign(until)):
+            return False
+        try:
+            return float(until) > self._wall_clock()
+        except ValueError:
+            return False
+
+    def is_sticky(self, key: Optional[str]) -> bool:
+        """Indica se le letture di `key` devono ancora andare sul primario."""
+        if not key:
+            return False
+        until = self._sticky_until.get(key)
+        if until is None:
+            return False
+        if until <= self._clock():
+            self._sticky_until.pop(key, None)
+            return False
+        return True
+
+    def choose_replica(self) -> Optional[ReplicaNode]:
+        """Sceglie a caso una replica disponibile, o None se nessuna lo è."""
+        candidates = [node for node in self.replicas if node.is_available(self.max_lag)]
+        if not candidates:
+            return None
+        return random.choice(candidates)
+
+    @asynccontextmanager
+    async def connection(
+        self,
+        read_only: bool = False,
+        sticky_key: Optional[str] = None,
+    ) -> AsyncIterator[AsyncConnection]:
+        """
+        Fornisce una connessione dal pool appropriato.
+
+        La transazione viene confermata all'uscita, o annullata in caso di errore.
+
+        Args:
+            read_only: True se il chiamante esegue solo letture
+            sticky_key: Chiave dell'utente per la finestra read-your-writes
+        """
+        pool = self.primary
+        conn: Optional[AsyncConnection] = None
+
+        if read_only and not self.is_sticky(sticky_key):
+            node = self.choose_replica()
+            if node is not None:
+                try:
+                    # Timeout breve: una replica ferma non deve trattenere la richiesta
+                    conn = await node.pool.getconn(timeout=self.replica_timeout)
+                    pool = node.pool
+                except Exception as e:
+                    # Failover: la replica viene esclusa fino al prossimo controllo riuscito
+                    node.healthy = False
+                    logger.warning("Replica %s non disponibile, uso il primario: %s", node.dsn, e)
+
+        if conn is None:
+            conn = await self.primary.getconn()
+
+        try:
+            yield conn
+            await conn.commit()
+        except BaseException:
+            await conn.rollback()
+            raise
+        finally:
+            await pool.putconn(conn)
+
+    async def check_replicas(self) -> None:
+        """Misura il ritardo di tutte le repliche e ne aggiorna lo stato."""
+        for node in self.replicas:
+            was_available = node.is_available(self.max_lag)
+            try:
+                async with node.pool.connection(timeout=self.check_interval) as conn:
+                    lag = await self._lag_probe(conn)
+                node.lag = lag or 0.0
+                node.healthy = True
+            except Exception as e:
+                node.healthy = False
+                logger.debug("Controllo replica %s fallito: %s", node.dsn, e)
+
+            is_available = node.is_available(self.max_lag)
+            if was_available != is_available:
+                logger.warning(
+                    "Replica %s %s (lag=%.2fs, healthy=%s)",
+                    node.dsn,
+                    "di nuovo disponibile" if is_available else "esclusa",
+                    node.lag,
+                    node.healthy,
+                )
+
+    async def _monitor_lag(self) -> None:
+        while True:
+            await self.check_replicas()
+            self.prune_sticky()
+            await asyncio.sleep(self.check_interval)
+
+
+def sticky_key(request: Request) -> Optional[str]:
+    """
+    Chiave read-your-writes: l'utente autenticato, altrimenti l'IP del client.
+
+    L'utente viene da get_current_user o, se la dependency non è ancora stata
+    risolta, dai claim già verificati dal RateLimitMiddleware.
+    """
+    user_id = getattr(request.state, "user_id", None)
+    if user_id is None:
+        claims = getattr(request.state, "token_claims", None)
+        if claims is not None:
+            user_id = claims.get("sub")
+    if user_id is not None:
+        return f"user:{user_id}"
+    if request.client is not None:
+        return f"ip:{request.client.host}"
+    return None
+
+
+def mark_request_write(request: Request) -> None:
+    """
+    Attiva la finestra read-your-writes dopo una scrittura confermata della richiesta.
+
+    Oltre a registrarla nel processo, lascia in request.state il token che
+    DatabaseCommitMiddleware invia come cookie: le letture successive dello
+    stesso client vanno sul primario anche se le serve un altro worker.
+    """
+    db_router.mark_write(sticky_key(request))
+    token = db_router.sticky_token()
+    if token is not None:
+        request.state.db_sticky_cookie = (
+            f"{STICKY_COOKIE}={token}; Max-Age={math.ceil(db_router.sticky_seconds)}; "
+            "Path=/; HttpOnly; SameSite=Lax"
+        )
+
+
+def read_is_sticky(request: Request) -> bool:
+    """Indica se la richiesta porta una finestra read-your-writes aperta (cookie o processo)."""
+    return db_router.token_is_sticky(request.cookies.get(STICKY_COOKIE)) or db_router.is_sticky(sticky_key(request))
+
+
+# Router singleton, aperto/chiuso dagli eventi di startup/shutdown dell'app
+db_router = DatabaseRouter(
+    str(settings.DATABASE_URI),
+    settings.DATABASE_REPLICA_URIS,
+    min_size=settings.DB_POOL_MIN_SIZE,
+    max_size=settings.DB_POOL_MAX_SIZE,
+    sticky_seconds=settings.DB_READ_YOUR_WRITES_SECONDS,
+    max_lag=settings.DB_REPLICA_MAX_LAG_SECONDS,
+    check_interval=settings.DB_REPLICA_LAG_CHECK_INTERVAL,
+    replica_timeout=settings.DB_REPLICA_CONNECT_TIMEOUT,
+    sticky_secret=SECRET_KEY,
+)
+
+
+async def init_db() -> None:
+    """Apre i pool e crea le tabelle mancanti sul primario."""
+    from app.db.schema import create_schema
+
+    await db_router.open()
+    async with db_router.connection() as conn:
+        await create_schema(conn)
+
+
+async def close_db() -> None:
+    await db_router.close()
+
+
+async def commit_pending(request: Request, success: bool) -> None:
+    """
+    Conferma (o annulla) la transazione di get_db prima di inviare la risposta.
+
+    Con FastAPI 0.95 il codice dopo lo `yield` di una dependency gira dopo
+    l'invio della risposta: il client riceverebbe un 200 prima del COMMIT e
+    potrebbe leggere da una replica prima che la finestra read-your-writes
+    sia attiva. DatabaseCommitMiddleware chiama questa funzione quando parte
+    la risposta; senza middleware la conferma resta all'uscita di get_db.
+
+    Args:
+        request: Richiesta che ha usato get_db
+        success: True per confermare (risposta 2xx/3xx), False per annullare
+
+    Raises:
+        psycopg.Error: se il COMMIT fallisce (la transazione viene annullata)
+    """
+    conn: Optional[AsyncConnection] = getattr(request.state, "db_pending", None)
+    if conn is None:
+        return
+    request.state.db_pending = None
+    if not success:
+        await conn.rollback()
+        return
+    try:
+        await conn.commit()
+    except BaseException:
+        await conn.rollback()
+        raise
+    if request.method not in SAFE_METHODS:
+        mark_request_write(request)
+
+
+async def get_db(request: Request) -> AsyncIterator[AsyncConnection]:
+    """
+    Dependency per le operazioni di scrittura: connessione sul primario.
+
+    La transazione viene confermata da DatabaseCommitMiddleware prima della
+    risposta; le richieste non sicure (POST, PUT, ...) confermate attivano la
+    finestra read-your-writes.
+    """
+    async with db_router.connection() as conn:
+        request.state.db_pending = conn
+        yield conn
+        # Nessun middleware (es. test o script): si conferma qui, dopo la risposta
+        await commit_pending(request, success=True)
+
+
+async def get_read_db(request: Request) -> AsyncIterator[AsyncConnection]:
+    """
+    Dependency per le sole letture: connessione su una replica quando possibile.
+
+    Nella finestra read-your-writes del client (anche aperta da un altro
+    worker, tramite il cookie) la connessione è sul primario.
+    """
+    async with db_router.connection(read_only=not read_is_sticky(request)) as conn:
+        yield conn
@@ -0,0 +1,157 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config_snapshot import ConfigSnapshot, get_config
+
+Header = Tuple[bytes, bytes]
+
+# Header che il browser manda sempre senza chiederli nel preflight
+SAFELISTED_HEADERS = {"accept", "accept-language", "content-language", "content-type"}
+
+
+class CORSPolicy:
+    """
+    Regole CORS di una copia della configurazione, con gli header già codificati.
+
+    Per ogni origine resta in memoria l'esito del confronto (al più
+    `max_origins` origini), quindi anche le origini con jolly costano una
+    regex solo alla prima richiesta.
+    """
+
+    __slots__ = ("config", "matcher", "methods", "allow_all_headers", "allowed_headers",
+                 "preflight_headers", "simple_headers", "max_origins", "_origins")
+
+    def __init__(self, config: ConfigSnapshot, max_origins: int = 10_000):
+        self.config = config
+        self.matcher = config.cors_origins
+        self.methods = frozenset(m.upper() for m in config.CORS_ALLOW_METHODS) | {"OPTIONS"}
+        self.allow_all_headers = "*" in config.CORS_ALLOW_HEADERS
+        self.allowed_headers = SAFELISTED_HEADERS | {h.lower() for h in config.CORS_ALLOW_HEADERS}
+        # Le credenziali sono consentite: l'origine va sempre ripetuta (mai "*"), quindi Vary: Origin
+        self.preflight_headers: List[Header] = [
+            (b"access-control-allow-methods", ", ".join(sorted(self.methods)).encode()),
+            (b"access-control-max-age", str(config.CORS_MAX_AGE).encode()),
+            (b"access-control-allow-credentials", b"true"),
+            (b"vary", b"Origin"),
+        ]
+        if not self.allow_all_headers:
+            self.preflight_headers.append((b"access-control-allow-headers", ", ".join(sorted(self.allowed_headers)).encode()))
+        self.simple_headers: List[Header] = [(b"access-control-allow-credentials", b"true")]
+        if config.CORS_EXPOSE_HEADERS:
+            self.simple_headers.append((b"access-control-expose-headers", ", ".join(config.CORS_EXPOSE_HEADERS).encode()))
+        self.max_origins = max_origins
+        self._origins: Dict[bytes, bool] = {}
+
+    def allowed(self, origin: bytes) -> bool:
+        result = self._origins.get(origin)
+        if result is None:
+            result = self.matcher(origin.decode("latin-1"))
+            if len(self._origins) >= self.max_origins:
+                self._origins.clear()
+            self._origins[origin] = result
+        return result
+
+    def headers_allowed(self, requested: bytes) -> bool:
+        if self.allow_all_headers:
+            return True
+        return all(h.strip() in self.allowed_headers for h in requested.decode("latin-1").lower().split(",") if h.strip())
+
+
+def _with_vary(headers: Iterable[Header]) -> List[Header]:
+    """Header della risposta con `Origin` aggiunto a Vary."""
+    result, vary = [], None
+    for name, value in headers:
+        if name.lower() == b"vary":
+            vary = value
+        else:
+            result.append((name, value))
+    result.append((b"vary", b"Origin" if vary is None else vary + b", Origin"))
+    return result
+
+
+class CORSMiddleware:
+    """
+    CORS con origini da ALLOWED_ORIGINS (esatte o con jolly), credenziali consentite.
+
+    Sostituisce quello di Starlette: le origini consentite stanno in un
+    insieme più un'unica regex invece di una lista scorsa a ogni richiesta,
+    gli header sono codificati una volta e seguono i ricaricamenti della
+    configurazione. Va aggiunto per ultimo (è il più esterno): i preflight
+    ricevono risposta qui, senza passare da rate limiting e routing, e
+    Access-Control-Max-Age lunga li rende rari.
+    """
+
+    def __init__(self, app: ASGIApp, config: Optional[ConfigSnapshot] = None):
+        self.app = app
+        self._fixed = config
+        self._policy: Optional[CORSPolicy] = None
+
+    @property
+    def policy(self) -> CORSPolicy:
+        config = self._fixed if self._fixed is not None else get_config()
+        policy = self._policy
+        if policy is None or policy.config is not config:
+            policy = self._policy = CORSPolicy(config)
+        return policy
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = request_method = request_headers = None
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+            elif name == b"access-control-request-method":
+                request_method = value
+            elif name == b"access-control-request-headers":
+                request_headers = value
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
+
+        policy = self.policy
+        if scope["method"] == "OPTIONS" and request_method is not None:
+            await self._preflight(policy, origin, request_method, request_headers, send)
+            return
+        if not policy.allowed(origin):
+            await self.app(scope, receive, send)
+            return
+
+        cors_headers = [(b"access-control-allow-origin", origin), *policy.simple_headers]
+
+        async def send_with_cors(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*_with_vary(message.get("headers", [])), *cors_headers]
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+    async def _preflight(
+        self,
+        policy: CORSPolicy,
+        origin: bytes,
+        request_method: bytes,
+        request_headers: Optional[bytes],
+        send: Send,
+    ) -> None:
+        # Un preflight rifiutato è un 400 semplice: nessun header CORS, l'origine non viene ripetuta
+        headers: List[Header] = []
+        if not policy.allowed(origin):
+            status, body = 400, b"Origine CORS non consentita"
+        elif request_method.decode("latin-1").upper() not in policy.methods:
+            status, body = 400, b"Metodo CORS non consentito"
+        elif request_headers is not None and not policy.headers_allowed(request_headers):
+            status, body = 400, b"Header CORS non consentiti"
+        else:
+            status, body = 204, b""
+            headers = [(b"access-control-allow-origin", origin), *policy.preflight_headers]
+            if policy.allow_all_headers and request_headers:
+                headers.append((b"access-control-allow-headers", request_headers))
+        headers.append((b"content-length", str(len(body)).encode()))
+        if body:
+            headers.append((b"content-type", b"text/plain; charset=utf-8"))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
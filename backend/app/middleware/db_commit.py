@@ -0,0 +1,62 @@
+import json
+import logging
+
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.errors import ErrorCode
+from app.db.session import commit_pending
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseCommitMiddleware:
+    """
+    Conferma la transazione di get_db prima che la risposta parta.
+
+    Le risposte 2xx/3xx confermano, le altre annullano. Se il COMMIT
+    fallisce il client riceve un 500 (al posto della risposta dell'endpoint)
+    invece di un 200 per dati mai scritti. La finestra read-your-writes viene
+    attivata prima della risposta, quindi la lettura successiva del client
+    trova già la stickiness sul primario; il cookie firmato della finestra
+    (vedi mark_request_write) viene aggiunto agli header della risposta.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request = Request(scope)
+        failed = False
+
+        async def send_after_commit(message: Message) -> None:
+            nonlocal failed
+            if failed:
+                # Risposta dell'endpoint sostituita dal 500
+                return
+            if message["type"] == "http.response.start":
+                try:
+                    await commit_pending(request, success=message["status"] < 400)
+                except Exception:
+                    logger.exception("COMMIT fallito per %s %s", scope["method"], scope["path"])
+                    failed = True
+                    body = json.dumps({
+                        "detail": "Si è verificato un errore con il database. Riprova più tardi.",
+                        "error_code": ErrorCode.DATABASE_ERROR.value,
+                    }).encode()
+                    await send({
+                        "type": "http.response.start",
+                        "status": 500,
+                        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+                    })
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                cookie = getattr(request.state, "db_sticky_cookie", None)
+                if cookie is not None:
+                    message["headers"] = [*message.get("headers", []), (b"set-cookie", cookie.encode("latin-1"))]
+            await send(message)
+
+        await self.app(scope, receive, send_after_commit)
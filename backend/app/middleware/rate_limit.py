@@ -0,0 +1,162 @@
+import json
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.auth import decode_token
+from app.core.config import settings
+from app.core.config_snapshot import ConfigSnapshot, get_config
+from app.core.errors import ErrorCode
+from app.services.entitlements import EntitlementCache, get_entitlements
+
+
+class RateLimiter:
+    """
+    Token bucket per client: `limit` richieste al minuto, con raffiche fino a `limit`.
+
+    I contatori sono del processo. Ogni client costa due numeri; quando i
+    client tracciati superano `max_clients` vengono dimenticati quelli con il
+    secchio già pieno, che ricomincerebbero comunque da capo.
+    """
+
+    def __init__(self, max_clients: int = 100_000):
+        self.max_clients = max_clients
+        self._buckets: Dict[str, List[float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def hit(self, client_id: str, limit: int, now: Optional[float] = None) -> Tuple[bool, int, int]:
+        """
+        Consuma un gettone del client.
+
+        Args:
+            client_id: Identificatore del client (es. utente o IP)
+            limit: Richieste al minuto concesse al client
+            now: Istante corrente (default: time.monotonic())
+
+        Returns:
+            Tupla (allowed, remaining, reset_in_seconds)
+        """
+        now = time.monotonic() if now is None else now
+        rate = limit / 60.0
+        bucket = self._buckets.get(client_id)
+        if bucket is None:
+            if len(self._buckets) >= self.max_clients:
+                self._prune(now)
+            bucket = self._buckets[client_id] = [float(limit), now]
+        else:
+            bucket[0] = min(float(limit), bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+
+        if bucket[0] < 1.0:
+            return False, 0, math.ceil((1.0 - bucket[0]) / rate)
+        bucket[0] -= 1.0
+        return True, int(bucket[0]), math.ceil((limit - bucket[0]) / rate)
+
+    def _prune(self, now: float) -> None:
+        # Dopo un minuto di inattività il secchio è di nuovo pieno, qualunque sia il limite
+        for client_id, (_, last) in list(self._buckets.items()):
+            if now - last >= 60.0:
+                del self._buckets[client_id]
+
+
+class RateLimitMiddleware:
+    """
+    Rate limiting delle richieste API, con il limite del piano dell'utente.
+
+    L'utente viene riconosciuto dal token bearer (solo verifica della firma,
+    in memoria) e il suo limite viene dalla cache dei piani: nessun I/O per
+    richiesta. Le richieste anonime o con token non valido sono limitate per
+    IP con RATE_LIMIT_DEFAULT, il login (scambio del token Firebase) con
+    RATE_LIMIT_LOGIN; i webhook (che arrivano da pochi IP del mittente) non
+    sono limitati. I claim verificati restano in request.state.token_claims
+    per get_current_user.
+
+    Middleware ASGI puro: a differenza di BaseHTTPMiddleware non interpone un
+    task per richiesta e non bufferizza le risposte in streaming (SSE).
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        entitlements: Optional[EntitlementCache] = None,
+        default_limit: Optional[int] = None,
+        login_limit: Optional[int] = None,
+        exempt_prefixes: Tuple[str, ...] = (f"{settings.API_V1_STR}/webhooks/",),
+        login_paths: Tuple[str, ...] = (f"{settings.API_V1_STR}/auth/firebase",),
+    ):
+        self.app = app
+        self.exempt_prefixes = exempt_prefixes
+        self.login_paths = login_paths
+        self._entitlements = entitlements
+        # None: i limiti della configurazione corrente (ricaricabile)
+        self.default_limit = default_limit
+        self.login_limit = login_limit
+        self.limiter = RateLimiter()
+        self.login_limiter = RateLimiter()
+
+    @property
+    def entitlements(self) -> EntitlementCache:
+        return self._entitlements if self._entitlements is not None else get_entitlements()
+
+    def _client(self, scope: Scope, config: ConfigSnapshot) -> Tuple[str, int, RateLimiter]:
+        if scope["path"] in self.login_paths:
+            limit = config.RATE_LIMIT_LOGIN if self.login_limit is None else self.login_limit
+            return f"ip:{scope['client'][0] if scope.get('client') else '-'}", limit, self.login_limiter
+        authorization = Headers(scope=scope).get("authorization", "")
+        if authorization[:7].lower() == "bearer ":
+            try:
+                claims = decode_token(authorization[7:])
+            except Exception:
+                # Token non valido: limitato come anonimo, l'endpoint lo rifiuterà
+                pass
+            else:
+                scope.setdefault("state", {})["token_claims"] = claims
+                user_id = str(claims["sub"])
+                return f"user:{user_id}", self.entitlements.get(user_id).rate_limit, self.limiter
+        limit = config.RATE_LIMIT_DEFAULT if self.default_limit is None else self.default_limit
+        return f"ip:{scope['client'][0] if scope.get('client') else '-'}", limit, self.limiter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        config = get_config()
+        if scope["type"] != "http" or not config.RATE_LIMIT_ENABLED or scope["path"].startswith(self.exempt_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        client_id, limit, limiter = self._client(scope, config)
+        allowed, remaining, reset_in = limiter.hit(client_id, limit)
+        rate_headers = [
+            (b"x-ratelimit-limit", str(limit).encode()),
+            (b"x-ratelimit-remaining", str(remaining).encode()),
+            (b"x-ratelimit-reset", str(int(time.time()) + reset_in).encode()),
+        ]
+
+        if not allowed:
+            body = json.dumps({
+                "detail": "Troppe richieste. Riprova più tardi.",
+                "error_code": ErrorCode.RATE_LIMIT_EXCEEDED.value,
+                "details": {"reset_in": reset_in},
+            }).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(reset_in).encode()),
+                    *rate_headers,
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_with_headers(message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), *rate_headers]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
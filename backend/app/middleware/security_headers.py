@@ -0,0 +1,32 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config_snapshot import get_config
+
+
+class SecurityHeadersMiddleware:
+    """
+    Aggiunge SECURITY_HEADERS a ogni risposta HTTP.
+
+    Gli header arrivano già codificati dalla copia della configurazione
+    (nessuna codifica né iterazione del dizionario per risposta) e seguono
+    i ricaricamenti. Gli header impostati dall'endpoint hanno la precedenza.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        security_headers = get_config().security_headers
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                present = {name.lower() for name, _ in headers}
+                headers.extend(header for header in security_headers if header[0] not in present)
+                message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -0,0 +1,16 @@
+from pydantic import Field
+
+from app.schemas.base import BaseSchema
+
+
+class FirebaseTokenExchange(BaseSchema):
+    """Richiesta di scambio di un ID token Firebase con un token di sessione."""
+    id_token: str = Field(..., min_length=1, max_length=4096)
+
+
+class SessionToken(BaseSchema):
+    """Token di sessione emesso dall'API."""
+    access_token: str
+    token_type: str = "bearer"
+    expires_in: int = Field(..., description="Durata del token in secondi")
+    user_id: int = Field(..., description="Id interno dell'utente (metadata.user_id degli abbonamenti Stripe)")
@@ -0,0 +1,66 @@
+from datetime import datetime
+from typing import Generic, List, Optional, TypeVar
+from pydantic import BaseModel
+from pydantic.generics import GenericModel
+
+# Generic type per i modelli di dati
+T = TypeVar('T')
+
+class BaseSchema(BaseModel):
+    """Schema di base per tutti i modelli Pydantic."""
+    
+    class Config:
+        """Configurazione per lo schema di base."""
+        allow_population_by_field_name = True  # Supporta popolamento sia da alias che da nome campo
+        use_enum_values = True   # Usa i valori enum invece delle istanze enum
+        json_encoders = {
+            datetime: lambda dt: dt.isoformat(),
+        }
+
+
+class TimeStampMixin(BaseSchema):
+    """Mixin per campi timestamp comuni."""
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class ResponseSchema(GenericModel, Generic[T]):
+    """Schema generico per le risposte API."""
+    success: bool = True
+    data: Optional[T] = None
+    message: Optional[str] = None
+    
+    class Config:
+        """Configurazione per lo schema di risposta."""
+        schema_extra = {
+            "example": {
+                "success": True,
+                "data": {},
+                "message": "Operazione completata con successo"
+            }
+        }
+
+
+class PaginatedResponseSchema(GenericModel, Generic[T]):
+    """Schema generico per le risposte API paginate."""
+    items: List[T]
+    total: int
+    page: int
+    per_page: int
+    pages: int
+    has_next: bool
+    has_prev: bool
+    
+    class Config:
+        """Configurazione per lo schema di risposta paginata."""
+        schema_extra = {
+            "example": {
+                "items": [],
+                "total": 100,
+                "page": 1,
+                "per_page": 10,
+                "pages": 10,
+                "has_next": True,
+                "has_prev": False
+            }
+        }
@@ -0,0 +1,34 @@
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
+
+from pydantic import Field, validator
+
+from app.schemas.base import BaseSchema
+
+
+class ReservationItem(BaseSchema):
+    """Quantità da prenotare per un prodotto."""
+    product_id: int
+    quantity: int = Field(..., gt=0, le=1000)
+
+
+class ReservationCreate(BaseSchema):
+    """Schema per la prenotazione dello stock di un carrello."""
+    items: List[ReservationItem] = Field(..., min_items=1, max_items=100)
+    ttl: Optional[float] = Field(None, gt=0, le=3600, description="Durata della prenotazione in secondi")
+
+    @validator('items')
+    def merge_items(cls, v):
+        """Somma le quantità dello stesso prodotto."""
+        merged = {}
+        for item in v:
+            merged[item.product_id] = merged.get(item.product_id, 0) + item.quantity
+        return [ReservationItem(product_id=pid, quantity=quantity) for pid, quantity in merged.items()]
+
+
+class Reservation(BaseSchema):
+    """Schema per la risposta API della prenotazione."""
+    reservation_id: UUID
+    items: List[ReservationItem]
+    expires_at: datetime
@@ -0,0 +1,151 @@
+from decimal import Decimal
+from enum import Enum
+from typing import List, Optional
+from uuid import UUID
+
+from pydantic import Field, validator
+
+from app.schemas.base import BaseSchema, TimeStampMixin
+
+
+class OrderStatus(str, Enum):
+    """Enumerazione per lo stato dell'ordine."""
+    PENDING = "pending"
+    PROCESSING = "processing"
+    SHIPPED = "shipped"
+    DELIVERED = "delivered"
+    CANCELLED = "cancelled"
+
+
+class OrderItemBase(BaseSchema):
+    """Schema base per gli item dell'ordine."""
+    product_id: int
+    quantity: int = Field(..., gt=0)
+    unit_price: Decimal = Field(..., ge=0, decimal_places=2)
+
+    @validator('unit_price')
+    def validate_unit_price(cls, v):
+        """Valida il prezzo unitario."""
+        if v < 0:
+            raise ValueError("Il prezzo unitario non può essere negativo")
+        return v
+
+    @validator('quantity')
+    def validate_quantity(cls, v):
+        """Valida la quantità."""
+        if v <= 0:
+            raise ValueError("La quantità deve essere maggiore di zero")
+        return v
+
+
+class OrderItemCreate(OrderItemBase):
+    """Schema per la creazione di un item dell'ordine."""
+    pass
+
+
+class OrderItemInDB(OrderItemBase, TimeStampMixin):
+    """Schema per un item dell'ordine nel database (subtotal calcolato in SQL)."""
+    id: int
+    order_id: int
+    subtotal: Decimal
+
+    class Config:
+        """Configurazione per lo schema item dell'ordine nel DB."""
+        orm_mode = True
+
+
+class OrderItem(OrderItemInDB):
+    """Schema per la risposta API dell'item dell'ordine."""
+    pass
+
+
+class OrderBase(BaseSchema):
+    """Schema base per gli ordini."""
+    user_id: int
+    status: OrderStatus = OrderStatus.PENDING
+    shipping_address: str = Field(..., min_length=5, max_length=255)
+    notes: Optional[str] = Field(None, max_length=1000)
+
+
+class OrderCreate(BaseSchema):
+    """Schema per la creazione di un ordine."""
+    items: List[OrderItemCreate]
+    shipping_address: str = Field(..., min_length=5, max_length=255)
+    notes: Optional[str] = Field(None, max_length=1000)
+
+    @validator('items')
+    def validate_items(cls, v):
+        """Valida che ci sia almeno un item nell'ordine."""
+        if not v or len(v) == 0:
+            raise ValueError("L'ordine deve contenere almeno un prodotto")
+        return v
+
+
+class MarketplaceOrderCreate(OrderCreate):
+    """Ordine importato da un marketplace: il riferimento esterno rende la sync idempotente."""
+    user_id: int
+    external_ref: str = Field(..., min_length=1, max_length=128)
+    reservation_id: Optional[UUID] = Field(
+        None, description="Prenotazione fatta al checkout: viene confermata invece di prenotare di nuovo",
+    )
+
+
+class OrderBulkCreate(BaseSchema):
+    """Schema per la creazione massiva di ordini (sync dai marketplace)."""
+    orders: List[MarketplaceOrderCreate] = Field(..., min_items=1, max_items=5000)
+    status: OrderStatus = OrderStatus.PROCESSING
+
+
+class OrderUpdate(BaseSchema):
+    """Schema per l'aggiornamento di un ordine."""
+    status: Optional[OrderStatus] = None
+    shipping_address: Optional[str] = Field(None, min_length=5, max_length=255)
+    notes: Optional[str] = Field(None, max_length=1000)
+
+
+class OrderStatusUpdate(BaseSchema):
+    """Schema per il cambio di stato di uno o più ordini."""
+    order_ids: List[int] = Field(..., min_items=1, max_items=10000)
+    status: OrderStatus
+
+    @validator('order_ids')
+    def unique_ids(cls, v):
+        """Rimuove i duplicati mantenendo l'ordine."""
+        return list(dict.fromkeys(v))
+
+
+class OrderInDB(OrderBase, TimeStampMixin):
+    """Schema per un ordine nel database."""
+    id: int
+    total_amount: Decimal
+
+    class Config:
+        """Configurazione per lo schema ordine nel DB."""
+        orm_mode = True
+
+
+class Order(OrderInDB):
+    """Schema per la risposta API dell'ordine."""
+    items: List[OrderItem]
+
+
+class CreatedOrder(BaseSchema):
+    """Ordine creato da un import massivo."""
+    index: int
+    order_id: int
+    external_ref: Optional[str] = None
+    total_amount: Decimal
+
+
+class RejectedOrder(BaseSchema):
+    """Ordine scartato da un import massivo, con il motivo."""
+    index: int
+    external_ref: Optional[str] = None
+    reason: str
+
+
+class OrderBatchReport(BaseSchema):
+    """Esito di una creazione massiva di ordini."""
+    created: List[CreatedOrder] = []
+    duplicates: List[str] = []
+    rejected: List[RejectedOrder] = []
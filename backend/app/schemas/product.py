@@ -0,0 +1,65 @@
+from typing import Optional
+from decimal import Decimal
+from pydantic import Field, validator
+
+from app.schemas.base import BaseSchema, TimeStampMixin
+
+class ProductBase(BaseSchema):
+    """Schema base per i prodotti."""
+    name: str = Field(..., min_length=1, max_length=100)
+    description: Optional[str] = Field(None, max_length=1000)
+    price: Decimal = Field(..., ge=0, decimal_places=2)
+    stock: int = Field(..., ge=0)
+    category_id: Optional[int] = None
+    
+    @validator('price')
+    def price_must_be_positive(cls, v):
+        """Valida che il prezzo sia positivo e con massimo 2 decimali."""
+        if v < 0:
+            raise ValueError("Il prezzo non può essere negativo")
+        
+        # Assicura massimo 2 decimali
+        if v.as_tuple().exponent < -2:
+            raise ValueError("Il prezzo può avere al massimo 2 decimali")
+        
+        return v
+
+
+class ProductCreate(ProductBase):
+    """Schema per la creazione di un prodotto."""
+    pass
+
+
+class ProductImportRow(ProductCreate):
+    """Prodotto con codice fornitore (import massivo, marketplace): lo SKU lo identifica."""
+    sku: str = Field(..., min_length=1, max_length=64)
+
+    @validator('description', 'category_id', pre=True)
+    def empty_as_none(cls, v):
+        """Le celle vuote dei CSV valgono come campo assente."""
+        if v == "":
+            return None
+        return v
+
+
+class ProductUpdate(BaseSchema):
+    """Schema per l'aggiornamento di un prodotto."""
+    name: Optional[str] = Field(None, min_length=1, max_length=100)
+    description: Optional[str] = Field(None, max_length=1000)
+    price: Optional[Decimal] = Field(None, ge=0, decimal_places=2)
+    stock: Optional[int] = Field(None, ge=0)
+    category_id: Optional[int] = None
+
+
+class ProductInDB(ProductBase, TimeStampMixin):
+    """Schema per un prodotto nel database."""
+    id: int
+    
+    class Config:
+        """Configurazione per lo schema prodotto nel DB."""
+        orm_mode = True
+
+
+class Product(ProductInDB):
+    """Schema per la risposta API del prodotto."""
+    pass
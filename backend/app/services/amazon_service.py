@@ -0,0 +1,152 @@
+import hashlib
+import hmac
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+from app.core.config import settings
+from app.services.marketplace import (
+    MarketplaceClient,
+    MarketplaceRequest,
+    MarketplaceService,
+    get_marketplace_client,
+    to_price,
+    truncate,
+)
+
+# Product Advertising API 5.0
+PAAPI_SERVICE = "ProductAdvertisingAPI"
+PAAPI_SEARCH_TARGET = "com.amazon.paapi5.v1.ProductAdvertisingAPIv1.SearchItems"
+PAAPI_SEARCH_RESOURCES = [
+    "ItemInfo.Title",
+    "ItemInfo.Features",
+    "Offers.Listings.Price",
+    "Offers.Listings.Availability.MaxOrderQuantity",
+    "Offers.Listings.Availability.Type",
+]
+# PA-API restituisce al massimo 10 articoli per pagina
+PAAPI_MAX_ITEM_COUNT = 10
+
+
+def _hmac(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode("utf-8"), hashlib.sha256).digest()
+
+
+def sign_paapi_request(
+    url: str,
+    headers: Dict[str, str],
+    body: bytes,
+    access_key: str,
+    secret_key: str,
+    region: str,
+    now: Optional[datetime] = None,
+) -> Dict[str, str]:
+    """
+    Firma una richiesta PA-API con AWS Signature Version 4.
+
+    Returns:
+        Gli header da inviare, inclusi `X-Amz-Date` e `Authorization`
+    """
+    now = now or datetime.now(timezone.utc)
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    date_stamp = now.strftime("%Y%m%d")
+    parts = urlsplit(url)
+
+    signed = {k.lower(): v.strip() for k, v in headers.items()}
+    signed["host"] = parts.netloc
+    signed["x-amz-date"] = amz_date
+    names = sorted(signed)
+
+    canonical_request = "\n".join([
+        "POST",
+        parts.path or "/",
+        "",
+        "".join(f"{name}:{signed[name]}\n" for name in names),
+        ";".join(names),
+        hashlib.sha256(body).hexdigest(),
+    ])
+    scope = f"{date_stamp}/{region}/{PAAPI_SERVICE}/aws4_request"
+    string_to_sign = "\n".join([
+        "AWS4-HMAC-SHA256",
+        amz_date,
+        scope,
+        hashlib.sha256(canonical_request.encode("utf-8")).hexdigest(),
+    ])
+
+    key = _hmac(("AWS4" + secret_key).encode("utf-8"), date_stamp)
+    for part in (region, PAAPI_SERVICE, "aws4_request"):
+        key = _hmac(key, part)
+    signature = hmac.new(key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    return {
+        **headers,
+        "X-Amz-Date": amz_date,
+        "Authorization": (
+            f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+            f"SignedHeaders={';'.join(names)}, Signature={signature}"
+        ),
+    }
+
+
+class AmazonService(MarketplaceService):
+    """Catalogo Amazon tramite Product Advertising API 5.0 (SearchItems)."""
+
+    name = "amazon"
+
+    def __init__(
+        self,
+        client: Optional[MarketplaceClient] = None,
+        base_url: Optional[str] = None,
+        partner_tag: Optional[str] = None,
+        marketplace: Optional[str] = None,
+    ):
+        super().__init__(client or get_marketplace_client(), base_url or settings.AMAZON_API_URL)
+        self.partner_tag = partner_tag if partner_tag is not None else settings.AMAZON_PARTNER_TAG
+        self.marketplace = marketplace or settings.AMAZON_MARKETPLACE
+
+    def search_request(self, query: str, limit: int) -> MarketplaceRequest:
+        url = f"{self.base_url}/searchitems"
+        body = json.dumps({
+            "Keywords": query,
+            "PartnerTag": self.partner_tag,
+            "PartnerType": "Associates",
+            "Marketplace": self.marketplace,
+            "ItemCount": min(limit, PAAPI_MAX_ITEM_COUNT),
+            "Resources": PAAPI_SEARCH_RESOURCES,
+        }).encode("utf-8")
+        headers = {
+            "Content-Encoding": "amz-1.0",
+            "Content-Type": "application/json; charset=utf-8",
+            "X-Amz-Target": PAAPI_SEARCH_TARGET,
+        }
+
+        # Senza credenziali (es. server di mock locale) la richiesta parte non firmata
+        if settings.AMAZON_ACCESS_KEY and settings.AMAZON_SECRET_KEY:
+            headers = sign_paapi_request(
+                url, headers, body,
+                settings.AMAZON_ACCESS_KEY, settings.AMAZON_SECRET_KEY, settings.AMAZON_REGION,
+            )
+        return MarketplaceRequest("POST", url, headers=headers, body=body)
+
+    def item_url(self, item_id: str) -> str:
+        return f"https://{self.marketplace}/dp/{item_id}"
+
+    def parse_items(self, payload: Any) -> Iterable[Dict[str, Any]]:
+        return (payload.get("SearchResult") or {}).get("Items") or []
+
+    def normalize(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        info = item.get("ItemInfo") or {}
+        listings = (item.get("Offers") or {}).get("Listings") or [{}]
+        listing = listings[0]
+        availability = listing.get("Availability") or {}
+        features = (info.get("Features") or {}).get("DisplayValues") or []
+
+        in_stock = availability.get("Type") == "Now"
+        return {
+            "sku": f"{self.name}:{item['ASIN']}",
+            "name": truncate((info.get("Title") or {}).get("DisplayValue"), 100),
+            "description": truncate(" ".join(features), 1000),
+            "price": to_price((listing.get("Price") or {}).get("Amount")),
+            "stock": availability.get("MaxOrderQuantity", 1) if in_stock else 0,
+        }
@@ -0,0 +1,343 @@
+import logging
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from psycopg import AsyncConnection
+
+from app.core.config import settings
+from app.schemas.order import OrderStatus
+
+logger = logging.getLogger(__name__)
+
+# Stati in cui un ordine conta nei ricavi
+COUNTED_STATUSES = frozenset({OrderStatus.PROCESSING, OrderStatus.SHIPPED, OrderStatus.DELIVERED})
+
+# Righe d'ordine con il segno (+1 entra nei rollup, -1 ne esce) degli ordini in `changed`.
+# `changed` è sostituito da una delle sorgenti sotto (frammenti costanti, nessun input utente).
+_ROLLUP_DELTAS = """
+WITH changed AS ({changed}),
+lines AS (
+    SELECT o.id AS order_id, o.user_id, (o.created_at AT TIME ZONE 'UTC')::date AS day, c.sign,
+           i.product_id, i.quantity,
+           i.unit_price * i.quantity AS revenue,
+           COALESCE(i.unit_cost, 0) * i.quantity AS cost
+    FROM changed c
+    JOIN orders o ON o.id = c.order_id
+    JOIN order_items i ON i.order_id = o.id
+),
+per_order AS (
+    SELECT order_id, user_id, day, sign,
+           sum(quantity) AS items, sum(revenue) AS revenue, sum(cost) AS cost
+    FROM lines GROUP BY order_id, user_id, day, sign
+),
+per_product AS (
+    SELECT user_id, day, product_id, sign,
+           sum(quantity) AS quantity, sum(revenue) AS revenue, sum(cost) AS cost
+    FROM lines GROUP BY order_id, user_id, day, product_id, sign
+),
+daily AS (
+    INSERT INTO analytics_daily AS r (day, shard, orders, items, revenue, cost)
+    SELECT day, order_id %% {shards}, sum(sign), sum(sign * items), sum(sign * revenue), sum(sign * cost)
+    FROM per_order GROUP BY day, order_id %% {shards}
+    ON CONFLICT (day, shard) DO UPDATE SET
+        orders = r.orders + EXCLUDED.orders, items = r.items + EXCLUDED.items,
+        revenue = r.revenue + EXCLUDED.revenue, cost = r.cost + EXCLUDED.cost
+),
+products AS (
+    INSERT INTO analytics_product_daily AS r (day, product_id, orders, quantity, revenue, cost)
+    SELECT day, product_id, sum(sign), sum(sign * quantity), sum(sign * revenue), sum(sign * cost)
+    FROM per_product GROUP BY day, product_id
+    ON CONFLICT (day, product_id) DO UPDATE SET
+        orders = r.orders + EXCLUDED.orders, quantity = r.quantity + EXCLUDED.quantity,
+        revenue = r.revenue + EXCLUDED.revenue, cost = r.cost + EXCLUDED.cost
+),
+user_products AS (
+    INSERT INTO analytics_user_product_daily AS r (user_id, day, product_id, orders, quantity, revenue, cost)
+    SELECT user_id, day, product_id, sum(sign), sum(sign * quantity), sum(sign * revenue), sum(sign * cost)
+    FROM per_product GROUP BY user_id, day, product_id
+    ON CONFLICT (user_id, day, product_id) DO UPDATE SET
+        orders = r.orders + EXCLUDED.orders, quantity = r.quantity + EXCLUDED.quantity,
+        revenue = r.revenue + EXCLUDED.revenue, cost = r.cost + EXCLUDED.cost
+)
+INSERT INTO analytics_user_daily AS r (user_id, day, orders, items, revenue, cost)
+SELECT user_id, day, sum(sign), sum(sign * items), sum(sign * revenue), sum(sign * cost)
+FROM per_order GROUP BY user_id, day
+ON CONFLICT (user_id, day) DO UPDATE SET
+    orders = r.orders + EXCLUDED.orders, items = r.items + EXCLUDED.items,
+    revenue = r.revenue + EXCLUDED.revenue, cost = r.cost + EXCLUDED.cost
+"""
+
+_CHANGED_FROM_ARRAYS = "SELECT * FROM unnest(%s::bigint[], %s::int[]) AS c(order_id, sign)"
+_CHANGED_FROM_RANGE = """
+SELECT id AS order_id, 1 AS sign FROM orders
+WHERE status = ANY(%s) AND created_at >= %s AND created_at < %s
+"""
+
+# Eseguite sempre con parametri: "%%" nel template è l'operatore modulo
+APPLY_DELTAS = _ROLLUP_DELTAS.format(changed=_CHANGED_FROM_ARRAYS, shards=settings.ANALYTICS_DAILY_SHARDS)
+REBUILD_RANGE = _ROLLUP_DELTAS.format(changed=_CHANGED_FROM_RANGE, shards=settings.ANALYTICS_DAILY_SHARDS)
+
+DELETE_RANGE = [
+    "DELETE FROM analytics_daily WHERE day >= %s AND day < %s",
+    "DELETE FROM analytics_product_daily WHERE day >= %s AND day < %s",
+    "DELETE FROM analytics_user_daily WHERE day >= %s AND day < %s",
+    "DELETE FROM analytics_user_product_daily WHERE day >= %s AND day < %s",
+]
+
+
+class Period(str, Enum):
+    """Granularità della serie temporale."""
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+
+class RankBy(str, Enum):
+    """Metrica di ordinamento delle classifiche."""
+    REVENUE = "revenue"
+    PROFIT = "profit"
+    QUANTITY = "quantity"
+
+
+def status_sign(old: Optional[str], new: str) -> int:
+    """+1 se l'ordine entra nei rollup, -1 se ne esce, 0 se non cambia nulla."""
+    return (new in COUNTED_STATUSES) - (old in COUNTED_STATUSES)
+
+
+class AnalyticsCache:
+    """
+    Cache LRU con scadenza per le risposte del dashboard.
+
+    I rollup cambiano a ogni cambio di stato: il processo che li aggiorna
+    svuota la propria cache, gli altri worker si allineano entro `ttl`.
+    """
+
+    def __init__(self, ttl: float, max_size: int, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < self._clock():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (self._clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+cache = AnalyticsCache(settings.ANALYTICS_CACHE_TTL, settings.ANALYTICS_CACHE_SIZE)
+
+
+async def apply_status_changes(conn: AsyncConnection, changes: Sequence[Tuple[int, Optional[str], str]]) -> int:
+    """
+    Aggiorna i rollup per una serie di cambi di stato.
+
+    Va chiamata nella stessa transazione che modifica gli ordini, così rollup
+    e ordini restano coerenti.
+
+    Args:
+        conn: Connessione al database
+        changes: Tuple (id ordine, stato precedente o None se nuovo, nuovo stato)
+
+    Returns:
+        Il numero di ordini entrati o usciti dai rollup
+    """
+    ids: List[int] = []
+    signs: List[int] = []
+    for order_id, old, new in changes:
+        sign = status_sign(old, new)
+        if sign:
+            ids.append(order_id)
+            signs.append(sign)
+    if ids:
+        await conn.execute(APPLY_DELTAS, (ids, signs))
+        cache.clear()
+    return len(ids)
+
+
+async def rebuild_rollups(conn: AsyncConnection, date_from: date, date_to: date) -> None:
+    """Ricalcola da zero i rollup dei giorni [date_from, date_to] (backfill o riallineamento)."""
+    end = date_to + timedelta(days=1)
+    for statement in DELETE_RANGE:
+        await conn.execute(statement, (date_from, end))
+    # I giorni dei rollup sono in UTC, indipendentemente dal fuso della sessione
+    start_ts = datetime.combine(date_from, datetime.min.time(), timezone.utc)
+    end_ts = datetime.combine(end, datetime.min.time(), timezone.utc)
+    await conn.execute(REBUILD_RANGE, ([s.value for s in COUNTED_STATUSES], start_ts, end_ts))
+    cache.clear()
+
+
+def _money(value: Optional[Decimal]) -> float:
+    return float(value or 0)
+
+
+async def _cached(key: Hashable, compute: Callable[[], Any]) -> Any:
+    value = cache.get(key)
+    if value is None:
+        value = await compute()
+        cache.set(key, value)
+    return value
+
+
+async def get_overview(
+    conn: AsyncConnection, date_from: date, date_to: date, user_id: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Totali del periodo: ricavi, profitto, ordini, valore medio, margine e prodotti venduti."""
+    async def compute() -> Dict[str, Any]:
+        if user_id is None:
+            cursor = await conn.execute(
+                "SELECT sum(orders), sum(revenue), sum(cost) FROM analytics_daily WHERE day BETWEEN %s AND %s",
+                (date_from, date_to),
+            )
+        else:
+            cursor = await conn.execute(
+                "SELECT sum(orders), sum(revenue), sum(cost) FROM analytics_user_daily "
+                "WHERE user_id = %s AND day BETWEEN %s AND %s",
+                (user_id, date_from, date_to),
+            )
+        orders, revenue, cost = await cursor.fetchone()
+        table, user_filter, params = _product_rollup(user_id, date_from, date_to)
+        cursor = await conn.execute(
+            f"SELECT count(DISTINCT product_id) FROM {table} r "
+            f"WHERE r.day BETWEEN %s AND %s {user_filter} AND r.quantity > 0",
+            params,
+        )
+        (active_products,) = await cursor.fetchone()
+
+        orders = int(orders or 0)
+        revenue, profit = _money(revenue), _money(revenue) - _money(cost)
+        return {
+            "total_revenue": round(revenue, 2),
+            "total_profit": round(profit, 2),
+            "total_orders": orders,
+            "average_order_value": round(revenue / orders, 2) if orders else 0.0,
+            "margin_percentage": round(profit / revenue * 100, 2) if revenue else 0.0,
+            "active_products": active_products,
+        }
+
+    return await _cached(("overview", date_from, date_to, user_id), compute)
+
+
+async def get_revenue_series(
+    conn: AsyncConnection,
+    date_from: date,
+    date_to: date,
+    period: Period = Period.DAY,
+    user_id: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Ricavi, profitto e ordini per giorno, settimana o mese (dati di ProfitChart)."""
+    async def compute() -> List[Dict[str, Any]]:
+        table, user_filter, params = "analytics_daily", "", [Period(period).value, date_from, date_to]
+        if user_id is not None:
+            table, user_filter = "analytics_user_daily", "AND user_id = %s"
+            params.append(user_id)
+        cursor = await conn.execute(
+            f"SELECT date_trunc(%s, day)::date AS period, sum(orders), sum(revenue), sum(revenue - cost) "
+            f"FROM {table} WHERE day BETWEEN %s AND %s {user_filter} GROUP BY 1 ORDER BY 1",
+            params,
+        )
+        return [
+            {"date": day.isoformat(), "orders": int(orders), "revenue": _money(revenue), "profit": _money(profit)}
+            for day, orders, revenue, profit in await cursor.fetchall()
+        ]
+
+    return await _cached(("series", date_from, date_to, period, user_id), compute)
+
+
+def _product_rollup(user_id: Optional[int], date_from: date, date_to: date) -> Tuple[str, str, List[Any]]:
+    """Tabella, filtro e parametri dei rollup per prodotto: di tutti o di un utente."""
+    if user_id is None:
+        return "analytics_product_daily", "", [date_from, date_to]
+    return "analytics_user_product_daily", "AND r.user_id = %s", [date_from, date_to, user_id]
+
+
+_RANK_EXPRESSIONS = {
+    RankBy.REVENUE: "sum(r.revenue)",
+    RankBy.PROFIT: "sum(r.revenue - r.cost)",
+    RankBy.QUANTITY: "sum(r.quantity)",
+}
+
+
+async def get_top_products(
+    conn: AsyncConnection,
+    date_from: date,
+    date_to: date,
+    limit: int = 5,
+    rank_by: RankBy = RankBy.REVENUE,
+    user_id: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Prodotti migliori del periodo per ricavi, profitto o quantità (di tutti o di un utente)."""
+    async def compute() -> List[Dict[str, Any]]:
+        table, user_filter, params = _product_rollup(user_id, date_from, date_to)
+        cursor = await conn.execute(
+            f"""
+            SELECT r.product_id, p.name, p.sku, sum(r.quantity), sum(r.revenue), sum(r.revenue - r.cost)
+            FROM {table} r
+            JOIN products p ON p.id = r.product_id
+            WHERE r.day BETWEEN %s AND %s {user_filter}
+            GROUP BY r.product_id, p.name, p.sku
+            HAVING sum(r.quantity) > 0
+            ORDER BY {_RANK_EXPRESSIONS[RankBy(rank_by)]} DESC
+            LIMIT %s
+            """,
+            [*params, limit],
+        )
+        return [
+            {
+                "id": product_id, "name": name, "sku": sku, "quantity": int(quantity),
+                "revenue": _money(revenue), "profit": _money(profit),
+            }
+            for product_id, name, sku, quantity, revenue, profit in await cursor.fetchall()
+        ]
+
+    return await _cached(("products", date_from, date_to, limit, rank_by, user_id), compute)
+
+
+async def get_top_categories(
+    conn: AsyncConnection,
+    date_from: date,
+    date_to: date,
+    limit: int = 5,
+    rank_by: RankBy = RankBy.REVENUE,
+    user_id: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Categorie migliori del periodo, aggregando i rollup per prodotto (di tutti o di un utente)."""
+    async def compute() -> List[Dict[str, Any]]:
+        table, user_filter, params = _product_rollup(user_id, date_from, date_to)
+        cursor = await conn.execute(
+            f"""
+            SELECT p.category_id, sum(r.quantity), sum(r.revenue), sum(r.revenue - r.cost)
+            FROM {table} r
+            JOIN products p ON p.id = r.product_id
+            WHERE r.day BETWEEN %s AND %s {user_filter}
+            GROUP BY p.category_id
+            HAVING sum(r.quantity) > 0
+            ORDER BY {_RANK_EXPRESSIONS[RankBy(rank_by)]} DESC
+            LIMIT %s
+            """,
+            [*params, limit],
+        )
+        return [
+            {"category_id": category_id, "quantity": int(quantity), "revenue": _money(revenue), "profit": _money(profit)}
+            for category_id, quantity, revenue, profit in await cursor.fetchall()
+        ]
+
+    return await _cached(("categories", date_from, date_to, limit, rank_by, user_id), compute)
@@ -0,0 +1,581 @@
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import pickle
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import (
+    Any, AsyncContextManager, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple,
+)
+
+from fastapi import Request
+from psycopg import AsyncConnection
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+ConnectionFactory = Callable[[], AsyncContextManager[AsyncConnection]]
+Loader = Callable[[], Awaitable[Any]]
+
+CHANNEL = "cache_invalidation"
+
+# Limite di PostgreSQL per il payload di NOTIFY (8000 byte), con margine
+MAX_NOTIFY_PAYLOAD = 7900
+
+GET_SHARED = """
+SELECT value, extract(epoch FROM fresh_until - now()), extract(epoch FROM stale_until - now()), tags
+FROM cache_entries WHERE key = %s AND stale_until > now()
+"""
+
+SET_SHARED = """
+INSERT INTO cache_entries (key, value, tags, fresh_until, stale_until)
+VALUES (%s, %s, %s, now() + make_interval(secs => %s), now() + make_interval(secs => %s))
+ON CONFLICT (key) DO UPDATE SET
+    value = EXCLUDED.value, tags = EXCLUDED.tags,
+    fresh_until = EXCLUDED.fresh_until, stale_until = EXCLUDED.stale_until
+"""
+
+DELETE_SHARED_TAGS = "DELETE FROM cache_entries WHERE tags && %s::text[]"
+
+PURGE_SHARED = "DELETE FROM cache_entries WHERE stale_until < now()"
+
+
+class CacheEntry:
+    __slots__ = ("value", "fresh_until", "stale_until", "tags")
+
+    def __init__(self, value: Any, fresh_until: float, stale_until: float, tags: Tuple[str, ...]):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+        self.tags = tags
+
+
+class CacheMetrics:
+    """Contatori della cache e istogramma dei tempi di caricamento."""
+
+    # Limiti superiori (secondi) delle classi dell'istogramma
+    LOAD_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, float("inf"))
+
+    def __init__(self):
+        self.hits = 0            # valori freschi dal livello in processo
+        self.stale_hits = 0      # valori scaduti serviti mentre si ricaricano
+        self.shared_hits = 0     # valori dal livello condiviso
+        self.misses = 0
+        self.coalesced = 0       # richieste che hanno atteso un caricamento già in corso
+        self.loads = 0
+        self.load_errors = 0
+        self.refreshes = 0       # ricaricamenti in background
+        self.evictions = 0
+        self.invalidations = 0   # voci rimosse per tag
+        self.load_seconds = 0.0
+        self.load_histogram = [0] * len(self.LOAD_BUCKETS)
+
+    def observe_load(self, seconds: float) -> None:
+        self.loads += 1
+        self.load_seconds += seconds
+        for i, bound in enumerate(self.LOAD_BUCKETS):
+            if seconds <= bound:
+                self.load_histogram[i] += 1
+                break
+
+    def load_quantile(self, q: float) -> Optional[float]:
+        """Limite superiore della classe che contiene il quantile `q` dei caricamenti."""
+        if not self.loads:
+            return None
+        target, seen = q * self.loads, 0
+        for bound, count in zip(self.LOAD_BUCKETS, self.load_histogram):
+            seen += count
+            if seen >= target:
+                return bound
+        return self.LOAD_BUCKETS[-1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.shared_hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits, "stale_hits": self.stale_hits, "shared_hits": self.shared_hits,
+            "misses": self.misses, "coalesced": self.coalesced, "loads": self.loads,
+            "load_errors": self.load_errors, "refreshes": self.refreshes,
+            "evictions": self.evictions, "invalidations": self.invalidations,
+            "hit_ratio": round((lookups - self.misses) / lookups, 4) if lookups else None,
+            "load_avg_ms": round(self.load_seconds / self.loads * 1000, 3) if self.loads else None,
+            "load_p50_le_ms": _ms(self.load_quantile(0.5)),
+            "load_p99_le_ms": _ms(self.load_quantile(0.99)),
+        }
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None or seconds == float("inf") else seconds * 1000
+
+
+class SharedTier(ABC):
+    """Livello condiviso tra i worker: interfaccia."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Tuple[Any, float, float, Tuple[str, ...]]]:
+        """Restituisce (valore, secondi di freschezza residui, secondi residui prima di scartarlo, tag)."""
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: float, stale_ttl: float, tags: Tuple[str, ...]) -> None:
+        """Salva un valore fresco per `ttl` secondi e servibile scaduto per altri `stale_ttl`."""
+
+    @abstractmethod
+    async def delete_tags(self, conn: AsyncConnection, tags: Sequence[str]) -> None:
+        """Rimuove le voci con questi tag, nella transazione del chiamante."""
+
+    async def purge(self) -> None:
+        """Rimuove le voci scadute."""
+
+
+class PostgresCacheTier(SharedTier):
+    """
+    Livello condiviso su una tabella UNLOGGED del primario (cache_entries).
+
+    Una lettura per chiave primaria costa molto meno delle query che la
+    cache evita, e il contenuto si perde senza danni in caso di crash.
+    I valori sono serializzati con pickle: la tabella va scritta solo
+    dall'applicazione.
+    """
+
+    def __init__(self, connection: Optional[ConnectionFactory] = None):
+        """
+        Args:
+            connection: Factory delle connessioni (default: primario del db_router)
+        """
+        if connection is None:
+            from app.db.session import db_router
+            connection = db_router.connection
+        self._connection = connection
+
+    async def get(self, key: str) -> Optional[Tuple[Any, float, float, Tuple[str, ...]]]:
+        async with self._connection() as conn:
+            cursor = await conn.execute(GET_SHARED, (key,))
+            row = await cursor.fetchone()
+        if row is None:
+            return None
+        return pickle.loads(row[0]), float(row[1]), float(row[2]), tuple(row[3])
+
+    async def set(self, key: str, value: Any, ttl: float, stale_ttl: float, tags: Tuple[str, ...]) -> None:
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        async with self._connection() as conn:
+            await conn.execute(SET_SHARED, (key, data, list(tags), ttl, ttl + stale_ttl))
+
+    async def delete_tags(self, conn: AsyncConnection, tags: Sequence[str]) -> None:
+        await conn.execute(DELETE_SHARED_TAGS, (list(tags),))
+
+    async def purge(self) -> None:
+        async with self._connection() as conn:
+            await conn.execute(PURGE_SHARED)
+
+
+class LayeredCache:
+    """
+    Cache a due livelli per i risultati delle letture più frequenti.
+
+    - livello in processo: LRU limitato a `max_size` voci
+    - livello condiviso opzionale (SharedTier), consultato prima di caricare
+    - invalidazione per tag (es. "product:42"), propagata agli altri worker
+      con NOTIFY sul canale `cache_invalidation`
+    - single-flight: richieste concorrenti per la stessa chiave attendono un
+      solo caricamento
+    - stale-while-revalidate: per `stale_ttl` secondi dopo la scadenza il
+      valore vecchio viene servito subito e ricaricato in background
+
+    I valori sono condivisi tra le richieste: non vanno modificati.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        ttl: float = 30.0,
+        stale_ttl: float = 300.0,
+        shared: Optional[SharedTier] = None,
+        dsn: Optional[str] = None,
+        purge_interval: float = 300.0,
+        reconnect_delay: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            max_size: Voci massime nel livello in processo
+            ttl: Secondi di freschezza di default
+            stale_ttl: Secondi dopo la scadenza in cui il valore vecchio può ancora essere servito
+            shared: Livello condiviso (None: solo in processo)
+            dsn: Database da ascoltare per le invalidazioni degli altri worker (None: nessuno)
+            purge_interval: Secondi tra due pulizie del livello condiviso
+            reconnect_delay: Attesa prima di ricollegarsi dopo un errore
+            clock: Orologio monotono (sostituibile nei test)
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.shared = shared
+        self.dsn = dsn
+        self.purge_interval = purge_interval
+        self.reconnect_delay = reconnect_delay
+        self._clock = clock
+
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        # Versioni dei tag: un caricamento iniziato prima di un'invalidazione non viene salvato
+        self._tag_versions: Dict[str, int] = {}
+        self._generation = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._refreshing: Set[str] = set()
+        self._background: Set[asyncio.Task] = set()
+        self._tasks: List[asyncio.Task] = []
+        self.metrics = CacheMetrics()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _store(self, key: str, value: Any, fresh_for: float, stale_for: float, tags: Tuple[str, ...]) -> None:
+        now = self._clock()
+        self._discard(key)
+        self._entries[key] = CacheEntry(value, now + fresh_for, now + stale_for, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._discard(next(iter(self._entries)))
+            self.metrics.evictions += 1
+
+    def _discard(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def _versions(self, tags: Tuple[str, ...]) -> Tuple[int, ...]:
+        return (self._generation, *(self._tag_versions.get(tag, 0) for tag in tags))
+
+    def _spawn(self, coro: Awaitable[Any]) -> None:
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Loader,
+        *,
+        ttl: Optional[float] = None,
+        stale_ttl: Optional[float] = None,
+        tags: Iterable[str] = (),
+        refresh: Optional[Loader] = None,
+    ) -> Any:
+        """
+        Valore in cache per `key`, caricato con `loader` se manca.
+
+        Args:
+            key: Chiave (stringa, per poterla condividere tra i worker)
+            loader: Coroutine che calcola il valore
+            ttl: Secondi di freschezza (default: quello della cache)
+            stale_ttl: Secondi in cui il valore scaduto può essere servito (default: quello della cache)
+            tags: Tag per l'invalidazione
+            refresh: Loader per il ricaricamento in background, se `loader` usa
+                risorse della richiesta (es. la sua connessione)
+        """
+        ttl = self.ttl if ttl is None else ttl
+        stale_ttl = self.stale_ttl if stale_ttl is None else stale_ttl
+        tags = tuple(tags)
+        entry = self._entries.get(key)
+        if entry is not None:
+            now = self._clock()
+            if now < entry.fresh_until:
+                self._entries.move_to_end(key)
+                self.metrics.hits += 1
+                return entry.value
+            if now < entry.stale_until:
+                self._entries.move_to_end(key)
+                self.metrics.stale_hits += 1
+                self._revalidate(key, refresh or loader, ttl, stale_ttl, tags)
+                return entry.value
+
+        while True:
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            self.metrics.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Annullato il caricamento (non questa richiesta): si riprova
+                if not future.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        try:
+            value = await self._load(key, loader, refresh or loader, ttl, stale_ttl, tags)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def _load(
+        self, key: str, loader: Loader, refresh: Loader, ttl: float, stale_ttl: float, tags: Tuple[str, ...],
+    ) -> Any:
+        versions = self._versions(tags)
+        if self.shared is not None:
+            try:
+                found = await self.shared.get(key)
+            except Exception as e:
+                found = None
+                logger.warning("Lettura dalla cache condivisa fallita per %s: %s", key, e)
+            if found is not None:
+                value, fresh_for, stale_for, shared_tags = found
+                self.metrics.shared_hits += 1
+                if self._versions(tags) == versions:
+                    self._store(key, value, fresh_for, stale_for, shared_tags)
+                if fresh_for <= 0:
+                    self._revalidate(key, refresh, ttl, stale_ttl, tags)
+                return value
+
+        self.metrics.misses += 1
+        return await self._fetch(key, loader, ttl, stale_ttl, tags, versions)
+
+    async def _fetch(
+        self, key: str, loader: Loader, ttl: float, stale_ttl: float, tags: Tuple[str, ...], versions: Tuple[int, ...],
+    ) -> Any:
+        started = time.perf_counter()
+        try:
+            value = await loader()
+        except Exception:
+            self.metrics.load_errors += 1
+            raise
+        self.metrics.observe_load(time.perf_counter() - started)
+        if self._versions(tags) == versions:
+            self._store(key, value, ttl, ttl + stale_ttl, tags)
+            if self.shared is not None:
+                self._spawn(self._share(key, value, ttl, stale_ttl, tags))
+        return value
+
+    async def _share(self, key: str, value: Any, ttl: float, stale_ttl: float, tags: Tuple[str, ...]) -> None:
+        try:
+            await self.shared.set(key, value, ttl, stale_ttl, tags)
+        except Exception as e:
+            logger.warning("Scrittura nella cache condivisa fallita per %s: %s", key, e)
+
+    def _revalidate(self, key: str, loader: Loader, ttl: float, stale_ttl: float, tags: Tuple[str, ...]) -> None:
+        if key in self._refreshing or key in self._inflight:
+            return
+        self._refreshing.add(key)
+        self.metrics.refreshes += 1
+
+        async def refresh() -> None:
+            try:
+                await self._fetch(key, loader, ttl, stale_ttl, tags, self._versions(tags))
+            except Exception:
+                logger.exception("Ricaricamento in background fallito per %s", key)
+            finally:
+                self._refreshing.discard(key)
+
+        self._spawn(refresh())
+
+    def invalidate_local(self, tags: Iterable[str]) -> int:
+        """Rimuove dal livello in processo le voci con questi tag; restituisce quante."""
+        removed = 0
+        for tag in tags:
+            self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+            for key in list(self._tags.get(tag, ())):
+                self._discard(key)
+                removed += 1
+        self.metrics.invalidations += removed
+        return removed
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+        self._tags.clear()
+        self._tag_versions.clear()
+
+    async def _listen(self) -> None:
+        connected_before = False
+        while True:
+            try:
+                async with await AsyncConnection.connect(self.dsn, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {CHANNEL}")
+                    if connected_before:
+                        # Le invalidazioni perse durante la disconnessione non sono recuperabili
+                        self.clear()
+                    connected_before = True
+                    async for notify in conn.notifies():
+                        try:
+                            self.invalidate_local(json.loads(notify.payload))
+                        except ValueError:
+                            logger.warning("Payload non valido sul canale %s", CHANNEL)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Ascolto delle invalidazioni della cache interrotto: %s", e)
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def _purge(self) -> None:
+        while True:
+            await asyncio.sleep(self.purge_interval)
+            try:
+                await self.shared.purge()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Pulizia della cache condivisa fallita, nuovo tentativo al prossimo giro")
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        if self.dsn:
+            self._tasks.append(asyncio.create_task(self._listen()))
+        if self.shared is not None:
+            self._tasks.append(asyncio.create_task(self._purge()))
+
+    async def close(self) -> None:
+        tasks = [*self._tasks, *self._background]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+
+
+async def invalidate_tags(conn: AsyncConnection, tags: Iterable[str], cache: Optional[LayeredCache] = None) -> None:
+    """
+    Invalida le voci con questi tag in tutti i worker.
+
+    Va chiamata nella transazione che modifica i dati: il livello condiviso
+    viene ripulito nella stessa transazione e gli altri worker (e di nuovo
+    questo, per i caricamenti fatti nel frattempo) ricevono il NOTIFY al
+    commit.
+    """
+    cache = cache if cache is not None else get_cache()
+    tags = list(dict.fromkeys(tags))
+    if not tags:
+        return
+    cache.invalidate_local(tags)
+    if cache.shared is not None:
+        await cache.shared.delete_tags(conn, tags)
+
+    payloads: List[str] = []
+    batch: List[str] = []
+    size = 2
+    for tag in tags:
+        encoded = json.dumps(tag)
+        if batch and size + len(encoded) + 1 > MAX_NOTIFY_PAYLOAD:
+            payloads.append(f"[{','.join(batch)}]")
+            batch, size = [], 2
+        batch.append(encoded)
+        size += len(encoded) + 1
+    payloads.append(f"[{','.join(batch)}]")
+    await conn.execute("SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload", (CHANNEL, payloads))
+
+
+def cached(
+    ttl: Optional[float] = None,
+    stale_ttl: Optional[float] = None,
+    tags: Optional[Callable[..., Iterable[str]]] = None,
+    key: Optional[Callable[..., str]] = None,
+    cache: Optional[LayeredCache] = None,
+    connection: Optional[ConnectionFactory] = None,
+):
+    """
+    Decoratore per funzioni di servizio e route asincrone.
+
+    La chiave è il nome della funzione più gli argomenti, escluse connessione
+    e Request; `tags` e `key` ricevono gli argomenti per nome. Se la funzione
+    riceve una AsyncConnection (parametro `conn`), i caricamenti ne usano una
+    propria sul primario, e quella del chiamante può mancare (None): una
+    replica in ritardo potrebbe restituire una riga già invalidata, che
+    resterebbe poi in cache per tutto il TTL, per tutti gli utenti.
+
+    Esempio:
+        @cached(ttl=60, tags=lambda product_id, conn: [f"product:{product_id}"])
+        async def get_product(product_id, conn=None): ...
+
+    Args:
+        ttl: Secondi di freschezza (default: CACHE_TTL)
+        stale_ttl: Secondi in cui il valore scaduto può essere servito (default: CACHE_STALE_TTL)
+        tags: Tag di invalidazione dagli argomenti
+        key: Chiave dagli argomenti (default: derivata dagli argomenti)
+        cache: Cache da usare (default: quella del processo)
+        connection: Factory delle connessioni per i caricamenti (default: primario del db_router)
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        conn_param = next((
+            name for name, p in signature.parameters.items()
+            if p.annotation is AsyncConnection or name == "conn"
+        ), None)
+        prefix = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = bound.arguments
+            if key is not None:
+                cache_key = f"{prefix}:{key(**arguments)}"
+            else:
+                cache_key = prefix + ":" + repr([
+                    (name, value) for name, value in arguments.items()
+                    if name != conn_param and not isinstance(value, (AsyncConnection, Request))
+                ])
+
+            async def load():
+                if conn_param is None:
+                    return await func(*args, **kwargs)
+                if connection is None:
+                    from app.db.session import db_router
+                    factory = db_router.connection
+                else:
+                    factory = connection
+                async with factory() as conn:
+                    return await func(**{**arguments, conn_param: conn})
+
+            return await (cache if cache is not None else get_cache()).get_or_load(
+                cache_key, load, ttl=ttl, stale_ttl=stale_ttl,
+                tags=tags(**arguments) if tags is not None else (),
+            )
+
+        return wrapper
+
+    return decorator
+
+
+_cache: Optional[LayeredCache] = None
+
+
+def get_cache() -> LayeredCache:
+    """Cache dei dati del processo (una per worker)."""
+    global _cache
+    if _cache is None:
+        _cache = LayeredCache(
+            max_size=settings.CACHE_MAX_SIZE,
+            ttl=settings.CACHE_TTL,
+            stale_ttl=settings.CACHE_STALE_TTL,
+            shared=PostgresCacheTier() if settings.CACHE_SHARED else None,
+            dsn=str(settings.DATABASE_URI),
+            purge_interval=settings.CACHE_PURGE_INTERVAL,
+        )
+    return _cache
+
+
+async def close_cache() -> None:
+    global _cache
+    if _cache is not None:
+        await _cache.close()
+        _cache = None
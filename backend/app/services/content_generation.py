@@ -0,0 +1,533 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import AsyncContextManager, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import httpx
+from psycopg import AsyncConnection
+from pydantic import Field, ValidationError
+
+from app.core.config import settings
+from app.core.errors import ExternalServiceError
+from app.schemas.base import BaseSchema
+from app.services.cache import invalidate_tags
+from app.services.marketplace import HostLimits, MarketplaceClient, MarketplaceRequest, truncate
+from app.services.products import product_tag
+
+logger = logging.getLogger(__name__)
+
+ConnectionFactory = Callable[[], AsyncContextManager[AsyncConnection]]
+
+# Da incrementare quando cambia il prompt: invalida i testi in cache
+PROMPT_VERSION = 1
+
+SYSTEM_PROMPT = (
+    "Sei un copywriter di un e-commerce. Per ogni prodotto ricevuto scrivi in lingua '{language}' "
+    "un titolo (massimo 100 caratteri) e una descrizione (massimo 1000 caratteri) chiari e "
+    "persuasivi, senza inventare caratteristiche assenti dai dati. Rispondi solo con un oggetto "
+    'JSON: {{"items": [{{"id": <id del prodotto>, "title": "...", "description": "..."}}]}}'
+)
+
+LOAD_CACHED = """
+SELECT content_hash, title, description FROM generated_content WHERE content_hash = ANY(%s)
+"""
+
+STORE_CACHED = """
+INSERT INTO generated_content (content_hash, model, title, description)
+SELECT h, %s, t, d FROM unnest(%s::bytea[], %s::text[], %s::text[]) AS u(h, t, d)
+ON CONFLICT (content_hash) DO NOTHING
+"""
+
+# Con owner_id NULL (amministratori) qualunque prodotto, altrimenti solo quelli dell'utente
+LOAD_PRODUCTS = """
+SELECT id, name, description FROM products
+WHERE id = ANY(%(ids)s) AND (%(owner_id)s::bigint IS NULL OR owner_id = %(owner_id)s)
+"""
+
+APPLY_CONTENT = """
+UPDATE products AS p
+SET name = u.title, description = u.description, updated_at = now()
+FROM unnest(%(ids)s::bigint[], %(titles)s::text[], %(descriptions)s::text[]) AS u(id, title, description)
+WHERE p.id = u.id AND (p.name, p.description) IS DISTINCT FROM (u.title, u.description)
+  AND (%(owner_id)s::bigint IS NULL OR p.owner_id = %(owner_id)s)
+"""
+
+
+class GeneratedContent(BaseSchema):
+    """Titolo e descrizione generati per un prodotto."""
+    title: str = Field(..., min_length=1, max_length=100)
+    description: str = Field(..., min_length=1, max_length=1000)
+
+
+class ContentRequest:
+    """Testo di origine di un prodotto da riscrivere, con la chiave di cache."""
+
+    __slots__ = ("key", "name", "description", "category", "attempts")
+
+    def __init__(self, key: bytes, name: str, description: Optional[str] = None, category: Optional[str] = None):
+        self.key = key
+        self.name = name
+        self.description = description
+        self.category = category
+        self.attempts = 0
+
+
+def content_key(model: str, language: str, name: str, description: Optional[str], category: Optional[str]) -> bytes:
+    """
+    Hash del contenuto di origine.
+
+    Gli spazi vengono normalizzati, così la stessa descrizione del fornitore
+    formattata diversamente produce la stessa chiave.
+    """
+    source = [
+        PROMPT_VERSION, model, language,
+        " ".join(name.split()), " ".join((description or "").split()), category or "",
+    ]
+    return hashlib.blake2b(json.dumps(source, ensure_ascii=False).encode(), digest_size=16).digest()
+
+
+class ContentProvider(ABC):
+    """Modello che genera i testi per un batch di prodotti."""
+
+    name: str = "provider"
+    model: str = ""
+    language: str = "it"
+
+    @abstractmethod
+    async def generate(self, batch: Sequence[ContentRequest]) -> List[Optional[GeneratedContent]]:
+        """
+        Genera i testi di un batch.
+
+        Returns:
+            Un risultato per richiesta, nello stesso ordine; None per i
+            prodotti che il modello ha saltato o restituito non validi
+
+        Raises:
+            ExternalServiceError: se il provider non risponde
+        """
+
+    async def aclose(self) -> None:
+        pass
+
+
+class OpenAIProvider(ContentProvider):
+    """
+    Provider per API compatibili con le chat completions di OpenAI.
+
+    Usa `MarketplaceClient` per concorrenza, rate limit e retry con backoff
+    (429 e 5xx, rispettando Retry-After). Un batch è una sola richiesta: le
+    istruzioni vengono inviate una volta per tutti i prodotti del batch.
+    """
+
+    name = "openai"
+
+    def __init__(
+        self,
+        api_key: str,
+        *,
+        model: str = "gpt-4o-mini",
+        language: str = "it",
+        base_url: str = "https://api.openai.com/v1",
+        concurrency: int = 4,
+        rate: float = 5.0,
+        timeout: float = 120.0,
+        max_retries: int = 4,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        """
+        Args:
+            api_key: Chiave dell'API
+            model: Modello da usare
+            language: Lingua dei testi generati
+            base_url: URL base dell'API (es. un server locale compatibile)
+            concurrency: Richieste contemporanee massime
+            rate: Richieste al secondo in media
+            timeout: Timeout per richiesta in secondi
+            max_retries: Tentativi aggiuntivi dopo il primo
+            transport: Transport httpx alternativo (es. modello finto nei test)
+        """
+        self.api_key = api_key
+        self.model = model
+        self.language = language
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.client = MarketplaceClient(
+            default_limits=HostLimits(concurrency=concurrency, rate=rate),
+            max_connections=concurrency,
+            timeout=timeout,
+            max_retries=max_retries,
+            backoff_base=1.0,
+            backoff_max=60.0,
+            transport=transport,
+        )
+        self.stats = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    def build_request(self, batch: Sequence[ContentRequest]) -> MarketplaceRequest:
+        products = []
+        for i, request in enumerate(batch):
+            product = {"id": i, "name": request.name}
+            if request.description:
+                product["description"] = request.description
+            if request.category:
+                product["category"] = request.category
+            products.append(product)
+        body = {
+            "model": self.model,
+            "temperature": 0.4,
+            "response_format": {"type": "json_object"},
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT.format(language=self.language)},
+                {"role": "user", "content": json.dumps(products, ensure_ascii=False)},
+            ],
+        }
+        return MarketplaceRequest(
+            "POST",
+            self.url,
+            headers={"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"},
+            body=json.dumps(body, ensure_ascii=False).encode(),
+        )
+
+    async def generate(self, batch: Sequence[ContentRequest]) -> List[Optional[GeneratedContent]]:
+        result = await self.client.request(self.build_request(batch))
+        self.stats["requests"] += 1
+        if result.status_code != 200:
+            raise ExternalServiceError(self.name, detail=f"{self.name}: HTTP {result.status_code}")
+
+        results: List[Optional[GeneratedContent]] = [None] * len(batch)
+        try:
+            payload = result.json()
+            usage = payload.get("usage") or {}
+            self.stats["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            self.stats["completion_tokens"] += usage.get("completion_tokens", 0)
+            items = json.loads(payload["choices"][0]["message"]["content"])["items"]
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            # Risposta troncata o non JSON: i prodotti verranno ritentati
+            logger.warning("%s: risposta non valida per un batch di %d prodotti: %s", self.name, len(batch), e)
+            return results
+
+        for item in items:
+            try:
+                index = item["id"]
+                if isinstance(index, int) and 0 <= index < len(batch):
+                    results[index] = GeneratedContent(
+                        title=truncate(item["title"], 100), description=truncate(item["description"], 1000),
+                    )
+            except (KeyError, TypeError, ValidationError) as e:
+                logger.debug("%s: testo scartato: %s", self.name, e)
+        return results
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+class ContentGenerator:
+    """
+    Genera titoli e descrizioni raggruppando le richieste in batch.
+
+    - le richieste arrivate entro `batch_wait` secondi (o fino a `batch_size`)
+      partono insieme in una sola chiamata al provider
+    - i testi già generati sono in una cache LRU in memoria (e, con
+      `generate_many`, nella tabella generated_content), indicizzati per hash
+      del contenuto di origine: la stessa descrizione del fornitore non viene
+      mai generata due volte
+    - richieste identiche in corso condividono lo stesso risultato
+    - al massimo `concurrency` batch alla volta; i prodotti saltati dal
+      modello vengono ritentati in un batch successivo
+    """
+
+    def __init__(
+        self,
+        provider: ContentProvider,
+        *,
+        batch_size: int = 20,
+        batch_wait: float = 0.05,
+        concurrency: int = 4,
+        cache_size: int = 50_000,
+        max_attempts: int = 2,
+    ):
+        """
+        Args:
+            provider: Modello che genera i testi
+            batch_size: Prodotti massimi per chiamata al provider
+            batch_wait: Attesa massima per riempire un batch, in secondi
+            concurrency: Batch in corso contemporaneamente
+            cache_size: Testi generati tenuti in memoria
+            max_attempts: Tentativi per prodotto se il modello lo salta
+        """
+        self.provider = provider
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.cache_size = cache_size
+        self.max_attempts = max_attempts
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._cache: "OrderedDict[bytes, GeneratedContent]" = OrderedDict()
+        self._inflight: Dict[bytes, asyncio.Future] = {}
+        self._pending: List[ContentRequest] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.stats = {"requests": 0, "cache_hits": 0, "deduplicated": 0, "batches": 0, "generated": 0, "failed": 0}
+
+    def request(self, name: str, description: Optional[str] = None, category: Optional[str] = None) -> ContentRequest:
+        """Prepara la richiesta per un prodotto, calcolandone la chiave di cache."""
+        key = content_key(self.provider.model, self.provider.language, name, description, category)
+        return ContentRequest(key, name, description, category)
+
+    def cached(self, key: bytes) -> Optional[GeneratedContent]:
+        content = self._cache.get(key)
+        if content is not None:
+            self._cache.move_to_end(key)
+        return content
+
+    def remember(self, key: bytes, content: GeneratedContent) -> None:
+        self._cache[key] = content
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def generate(self, name: str, description: Optional[str] = None, category: Optional[str] = None) -> GeneratedContent:
+        """
+        Genera titolo e descrizione di un prodotto.
+
+        Raises:
+            ExternalServiceError: se il provider non riesce a generare il testo
+        """
+        return await asyncio.shield(self.submit(self.request(name, description, category)))
+
+    def submit(self, request: ContentRequest) -> "asyncio.Future[GeneratedContent]":
+        """Accoda una richiesta; il future è condiviso con le richieste identiche in corso."""
+        self.stats["requests"] += 1
+        loop = asyncio.get_running_loop()
+        content = self.cached(request.key)
+        if content is not None:
+            self.stats["cache_hits"] += 1
+            future = loop.create_future()
+            future.set_result(content)
+            return future
+        future = self._inflight.get(request.key)
+        if future is not None:
+            self.stats["deduplicated"] += 1
+            return future
+        future = loop.create_future()
+        self._inflight[request.key] = future
+        self._enqueue(request)
+        return future
+
+    def _enqueue(self, request: ContentRequest) -> None:
+        self._pending.append(request)
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.batch_wait, self._flush)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch = self._pending[:self.batch_size]
+            del self._pending[:self.batch_size]
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[ContentRequest]) -> None:
+        error: Optional[Exception] = None
+        results: List[Optional[GeneratedContent]] = [None] * len(batch)
+        async with self._semaphore:
+            self.stats["batches"] += 1
+            try:
+                results = await self.provider.generate(batch)
+            except Exception as e:
+                # I retry HTTP sono già stati fatti dal provider: il batch fallisce
+                logger.warning("Generazione di %d testi fallita: %s", len(batch), e)
+                error = e
+
+        for request, content in zip(batch, results):
+            if content is None and error is None and request.attempts + 1 < self.max_attempts:
+                request.attempts += 1
+                self._enqueue(request)
+                continue
+            future = self._inflight.pop(request.key, None)
+            if future is None or future.done():
+                continue
+            if content is not None:
+                self.stats["generated"] += 1
+                self.remember(request.key, content)
+                future.set_result(content)
+            else:
+                self.stats["failed"] += 1
+                future.set_exception(error or ExternalServiceError(
+                    self.provider.name, detail=f"{self.provider.name}: testo non generato per '{request.name}'",
+                ))
+
+    async def generate_many(
+        self,
+        requests: Sequence[ContentRequest],
+        connection: Optional[ConnectionFactory] = None,
+    ) -> Tuple[List[Optional[GeneratedContent]], int]:
+        """
+        Genera i testi di più prodotti (es. un import).
+
+        Con una factory di connessioni, i testi mancanti in memoria vengono
+        cercati nella tabella generated_content con una sola query e quelli
+        nuovi vi vengono salvati alla fine, ciascuna in una transazione breve:
+        durante le chiamate al modello non si tiene occupata nessuna connessione.
+
+        Returns:
+            Un risultato per richiesta (None se la generazione è fallita) e il
+            numero di testi generati ex novo
+        """
+        missing = list({r.key for r in requests if r.key not in self._cache})
+        if connection is not None and missing:
+            async with connection() as conn:
+                cur = await conn.execute(LOAD_CACHED, (missing,))
+                rows = await cur.fetchall()
+            for key, title, description in rows:
+                self.remember(bytes(key), GeneratedContent(title=title, description=description))
+        new_keys = {key for key in missing if key not in self._cache}
+
+        futures = [asyncio.shield(self.submit(r)) for r in requests]
+        outcomes = await asyncio.gather(*futures, return_exceptions=True)
+        results = [o if isinstance(o, GeneratedContent) else None for o in outcomes]
+
+        created: Dict[bytes, GeneratedContent] = {}
+        for request, content in zip(requests, results):
+            if content is not None and request.key in new_keys:
+                created[request.key] = content
+        if connection is not None and created:
+            async with connection() as conn:
+                await conn.execute(STORE_CACHED, (
+                    self.provider.model,
+                    list(created),
+                    [c.title for c in created.values()],
+                    [c.description for c in created.values()],
+                ))
+        return results, len(created)
+
+    async def close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for future in self._inflight.values():
+            future.cancel()
+        self._inflight.clear()
+        self._pending.clear()
+        await self.provider.aclose()
+
+
+class ProductContent(GeneratedContent):
+    """Testi generati per un prodotto del catalogo."""
+    product_id: int
+
+
+class ContentGenerationReport(BaseSchema):
+    """Esito della generazione dei testi per un insieme di prodotti."""
+    items: List[ProductContent] = []
+    failed: List[int] = []
+    not_found: List[int] = []
+    generated: int = 0
+    reused: int = 0
+    applied: int = 0
+    elapsed_seconds: float = 0.0
+
+
+async def generate_product_content(
+    generator: ContentGenerator,
+    product_ids: Sequence[int],
+    apply: bool = False,
+    connection: Optional[ConnectionFactory] = None,
+    owner_id: Optional[int] = None,
+) -> ContentGenerationReport:
+    """
+    Genera titolo e descrizione per i prodotti indicati.
+
+    Lettura dei prodotti e salvataggio dei testi usano transazioni brevi sul
+    primario; le chiamate al modello, che durano secondi, avvengono senza
+    connessioni in uso.
+
+    Args:
+        generator: Generatore condiviso del processo
+        product_ids: Prodotti da riscrivere
+        apply: True per salvare i testi al posto di nome e descrizione
+        connection: Factory delle connessioni (default: primario del db_router)
+        owner_id: Solo i prodotti di questo utente, gli altri risultano
+            inesistenti (None: qualunque prodotto)
+
+    Returns:
+        I testi generati, i prodotti falliti o inesistenti e i conteggi
+    """
+    if connection is None:
+        from app.db.session import db_router
+        connection = db_router.connection
+    started = time.perf_counter()
+    async with connection() as conn:
+        cur = await conn.execute(LOAD_PRODUCTS, {"ids": list(product_ids), "owner_id": owner_id})
+        rows = await cur.fetchall()
+    found = {row[0] for row in rows}
+
+    results, generated = await generator.generate_many(
+        [generator.request(name, description) for _, name, description in rows], connection,
+    )
+    report = ContentGenerationReport(
+        not_found=[pid for pid in product_ids if pid not in found],
+        generated=generated,
+    )
+    for (product_id, _, _), content in zip(rows, results):
+        if content is None:
+            report.failed.append(product_id)
+        else:
+            report.items.append(ProductContent(product_id=product_id, **content.dict()))
+    report.reused = len(report.items) - generated
+
+    if apply and report.items:
+        async with connection() as conn:
+            cur = await conn.execute(APPLY_CONTENT, {
+                "ids": [item.product_id for item in report.items],
+                "titles": [item.title for item in report.items],
+                "descriptions": [item.description for item in report.items],
+                "owner_id": owner_id,
+            })
+            report.applied = cur.rowcount
+            await invalidate_tags(conn, [product_tag(item.product_id) for item in report.items])
+    report.elapsed_seconds = round(time.perf_counter() - started, 3)
+    return report
+
+
+_generator: Optional[ContentGenerator] = None
+
+
+def get_content_generator() -> ContentGenerator:
+    """Generatore condiviso, creato al primo utilizzo con le impostazioni correnti."""
+    global _generator
+    if _generator is None:
+        provider = OpenAIProvider(
+            settings.OPENAI_API_KEY,
+            model=settings.CONTENT_MODEL,
+            language=settings.CONTENT_LANGUAGE,
+            base_url=settings.OPENAI_BASE_URL,
+            concurrency=settings.CONTENT_CONCURRENCY,
+            rate=settings.CONTENT_RATE,
+            timeout=settings.CONTENT_TIMEOUT,
+            max_retries=settings.CONTENT_MAX_RETRIES,
+        )
+        _generator = ContentGenerator(
+            provider,
+            batch_size=settings.CONTENT_BATCH_SIZE,
+            batch_wait=settings.CONTENT_BATCH_WAIT,
+            concurrency=settings.CONTENT_CONCURRENCY,
+            cache_size=settings.CONTENT_CACHE_SIZE,
+        )
+    return _generator
+
+
+async def close_content_generator() -> None:
+    global _generator
+    if _generator is not None:
+        await _generator.close()
+        _generator = None
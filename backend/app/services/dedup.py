@@ -0,0 +1,662 @@
+import asyncio
+import logging
+import re
+import time
+import unicodedata
+import zlib
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import AsyncContextManager, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from psycopg import AsyncConnection
+from pydantic import Field
+
+from app.core.config import settings
+from app.schemas.base import BaseSchema
+
+logger = logging.getLogger(__name__)
+
+ConnectionFactory = Callable[[], AsyncContextManager[AsyncConnection]]
+
+MAX_HASH = np.uint64(0xFFFFFFFF)
+FNV_PRIME = np.uint64(0x100000001B3)
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Unità attaccate al numero che le precede ("128 GB" e "128gb" diventano lo stesso token)
+UNITS = frozenset({
+    "gb", "tb", "mb", "kb", "mm", "cm", "m", "km", "g", "kg", "mg", "ml", "cl", "l",
+    "w", "kw", "v", "mah", "hz", "mhz", "ghz", "pz", "pezzi", "pcs", "x", "pollici", "inch",
+})
+
+STOPWORDS = frozenset({
+    "il", "lo", "la", "i", "gli", "le", "un", "uno", "una", "di", "da", "in", "con", "su", "per",
+    "tra", "fra", "e", "ed", "o", "del", "della", "dei", "delle", "al", "alla", "the", "a", "an",
+    "and", "or", "of", "for", "with", "new", "nuovo", "nuova", "originale", "original",
+    # Formule promozionali che i fornitori aggiungono ai titoli
+    "offerta", "promo", "spedizione", "gratuita", "gratis", "veloce", "garanzia", "italia",
+    "free", "shipping", "sale",
+})
+
+LOAD_CHANGED_PRODUCTS = """
+SELECT id, name, updated_at FROM products WHERE updated_at >= %s ORDER BY updated_at
+"""
+
+LOAD_PRODUCT_IDS = "SELECT id FROM products"
+
+
+def normalize_tokens(text: str) -> List[str]:
+    """Minuscolo, senza accenti e punteggiatura, unità unite al numero, senza parole vuote."""
+    text = text.lower()
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in text if not unicodedata.combining(c))
+    tokens: List[str] = []
+    for token in _TOKEN.findall(text):
+        if token in UNITS and tokens and tokens[-1].isdigit():
+            tokens[-1] += token
+        elif token not in STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+
+def product_tokens(name: str, attributes: Optional[Dict[str, str]] = None) -> List[str]:
+    tokens = normalize_tokens(name)
+    for value in (attributes or {}).values():
+        tokens.extend(normalize_tokens(str(value)))
+    return tokens
+
+
+def shingles(token_lists: Sequence[Sequence[str]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Feature di più titoli: le parole e i trigrammi di caratteri delle parole
+    lunghe, così refusi e varianti ("iphone"/"i-phone") restano vicini.
+
+    I trigrammi di tutti i titoli sono estratti con un'unica operazione
+    vettoriale; i duplicati non vengono rimossi perché non cambiano il
+    minimo di MinHash.
+
+    Returns:
+        Le feature concatenate, titolo per titolo, e il numero di feature di ciascun titolo
+    """
+    word_hashes: List[int] = []
+    word_counts: List[int] = []
+    texts: List[str] = []
+    for tokens in token_lists:
+        word_hashes.extend(zlib.crc32(t.encode()) for t in tokens)
+        word_counts.append(len(tokens))
+        texts.append(" ".join(f"#{t}#" for t in tokens if len(t) > 3))
+    titles = np.arange(len(texts))
+
+    # Le parole stanno sopra 2^32, i trigrammi sono interi a 24 bit
+    words = np.array(word_hashes, dtype=np.uint64) + np.uint64(1 << 32)
+    word_title = np.repeat(titles, word_counts)
+
+    # Testo ASCII (i token sono [a-z0-9]+): un carattere per byte, titoli separati da "\n"
+    chars = np.frombuffer("\n".join(texts).encode(), dtype=np.uint8).astype(np.uint64)
+    char_title = np.repeat(titles, [len(t) + 1 for t in texts])[:len(chars)]
+    trigrams = (chars[:-2] << np.uint64(16)) | (chars[1:-1] << np.uint64(8)) | chars[2:]
+    inside = (chars > 32)
+    within_word = inside[:-2] & inside[1:-1] & inside[2:]
+
+    values = np.concatenate([words, trigrams[within_word]])
+    title_of = np.concatenate([word_title, char_title[:-2][within_word]])
+    order = np.argsort(title_of, kind="stable")
+    return values[order], np.bincount(title_of, minlength=len(texts))
+
+
+def numbers_key(tokens: Sequence[str]) -> int:
+    """
+    Impronta dei token con cifre (capacità, misure, modelli).
+
+    "iPhone 13 128GB" e "iPhone 14 128GB" sono quasi uguali per MinHash ma non
+    sono lo stesso articolo: due prodotti sono duplicati solo con gli stessi numeri.
+    """
+    # I token sono [a-z0-9]+: chi non è solo lettere contiene una cifra
+    numbers = sorted({t for t in tokens if not t.isalpha()})
+    return zlib.crc32(" ".join(numbers).encode())
+
+
+class MinHasher:
+    """Firme MinHash con `num_perm` funzioni hash multiply-shift ((a*x + b) >> 32 su 64 bit)."""
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(0, 1 << 63, size=(num_perm, 1), dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 1 << 63, size=(num_perm, 1), dtype=np.uint64)
+        self.num_perm = num_perm
+
+    def signatures(self, values: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        """
+        Firme di più titoli in un'unica operazione vettoriale.
+
+        Args:
+            values: Feature concatenate titolo per titolo (vedi `shingles`)
+            counts: Numero di feature di ciascun titolo
+
+        Returns:
+            Una firma per riga
+        """
+        result = np.full((len(counts), self.num_perm), MAX_HASH, dtype=np.uint32)
+        filled = np.flatnonzero(counts)
+        if len(filled):
+            offsets = np.r_[0, np.cumsum(counts)[:-1]][filled]
+            hashed = (self.a * values[np.newaxis, :] + self.b) >> np.uint64(32)
+            result[filled] = np.minimum.reduceat(hashed, offsets, axis=1).T
+        return result
+
+
+class DedupIndex:
+    """
+    Indice LSH dei titoli per trovare i prodotti quasi duplicati.
+
+    Ogni prodotto ha una firma MinHash divisa in `bands` bande; due prodotti
+    sono candidati se coincidono in almeno una banda, e sono duplicati se la
+    somiglianza di Jaccard stimata dalla firma supera la soglia e i numeri del
+    titolo coincidono.
+
+    Le chiavi di tutte le bande stanno in un unico array ordinato per
+    (banda, chiave): una lookup è una ricerca binaria vettoriale, quindi costa
+    O(bands · log n) più i candidati, non O(n). I prodotti
+    aggiunti dopo l'ultimo ordinamento stanno in un segmento delta confrontato
+    in modo vettoriale, che viene fuso quando supera `merge_threshold` righe.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 32, threshold: float = 0.6, merge_threshold: int = 4096):
+        """
+        Args:
+            num_perm: Lunghezza della firma MinHash
+            bands: Bande LSH (num_perm deve esserne multiplo); più bande, più candidati
+            threshold: Somiglianza minima di default tra duplicati
+            merge_threshold: Righe del segmento delta prima di riordinare l'indice
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm deve essere un multiplo di bands")
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.threshold = threshold
+        self.merge_threshold = merge_threshold
+
+        self._size = 0
+        self._ids = np.empty(0, dtype=np.int64)
+        self._signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self._band_keys = np.empty((0, bands), dtype=np.uint32)
+        self._numbers = np.empty(0, dtype=np.uint32)
+        self._alive = np.empty(0, dtype=bool)
+        # Segmento ordinato: righe [0, _sorted_size), chiavi (banda << 32 | chiave) ordinate
+        self._sorted_size = 0
+        self._sorted_keys = np.empty(0, dtype=np.uint64)
+        self._sorted_rows = np.empty(0, dtype=np.int32)
+        self._band_prefix = np.arange(bands, dtype=np.uint64) << np.uint64(32)
+
+        self._row_of: Dict[int, int] = {}
+        self._fingerprints: Dict[int, int] = {}
+        self._lock = asyncio.Lock()
+        self.synced_until: Optional[datetime] = None
+        self._reconciled_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        """Una chiave a 32 bit per banda (FNV delle righe della banda)."""
+        rows = signatures.reshape(len(signatures), self.bands, self.rows_per_band).astype(np.uint64)
+        keys = np.zeros((len(signatures), self.bands), dtype=np.uint64)
+        for r in range(self.rows_per_band):
+            keys = (keys * FNV_PRIME) ^ rows[:, :, r]
+        return ((keys >> np.uint64(32)) ^ keys).astype(np.uint32)
+
+    def _signatures_of(self, token_lists: Sequence[Sequence[str]]) -> np.ndarray:
+        signatures = np.empty((len(token_lists), self.hasher.num_perm), dtype=np.uint32)
+        for start in range(0, len(token_lists), 1024):
+            block = token_lists[start:start + 1024]
+            signatures[start:start + len(block)] = self.hasher.signatures(*shingles(block))
+        return signatures
+
+    def _reserve(self, extra: int) -> None:
+        needed = self._size + extra
+        if needed <= len(self._ids):
+            return
+        capacity = max(needed, 2 * len(self._ids), 1024)
+
+        def grow(array: np.ndarray) -> np.ndarray:
+            grown = np.zeros((capacity, *array.shape[1:]), dtype=array.dtype)
+            grown[:self._size] = array[:self._size]
+            return grown
+
+        self._ids = grow(self._ids)
+        self._signatures = grow(self._signatures)
+        self._band_keys = grow(self._band_keys)
+        self._numbers = grow(self._numbers)
+        self._alive = grow(self._alive)
+
+    def add_many(self, products: Iterable[Tuple[int, str, Optional[Dict[str, str]]]]) -> int:
+        """
+        Aggiunge o aggiorna prodotti; quelli con titolo invariato vengono saltati.
+
+        Args:
+            products: Tuple (id prodotto, titolo, attributi o None)
+
+        Returns:
+            Il numero di prodotti indicizzati
+        """
+        ids: List[int] = []
+        token_lists: List[List[str]] = []
+        for product_id, name, attributes in products:
+            tokens = product_tokens(name, attributes)
+            fingerprint = zlib.crc32(" ".join(tokens).encode())
+            if self._fingerprints.get(product_id) == fingerprint:
+                continue
+            old_row = self._row_of.get(product_id)
+            if old_row is not None and old_row < self._size:
+                self._alive[old_row] = False
+            self._fingerprints[product_id] = fingerprint
+            # Lo stesso id ripetuto nel lotto: vale l'ultima versione
+            self._row_of[product_id] = self._size + len(ids)
+            ids.append(product_id)
+            token_lists.append(tokens)
+        if not ids:
+            return 0
+
+        start, end = self._size, self._size + len(ids)
+        self._reserve(len(ids))
+        self._ids[start:end] = ids
+        self._signatures[start:end] = self._signatures_of(token_lists)
+        self._band_keys[start:end] = self.band_keys(self._signatures[start:end])
+        self._numbers[start:end] = [numbers_key(tokens) for tokens in token_lists]
+        self._alive[start:end] = [self._row_of[pid] == start + i for i, pid in enumerate(ids)]
+        self._size = end
+        if self._size - self._sorted_size > max(self.merge_threshold, self._sorted_size // 8):
+            self._merge()
+        return len(ids)
+
+    def add(self, product_id: int, name: str, attributes: Optional[Dict[str, str]] = None) -> None:
+        self.add_many([(product_id, name, attributes)])
+
+    def _compact(self) -> None:
+        keep = np.flatnonzero(self._alive[:self._size])
+        if len(keep) == self._size:
+            return
+        self._ids = self._ids[keep]
+        self._signatures = self._signatures[keep]
+        self._band_keys = self._band_keys[keep]
+        self._numbers = self._numbers[keep]
+        self._alive = self._alive[keep]
+        self._size = len(keep)
+        self._row_of = {int(pid): row for row, pid in enumerate(self._ids)}
+
+    def _merge(self) -> None:
+        """Rimuove le righe sostituite e riordina tutte le chiavi di banda."""
+        self._compact()
+        keys = (self._band_keys[:self._size].astype(np.uint64) | self._band_prefix).ravel()
+        order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[order]
+        self._sorted_rows = (order // self.bands).astype(np.int32)
+        self._sorted_size = self._size
+
+    def _candidates(self, keys: np.ndarray) -> np.ndarray:
+        # Una sola ricerca binaria vettoriale per tutte le bande
+        prefixed = keys.astype(np.uint64) | self._band_prefix
+        lo = np.searchsorted(self._sorted_keys, prefixed, side="left")
+        hi = np.searchsorted(self._sorted_keys, prefixed, side="right")
+        found = [self._sorted_rows[a:b] for a, b in zip(lo[hi > lo], hi[hi > lo])]
+        delta = self._band_keys[self._sorted_size:self._size]
+        if len(delta):
+            found.append(np.flatnonzero((delta == keys).any(axis=1)) + self._sorted_size)
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(found))
+
+    def query(
+        self,
+        name: str,
+        attributes: Optional[Dict[str, str]] = None,
+        limit: int = 10,
+        threshold: Optional[float] = None,
+        exclude: Optional[int] = None,
+    ) -> List[Tuple[int, float]]:
+        """
+        Cerca i prodotti quasi duplicati di un titolo.
+
+        Args:
+            name: Titolo del prodotto
+            attributes: Attributi aggiuntivi (marca, modello, colore, ...)
+            limit: Risultati massimi
+            threshold: Somiglianza minima (default: quella dell'indice)
+            exclude: Id da escludere (il prodotto stesso)
+
+        Returns:
+            Coppie (id prodotto, somiglianza stimata), dalla più simile
+        """
+        return self.query_many([(name, attributes)], limit, threshold, exclude)[0]
+
+    def query_many(
+        self,
+        products: Sequence[Tuple[str, Optional[Dict[str, str]]]],
+        limit: int = 10,
+        threshold: Optional[float] = None,
+        exclude: Optional[int] = None,
+    ) -> List[List[Tuple[int, float]]]:
+        """Come `query` per più titoli, con le firme calcolate in un'unica operazione."""
+        threshold = self.threshold if threshold is None else threshold
+        token_lists = [product_tokens(name, attributes) for name, attributes in products]
+        signatures = self._signatures_of(token_lists)
+        band_keys = self.band_keys(signatures)
+        results: List[List[Tuple[int, float]]] = []
+        for tokens, signature, keys in zip(token_lists, signatures, band_keys):
+            rows = self._candidates(keys)
+            rows = rows[self._alive[rows] & (self._numbers[rows] == numbers_key(tokens))]
+            if exclude is not None:
+                rows = rows[self._ids[rows] != exclude]
+            similarity = (self._signatures[rows] == signature).mean(axis=1)
+            hits = np.flatnonzero(similarity >= threshold)
+            best = hits[np.argsort(-similarity[hits], kind="stable")][:limit]
+            results.append([(int(self._ids[rows[i]]), round(float(similarity[i]), 3)) for i in best])
+        return results
+
+    def snapshot(self) -> "IndexSnapshot":
+        """
+        Copia in sola lettura delle righe vive, da elaborare fuori dal loop.
+
+        Costa O(n) booleani: le altre colonne sono viste, e l'indice scrive
+        in place solo righe oltre quelle della copia (o nuovi array).
+        """
+        keep = np.flatnonzero(self._alive[:self._size])
+        return IndexSnapshot(
+            self._ids[keep], self._signatures[keep], self._band_keys[keep], self._numbers[keep], self.bands,
+        )
+
+    def clusters(
+        self,
+        threshold: Optional[float] = None,
+        max_bucket: int = 500,
+        chunk_size: int = 100_000,
+    ) -> List[List[int]]:
+        """Raggruppa l'intero catalogo in cluster di duplicati (vedi `IndexSnapshot.clusters`)."""
+        return self.snapshot().clusters(self.threshold if threshold is None else threshold, max_bucket, chunk_size)
+
+    def remove_many(self, product_ids: Iterable[int]) -> int:
+        """
+        Toglie dall'indice prodotti cancellati dal catalogo.
+
+        Returns:
+            Il numero di prodotti rimossi
+        """
+        removed = 0
+        for product_id in product_ids:
+            row = self._row_of.pop(product_id, None)
+            self._fingerprints.pop(product_id, None)
+            if row is not None:
+                self._alive[row] = False
+                removed += 1
+        return removed
+
+    async def sync(
+        self,
+        conn: AsyncConnection,
+        overlap: float = 60.0,
+        batch_size: int = 10_000,
+        reconcile_interval: float = 300.0,
+    ) -> int:
+        """
+        Indicizza i prodotti creati o modificati dall'ultima sincronizzazione.
+
+        Rilegge anche gli ultimi `overlap` secondi: updated_at è l'ora di inizio
+        della transazione, quindi una transazione lunga o una replica in
+        ritardo possono rendere visibili righe con una data già superata.
+        I titoli invariati vengono saltati. Le cancellazioni non lasciano
+        traccia in updated_at: ogni `reconcile_interval` secondi si confrontano
+        gli id del catalogo con quelli indicizzati.
+
+        Returns:
+            Il numero di prodotti indicizzati
+        """
+        async with self._lock:
+            since = (
+                self.synced_until - timedelta(seconds=overlap)
+                if self.synced_until is not None else datetime(1970, 1, 1, tzinfo=timezone.utc)
+            )
+            indexed = 0
+            async with conn.cursor(name="dedup_sync") as cursor:
+                await cursor.execute(LOAD_CHANGED_PRODUCTS, (since,))
+                while True:
+                    rows = await cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    indexed += self.add_many((product_id, name, None) for product_id, name, _ in rows)
+                    self.synced_until = max(self.synced_until or rows[-1][2], rows[-1][2])
+            if time.monotonic() - self._reconciled_at >= reconcile_interval:
+                await self._reconcile(conn, batch_size)
+            return indexed
+
+    async def _reconcile(self, conn: AsyncConnection, batch_size: int) -> None:
+        # Letti dopo le modifiche: un prodotto appena indicizzato è sicuramente tra questi id
+        chunks: List[np.ndarray] = []
+        async with conn.cursor(name="dedup_ids") as cursor:
+            await cursor.execute(LOAD_PRODUCT_IDS)
+            while True:
+                rows = await cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                chunks.append(np.array([product_id for (product_id,) in rows], dtype=np.int64))
+        existing = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+        live = self._alive[:self._size]
+        gone = self._ids[:self._size][live & ~np.isin(self._ids[:self._size], existing)]
+        removed = self.remove_many(int(product_id) for product_id in gone)
+        if removed:
+            logger.info("Indice duplicati: %d prodotti cancellati rimossi", removed)
+        self._reconciled_at = time.monotonic()
+
+
+class IndexSnapshot:
+    """Righe vive di un DedupIndex, immutabili: il clustering può girare in un thread."""
+
+    __slots__ = ("ids", "signatures", "band_keys", "numbers", "bands")
+
+    def __init__(self, ids: np.ndarray, signatures: np.ndarray, band_keys: np.ndarray, numbers: np.ndarray, bands: int):
+        self.ids = ids
+        self.signatures = signatures
+        self.band_keys = band_keys
+        self.numbers = numbers
+        self.bands = bands
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _candidate_pairs(self, max_bucket: int) -> np.ndarray:
+        n = len(self.ids)
+        keys = (self.band_keys.astype(np.uint64) | (np.arange(self.bands, dtype=np.uint64) << np.uint64(32))).ravel()
+        order = np.argsort(keys, kind="stable")
+        keys, rows = keys[order], (order // self.bands).astype(np.int32)
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        sizes = np.diff(np.r_[starts, len(keys)])
+        # Bucket da due: il caso comune, in forma vettoriale
+        two = starts[sizes == 2]
+        pairs = [np.stack([rows[two], rows[two + 1]], axis=1)]
+        larger = (sizes > 2) & (sizes <= max_bucket)
+        for start, size in zip(starts[larger], sizes[larger]):
+            i, j = np.triu_indices(size, k=1)
+            pairs.append(np.stack([rows[start + i], rows[start + j]], axis=1))
+        skipped = int((sizes > max_bucket).sum())
+        if skipped:
+            logger.debug("%d bucket LSH oltre %d prodotti ignorati", skipped, max_bucket)
+        pairs = np.sort(np.concatenate(pairs).astype(np.int64), axis=1)
+        encoded = np.unique(pairs[:, 0] * n + pairs[:, 1])
+        return np.stack([encoded // n, encoded % n], axis=1)
+
+    def clusters(self, threshold: float, max_bucket: int = 500, chunk_size: int = 100_000) -> List[List[int]]:
+        """
+        Raggruppa i prodotti in cluster di duplicati.
+
+        Le coppie candidate vengono dai bucket LSH (quelli più grandi di
+        `max_bucket`, tipici di titoli generici, sono ignorati) e unite
+        transitivamente: A~B e B~C finiscono nello stesso cluster.
+
+        Returns:
+            Liste di id prodotto con almeno due elementi, dal cluster più grande
+        """
+        size = len(self.ids)
+        if size < 2:
+            return []
+        pairs = self._candidate_pairs(max_bucket)
+        parent = np.arange(size)
+
+        def find(x: int) -> int:
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for start in range(0, len(pairs), chunk_size):
+            chunk = pairs[start:start + chunk_size]
+            left, right = chunk[:, 0], chunk[:, 1]
+            same_numbers = self.numbers[left] == self.numbers[right]
+            chunk, left, right = chunk[same_numbers], left[same_numbers], right[same_numbers]
+            similarity = (self.signatures[left] == self.signatures[right]).mean(axis=1)
+            for a, b in chunk[similarity >= threshold]:
+                root_a, root_b = find(a), find(b)
+                if root_a != root_b:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+
+        groups: Dict[int, List[int]] = {}
+        for row in np.flatnonzero(parent != np.arange(size)):
+            groups.setdefault(find(row), []).append(int(self.ids[row]))
+        result = [sorted([int(self.ids[root]), *members]) for root, members in groups.items()]
+        result.sort(key=lambda c: (-len(c), c[0]))
+        return result
+
+
+_index: Optional[DedupIndex] = None
+
+
+def get_dedup_index() -> DedupIndex:
+    """Indice del processo, riempito dal catalogo al primo `sync`."""
+    global _index
+    if _index is None:
+        _index = DedupIndex(
+            num_perm=settings.DEDUP_NUM_PERM,
+            bands=settings.DEDUP_BANDS,
+            threshold=settings.DEDUP_THRESHOLD,
+        )
+    return _index
+
+
+class DuplicateCandidate(BaseSchema):
+    """Prodotto in arrivo da confrontare col catalogo."""
+    name: str = Field(..., min_length=1, max_length=500)
+    attributes: Dict[str, str] = Field(default_factory=dict, description="Marca, modello, colore, ...")
+
+
+class DuplicateMatch(BaseSchema):
+    """Prodotto del catalogo simile a quello cercato."""
+    product_id: int
+    similarity: float
+
+
+class DuplicateClusters(BaseSchema):
+    """Gruppi di prodotti quasi duplicati nel catalogo."""
+    clusters: List[List[int]] = []
+    products: int = 0
+    elapsed_seconds: float = 0.0
+
+
+async def find_duplicates(
+    conn: AsyncConnection,
+    candidates: Sequence[DuplicateCandidate],
+    limit: int = 10,
+    threshold: Optional[float] = None,
+) -> List[List[DuplicateMatch]]:
+    """
+    Cerca nel catalogo i quasi duplicati di prodotti in arrivo (es. un import).
+
+    L'indice del processo viene prima allineato ai prodotti modificati
+    dall'ultima ricerca.
+
+    Returns:
+        Per ogni prodotto, i prodotti simili dal più somigliante
+    """
+    index = get_dedup_index()
+    await index.sync(
+        conn, overlap=settings.DEDUP_SYNC_OVERLAP, reconcile_interval=settings.DEDUP_RECONCILE_INTERVAL,
+    )
+    results = index.query_many([(c.name, c.attributes) for c in candidates], limit=limit, threshold=threshold)
+    return [
+        [DuplicateMatch(product_id=product_id, similarity=similarity) for product_id, similarity in matches]
+        for matches in results
+    ]
+
+
+class ClusterCache:
+    """Ultimi cluster calcolati per soglia: il clustering del catalogo costa secondi."""
+
+    def __init__(self, ttl: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._results: Dict[float, Tuple[float, DuplicateClusters]] = {}
+        self.lock = asyncio.Lock()
+
+    def get(self, threshold: float) -> Optional[DuplicateClusters]:
+        entry = self._results.get(threshold)
+        if entry is None or self.clock() - entry[0] >= self.ttl:
+            return None
+        return entry[1]
+
+    def set(self, threshold: float, clusters: DuplicateClusters) -> None:
+        self._results[threshold] = (self.clock(), clusters)
+
+
+_clusters: Optional[ClusterCache] = None
+
+
+def get_cluster_cache() -> ClusterCache:
+    global _clusters
+    if _clusters is None:
+        _clusters = ClusterCache(settings.DEDUP_CLUSTERS_TTL)
+    return _clusters
+
+
+async def cluster_catalogue(
+    threshold: Optional[float] = None,
+    connection: Optional[ConnectionFactory] = None,
+) -> DuplicateClusters:
+    """
+    Raggruppa i quasi duplicati dell'intero catalogo.
+
+    Il risultato resta in cache per DEDUP_CLUSTERS_TTL secondi e un solo
+    calcolo alla volta è in corso: le richieste concorrenti attendono quello.
+    L'allineamento col catalogo usa una connessione breve (replica), il
+    clustering gira in un thread sulla copia delle righe vive, senza fermare
+    il loop né tenere connessioni.
+
+    Args:
+        threshold: Somiglianza minima (default: quella dell'indice)
+        connection: Factory delle connessioni (default: lettura dal db_router)
+    """
+    index = get_dedup_index()
+    cache = get_cluster_cache()
+    threshold = index.threshold if threshold is None else threshold
+    cached = cache.get(threshold)
+    if cached is not None:
+        return cached
+
+    async with cache.lock:
+        cached = cache.get(threshold)
+        if cached is not None:
+            return cached
+        if connection is None:
+            from app.db.session import db_router
+            connection = partial(db_router.connection, read_only=True)
+        started = time.perf_counter()
+        async with connection() as conn:
+            await index.sync(
+                conn, overlap=settings.DEDUP_SYNC_OVERLAP, reconcile_interval=settings.DEDUP_RECONCILE_INTERVAL,
+            )
+        snapshot = index.snapshot()
+        clusters = await asyncio.get_running_loop().run_in_executor(None, snapshot.clusters, threshold)
+        result = DuplicateClusters(
+            clusters=clusters, products=len(snapshot), elapsed_seconds=round(time.perf_counter() - started, 3),
+        )
+        cache.set(threshold, result)
+        return result
@@ -0,0 +1,62 @@
+from typing import Any, Dict, Iterable, Optional
+
+from app.core.config import settings
+from app.services.marketplace import (
+    MarketplaceClient,
+    MarketplaceRequest,
+    MarketplaceService,
+    get_marketplace_client,
+    to_price,
+    truncate,
+)
+
+# La Browse API restituisce al massimo 200 articoli per pagina
+BROWSE_MAX_LIMIT = 200
+
+
+class EbayService(MarketplaceService):
+    """Catalogo eBay tramite Browse API (item_summary/search)."""
+
+    name = "ebay"
+
+    def __init__(
+        self,
+        client: Optional[MarketplaceClient] = None,
+        base_url: Optional[str] = None,
+        oauth_token: Optional[str] = None,
+        marketplace_id: Optional[str] = None,
+    ):
+        super().__init__(client or get_marketplace_client(), base_url or settings.EBAY_API_URL)
+        self.oauth_token = oauth_token if oauth_token is not None else settings.EBAY_OAUTH_TOKEN
+        self.marketplace_id = marketplace_id or settings.EBAY_MARKETPLACE_ID
+        self.site_url = settings.EBAY_SITE_URL.rstrip("/")
+
+    def search_request(self, query: str, limit: int) -> MarketplaceRequest:
+        headers = {"X-EBAY-C-MARKETPLACE-ID": self.marketplace_id}
+        if self.oauth_token:
+            headers["Authorization"] = f"Bearer {self.oauth_token}"
+        return MarketplaceRequest(
+            "GET",
+            f"{self.base_url}/item_summary/search",
+            params={"q": query, "limit": min(limit, BROWSE_MAX_LIMIT)},
+            headers=headers,
+        )
+
+    def item_url(self, item_id: str) -> str:
+        # "v1|<legacy id>|<variante>" -> pagina dell'inserzione
+        parts = item_id.split("|")
+        legacy_id = parts[1] if len(parts) > 1 else item_id
+        return f"{self.site_url}/itm/{legacy_id}"
+
+    def parse_items(self, payload: Any) -> Iterable[Dict[str, Any]]:
+        return payload.get("itemSummaries") or []
+
+    def normalize(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        availabilities = item.get("estimatedAvailabilities") or [{}]
+        return {
+            "sku": f"{self.name}:{item['itemId']}",
+            "name": truncate(item.get("title"), 100),
+            "description": truncate(item.get("shortDescription"), 1000),
+            "price": to_price((item.get("price") or {}).get("value")),
+            "stock": availabilities[0].get("estimatedAvailableQuantity", 0),
+        }
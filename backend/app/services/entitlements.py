@@ -0,0 +1,236 @@
+import asyncio
+import logging
+from typing import AsyncContextManager, Callable, Dict, Iterable, List, Optional
+
+from psycopg import AsyncConnection
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+ConnectionFactory = Callable[[], AsyncContextManager[AsyncConnection]]
+
+CHANNEL = "entitlements"
+
+# Limite di PostgreSQL per il payload di NOTIFY (8000 byte), con margine
+MAX_NOTIFY_PAYLOAD = 7900
+
+# Stati Stripe che danno diritto al piano pagato (past_due: Stripe sta ancora ritentando il pagamento)
+ENTITLED_STATUSES = ["active", "trialing", "past_due"]
+
+# Con users NULL carica tutti gli utenti
+LOAD_SUBSCRIPTIONS = """
+SELECT user_id, price_id FROM stripe_subscriptions
+WHERE user_id IS NOT NULL AND status = ANY(%(statuses)s)
+  AND (%(users)s::bigint[] IS NULL OR user_id = ANY(%(users)s))
+"""
+
+AFFECTED_USERS = """
+SELECT DISTINCT user_id FROM stripe_subscriptions WHERE id = ANY(%s) AND user_id IS NOT NULL
+"""
+
+
+class PlanLimits:
+    """Limiti di un piano, condivisi (immutabili) da tutti gli utenti del piano."""
+
+    __slots__ = ("plan", "max_skus", "monitor_interval", "rate_limit")
+
+    def __init__(self, plan: str, max_skus: int, monitor_interval: float, rate_limit: int):
+        self.plan = plan
+        self.max_skus = max_skus
+        self.monitor_interval = monitor_interval
+        self.rate_limit = rate_limit  # richieste al minuto
+
+    def __repr__(self) -> str:
+        return f"PlanLimits({self.plan!r}, max_skus={self.max_skus}, rate_limit={self.rate_limit})"
+
+
+def load_plans(config: Dict[str, Dict[str, float]]) -> Dict[str, PlanLimits]:
+    """Piani dalla configurazione; l'ordine delle voci è l'ordine dal più basso al più alto."""
+    return {
+        name: PlanLimits(name, int(limits["max_skus"]), float(limits["monitor_interval"]), int(limits["rate_limit"]))
+        for name, limits in config.items()
+    }
+
+
+async def publish_entitlement_changes(conn: AsyncConnection, subscription_ids: Iterable[str]) -> None:
+    """
+    Segnala ai worker che i piani degli utenti di questi abbonamenti sono cambiati.
+
+    NOTIFY è transazionale: i worker ricaricano solo dopo il commit del chiamante.
+    """
+    cursor = await conn.execute(AFFECTED_USERS, (list(subscription_ids),))
+    payloads: List[str] = []
+    batch: List[str] = []
+    size = 0
+    for (user_id,) in await cursor.fetchall():
+        encoded = str(user_id)
+        if batch and size + len(encoded) + 1 > MAX_NOTIFY_PAYLOAD:
+            payloads.append(",".join(batch))
+            batch, size = [], 0
+        batch.append(encoded)
+        size += len(encoded) + 1
+    if batch:
+        payloads.append(",".join(batch))
+    if payloads:
+        await conn.execute("SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload", (CHANNEL, payloads))
+
+
+class EntitlementCache:
+    """
+    Piano di ogni utente, tenuto in memoria dal worker.
+
+    La lettura (get) è un accesso a dizionario, senza I/O: si può fare a ogni
+    richiesta. La mappa contiene solo gli utenti con un abbonamento valido;
+    tutti gli altri hanno il piano di default. Viene caricata per intero
+    all'avvio e a ogni riconnessione, aggiornata per i soli utenti indicati
+    dalle notifiche che il processore dei webhook Stripe pubblica sul canale
+    `entitlements`, e ricaricata periodicamente come rete di sicurezza.
+    """
+
+    def __init__(
+        self,
+        dsn: Optional[str] = None,
+        connection: Optional[ConnectionFactory] = None,
+        plans: Optional[Dict[str, Dict[str, float]]] = None,
+        price_plans: Optional[Dict[str, str]] = None,
+        default_plan: str = "free",
+        refresh_interval: float = 300.0,
+        reconnect_delay: float = 1.0,
+    ):
+        """
+        Args:
+            dsn: Database da ascoltare (None: nessun aggiornamento automatico)
+            connection: Factory delle connessioni (default: primario del db_router)
+            plans: Limiti per piano (default: ENTITLEMENT_PLANS)
+            price_plans: Piano di ogni prezzo Stripe (default: STRIPE_PRICE_PLANS)
+            default_plan: Piano di chi non ha un abbonamento valido
+            refresh_interval: Secondi tra due ricaricamenti completi
+            reconnect_delay: Attesa prima di ricollegarsi dopo un errore
+        """
+        if connection is None:
+            from app.db.session import db_router
+            connection = db_router.connection
+        self._connection = connection
+        self.dsn = dsn
+        self.plans = load_plans(settings.ENTITLEMENT_PLANS if plans is None else plans)
+        self.price_plans = settings.STRIPE_PRICE_PLANS if price_plans is None else price_plans
+        self.default = self.plans[default_plan]
+        self.refresh_interval = refresh_interval
+        self.reconnect_delay = reconnect_delay
+
+        self._rank = {name: i for i, name in enumerate(self.plans)}
+        self._users: Dict[str, PlanLimits] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"reloads": 0, "refreshes": 0}
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def get(self, user_id: object) -> PlanLimits:
+        """Limiti del piano dell'utente (il piano di default se non ha abbonamenti validi)."""
+        return self._users.get(str(user_id), self.default)
+
+    def _plan_for(self, price_id: Optional[str]) -> PlanLimits:
+        name = self.price_plans.get(price_id or "")
+        if name is None or name not in self.plans:
+            logger.warning("Prezzo Stripe %s senza piano configurato, uso %s", price_id, self.default.plan)
+            return self.default
+        return self.plans[name]
+
+    def apply(self, rows: Iterable[tuple], user_ids: Optional[Iterable[object]] = None) -> None:
+        """
+        Aggiorna la mappa con le righe (user_id, price_id) degli abbonamenti validi.
+
+        Args:
+            rows: Abbonamenti validi; con più abbonamenti vale il piano più alto
+            user_ids: Utenti ricaricati (None: ricaricamento completo, la mappa viene sostituita)
+        """
+        users: Dict[str, PlanLimits] = {}
+        for user_id, price_id in rows:
+            key, limits = str(user_id), self._plan_for(price_id)
+            current = users.get(key)
+            if current is None or self._rank[limits.plan] > self._rank[current.plan]:
+                users[key] = limits
+        if user_ids is None:
+            self._users = users
+            return
+        for user_id in user_ids:
+            key = str(user_id)
+            if key in users:
+                self._users[key] = users[key]
+            else:
+                self._users.pop(key, None)
+
+    async def load(self, user_ids: Optional[List[int]] = None) -> None:
+        """Ricarica dal database i piani di alcuni utenti (None: di tutti)."""
+        async with self._connection() as conn:
+            cursor = await conn.execute(LOAD_SUBSCRIPTIONS, {"statuses": ENTITLED_STATUSES, "users": user_ids})
+            rows = await cursor.fetchall()
+        self.apply(rows, user_ids)
+        self.stats["reloads" if user_ids is None else "refreshes"] += 1
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with await AsyncConnection.connect(self.dsn, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {CHANNEL}")
+                    # Dopo LISTEN: le modifiche fatte durante una disconnessione non vanno perse
+                    await self.load()
+                    async for notify in conn.notifies():
+                        try:
+                            user_ids = [int(u) for u in notify.payload.split(",")]
+                        except ValueError:
+                            logger.warning("Payload non valido sul canale %s", CHANNEL)
+                            continue
+                        await self.load(user_ids)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Aggiornamento dei piani interrotto: %s", e)
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def _refresh(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.load()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Ricaricamento dei piani fallito, nuovo tentativo al prossimo giro")
+
+    async def run(self) -> None:
+        await asyncio.gather(self._listen(), self._refresh())
+
+    def start(self) -> None:
+        if self.dsn and self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+_cache: Optional[EntitlementCache] = None
+
+
+def get_entitlements() -> EntitlementCache:
+    """Cache dei piani del processo (una per worker)."""
+    global _cache
+    if _cache is None:
+        _cache = EntitlementCache(
+            str(settings.DATABASE_URI),
+            default_plan=settings.ENTITLEMENT_DEFAULT_PLAN,
+            refresh_interval=settings.ENTITLEMENT_REFRESH_INTERVAL,
+        )
+    return _cache
+
+
+async def close_entitlements() -> None:
+    global _cache
+    if _cache is not None:
+        await _cache.close()
+        _cache = None
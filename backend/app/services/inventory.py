@@ -0,0 +1,551 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import AsyncContextManager, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from psycopg import AsyncConnection
+
+from app.core.config import settings
+from app.core.errors import BusinessLogicError, InsufficientStockError
+
+logger = logging.getLogger(__name__)
+
+ConnectionFactory = Callable[[], AsyncContextManager[AsyncConnection]]
+
+# Giacenza reale del prodotto `p` nelle letture (ricerca, scheda): la quota non
+# assegnata più le unità prese in carico dai processi e non ancora riconciliate
+PRODUCT_STOCK = "(p.stock + COALESCE((SELECT sum(l.quantity) FROM stock_leases AS l WHERE l.product_id = p.id), 0))::int"
+
+# Prende in carico fino a `want` unità: l'unico punto che tocca la riga (calda) del prodotto
+LEASE_STOCK = """
+WITH granted AS (
+    UPDATE products AS p
+    SET stock = p.stock - g.quantity, updated_at = now()
+    FROM (
+        SELECT id, LEAST(stock, %(want)s) AS quantity FROM products WHERE id = %(product_id)s FOR UPDATE
+    ) AS g
+    WHERE p.id = g.id AND g.quantity > 0
+    RETURNING g.quantity
+), lease AS (
+    INSERT INTO stock_leases (worker_id, product_id, quantity)
+    SELECT %(worker_id)s, %(product_id)s, quantity FROM granted
+    ON CONFLICT (worker_id, product_id) DO UPDATE SET
+        quantity = stock_leases.quantity + EXCLUDED.quantity,
+        updated_at = now()
+)
+SELECT quantity FROM granted
+"""
+
+INSERT_HOLDS = """
+INSERT INTO stock_holds (reservation_id, product_id, worker_id, quantity, expires_at)
+SELECT %s, product_id, %s, quantity, %s
+FROM unnest(%s::bigint[], %s::integer[]) AS h(product_id, quantity)
+"""
+
+# Più prenotazioni in un solo INSERT (import degli ordini)
+INSERT_BATCH_HOLDS = """
+INSERT INTO stock_holds (reservation_id, product_id, worker_id, quantity, expires_at)
+SELECT reservation_id, product_id, %s, quantity, %s
+FROM unnest(%s::uuid[], %s::bigint[], %s::integer[]) AS h(reservation_id, product_id, quantity)
+"""
+
+CONFIRM_HOLD = """
+UPDATE stock_holds SET state = 'confirmed'
+WHERE reservation_id = %s AND state = 'held' AND expires_at > now()
+"""
+
+CONFIRM_HOLDS = """
+WITH confirmed AS (
+    UPDATE stock_holds SET state = 'confirmed'
+    WHERE reservation_id = ANY(%s::uuid[]) AND state = 'held' AND expires_at > now()
+    RETURNING reservation_id
+)
+SELECT DISTINCT reservation_id::text FROM confirmed
+"""
+
+# Prenotazioni ancora aperte, bloccate fino al commit: il flush non le raccoglie nel frattempo
+LOCK_OPEN_HOLDS = """
+SELECT reservation_id::text, product_id, quantity, expires_at FROM stock_holds
+WHERE reservation_id = ANY(%s::uuid[]) AND state = 'held' AND expires_at > now()
+ORDER BY reservation_id, product_id
+FOR UPDATE
+"""
+
+RELEASE_HOLD = """
+UPDATE stock_holds SET state = 'released'
+WHERE reservation_id = %s AND state = 'held'
+"""
+
+RELEASE_HOLDS = """
+UPDATE stock_holds SET state = 'released'
+WHERE reservation_id = ANY(%s::uuid[]) AND state = 'held'
+"""
+
+# Prenotazioni chiuse o scadute di questo processo, aggregate per prodotto
+COLLECT_HOLDS = """
+WITH done AS (
+    DELETE FROM stock_holds
+    WHERE worker_id = %s AND (state <> 'held' OR expires_at <= now())
+    RETURNING product_id, quantity, state = 'confirmed' AS sold
+)
+SELECT product_id,
+       COALESCE(sum(quantity) FILTER (WHERE sold), 0),
+       COALESCE(sum(quantity) FILTER (WHERE NOT sold), 0)
+FROM done GROUP BY product_id
+"""
+
+SETTLE_LEASES = """
+UPDATE stock_leases AS l
+SET quantity = l.quantity - d.sold - d.returned, updated_at = now()
+FROM unnest(%s::bigint[], %s::integer[], %s::integer[]) AS d(product_id, sold, returned)
+WHERE l.worker_id = %s AND l.product_id = d.product_id
+"""
+
+RETURN_STOCK = """
+UPDATE products AS p
+SET stock = p.stock + d.quantity, updated_at = now()
+FROM unnest(%s::bigint[], %s::integer[]) AS d(id, quantity)
+WHERE p.id = d.id AND d.quantity > 0
+"""
+
+HEARTBEAT = "UPDATE stock_leases SET updated_at = now() WHERE worker_id = %s"
+
+# Lease di processi spariti senza chiudere: torna a catalogo tutto tranne il venduto confermato
+RECLAIM_STALE_LEASES = """
+WITH stale AS (
+    DELETE FROM stock_leases
+    WHERE updated_at < now() - make_interval(secs => %s)
+    RETURNING worker_id, product_id, quantity
+), holds AS (
+    DELETE FROM stock_holds AS h USING stale AS s
+    WHERE h.worker_id = s.worker_id AND h.product_id = s.product_id
+    RETURNING h.product_id, CASE WHEN h.state = 'confirmed' THEN h.quantity ELSE 0 END AS sold
+), returned AS (
+    SELECT product_id, sum(quantity) AS quantity FROM (
+        SELECT product_id, quantity FROM stale
+        UNION ALL
+        SELECT product_id, -sold FROM holds
+    ) AS movements
+    GROUP BY product_id
+)
+UPDATE products AS p
+SET stock = p.stock + r.quantity, updated_at = now()
+FROM returned AS r
+WHERE p.id = r.product_id AND r.quantity > 0
+"""
+
+
+class LocalStock:
+    """Quota di uno SKU presa in carico dal processo."""
+
+    __slots__ = ("available", "reserved_since_flush", "demand", "sold_out_until", "lock")
+
+    def __init__(self):
+        # Unità della lease non ancora prenotate
+        self.available = 0
+        self.reserved_since_flush = 0
+        # Media mobile delle unità prenotate per intervallo di flush
+        self.demand = 0.0
+        # Dopo una lease vuota non si interroga il database fino a questo istante (monotono)
+        self.sold_out_until = 0.0
+        self.lock = asyncio.Lock()
+
+
+class Reservation:
+    """Prenotazione temporanea di stock (hold) in attesa di conferma."""
+
+    def __init__(self, reservation_id: str, items: Dict[int, int], expires_at: datetime):
+        self.id = reservation_id
+        self.items = items
+        self.expires_at = expires_at
+
+
+class InventoryEngine:
+    """
+    Prenotazione dello stock sicura sotto alta concorrenza.
+
+    Il processo prende in carico ("lease") blocchi di unità di uno SKU con un
+    solo UPDATE sulla riga del prodotto e poi prenota da quella quota in
+    memoria: il controllo e il decremento avvengono senza await in mezzo, quindi
+    sono atomici nel loop asyncio e non si può vendere più di quanto preso in
+    carico. Ogni prenotazione scrive solo le proprie righe in `stock_holds`
+    (nessuna contesa), con scadenza: conferma e rilascio possono arrivare a
+    qualunque worker. Il flush periodico raccoglie in blocco prenotazioni
+    confermate, rilasciate e scadute, aggiorna le lease e restituisce a
+    catalogo le unità in eccesso rispetto alla domanda recente.
+
+    Il blocco di lease si adatta alla domanda (`min_lease`..`max_lease`), così
+    durante un picco la riga del prodotto viene toccata una volta ogni molte
+    vendite invece che a ogni checkout.
+    """
+
+    def __init__(
+        self,
+        connection: Optional[ConnectionFactory] = None,
+        worker_id: Optional[str] = None,
+        hold_ttl: float = 600.0,
+        min_lease: int = 5,
+        max_lease: int = 500,
+        flush_interval: float = 1.0,
+        stale_after: float = 300.0,
+        alpha: float = 0.3,
+    ):
+        """
+        Args:
+            connection: Factory delle connessioni (default: primario del db_router)
+            worker_id: Identificativo del processo nelle lease
+            hold_ttl: Durata di default delle prenotazioni (secondi)
+            min_lease: Unità minime prese in carico per volta
+            max_lease: Unità massime prese in carico per volta
+            flush_interval: Secondi tra due flush dei contatori
+            stale_after: Secondi senza heartbeat dopo cui la lease di un processo viene restituita
+            alpha: Peso dell'ultimo intervallo nella media della domanda
+        """
+        if connection is None:
+            from app.db.session import db_router
+            connection = db_router.connection
+        self._connection = connection
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.hold_ttl = hold_ttl
+        self.min_lease = min_lease
+        self.max_lease = max_lease
+        self.flush_interval = flush_interval
+        self.stale_after = stale_after
+        self.alpha = alpha
+
+        self._stock: Dict[int, LocalStock] = defaultdict(LocalStock)
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        self.stats = {"reserved": 0, "rejected": 0, "leases": 0, "flushes": 0}
+
+    def available(self, product_id: int) -> int:
+        """Unità prenotabili subito da questo processo (senza nuove lease)."""
+        return self._stock[product_id].available
+
+    def _lease_size(self, local: LocalStock, need: int) -> int:
+        # Abbastanza per la richiesta più circa due intervalli di domanda
+        # (durante un picco conta anche quanto prenotato dall'ultimo flush)
+        # max_lease limita l'anticipo, non la richiesta: un carrello più grande del blocco resta prenotabile
+        demand = max(local.demand, local.reserved_since_flush)
+        return max(self.min_lease, need, min(self.max_lease, need + int(2 * demand)))
+
+    async def _refill(self, product_id: int, need: int) -> int:
+        local = self._stock[product_id]
+        async with local.lock:
+            # Un'altra coroutine può aver già rifornito la quota mentre si attendeva il lock
+            if local.available >= need:
+                return need
+            if local.sold_out_until > time.monotonic():
+                return 0
+            want = self._lease_size(local, need - local.available)
+            async with self._connection() as conn:
+                cursor = await conn.execute(LEASE_STOCK, {
+                    "want": want, "product_id": product_id, "worker_id": self.worker_id,
+                })
+                row = await cursor.fetchone()
+            granted = row[0] if row else 0
+            local.available += granted
+            if not granted:
+                # Esaurito a catalogo: fino al prossimo flush si risponde senza toccare la riga del prodotto
+                local.sold_out_until = time.monotonic() + self.flush_interval
+            self.stats["leases"] += 1
+            return granted
+
+    async def _ensure(self, needed: Dict[int, int]) -> None:
+        """Prende in carico le unità mancanti alla quota locale (al massimo tre tentativi)."""
+        for _ in range(3):
+            short = [pid for pid, quantity in needed.items() if self._stock[pid].available < quantity]
+            if not short:
+                return
+            granted = 0
+            for product_id in short:
+                granted += await self._refill(product_id, needed[product_id])
+            if not granted:
+                return
+
+    async def reserve(self, items: Dict[int, int], ttl: Optional[float] = None) -> Reservation:
+        """
+        Prenota atomicamente le quantità richieste (tutto o niente).
+
+        Args:
+            items: Quantità per prodotto
+            ttl: Durata della prenotazione in secondi (default: hold_ttl)
+
+        Returns:
+            La prenotazione, da confermare o rilasciare entro la scadenza
+
+        Raises:
+            InsufficientStockError: Se almeno un prodotto non ha disponibilità sufficiente
+        """
+        items = {product_id: quantity for product_id, quantity in items.items() if quantity > 0}
+        await self._ensure(items)
+
+        # Controllo e decremento senza await in mezzo: atomici rispetto alle altre coroutine
+        short = [pid for pid, quantity in items.items() if self._stock[pid].available < quantity]
+        if short:
+            self.stats["rejected"] += 1
+            raise InsufficientStockError(short)
+        for product_id, quantity in items.items():
+            local = self._stock[product_id]
+            local.available -= quantity
+            local.reserved_since_flush += quantity
+
+        reservation = Reservation(
+            str(uuid.uuid4()), items,
+            datetime.now(timezone.utc) + timedelta(seconds=ttl or self.hold_ttl),
+        )
+        try:
+            async with self._connection() as conn:
+                await conn.execute(INSERT_HOLDS, (
+                    reservation.id, self.worker_id, reservation.expires_at, list(items), list(items.values()),
+                ))
+        except BaseException:
+            for product_id, quantity in items.items():
+                self._stock[product_id].available += quantity
+            raise
+        self.stats["reserved"] += 1
+        return reservation
+
+    async def reserve_many(
+        self,
+        batch: Sequence[Dict[int, int]],
+        ttl: Optional[float] = None,
+    ) -> List[Optional[Reservation]]:
+        """
+        Prenota un batch di carrelli, ognuno tutto o niente, nell'ordine dato.
+
+        Le lease vengono prese per il totale del batch e le prenotazioni
+        scritte con un solo INSERT, qualunque sia il numero di carrelli.
+
+        Args:
+            batch: Quantità per prodotto di ogni carrello
+            ttl: Durata delle prenotazioni in secondi (default: hold_ttl)
+
+        Returns:
+            Una prenotazione per carrello, None per quelli senza disponibilità sufficiente
+        """
+        batch = [{pid: quantity for pid, quantity in items.items() if quantity > 0} for items in batch]
+        totals: Dict[int, int] = defaultdict(int)
+        for items in batch:
+            for product_id, quantity in items.items():
+                totals[product_id] += quantity
+        await self._ensure(totals)
+
+        # Assegnazione senza await in mezzo, come in reserve
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl or self.hold_ttl)
+        reservations: List[Optional[Reservation]] = []
+        for items in batch:
+            if any(self._stock[pid].available < quantity for pid, quantity in items.items()):
+                self.stats["rejected"] += 1
+                reservations.append(None)
+                continue
+            for product_id, quantity in items.items():
+                local = self._stock[product_id]
+                local.available -= quantity
+                local.reserved_since_flush += quantity
+            reservations.append(Reservation(str(uuid.uuid4()), items, expires_at))
+
+        held = [reservation for reservation in reservations if reservation is not None]
+        columns: Tuple[list, list, list] = ([], [], [])
+        for reservation in held:
+            for product_id, quantity in reservation.items.items():
+                for column, value in zip(columns, (reservation.id, product_id, quantity)):
+                    column.append(value)
+        try:
+            if columns[0]:
+                async with self._connection() as conn:
+                    await conn.execute(INSERT_BATCH_HOLDS, (self.worker_id, expires_at, *columns))
+        except BaseException:
+            for reservation in held:
+                for product_id, quantity in reservation.items.items():
+                    self._stock[product_id].available += quantity
+            raise
+        self.stats["reserved"] += len(held)
+        return reservations
+
+    async def confirm(self, reservation_id: str, conn: Optional[AsyncConnection] = None) -> None:
+        """
+        Conferma una prenotazione (vendita).
+
+        Passando la connessione dell'ordine, conferma e creazione dell'ordine
+        avvengono nella stessa transazione.
+
+        Raises:
+            BusinessLogicError: Se la prenotazione non esiste, è scaduta o già chiusa
+        """
+        if conn is not None:
+            cursor = await conn.execute(CONFIRM_HOLD, (reservation_id,))
+        else:
+            async with self._connection() as own:
+                cursor = await own.execute(CONFIRM_HOLD, (reservation_id,))
+        if not cursor.rowcount:
+            raise BusinessLogicError("Prenotazione inesistente, scaduta o già chiusa")
+
+    async def release(self, reservation_id: str) -> bool:
+        """Annulla una prenotazione; le unità tornano disponibili al prossimo flush."""
+        async with self._connection() as conn:
+            cursor = await conn.execute(RELEASE_HOLD, (reservation_id,))
+        return bool(cursor.rowcount)
+
+    async def confirm_many(self, reservation_ids: Sequence[str], conn: AsyncConnection) -> Set[str]:
+        """
+        Conferma più prenotazioni nella transazione del chiamante.
+
+        Returns:
+            Gli id effettivamente confermati (esclusi quelli scaduti o già chiusi)
+        """
+        cursor = await conn.execute(CONFIRM_HOLDS, (list(reservation_ids),))
+        return {reservation_id for (reservation_id,) in await cursor.fetchall()}
+
+    async def lock_open(self, reservation_ids: Sequence[str], conn: AsyncConnection) -> Dict[str, Reservation]:
+        """
+        Blocca nella transazione del chiamante le prenotazioni non ancora chiuse né scadute.
+
+        Returns:
+            Le prenotazioni trovate, per id (quelle assenti sono inesistenti, scadute o già chiuse)
+        """
+        if not reservation_ids:
+            return {}
+        cursor = await conn.execute(LOCK_OPEN_HOLDS, (list(reservation_ids),))
+        found: Dict[str, Reservation] = {}
+        for reservation_id, product_id, quantity, expires_at in await cursor.fetchall():
+            found.setdefault(reservation_id, Reservation(reservation_id, {}, expires_at)).items[product_id] = quantity
+        return found
+
+    async def release_many(self, reservation_ids: Sequence[str], conn: Optional[AsyncConnection] = None) -> None:
+        """Annulla più prenotazioni, nella transazione del chiamante se passata."""
+        if not reservation_ids:
+            return
+        if conn is not None:
+            await conn.execute(RELEASE_HOLDS, (list(reservation_ids),))
+        else:
+            async with self._connection() as own:
+                await own.execute(RELEASE_HOLDS, (list(reservation_ids),))
+
+    async def flush(self) -> None:
+        """
+        Chiude in blocco le prenotazioni terminate e riallinea le lease.
+
+        In una transazione: elimina le prenotazioni confermate, rilasciate e
+        scadute del processo, scala il venduto dalle lease e restituisce a
+        catalogo le unità oltre il fabbisogno previsto.
+        """
+        async with self._flush_lock:
+            for local in self._stock.values():
+                local.demand = self.alpha * local.reserved_since_flush + (1 - self.alpha) * local.demand
+                local.reserved_since_flush = 0
+
+            surplus: Dict[int, int] = {}
+            taken: Dict[int, int] = {}
+            closed: Dict[int, Tuple[int, int]] = {}
+            try:
+                async with self._connection() as conn:
+                    cursor = await conn.execute(COLLECT_HOLDS, (self.worker_id,))
+                    closed = {pid: (int(sold), int(freed)) for pid, sold, freed in await cursor.fetchall()}
+
+                    # Eccedenza rispetto al fabbisogno, contando anche le unità appena liberate.
+                    # La parte già in quota locale esce subito, così non viene prenotata durante la scrittura
+                    for product_id in set(self._stock) | set(closed):
+                        local = self._stock[product_id]
+                        if local.lock.locked():
+                            continue
+                        keep = 0 if local.demand < 0.01 else self._lease_size(local, 0)
+                        extra = local.available + closed.get(product_id, (0, 0))[1] - keep
+                        if extra > 0:
+                            surplus[product_id] = extra
+                            taken[product_id] = min(extra, local.available)
+                            local.available -= taken[product_id]
+
+                    ids = sorted(set(closed) | set(surplus))
+                    if ids:
+                        await conn.execute(SETTLE_LEASES, (
+                            ids,
+                            [closed.get(pid, (0, 0))[0] for pid in ids],
+                            [surplus.get(pid, 0) for pid in ids],
+                            self.worker_id,
+                        ))
+                        await conn.execute(RETURN_STOCK, (ids, [surplus.get(pid, 0) for pid in ids]))
+                    await conn.execute(HEARTBEAT, (self.worker_id,))
+            except BaseException:
+                # Transazione annullata: le prenotazioni chiuse verranno raccolte al prossimo flush
+                for product_id, quantity in taken.items():
+                    self._stock[product_id].available += quantity
+                raise
+
+            # Le unità rilasciate o scadute (al netto di quelle restituite) tornano prenotabili
+            for product_id in set(closed) | set(surplus):
+                freed = closed.get(product_id, (0, 0))[1]
+                self._stock[product_id].available += freed - (surplus.get(product_id, 0) - taken.get(product_id, 0))
+                self._stock[product_id].sold_out_until = 0.0
+            idle = [
+                pid for pid, local in self._stock.items()
+                if not local.available and local.demand < 0.01 and not local.lock.locked()
+            ]
+            for product_id in idle:
+                del self._stock[product_id]
+            self.stats["flushes"] += 1
+
+    async def reclaim_stale_leases(self) -> None:
+        """Restituisce a catalogo le lease dei processi che non danno segni di vita."""
+        async with self._connection() as conn:
+            await conn.execute(RECLAIM_STALE_LEASES, (self.stale_after,))
+
+    async def run(self) -> None:
+        """Ciclo di flush periodico (con recupero delle lease orfane ogni minuto circa)."""
+        last_reclaim = 0.0
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if time.monotonic() - last_reclaim > 60:
+                    await self.reclaim_stale_leases()
+                    last_reclaim = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Flush dell'inventario fallito, nuovo tentativo al prossimo giro")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def close(self) -> None:
+        """Ferma il flush e restituisce a catalogo tutta la quota non prenotata."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for local in self._stock.values():
+            local.demand = 0.0
+            local.reserved_since_flush = 0
+        await self.flush()
+
+
+_engine: Optional[InventoryEngine] = None
+
+
+def get_inventory() -> InventoryEngine:
+    """Motore di inventario del processo."""
+    global _engine
+    if _engine is None:
+        _engine = InventoryEngine(
+            hold_ttl=settings.INVENTORY_HOLD_TTL,
+            min_lease=settings.INVENTORY_MIN_LEASE,
+            max_lease=settings.INVENTORY_MAX_LEASE,
+            flush_interval=settings.INVENTORY_FLUSH_INTERVAL,
+            stale_after=settings.INVENTORY_LEASE_STALE_AFTER,
+        )
+    return _engine
+
+
+async def close_inventory() -> None:
+    global _engine
+    if _engine is not None:
+        await _engine.close()
+        _engine = None
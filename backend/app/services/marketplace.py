@@ -0,0 +1,379 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import httpx
+from pydantic import ValidationError
+
+from app.core.config import settings
+from app.core.errors import ExternalServiceError
+from app.schemas.product import ProductImportRow
+
+logger = logging.getLogger(__name__)
+
+# Stati HTTP per cui ha senso ritentare la richiesta
+RETRY_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+class TokenBucket:
+    """
+    Rate limiter a token bucket.
+
+    Concede `rate` richieste al secondo in media, con raffiche fino a `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        """Attende finché un token è disponibile e lo consuma."""
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class HostLimits:
+    """Limiti applicati a un singolo host."""
+
+    def __init__(self, concurrency: int = 8, rate: float = 5.0, burst: Optional[float] = None):
+        """
+        Args:
+            concurrency: Richieste contemporanee massime verso l'host
+            rate: Richieste al secondo consentite in media
+            burst: Dimensione massima di una raffica (default: rate)
+        """
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+
+
+class _HostState:
+    def __init__(self, limits: HostLimits):
+        self.semaphore = asyncio.Semaphore(limits.concurrency)
+        self.bucket = TokenBucket(limits.rate, limits.burst)
+
+
+class _Validator:
+    """Validatori di una risposta salvati per le richieste condizionali."""
+
+    def __init__(self, etag: Optional[str], last_modified: Optional[str], content: bytes):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content = content
+
+
+class FetchResult:
+    """Risposta di un marketplace, eventualmente servita dalla cache condizionale."""
+
+    def __init__(self, url: str, status_code: int, content: bytes, from_cache: bool = False):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.from_cache = from_cache
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+
+class MarketplaceClient:
+    """
+    Motore di fetch asincrono condiviso dai servizi dei marketplace.
+
+    Un solo pool di connessioni httpx per tutti i servizi, con limiti di
+    concorrenza e token bucket per host, retry con backoff esponenziale e jitter
+    e richieste condizionali (ETag / Last-Modified) per non riscaricare
+    contenuti invariati.
+    """
+
+    def __init__(
+        self,
+        *,
+        default_limits: Optional[HostLimits] = None,
+        host_limits: Optional[Dict[str, HostLimits]] = None,
+        max_connections: int = 100,
+        timeout: float = 10.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        cache_size: int = 10_000,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        """
+        Inizializza il client.
+
+        Args:
+            default_limits: Limiti per gli host senza configurazione specifica
+            host_limits: Limiti per host (es. {"api.ebay.com": HostLimits(...)})
+            max_connections: Connessioni massime del pool condiviso
+            timeout: Timeout per richiesta in secondi
+            max_retries: Tentativi aggiuntivi dopo il primo
+            backoff_base: Base del backoff esponenziale in secondi
+            backoff_max: Attesa massima tra due tentativi
+            cache_size: Numero massimo di URL di cui ricordare ETag/Last-Modified
+            transport: Transport httpx alternativo (es. MockTransport nei test)
+        """
+        self.default_limits = default_limits or HostLimits()
+        self.host_limits = host_limits or {}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.cache_size = cache_size
+
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            timeout=timeout,
+            transport=transport,
+            follow_redirects=True,
+        )
+        self._hosts: Dict[str, _HostState] = {}
+        self._validators: "OrderedDict[str, _Validator]" = OrderedDict()
+
+    async def __aenter__(self) -> "MarketplaceClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    def _host_state(self, host: str) -> _HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            state = _HostState(self.host_limits.get(host, self.default_limits))
+            self._hosts[host] = state
+        return state
+
+    def _remember(self, url: str, response: httpx.Response) -> None:
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if not etag and not last_modified:
+            self._validators.pop(url, None)
+            return
+        self._validators[url] = _Validator(etag, last_modified, response.content)
+        self._validators.move_to_end(url)
+        while len(self._validators) > self.cache_size:
+            self._validators.popitem(last=False)
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        # Full jitter: attesa casuale in [0, base * 2^tentativo]
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                try:
+                    delay = max(delay, parsedate_to_datetime(retry_after).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+        return min(delay, self.backoff_max)
+
+    async def get(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> FetchResult:
+        """Esegue una GET condizionale rispettando i limiti dell'host."""
+        return await self.request(MarketplaceRequest("GET", url, params=params, headers=headers))
+
+    async def request(self, spec: "MarketplaceRequest") -> FetchResult:
+        """
+        Esegue una richiesta rispettando i limiti dell'host.
+
+        Solo le GET usano ETag / Last-Modified: le altre richieste non sono
+        cacheabili.
+
+        Raises:
+            ExternalServiceError: se la richiesta fallisce dopo tutti i tentativi
+        """
+        request = self._client.build_request(
+            spec.method, spec.url, params=spec.params, headers=spec.headers, content=spec.body,
+        )
+        cache_key = str(request.url)
+        host = request.url.host
+        state = self._host_state(host)
+        conditional = spec.method == "GET"
+
+        validator = self._validators.get(cache_key) if conditional else None
+        if validator is not None:
+            if validator.etag:
+                request.headers["If-None-Match"] = validator.etag
+            if validator.last_modified:
+                request.headers["If-Modified-Since"] = validator.last_modified
+
+        last_error: Optional[str] = None
+        for attempt in range(self.max_retries + 1):
+            response: Optional[httpx.Response] = None
+            try:
+                async with state.semaphore:
+                    await state.bucket.acquire()
+                    response = await self._client.send(request)
+            except httpx.TransportError as e:
+                last_error = f"{type(e).__name__}: {e}"
+            else:
+                if response.status_code == 304 and validator is not None:
+                    self._validators.move_to_end(cache_key)
+                    return FetchResult(cache_key, 200, validator.content, from_cache=True)
+                if response.status_code not in RETRY_STATUSES:
+                    if conditional and response.is_success:
+                        self._remember(cache_key, response)
+                    return FetchResult(cache_key, response.status_code, response.content)
+                last_error = f"HTTP {response.status_code}"
+
+            if attempt < self.max_retries:
+                delay = self._backoff(attempt, response)
+                logger.debug("Retry %d per %s tra %.2fs (%s)", attempt + 1, cache_key, delay, last_error)
+                await asyncio.sleep(delay)
+
+        raise ExternalServiceError(
+            host,
+            detail=f"Richiesta a {host} fallita dopo {self.max_retries + 1} tentativi: {last_error}",
+        )
+
+
+class MarketplaceRequest:
+    """Descrizione di una richiesta verso un marketplace."""
+
+    def __init__(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        body: Optional[bytes] = None,
+    ):
+        self.method = method
+        self.url = url
+        self.params = params
+        self.headers = headers or {}
+        self.body = body
+
+
+def to_price(value: Any) -> Optional[Decimal]:
+    """Converte un prezzo del marketplace in Decimal a 2 decimali."""
+    if value is None:
+        return None
+    try:
+        return Decimal(str(value)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        return None
+
+
+def truncate(text: Optional[str], length: int) -> Optional[str]:
+    """Tronca un testo alla lunghezza massima ammessa dallo schema."""
+    if text is None:
+        return None
+    text = " ".join(text.split())
+    return text[:length] if text else None
+
+
+class MarketplaceService(ABC):
+    """
+    Base per i servizi dei marketplace.
+
+    Ogni marketplace definisce come costruire la richiesta di ricerca, dove si
+    trovano gli articoli nella risposta e come normalizzarli in `ProductCreate`
+    (come `ProductImportRow`, con lo SKU "<marketplace>:<id articolo>").
+    """
+
+    name: str = "marketplace"
+
+    def __init__(self, client: MarketplaceClient, base_url: str):
+        self.client = client
+        self.base_url = base_url.rstrip("/")
+
+    @abstractmethod
+    def search_request(self, query: str, limit: int) -> MarketplaceRequest:
+        """Costruisce la richiesta di ricerca."""
+
+    @abstractmethod
+    def parse_items(self, payload: Any) -> Iterable[Dict[str, Any]]:
+        """Estrae gli articoli grezzi dalla risposta."""
+
+    @abstractmethod
+    def normalize(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Mappa un articolo grezzo sui campi di `ProductImportRow`."""
+
+    @abstractmethod
+    def item_url(self, item_id: str) -> str:
+        """URL pubblico della pagina prodotto, usato dal monitoraggio prezzi."""
+
+    def to_products(self, payload: Any) -> List[ProductImportRow]:
+        """Normalizza una risposta, scartando gli articoli non validi."""
+        products: List[ProductImportRow] = []
+        for item in self.parse_items(payload):
+            try:
+                products.append(ProductImportRow(**self.normalize(item)))
+            except (ValidationError, KeyError, TypeError) as e:
+                logger.debug("%s: articolo scartato: %s", self.name, e)
+        return products
+
+    async def search(self, query: str, limit: int = 50) -> List[ProductImportRow]:
+        """Cerca nel catalogo del marketplace."""
+        result = await self.client.request(self.search_request(query, limit))
+        if result.status_code != 200:
+            raise ExternalServiceError(self.name, detail=f"{self.name}: HTTP {result.status_code}")
+        return self.to_products(result.json())
+
+    async def search_many(self, queries: List[str], limit: int = 50) -> Dict[str, List[ProductImportRow]]:
+        """Esegue più ricerche in parallelo; i limiti per host restano rispettati."""
+        results = await asyncio.gather(*(self.search(q, limit) for q in queries))
+        return dict(zip(queries, results))
+
+
+_client: Optional[MarketplaceClient] = None
+
+
+def get_marketplace_client() -> MarketplaceClient:
+    """Client condiviso, creato al primo utilizzo con le impostazioni correnti."""
+    global _client
+    if _client is None:
+        _client = MarketplaceClient(
+            default_limits=HostLimits(
+                concurrency=settings.MARKETPLACE_HOST_CONCURRENCY,
+                rate=settings.MARKETPLACE_HOST_RATE,
+            ),
+            host_limits={
+                host: HostLimits(
+                    concurrency=limits.concurrency or settings.MARKETPLACE_HOST_CONCURRENCY,
+                    rate=limits.rate or settings.MARKETPLACE_HOST_RATE,
+                    burst=limits.burst,
+                )
+                for host, limits in settings.MARKETPLACE_HOST_LIMITS.items()
+            },
+            max_connections=settings.MARKETPLACE_MAX_CONNECTIONS,
+            timeout=settings.MARKETPLACE_TIMEOUT,
+            max_retries=settings.MARKETPLACE_MAX_RETRIES,
+        )
+    return _client
+
+
+async def close_marketplace_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,203 @@
+import asyncio
+import itertools
+import json
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set
+
+from psycopg import AsyncConnection
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "order_events"
+
+# Limite di PostgreSQL per il payload di NOTIFY (8000 byte), con margine
+MAX_NOTIFY_PAYLOAD = 7900
+
+# Evento inviato ai client che hanno perso eventi: devono ricaricare lo stato completo
+RESYNC = "event: resync\ndata: {}\n\n"
+
+
+async def publish_order_events(conn: AsyncConnection, events: Iterable[Dict[str, Any]]) -> None:
+    """
+    Pubblica eventi di cambio stato degli ordini.
+
+    NOTIFY è transazionale: gli eventi arrivano ai worker solo se la
+    transazione del chiamante viene confermata.
+
+    Args:
+        conn: Connessione della transazione che modifica gli ordini
+        events: Dizionari con order_id, user_id, status e previous_status
+    """
+    at = datetime.now(timezone.utc).isoformat()
+    payloads: List[str] = []
+    batch: List[str] = []
+    size = 2
+    for event in events:
+        encoded = json.dumps({**event, "at": at}, separators=(",", ":"))
+        if batch and size + len(encoded) + 1 > MAX_NOTIFY_PAYLOAD:
+            payloads.append(f"[{','.join(batch)}]")
+            batch, size = [], 2
+        batch.append(encoded)
+        size += len(encoded) + 1
+    if batch:
+        payloads.append(f"[{','.join(batch)}]")
+    if payloads:
+        await conn.execute("SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload", (CHANNEL, payloads))
+
+
+class Subscription:
+    """Coda limitata di un client connesso: se il client non legge, gli eventi più vecchi vengono scartati."""
+
+    __slots__ = ("user_id", "_buffer", "_ready", "dropped")
+
+    def __init__(self, user_id: Optional[int], buffer_size: int):
+        self.user_id = user_id
+        self._buffer: Deque[str] = deque(maxlen=buffer_size)
+        self._ready = asyncio.Event()
+        self.dropped = False
+
+    def push(self, message: str) -> None:
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped = True
+        self._buffer.append(message)
+        self._ready.set()
+
+    async def next_chunk(self, timeout: float) -> Optional[str]:
+        """
+        Attende nuovi messaggi.
+
+        Returns:
+            I messaggi in attesa concatenati, o None allo scadere del timeout
+        """
+        if not self._buffer:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        messages = list(self._buffer)
+        self._buffer.clear()
+        if self.dropped:
+            # Il client ha perso eventi: gli si chiede di ricaricare, poi riparte dai nuovi
+            self.dropped = False
+            messages.insert(0, RESYNC)
+        return "".join(messages)
+
+
+class OrderEventBroadcaster:
+    """
+    Distribuisce gli eventi degli ordini ai client connessi del worker.
+
+    Un solo broadcaster per processo ascolta il canale con una connessione
+    dedicata (LISTEN) e smista ogni evento ai soli client dell'utente
+    interessato (più quelli senza filtro, es. backoffice). Ogni evento viene
+    serializzato una volta sola e la stessa stringa viene accodata a tutti i
+    client; le code sono limitate, quindi un client lento costa al massimo
+    `buffer_size` messaggi e riceve un evento `resync`.
+    """
+
+    def __init__(self, dsn: Optional[str] = None, buffer_size: int = 100, reconnect_delay: float = 1.0):
+        """
+        Args:
+            dsn: Database da ascoltare (None: solo eventi pubblicati con dispatch)
+            buffer_size: Messaggi massimi in coda per client
+            reconnect_delay: Attesa prima di ricollegarsi dopo un errore
+        """
+        self.dsn = dsn
+        self.buffer_size = buffer_size
+        self.reconnect_delay = reconnect_delay
+        self._subscriptions: Dict[Optional[int], Set[Subscription]] = {}
+        self._ids = itertools.count(1)
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"events": 0, "deliveries": 0}
+
+    def __len__(self) -> int:
+        return sum(len(subs) for subs in self._subscriptions.values())
+
+    def subscribe(self, user_id: Optional[int] = None) -> Subscription:
+        """Registra un client; user_id None riceve gli eventi di tutti gli utenti."""
+        subscription = Subscription(user_id, self.buffer_size)
+        self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subs = self._subscriptions.get(subscription.user_id)
+        if subs is not None:
+            subs.discard(subscription)
+            if not subs:
+                del self._subscriptions[subscription.user_id]
+
+    def dispatch(self, events: Iterable[Dict[str, Any]]) -> None:
+        """Smista gli eventi ai client interessati."""
+        everyone = self._subscriptions.get(None, ())
+        for event in events:
+            message = (
+                f"id: {next(self._ids)}\nevent: order_status\n"
+                f"data: {json.dumps(event, separators=(',', ':'))}\n\n"
+            )
+            self.stats["events"] += 1
+            for subs in (self._subscriptions.get(event.get("user_id"), ()), everyone):
+                for subscription in subs:
+                    subscription.push(message)
+                    self.stats["deliveries"] += 1
+
+    def _resync_all(self) -> None:
+        for subs in self._subscriptions.values():
+            for subscription in subs:
+                subscription.dropped = True
+                subscription._ready.set()
+
+    async def _listen(self) -> None:
+        connected_before = False
+        while True:
+            try:
+                async with await AsyncConnection.connect(self.dsn, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {CHANNEL}")
+                    if connected_before:
+                        # Gli eventi pubblicati durante la disconnessione sono persi
+                        self._resync_all()
+                    connected_before = True
+                    async for notify in conn.notifies():
+                        try:
+                            self.dispatch(json.loads(notify.payload))
+                        except ValueError:
+                            logger.warning("Payload non valido sul canale %s", CHANNEL)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Ascolto degli eventi ordine interrotto: %s", e)
+            await asyncio.sleep(self.reconnect_delay)
+
+    def start(self) -> None:
+        if self.dsn and self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+_broadcaster: Optional[OrderEventBroadcaster] = None
+
+
+def get_order_broadcaster() -> OrderEventBroadcaster:
+    """Broadcaster del processo (uno per worker)."""
+    global _broadcaster
+    if _broadcaster is None:
+        _broadcaster = OrderEventBroadcaster(
+            str(settings.DATABASE_URI), buffer_size=settings.ORDER_EVENTS_BUFFER_SIZE,
+        )
+    return _broadcaster
+
+
+async def close_order_broadcaster() -> None:
+    global _broadcaster
+    if _broadcaster is not None:
+        await _broadcaster.close()
+        _broadcaster = None
@@ -0,0 +1,266 @@
+import logging
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fastapi import status as http_status
+from psycopg import AsyncConnection
+
+from app.core.errors import BusinessLogicError
+from app.schemas.order import (
+    CreatedOrder, MarketplaceOrderCreate, OrderBatchReport, OrderStatus, RejectedOrder,
+)
+from app.services.analytics import apply_status_changes
+from app.services.inventory import InventoryEngine, Reservation, get_inventory
+from app.services.order_events import publish_order_events
+
+logger = logging.getLogger(__name__)
+
+# Blocca gli ordini (dell'utente, se indicato) in ordine di id (niente deadlock tra
+# aggiornamenti concorrenti) e restituisce per ciascuno lo stato precedente e se è cambiato
+UPDATE_STATUS = """
+WITH old AS (
+    SELECT id, status, user_id FROM orders
+    WHERE id = ANY(%(ids)s) AND (%(user_id)s::bigint IS NULL OR user_id = %(user_id)s)
+    ORDER BY id FOR UPDATE
+), changed AS (
+    UPDATE orders AS o
+    SET status = %(status)s, updated_at = now()
+    FROM old
+    WHERE o.id = old.id AND old.status <> %(status)s
+    RETURNING o.id
+)
+SELECT old.id, old.status, old.user_id, changed.id IS NOT NULL
+FROM old LEFT JOIN changed ON changed.id = old.id
+"""
+
+# Tutti i prodotti del batch in una query. FOR KEY SHARE impedisce la cancellazione
+# fino al commit senza bloccare gli UPDATE dello stock fatti dalle lease dell'inventario
+LOAD_PRODUCTS = """
+SELECT id, supplier_cost FROM products
+WHERE id = ANY(%s)
+FOR KEY SHARE
+"""
+
+# Un ordine importato in parallelo da un'altra richiesta non fa fallire il batch:
+# viene saltato e riportato tra i duplicati
+INSERT_ORDERS = """
+INSERT INTO orders (id, user_id, status, shipping_address, notes, total_amount, external_ref)
+SELECT * FROM unnest(
+    %s::bigint[], %s::bigint[], %s::text[], %s::text[], %s::text[], %s::numeric[], %s::text[]
+)
+ON CONFLICT (external_ref) DO NOTHING
+RETURNING id
+"""
+
+INSERT_ITEMS = """
+INSERT INTO order_items (order_id, product_id, quantity, unit_price, unit_cost)
+SELECT * FROM unnest(%s::bigint[], %s::bigint[], %s::integer[], %s::numeric[], %s::numeric[])
+"""
+
+
+async def update_order_status(
+    conn: AsyncConnection,
+    order_ids: List[int],
+    status: OrderStatus,
+    user_id: Optional[int] = None,
+) -> Tuple[List[int], List[int]]:
+    """
+    Cambia lo stato di uno o più ordini e aggiorna i rollup analitici.
+
+    Args:
+        conn: Connessione al database (ordini e rollup nella stessa transazione)
+        order_ids: Ordini da aggiornare
+        status: Nuovo stato
+        user_id: Aggiorna solo gli ordini di questo utente (None: di tutti)
+
+    Returns:
+        Gli id degli ordini il cui stato è effettivamente cambiato e quelli
+        inesistenti (o di altri utenti)
+    """
+    status = OrderStatus(status)
+    cursor = await conn.execute(UPDATE_STATUS, {"status": status.value, "ids": order_ids, "user_id": user_id})
+    rows = await cursor.fetchall()
+    found = {order_id for order_id, _, _, _ in rows}
+    changed = [(order_id, old, owner) for order_id, old, owner, updated in rows if updated]
+    await apply_status_changes(conn, [(order_id, old, status.value) for order_id, old, _ in changed])
+    await publish_order_events(conn, [
+        {"order_id": order_id, "user_id": user_id, "status": status.value, "previous_status": old}
+        for order_id, old, user_id in changed
+    ])
+    not_found = [order_id for order_id in dict.fromkeys(order_ids) if order_id not in found]
+    return [order_id for order_id, _, _ in changed], not_found
+
+
+async def create_orders(
+    conn: AsyncConnection,
+    orders: Sequence[MarketplaceOrderCreate],
+    status: OrderStatus = OrderStatus.PROCESSING,
+    inventory: Optional[InventoryEngine] = None,
+) -> OrderBatchReport:
+    """
+    Crea un batch di ordini con un numero fisso di query, qualunque sia la dimensione.
+
+    I prodotti referenziati vengono letti con una sola query, subtotali e
+    totali si calcolano in un unico passaggio e ordini e righe vengono inseriti
+    con insert multi-riga. Lo stock passa dal motore di inventario, come per il
+    checkout: ogni ordine prenota le sue quantità (tutto o niente) e la
+    prenotazione viene confermata nella stessa transazione dell'ordine, così
+    `products.stock` resta la quota non assegnata e le lease restano coerenti.
+    Un ordine con `reservation_id` (nato da un checkout) conferma invece la
+    prenotazione esistente, che deve essere aperta e avere le stesse quantità.
+    Gli ordini con prodotti inesistenti o stock insufficiente vengono scartati
+    singolarmente, nell'ordine di arrivo; quelli con un `external_ref` già
+    importato (anche da una richiesta concorrente) vengono ignorati.
+
+    Args:
+        conn: Connessione al database (ordini e conferme nella stessa transazione)
+        orders: Ordini da creare
+        status: Stato iniziale degli ordini
+        inventory: Motore di inventario (default: quello del processo)
+
+    Returns:
+        Il report con ordini creati, duplicati e scartati
+    """
+    status = OrderStatus(status)
+    inventory = inventory or get_inventory()
+    report = OrderBatchReport()
+
+    refs = [order.external_ref for order in orders]
+    cursor = await conn.execute("SELECT external_ref FROM orders WHERE external_ref = ANY(%s)", (refs,))
+    existing = {ref for (ref,) in await cursor.fetchall()}
+
+    product_ids = sorted({item.product_id for order in orders for item in order.items})
+    cursor = await conn.execute(LOAD_PRODUCTS, (product_ids,))
+    unit_cost: Dict[int, Decimal] = dict(await cursor.fetchall())
+
+    candidates: List[Tuple[int, MarketplaceOrderCreate, Decimal, Dict[int, int]]] = []
+    seen = set()
+    for index, order in enumerate(orders):
+        if order.external_ref in existing or order.external_ref in seen:
+            report.duplicates.append(order.external_ref)
+            continue
+        seen.add(order.external_ref)
+
+        wanted: Dict[int, int] = defaultdict(int)
+        total = Decimal(0)
+        for item in order.items:
+            wanted[item.product_id] += item.quantity
+            total += item.unit_price * item.quantity
+
+        missing = [product_id for product_id in wanted if product_id not in unit_cost]
+        if missing:
+            report.rejected.append(RejectedOrder(
+                index=index, external_ref=order.external_ref, reason=f"Prodotti inesistenti: {missing}",
+            ))
+            continue
+        candidates.append((index, order, total, wanted))
+
+    # Gli ordini nati da un checkout confermano la prenotazione già fatta invece di prenotare di nuovo
+    prebooked = await inventory.lock_open(
+        [str(order.reservation_id) for _, order, _, _ in candidates if order.reservation_id], conn,
+    )
+    fresh = iter(await inventory.reserve_many([
+        wanted for _, order, _, wanted in candidates if not order.reservation_id
+    ]))
+    accepted: List[Tuple[int, MarketplaceOrderCreate, Decimal, Reservation]] = []
+    own: List[str] = []
+    for index, order, total, wanted in candidates:
+        if order.reservation_id:
+            reservation = prebooked.pop(str(order.reservation_id), None)
+            if reservation is None or reservation.items != wanted:
+                reason = (
+                    "Prenotazione inesistente, scaduta o già usata" if reservation is None
+                    else "La prenotazione non corrisponde alle righe dell'ordine"
+                )
+                report.rejected.append(RejectedOrder(index=index, external_ref=order.external_ref, reason=reason))
+                continue
+        else:
+            reservation = next(fresh)
+            if reservation is None:
+                short = [pid for pid, quantity in wanted.items() if inventory.available(pid) < quantity]
+                report.rejected.append(RejectedOrder(
+                    index=index, external_ref=order.external_ref,
+                    reason=f"Stock insufficiente: {short or list(wanted)}",
+                ))
+                continue
+            own.append(reservation.id)
+        accepted.append((index, order, total, reservation))
+
+    if not accepted:
+        await inventory.release_many(own)
+        return report
+
+    try:
+        report.created = await _insert_orders(conn, accepted, status, unit_cost, inventory, report)
+    except BaseException:
+        # La transazione dell'ordine verrà annullata: le prenotazioni fatte qui si chiudono
+        # senza attendere la scadenza, quelle del checkout restano valide per un nuovo tentativo
+        await inventory.release_many(own)
+        raise
+    return report
+
+
+async def _insert_orders(
+    conn: AsyncConnection,
+    accepted: List[Tuple[int, MarketplaceOrderCreate, Decimal, Reservation]],
+    status: OrderStatus,
+    unit_cost: Dict[int, Decimal],
+    inventory: InventoryEngine,
+    report: OrderBatchReport,
+) -> List[CreatedOrder]:
+    """Inserisce ordini e righe e conferma le prenotazioni; i duplicati concorrenti finiscono nel report."""
+    cursor = await conn.execute(
+        "SELECT nextval(pg_get_serial_sequence('orders', 'id')) FROM generate_series(1, %s)", (len(accepted),),
+    )
+    order_ids = [order_id for (order_id,) in await cursor.fetchall()]
+
+    cursor = await conn.execute(INSERT_ORDERS, (
+        order_ids,
+        [order.user_id for _, order, _, _ in accepted],
+        [status.value] * len(accepted),
+        [order.shipping_address for _, order, _, _ in accepted],
+        [order.notes for _, order, _, _ in accepted],
+        [total for _, _, total, _ in accepted],
+        [order.external_ref for _, order, _, _ in accepted],
+    ))
+    inserted = {order_id for (order_id,) in await cursor.fetchall()}
+
+    created: List[Tuple[int, Tuple[int, MarketplaceOrderCreate, Decimal, Reservation]]] = []
+    conflicting: List[str] = []
+    for order_id, entry in zip(order_ids, accepted):
+        if order_id in inserted:
+            created.append((order_id, entry))
+        else:
+            report.duplicates.append(entry[1].external_ref)
+            conflicting.append(entry[3].id)
+    await inventory.release_many(conflicting, conn)
+    if not created:
+        return []
+
+    item_columns: Tuple[list, list, list, list, list] = ([], [], [], [], [])
+    for order_id, (_, order, _, _) in created:
+        for item in order.items:
+            for column, value in zip(item_columns, (
+                order_id, item.product_id, item.quantity, item.unit_price, unit_cost[item.product_id],
+            )):
+                column.append(value)
+    await conn.execute(INSERT_ITEMS, item_columns)
+
+    holds = [reservation.id for _, (_, _, _, reservation) in created]
+    if len(await inventory.confirm_many(holds, conn)) != len(holds):
+        # Solo se una prenotazione appena fatta è già scaduta: meglio annullare che vendere senza stock
+        raise BusinessLogicError(
+            "Prenotazione dello stock scaduta durante l'import, riprovare",
+            status_code=http_status.HTTP_409_CONFLICT,
+        )
+
+    await apply_status_changes(conn, [(order_id, None, status.value) for order_id, _ in created])
+    await publish_order_events(conn, [
+        {"order_id": order_id, "user_id": order.user_id, "status": status.value, "previous_status": None}
+        for order_id, (_, order, _, _) in created
+    ])
+    return [
+        CreatedOrder(index=index, order_id=order_id, external_ref=order.external_ref, total_amount=total)
+        for order_id, (index, order, total, _) in created
+    ]
@@ -0,0 +1,449 @@
+import asyncio
+import heapq
+import logging
+import math
+import random
+import time
+from collections import defaultdict, deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from psycopg import AsyncConnection
+
+from app.core.config import settings
+from app.services.amazon_service import AmazonService
+from app.services.ebay_service import EbayService
+from app.services.entitlements import EntitlementCache, get_entitlements
+from app.services.marketplace import MarketplaceService
+from app.services.tiered_fetcher import Offer, get_tiered_fetcher
+
+logger = logging.getLogger(__name__)
+
+
+class TrackedProduct:
+    """Stato di monitoraggio di uno SKU, compatto per reggere centinaia di migliaia di voci."""
+
+    __slots__ = (
+        "sku", "source", "url", "change_rate", "sales_per_day", "min_interval",
+        "price_cents", "in_stock", "failures", "next_check", "version",
+    )
+
+    def __init__(self, sku: str, source: str, url: str, sales_per_day: float = 0.0, min_interval: float = 0.0):
+        self.sku = sku
+        self.source = source
+        self.url = url
+        # Intervallo minimo del piano del proprietario (monitor_interval)
+        self.min_interval = min_interval
+        # Frequenza recente delle variazioni (media mobile in [0, 1])
+        self.change_rate = 0.5
+        self.sales_per_day = sales_per_day
+        self.price_cents = -1
+        self.in_stock: Optional[bool] = None
+        self.failures = 0
+        self.next_check = 0.0
+        self.version = 0
+
+
+Checker = Callable[[TrackedProduct], Awaitable[Optional[Offer]]]
+ChangeHandler = Callable[[TrackedProduct, Offer], Awaitable[None]]
+
+
+async def fetch_offer(product: TrackedProduct) -> Optional[Offer]:
+    """Checker di default: legge la pagina prodotto con il fetcher a livelli."""
+    outcome = await get_tiered_fetcher().fetch(product.url)
+    return outcome.offer
+
+
+class PriceMonitor:
+    """
+    Scheduler del monitoraggio prezzi e disponibilità.
+
+    Gli SKU stanno in un heap ordinato per orario del prossimo controllo. Ogni
+    controllo ricalcola l'intervallo: si accorcia per i prodotti che cambiano
+    spesso prezzo o disponibilità e per quelli che vendono di più, si allunga
+    per quelli stabili. Gli orari hanno un jitter per evitare picchi
+    sincronizzati e i controlli in corso sono limitati sia globalmente sia per
+    sorgente (marketplace). La memoria è O(SKU monitorati): nessuno storico per
+    prodotto, solo medie mobili.
+    """
+
+    def __init__(
+        self,
+        checker: Checker = fetch_offer,
+        on_change: Optional[ChangeHandler] = None,
+        on_check: Optional[ChangeHandler] = None,
+        min_interval: float = 300.0,
+        max_interval: float = 86400.0,
+        concurrency: int = 200,
+        source_concurrency: Optional[Dict[str, int]] = None,
+        default_source_concurrency: int = 20,
+        jitter: float = 0.1,
+        check_timeout: float = 60.0,
+        alpha: float = 0.3,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            checker: Coroutine che legge l'offerta corrente di un prodotto
+            on_change: Coroutine chiamata quando prezzo o disponibilità cambiano
+            on_check: Coroutine chiamata a ogni controllo riuscito (es. storico prezzi)
+            min_interval: Intervallo minimo tra due controlli (secondi)
+            max_interval: Intervallo massimo tra due controlli (secondi)
+            concurrency: Controlli contemporanei in totale
+            source_concurrency: Controlli contemporanei per sorgente
+            default_source_concurrency: Limite per le sorgenti non configurate
+            jitter: Variazione casuale relativa degli intervalli (0.1 = ±10%)
+            check_timeout: Durata massima di un controllo
+            alpha: Peso dell'ultimo esito nella frequenza delle variazioni
+            clock: Orologio monotono (sostituibile nei test)
+        """
+        self._checker = checker
+        self._on_change = on_change
+        self._on_check = on_check
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.concurrency = concurrency
+        self.source_concurrency = source_concurrency or {}
+        self.default_source_concurrency = default_source_concurrency
+        self.jitter = jitter
+        self.check_timeout = check_timeout
+        self.alpha = alpha
+        self._clock = clock
+
+        self._products: Dict[str, TrackedProduct] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._version = 0
+        self._in_flight: Dict[str, int] = defaultdict(int)
+        self._deferred: Dict[str, Deque[TrackedProduct]] = defaultdict(deque)
+        self._tasks: Set[asyncio.Task] = set()
+        self._slots = asyncio.Semaphore(concurrency)
+        self._wake = asyncio.Event()
+        self._running = False
+        self._task: Optional[asyncio.Task] = None
+
+        self.stats = {"checks": 0, "changes": 0, "failures": 0}
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+    def skus(self) -> List[str]:
+        """SKU monitorati."""
+        return list(self._products)
+
+    def _source_limit(self, source: str) -> int:
+        return self.source_concurrency.get(source, self.default_source_concurrency)
+
+    def _schedule(self, product: TrackedProduct, delay: float) -> None:
+        self._version += 1
+        product.version = self._version
+        product.next_check = self._clock() + delay
+        entry = (product.next_check, product.version, product.sku)
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wake.set()
+
+        # Le voci superate restano nell'heap fino all'estrazione: compattazione periodica
+        # (version 0 = prodotto non in coda, perché in controllo o in attesa della sorgente)
+        if len(self._heap) > 2 * len(self._products) + 1024:
+            self._heap = [
+                (p.next_check, p.version, p.sku) for p in self._products.values() if p.version
+            ]
+            heapq.heapify(self._heap)
+
+    def next_interval(self, product: TrackedProduct) -> float:
+        """Intervallo fino al prossimo controllo, senza jitter."""
+        # Da max_interval (prodotto stabile) a min_interval (cambia a ogni controllo)
+        interval = self.max_interval + (self.min_interval - self.max_interval) * product.change_rate
+        # I prodotti che vendono di più vengono controllati più spesso
+        interval /= 1 + math.log1p(product.sales_per_day)
+        # Dopo errori consecutivi si rallenta con backoff esponenziale
+        if product.failures:
+            interval *= 2 ** min(product.failures, 6)
+        # Il piano del proprietario può imporre controlli più radi anche di max_interval
+        floor = max(self.min_interval, product.min_interval)
+        return min(max(interval, floor), max(self.max_interval, floor))
+
+    def _jittered(self, interval: float) -> float:
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def track(
+        self,
+        sku: str,
+        source: str,
+        url: str,
+        sales_per_day: float = 0.0,
+        price_cents: int = -1,
+        min_interval: float = 0.0,
+    ) -> TrackedProduct:
+        """
+        Aggiunge (o aggiorna) uno SKU da monitorare.
+
+        Il primo controllo cade in un punto casuale del primo intervallo, così un
+        caricamento massivo non produce un'ondata di richieste simultanee.
+        `min_interval` è l'intervallo minimo del piano del proprietario e vale
+        dal prossimo controllo.
+        """
+        product = self._products.get(sku)
+        if product is not None:
+            product.url = url
+            product.sales_per_day = sales_per_day
+            product.min_interval = min_interval
+            return product
+
+        product = TrackedProduct(sku, source, url, sales_per_day, min_interval)
+        product.price_cents = price_cents
+        self._products[sku] = product
+        self._schedule(product, random.uniform(0, self.next_interval(product)))
+        return product
+
+    def untrack(self, sku: str) -> None:
+        """Rimuove uno SKU; le sue voci nell'heap vengono scartate all'estrazione."""
+        product = self._products.pop(sku, None)
+        if product is not None:
+            product.version = 0
+
+    def record_sales(self, sku: str, sales_per_day: float) -> None:
+        """Aggiorna la velocità di vendita di uno SKU (influisce dal prossimo controllo)."""
+        product = self._products.get(sku)
+        if product is not None:
+            product.sales_per_day = sales_per_day
+
+    async def _wait(self, timeout: Optional[float]) -> None:
+        self._wake.clear()
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self) -> None:
+        """Ciclo principale: estrae gli SKU scaduti e avvia i controlli nei limiti di concorrenza."""
+        self._running = True
+        while self._running:
+            if not self._heap:
+                await self._wait(None)
+                continue
+
+            due, version, sku = self._heap[0]
+            delay = due - self._clock()
+            if delay > 0:
+                await self._wait(delay)
+                continue
+
+            await self._slots.acquire()
+            heapq.heappop(self._heap)
+            product = self._products.get(sku)
+            if product is None or product.version != version:
+                self._slots.release()
+                continue
+            # Fuori dall'heap finché il controllo non lo riprogramma
+            product.version = 0
+
+            if self._in_flight[product.source] >= self._source_limit(product.source):
+                # Sorgente satura: il prodotto aspetta che si liberi un controllo della stessa sorgente
+                self._slots.release()
+                self._deferred[product.source].append(product)
+                continue
+
+            self._in_flight[product.source] += 1
+            task = asyncio.create_task(self._check(product))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def start(self) -> None:
+        """Avvia lo scheduler in un task in background."""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Ferma lo scheduler e annulla i controlli in corso."""
+        self._running = False
+        self._wake.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _check(self, product: TrackedProduct) -> None:
+        try:
+            offer = await asyncio.wait_for(self._checker(product), self.check_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug("Controllo di %s fallito: %s", product.sku, e)
+            offer = None
+
+        try:
+            self.stats["checks"] += 1
+            if offer is None:
+                product.failures += 1
+                self.stats["failures"] += 1
+            else:
+                product.failures = 0
+                price_cents = int(offer.price * 100)
+                changed = product.price_cents >= 0 and (
+                    price_cents != product.price_cents or offer.in_stock != product.in_stock
+                )
+                product.change_rate = self.alpha * changed + (1 - self.alpha) * product.change_rate
+                product.price_cents = price_cents
+                product.in_stock = offer.in_stock
+                if self._on_check is not None:
+                    try:
+                        await self._on_check(product, offer)
+                    except Exception:
+                        logger.exception("Registrazione del controllo di %s fallita", product.sku)
+                if changed:
+                    self.stats["changes"] += 1
+                    if self._on_change is not None:
+                        try:
+                            await self._on_change(product, offer)
+                        except Exception:
+                            logger.exception("Gestione della variazione di %s fallita", product.sku)
+        finally:
+            self._finish(product)
+
+    def _finish(self, product: TrackedProduct) -> None:
+        source = product.source
+        self._in_flight[source] -= 1
+        self._slots.release()
+
+        if self._products.get(product.sku) is product:
+            self._schedule(product, self._jittered(self.next_interval(product)))
+
+        # Un controllo della sorgente si è liberato: riparte il primo prodotto in attesa
+        deferred = self._deferred[source]
+        while deferred:
+            waiting = deferred.popleft()
+            if self._products.get(waiting.sku) is waiting:
+                self._schedule(waiting, 0.0)
+                break
+
+
+def marketplace_services() -> Dict[str, MarketplaceService]:
+    """Servizi dei marketplace monitorati, indicizzati per prefisso dello SKU."""
+    services: List[MarketplaceService] = [AmazonService(), EbayService()]
+    return {service.name: service for service in services}
+
+
+async def load_tracked_products(
+    conn: AsyncConnection,
+    monitor: PriceMonitor,
+    entitlements: Optional[EntitlementCache] = None,
+) -> int:
+    """
+    Allinea il monitor ai prodotti dei marketplace presenti a catalogo.
+
+    Gli SKU hanno la forma "<marketplace>:<id articolo>" (vedi MarketplaceService).
+    I prodotti nuovi vengono registrati, quelli già monitorati mantengono il
+    proprio stato e quelli non più a catalogo vengono rimossi. Per i prodotti
+    di un utente valgono i limiti del suo piano: al più `max_skus` SKU
+    monitorati (i primi importati) e controlli non più frequenti di
+    `monitor_interval`; i cambi di piano valgono dalla rilettura successiva.
+
+    Returns:
+        Il numero di SKU monitorati
+    """
+    services = marketplace_services()
+    entitlements = entitlements or get_entitlements()
+    seen: Set[str] = set()
+    owned: Dict[int, int] = defaultdict(int)
+    async with conn.cursor(name="monitor_products") as cursor:
+        await cursor.execute(
+            "SELECT sku, (price * 100)::bigint, owner_id FROM products WHERE sku LIKE ANY(%s) ORDER BY id",
+            ([f"{name}:%" for name in services],),
+        )
+        async for sku, price_cents, owner_id in cursor:
+            min_interval = 0.0
+            if owner_id is not None:
+                limits = entitlements.get(owner_id)
+                if owned[owner_id] >= limits.max_skus:
+                    continue
+                owned[owner_id] += 1
+                min_interval = limits.monitor_interval
+            source, item_id = sku.split(":", 1)
+            monitor.track(
+                sku, source, services[source].item_url(item_id), price_cents=price_cents, min_interval=min_interval,
+            )
+            seen.add(sku)
+    for sku in [sku for sku in monitor.skus() if sku not in seen]:
+        monitor.untrack(sku)
+    return len(seen)
+
+
+def create_price_monitor(
+    on_change: Optional[ChangeHandler] = None,
+    on_check: Optional[ChangeHandler] = None,
+) -> PriceMonitor:
+    """
+    Monitor configurato dalle impostazioni.
+
+    Per lo storico prezzi passare `on_check=get_snapshot_store().on_monitor_check`.
+    """
+    return PriceMonitor(
+        on_change=on_change,
+        on_check=on_check,
+        min_interval=settings.MONITOR_MIN_INTERVAL,
+        max_interval=settings.MONITOR_MAX_INTERVAL,
+        concurrency=settings.MONITOR_CONCURRENCY,
+        source_concurrency=settings.MONITOR_SOURCE_CONCURRENCY,
+        default_source_concurrency=settings.MONITOR_DEFAULT_SOURCE_CONCURRENCY,
+        jitter=settings.MONITOR_JITTER,
+        check_timeout=settings.MONITOR_CHECK_TIMEOUT,
+    )
+
+
+async def reload_tracked_products(monitor: PriceMonitor, interval: float) -> None:
+    """Rilegge periodicamente il catalogo monitorato (prodotti importati o rimossi)."""
+    from app.db.session import db_router
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with db_router.connection(read_only=True) as conn:
+                await load_tracked_products(conn, monitor)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Lettura del catalogo monitorato fallita, nuovo tentativo al prossimo giro")
+
+
+_monitor: Optional[PriceMonitor] = None
+_reload_task: Optional[asyncio.Task] = None
+
+
+async def start_price_monitor(on_check: Optional[ChangeHandler] = None) -> PriceMonitor:
+    """
+    Avvia il monitoraggio del processo (evento di startup con MONITOR_ENABLED).
+
+    Registra i prodotti dei marketplace a catalogo, avvia lo scheduler e la
+    rilettura periodica del catalogo.
+
+    Args:
+        on_check: Coroutine chiamata a ogni controllo riuscito (es. storico prezzi)
+    """
+    from app.db.session import db_router
+
+    global _monitor, _reload_task
+    if _monitor is None:
+        monitor = create_price_monitor(on_check=on_check)
+        # I limiti dei piani servono già al primo caricamento: non si aspetta il LISTEN della cache
+        await get_entitlements().load()
+        async with db_router.connection(read_only=True) as conn:
+            count = await load_tracked_products(conn, monitor)
+        monitor.start()
+        _reload_task = asyncio.create_task(reload_tracked_products(monitor, settings.MONITOR_RELOAD_INTERVAL))
+        _monitor = monitor
+        logger.info("Monitoraggio prezzi avviato su %d prodotti", count)
+    return _monitor
+
+
+async def close_price_monitor() -> None:
+    global _monitor, _reload_task
+    if _reload_task is not None:
+        _reload_task.cancel()
+        await asyncio.gather(_reload_task, return_exceptions=True)
+        _reload_task = None
+    if _monitor is not None:
+        await _monitor.stop()
+        _monitor = None
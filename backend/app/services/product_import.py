@@ -0,0 +1,416 @@
+import codecs
+import csv
+import json
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from enum import Enum
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import status as http_status
+from psycopg import AsyncConnection
+from pydantic import ValidationError
+
+from app.core.config import settings
+from app.core.errors import BusinessLogicError, ErrorCode, ValidationError as InvalidInputError
+from app.schemas.base import BaseSchema
+from app.schemas.product import ProductImportRow
+from app.services.cache import invalidate_tags
+from app.services.products import PRODUCTS_TAG
+
+logger = logging.getLogger(__name__)
+
+# Record grezzo: (numero di riga nel file, testo del record)
+RawRecord = Tuple[int, str]
+
+STAGING_DDL = """
+CREATE TEMP TABLE product_import_staging (
+    line_no BIGINT NOT NULL,
+    sku TEXT NOT NULL,
+    name TEXT NOT NULL,
+    description TEXT,
+    price NUMERIC(12, 2) NOT NULL,
+    stock INTEGER NOT NULL,
+    category_id INTEGER
+) ON COMMIT DROP
+"""
+
+STAGING_COPY = """
+COPY product_import_staging (line_no, sku, name, description, price, stock, category_id)
+FROM STDIN
+"""
+
+# Blocca i prodotti già esistenti del file: fino al commit nessun processo prende o
+# restituisce stock in lease, così le lease lette dall'upsert restano quelle vere
+LOCK_EXISTING_PRODUCTS = """
+SELECT p.id FROM products p
+WHERE p.sku IN (SELECT sku FROM product_import_staging)
+ORDER BY p.id
+FOR UPDATE
+"""
+
+# Upsert set-based: a parità di SKU vince l'ultima riga del file, e le righe
+# identiche a quelle già presenti non vengono riscritte. Lo stock del file è la
+# giacenza reale, products.stock la quota non assegnata: le unità già in lease
+# ai processi (app.services.inventory) vengono sottratte. Un utente aggiorna
+# solo i propri SKU (gli amministratori, owner_id None, tutti): quelli degli
+# altri sono già stati tolti dalla staging come scarti, il predicato copre gli
+# SKU creati nel frattempo da un import parallelo
+UPSERT_FROM_STAGING = """
+WITH leased AS (
+    SELECT product_id, sum(quantity) AS quantity FROM stock_leases GROUP BY product_id
+), src AS (
+    SELECT DISTINCT ON (s.sku) s.sku, s.name, s.description, s.price,
+           GREATEST(s.stock - COALESCE(l.quantity, 0), 0) AS stock, s.category_id
+    FROM product_import_staging s
+    LEFT JOIN products cur ON cur.sku = s.sku
+    LEFT JOIN leased l ON l.product_id = cur.id
+    ORDER BY s.sku, s.line_no DESC
+), upserted AS (
+    INSERT INTO products AS p (sku, name, description, price, stock, category_id, owner_id)
+    SELECT sku, name, description, price, stock, category_id, %(owner_id)s::bigint FROM src
+    ON CONFLICT (sku) DO UPDATE SET
+        name = EXCLUDED.name,
+        description = EXCLUDED.description,
+        price = EXCLUDED.price,
+        stock = EXCLUDED.stock,
+        category_id = EXCLUDED.category_id,
+        updated_at = now()
+    WHERE (%(owner_id)s::bigint IS NULL OR p.owner_id = %(owner_id)s)
+      AND (p.name, p.description, p.price, p.stock, p.category_id)
+        IS DISTINCT FROM
+        (EXCLUDED.name, EXCLUDED.description, EXCLUDED.price, EXCLUDED.stock, EXCLUDED.category_id)
+    RETURNING (xmax = 0) AS inserted
+)
+SELECT
+    count(*) FILTER (WHERE inserted),
+    count(*) FILTER (WHERE NOT inserted)
+FROM upserted
+"""
+
+# Righe del file il cui SKU appartiene a un altro utente (o a nessuno): vengono
+# tolte dalla staging e finiscono tra gli scarti
+REMOVE_FOREIGN_SKUS = """
+DELETE FROM product_import_staging s
+USING products p
+WHERE p.sku = s.sku AND p.owner_id IS DISTINCT FROM %(owner_id)s
+RETURNING s.line_no, s.sku
+"""
+
+# SKU già dell'utente e SKU nuovi del file (quelli altrui sono già stati tolti,
+# quindi il file non conta gli SKU di altri utenti); il lock serializza gli import
+# dello stesso utente fino al commit, così due import paralleli non superano insieme il limite
+COUNT_OWNED_SKUS = """
+SELECT
+    (SELECT count(*) FROM products WHERE owner_id = %(owner_id)s),
+    (SELECT count(DISTINCT s.sku) FROM product_import_staging s
+     WHERE NOT EXISTS (SELECT 1 FROM products p WHERE p.sku = s.sku))
+FROM pg_advisory_xact_lock(%(owner_id)s::bigint)
+"""
+
+
+class ImportFormat(str, Enum):
+    """Formati accettati dall'import massivo."""
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+
+class ImportReport(BaseSchema):
+    """Esito di un import massivo."""
+    total_rows: int = 0
+    valid_rows: int = 0
+    rejected_rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    reject_file: Optional[str] = None
+    elapsed_seconds: float = 0.0
+
+
+class RejectWriter:
+    """Scrive le righe scartate in un file NDJSON, creato solo al primo scarto."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.reject_id = uuid.uuid4().hex
+        self.count = 0
+        self._file = None
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, f"{self.reject_id}.ndjson")
+
+    def write(self, line_no: int, errors: List[Dict[str, Any]], raw: str) -> None:
+        if self._file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._file = open(self.path, "w", encoding="utf-8")
+        record = {"line": line_no, "errors": errors, "raw": raw}
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self.count += 1
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+async def iter_records(
+    chunks: AsyncIterator[bytes],
+    quoted: bool = False,
+    max_record_chars: Optional[int] = None,
+) -> AsyncIterator[RawRecord]:
+    """
+    Divide uno stream di byte in record testuali senza caricarlo in memoria.
+
+    Una virgoletta spaiata (es. `Monitor 27"` in un campo senza virgolette)
+    terrebbe aperto il record fino alla fine del file: se il record supera
+    `max_record_chars`, o il file finisce, la sua prima riga viene emessa da
+    sola e le righe seguenti vengono rilette da capo.
+
+    Args:
+        chunks: Stream dei byte ricevuti (es. `request.stream()`)
+        quoted: True per i CSV, dove un campo tra virgolette può contenere a capo
+        max_record_chars: Lunghezza massima di un record su più righe
+            (default: IMPORT_MAX_RECORD_CHARS)
+
+    Yields:
+        Tuple (numero di riga iniziale, testo del record)
+    """
+    max_record_chars = max_record_chars or settings.IMPORT_MAX_RECORD_CHARS
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    buffer = ""
+    pending: List[str] = []
+    pending_chars = 0
+    quotes = 0
+    line_no = 0
+    record_start = 1
+
+    def take() -> str:
+        nonlocal pending_chars, quotes
+        text = "\n".join(pending)
+        pending.clear()
+        pending_chars = quotes = 0
+        return text
+
+    def unwind(queue: deque) -> RawRecord:
+        """Emette da sola la prima riga del record aperto e rimette in coda le altre."""
+        first = (record_start, pending[0])
+        rest = list(enumerate(pending[1:], record_start + 1))
+        take()
+        queue.extendleft(reversed(rest))
+        return first
+
+    def feed(lines: Iterable[Tuple[int, str]]) -> List[RawRecord]:
+        nonlocal record_start, pending_chars, quotes
+        records: List[RawRecord] = []
+        queue = deque(lines)
+        while queue:
+            number, line = queue.popleft()
+            if not pending:
+                record_start = number
+            line = line.rstrip("\r")
+            pending.append(line)
+            pending_chars += len(line) + 1
+            # Con un numero dispari di virgolette il record prosegue sulla riga successiva
+            if quoted:
+                quotes += line.count('"')
+                if quotes % 2:
+                    if pending_chars > max_record_chars:
+                        records.append(unwind(queue))
+                    continue
+            records.append((record_start, take()))
+        return records
+
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for record in feed(enumerate(lines, line_no + 1)):
+            yield record
+        line_no += len(lines)
+
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        line_no += 1
+        for record in feed([(line_no, buffer)]):
+            yield record
+    while pending:
+        # Virgolette non bilanciate a fine file
+        queue: deque = deque()
+        yield unwind(queue)
+        for record in feed(queue):
+            yield record
+
+
+async def iter_batches(records: AsyncIterator[RawRecord], size: int) -> AsyncIterator[List[RawRecord]]:
+    """Raggruppa i record in blocchi di `size` elementi."""
+    batch: List[RawRecord] = []
+    async for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def parse_batch(
+    batch: List[RawRecord],
+    fmt: ImportFormat,
+    header: Optional[List[str]],
+) -> List[Tuple[int, str, Any]]:
+    """
+    Converte un blocco di record in dizionari.
+
+    Ogni record CSV ha il proprio reader: un record malformato finisce tra gli
+    scarti senza interrompere la lettura degli altri.
+
+    Returns:
+        Lista di (riga, testo, dati) dove dati è un dict oppure il messaggio di errore
+    """
+    parsed: List[Tuple[int, str, Any]] = []
+
+    if fmt == ImportFormat.CSV:
+        for line_no, raw in batch:
+            try:
+                values = next(csv.reader([raw]), [])
+            except csv.Error as e:
+                parsed.append((line_no, raw, f"CSV non valido: {e}"))
+                continue
+            if len(values) != len(header):
+                parsed.append((line_no, raw, f"Attese {len(header)} colonne, trovate {len(values)}"))
+            else:
+                parsed.append((line_no, raw, dict(zip(header, values))))
+        return parsed
+
+    for line_no, raw in batch:
+        try:
+            data = json.loads(raw)
+        except ValueError as e:
+            parsed.append((line_no, raw, f"JSON non valido: {e}"))
+            continue
+        if not isinstance(data, dict):
+            parsed.append((line_no, raw, "Ogni riga deve essere un oggetto JSON"))
+            continue
+        parsed.append((line_no, raw, data))
+    return parsed
+
+
+async def import_products(
+    conn: AsyncConnection,
+    chunks: AsyncIterator[bytes],
+    fmt: ImportFormat = ImportFormat.CSV,
+    batch_size: Optional[int] = None,
+    reject_dir: Optional[str] = None,
+    owner_id: Optional[int] = None,
+    max_skus: Optional[int] = None,
+) -> ImportReport:
+    """
+    Importa in blocco i prodotti di un fornitore.
+
+    Le righe vengono validate a blocchi con le regole di `ProductBase`, caricate
+    con COPY in una tabella temporanea e infine fuse in `products` con un unico
+    upsert. Le righe non valide, e quelle con lo SKU di un altro utente,
+    finiscono nel file degli scarti. Tutto avviene nella transazione della
+    connessione ricevuta.
+
+    Args:
+        conn: Connessione al primario
+        chunks: Stream del file caricato
+        fmt: Formato del file (CSV con intestazione oppure NDJSON)
+        batch_size: Righe validate per blocco
+        reject_dir: Cartella dei file di scarto
+        owner_id: Utente a cui attribuire gli SKU nuovi, che può aggiornare
+            solo i propri (None: nessuno, aggiorna tutti gli SKU)
+        max_skus: SKU massimi dell'utente dopo l'import (None: nessun limite)
+
+    Returns:
+        Il riepilogo dell'import
+
+    Raises:
+        InvalidInputError: se l'intestazione del CSV non è leggibile
+        BusinessLogicError: se gli SKU nuovi superano il limite del piano (nulla viene scritto)
+    """
+    started = time.perf_counter()
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    rejects = RejectWriter(reject_dir or settings.IMPORT_REJECTS_DIR)
+    report = ImportReport()
+
+    records = iter_records(chunks, quoted=fmt == ImportFormat.CSV)
+    header: Optional[List[str]] = None
+
+    await conn.execute(STAGING_DDL)
+    try:
+        async with conn.cursor() as cursor:
+            async with cursor.copy(STAGING_COPY) as copy:
+                async for batch in iter_batches(records, batch_size):
+                    if fmt == ImportFormat.CSV and header is None:
+                        try:
+                            header = [name.strip() for name in next(csv.reader([batch[0][1]]), [])]
+                        except csv.Error as e:
+                            raise InvalidInputError(f"Intestazione CSV non valida: {e}") from e
+                        batch = batch[1:]
+
+                    for line_no, raw, data in parse_batch(batch, fmt, header):
+                        if not raw.strip():
+                            continue
+                        report.total_rows += 1
+                        if isinstance(data, str):
+                            rejects.write(line_no, [{"msg": data}], raw)
+                            continue
+                        try:
+                            row = ProductImportRow(**data)
+                        except ValidationError as e:
+                            rejects.write(line_no, e.errors(), raw)
+                            continue
+                        await copy.write_row((
+                            line_no, row.sku, row.name, row.description,
+                            row.price, row.stock, row.category_id,
+                        ))
+                        report.valid_rows += 1
+
+        if owner_id is not None:
+            cursor = await conn.execute(REMOVE_FOREIGN_SKUS, {"owner_id": owner_id})
+            for line_no, sku in sorted(await cursor.fetchall()):
+                rejects.write(line_no, [{"loc": ["sku"], "msg": "SKU di un altro utente"}], sku)
+                report.valid_rows -= 1
+    finally:
+        rejects.close()
+
+    await conn.execute("ANALYZE product_import_staging")
+    if owner_id is not None and max_skus is not None:
+        cursor = await conn.execute(COUNT_OWNED_SKUS, {"owner_id": owner_id})
+        owned, new = await cursor.fetchone()
+        if owned + new > max_skus:
+            raise BusinessLogicError(
+                f"Il piano consente {max_skus} SKU: ne hai {owned} e il file ne aggiunge {new}",
+                error_code=ErrorCode.RESOURCE_EXHAUSTED,
+                details={"max_skus": max_skus, "owned": owned, "new": new},
+                status_code=http_status.HTTP_403_FORBIDDEN,
+            )
+    await conn.execute(LOCK_EXISTING_PRODUCTS)
+    cursor = await conn.execute(UPSERT_FROM_STAGING, {"owner_id": owner_id})
+    report.inserted, report.updated = await cursor.fetchone()
+    if report.inserted or report.updated:
+        await invalidate_tags(conn, [PRODUCTS_TAG])
+
+    report.rejected_rows = rejects.count
+    if rejects.count:
+        report.reject_file = rejects.reject_id
+    report.elapsed_seconds = round(time.perf_counter() - started, 3)
+
+    logger.info(
+        "Import prodotti: %d righe, %d inserite, %d aggiornate, %d scartate in %.1fs",
+        report.total_rows, report.inserted, report.updated, report.rejected_rows, report.elapsed_seconds,
+    )
+    return report
+
+
+def reject_file_path(reject_id: str) -> Optional[str]:
+    """Percorso del file di scarto, se l'identificativo è valido ed esiste."""
+    try:
+        reject_id = uuid.UUID(hex=reject_id).hex
+    except ValueError:
+        return None
+    path = os.path.join(settings.IMPORT_REJECTS_DIR, f"{reject_id}.ndjson")
+    return path if os.path.exists(path) else None
@@ -0,0 +1,39 @@
+from typing import Optional
+
+from psycopg import AsyncConnection
+
+from app.schemas.product import Product
+from app.services.cache import cached
+from app.services.inventory import PRODUCT_STOCK
+
+# Tag di cache: un prodotto, oppure tutto il catalogo (scritture massive: import, repricing)
+PRODUCTS_TAG = "products"
+
+GET_PRODUCT = f"""
+SELECT p.id, p.name, p.description, p.price, {PRODUCT_STOCK}, p.category_id, p.created_at, p.updated_at
+FROM products p WHERE p.id = %s
+"""
+
+
+def product_tag(product_id: int) -> str:
+    return f"product:{product_id}"
+
+
+@cached(tags=lambda product_id, conn: [product_tag(product_id), PRODUCTS_TAG])
+async def get_product(product_id: int, conn: Optional[AsyncConnection] = None) -> Optional[Product]:
+    """
+    Scheda di un prodotto, dalla cache dei dati.
+
+    Le modifiche a nome, descrizione e prezzo invalidano la voce; la
+    giacenza invece cambia a ogni prenotazione e resta indicativa fino alla
+    scadenza (CACHE_TTL): fa fede il motore di inventario. In caso di miss
+    la scheda viene letta dal primario (vedi `cached`), mai da una replica.
+    """
+    cursor = await conn.execute(GET_PRODUCT, (product_id,))
+    row = await cursor.fetchone()
+    if row is None:
+        return None
+    return Product(
+        id=row[0], name=row[1], description=row[2], price=row[3], stock=row[4],
+        category_id=row[5], created_at=row[6], updated_at=row[7],
+    )
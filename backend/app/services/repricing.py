@@ -0,0 +1,315 @@
+import logging
+import time
+from enum import IntEnum
+from typing import Dict, List, Optional
+
+import numpy as np
+from psycopg import AsyncConnection
+from pydantic import Field, root_validator, validator
+
+from app.core.config import settings
+from app.schemas.base import BaseSchema
+from app.services.cache import invalidate_tags
+from app.services.products import PRODUCTS_TAG
+
+logger = logging.getLogger(__name__)
+
+# Prezzi in centesimi come interi; NULL letti come -1 e convertiti in NaN.
+# Con owner_id NULL (amministratori) tutto il catalogo, altrimenti i prodotti dell'utente
+LOAD_CATALOGUE = """
+SELECT p.id,
+       (p.price * 100)::bigint,
+       COALESCE((p.supplier_cost * 100)::bigint, -1),
+       COALESCE((p.competitor_price * 100)::bigint, -1),
+       COALESCE(f.rate, %(default_rate)s)
+FROM products p
+LEFT JOIN unnest(%(sources)s::text[], %(rates)s::float8[]) AS f(source, rate)
+    ON f.source = split_part(p.sku, ':', 1)
+WHERE %(owner_id)s::bigint IS NULL OR p.owner_id = %(owner_id)s
+"""
+
+# Il prezzo viene aggiornato solo se nel frattempo nessuno l'ha cambiato
+# (né, per un utente, ceduto il prodotto a un altro)
+BULK_UPDATE_PRICES = """
+UPDATE products AS p
+SET price = v.new_price, updated_at = now()
+FROM unnest(%(ids)s::bigint[], %(old)s::numeric[], %(new)s::numeric[]) AS v(id, old_price, new_price)
+WHERE p.id = v.id AND p.price = v.old_price
+  AND (%(owner_id)s::bigint IS NULL OR p.owner_id = %(owner_id)s)
+"""
+
+
+class PriceReason(IntEnum):
+    """Regola che ha determinato il nuovo prezzo."""
+    UNCHANGED = 0
+    MARGIN_FLOOR = 1
+    UNDERCUT = 2
+    ROUNDING = 3
+    CEILING = 4
+
+
+class RepricingRules(BaseSchema):
+    """Regole di repricing applicate a tutto il catalogo."""
+    min_margin: float = Field(0.15, ge=0, lt=1, description="Margine minimo netto, in frazione del prezzo")
+    fixed_fee: float = Field(0.0, ge=0, description="Costo fisso per vendita (spedizione, transazione)")
+    fee_rates: Dict[str, float] = Field(
+        default_factory=dict, description="Commissione del marketplace per prefisso SKU (es. amazon: 0.15)",
+    )
+    default_fee_rate: float = Field(0.0, ge=0, lt=1)
+    undercut: float = Field(0.01, ge=0, description="Importo sotto il prezzo del concorrente")
+    undercut_percent: float = Field(0.0, ge=0, lt=1, description="Sconto percentuale sul concorrente")
+    max_markup: Optional[float] = Field(None, gt=1, description="Prezzo massimo come multiplo del costo")
+    charm_pricing: bool = Field(True, description="Arrotonda ai .99")
+
+    @validator("fee_rates")
+    def fee_rates_in_range(cls, v):
+        for source, rate in v.items():
+            if not 0 <= rate < 1:
+                raise ValueError(f"Commissione non valida per {source}: {rate}")
+        return v
+
+    @root_validator(skip_on_failure=True)
+    def margin_reachable(cls, values):
+        """Commissione + margine devono lasciare spazio al costo, altrimenti il minimo è infinito."""
+        highest = max([values["default_fee_rate"], *values["fee_rates"].values()])
+        if highest + values["min_margin"] >= 1:
+            raise ValueError("Commissione e margine minimo superano il 100% del prezzo")
+        return values
+
+
+class CatalogueArrays:
+    """Catalogo in forma colonnare (un array NumPy per campo, prezzi in centesimi)."""
+
+    def __init__(self, ids: np.ndarray, price: np.ndarray, cost: np.ndarray, competitor: np.ndarray, fee_rate: np.ndarray):
+        self.ids = ids
+        self.price = price
+        self.cost = cost
+        self.competitor = competitor
+        self.fee_rate = fee_rate
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_rows(cls, rows: np.ndarray) -> "CatalogueArrays":
+        """Costruisce le colonne da una matrice (id, prezzo, costo, concorrente, commissione)."""
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, 5)
+        cost = rows[:, 2].copy()
+        competitor = rows[:, 3].copy()
+        cost[cost < 0] = np.nan
+        competitor[competitor < 0] = np.nan
+        return cls(rows[:, 0].astype(np.int64), rows[:, 1].astype(np.int64), cost, competitor, rows[:, 4].copy())
+
+
+class RepricingResult:
+    """Nuovi prezzi calcolati per il catalogo."""
+
+    def __init__(self, catalogue: CatalogueArrays, new_price: np.ndarray, reason: np.ndarray):
+        self.catalogue = catalogue
+        self.new_price = new_price
+        self.reason = reason
+        self.changed = new_price != catalogue.price
+
+    @property
+    def changed_count(self) -> int:
+        return int(self.changed.sum())
+
+    def diff(self, limit: Optional[int] = None) -> List[Dict[str, object]]:
+        """Prezzi modificati (per il dry run), dal maggiore scostamento in giù."""
+        idx = np.flatnonzero(self.changed)
+        magnitude = -np.abs(self.new_price[idx] - self.catalogue.price[idx])
+        if limit is not None and limit < len(idx):
+            # Selezione parziale: ordinare tutto il catalogo per mostrare cento righe non serve
+            top = np.argpartition(magnitude, limit)[:limit]
+            idx, magnitude = idx[top], magnitude[top]
+        idx = idx[np.argsort(magnitude, kind="stable")]
+        return [
+            {
+                "id": int(self.catalogue.ids[i]),
+                "old_price": int(self.catalogue.price[i]) / 100,
+                "new_price": int(self.new_price[i]) / 100,
+                "reason": PriceReason(int(self.reason[i])).name.lower(),
+            }
+            for i in idx
+        ]
+
+
+class RepricingReport(BaseSchema):
+    """Esito di un repricing."""
+    products: int
+    changed: int
+    updated: int = 0
+    raised: int
+    lowered: int
+    by_reason: Dict[str, int]
+    dry_run: bool
+    elapsed_ms: float
+    diff: List[Dict[str, object]] = []
+
+
+def compute_prices(catalogue: CatalogueArrays, rules: RepricingRules) -> RepricingResult:
+    """
+    Applica le regole di repricing a tutto il catalogo in forma vettoriale.
+
+    Per ogni prodotto:
+      1. prezzo minimo che garantisce `min_margin` al netto di commissioni e
+         costi fissi: (costo + fisso) / (1 - commissione - margine);
+      2. se c'è un prezzo del concorrente, si va appena sotto, mai sotto il minimo;
+      3. tetto opzionale a `max_markup` volte il costo;
+      4. arrotondamento al .99 superiore; se così si supera il concorrente, si
+         scende di un euro purché resti sopra il minimo.
+
+    I prodotti senza costo fornitore mantengono il prezzo attuale.
+    """
+    cost = catalogue.cost
+    price = catalogue.price.astype(np.float64)
+    competitor = catalogue.competitor
+    has_cost = ~np.isnan(cost)
+    has_competitor = ~np.isnan(competitor)
+    reason = np.full(len(catalogue), PriceReason.UNCHANGED, dtype=np.int8)
+
+    with np.errstate(invalid="ignore"):
+        floor = (cost + rules.fixed_fee * 100) / (1 - catalogue.fee_rate - rules.min_margin)
+        undercut = competitor * (1 - rules.undercut_percent) - rules.undercut * 100
+        target = np.where(has_competitor, undercut, price)
+        reason[has_competitor] = PriceReason.UNDERCUT
+
+        below_floor = target < floor
+        target = np.where(below_floor, floor, target)
+        reason[below_floor] = PriceReason.MARGIN_FLOOR
+
+        if rules.max_markup is not None:
+            # Il tetto non scende mai sotto il margine minimo
+            ceiling = np.maximum(cost * rules.max_markup, floor)
+            above_ceiling = target > ceiling
+            target = np.where(above_ceiling, ceiling, target)
+            reason[above_ceiling] = PriceReason.CEILING
+
+        new_price = np.ceil(target - 1e-6)
+        if rules.charm_pricing:
+            # .99 superiore: 12.40 -> 12.99, 12.99 -> 12.99, 13.00 -> 13.99
+            charm = np.ceil((target - 99) / 100 - 1e-9) * 100 + 99
+            over_competitor = has_competitor & (charm >= competitor) & (charm - 100 >= floor)
+            charm = np.where(over_competitor, charm - 100, charm)
+            reason[(charm != new_price) & (reason == PriceReason.UNCHANGED)] = PriceReason.ROUNDING
+            new_price = charm
+
+    new_price = np.where(has_cost, new_price, price).astype(np.int64)
+    reason[~has_cost | (new_price == catalogue.price)] = PriceReason.UNCHANGED
+    return RepricingResult(catalogue, new_price, reason)
+
+
+async def load_catalogue(
+    conn: AsyncConnection,
+    rules: RepricingRules,
+    batch_size: int = 100_000,
+    owner_id: Optional[int] = None,
+) -> CatalogueArrays:
+    """Legge il catalogo (di `owner_id`, se indicato) in array NumPy, a blocchi da un cursore lato server."""
+    chunks: List[np.ndarray] = []
+    sources = list(rules.fee_rates)
+    async with conn.cursor(name="repricing_catalogue") as cursor:
+        await cursor.execute(LOAD_CATALOGUE, {
+            "default_rate": rules.default_fee_rate,
+            "sources": sources,
+            "rates": [rules.fee_rates[s] for s in sources],
+            "owner_id": owner_id,
+        })
+        while True:
+            rows = await cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            chunks.append(np.array(rows, dtype=np.float64))
+    return CatalogueArrays.from_rows(np.concatenate(chunks) if chunks else np.empty((0, 5)))
+
+
+def cents_to_text(cents: int) -> str:
+    """Centesimi interi come prezzo decimale esatto, es. 1299 -> "12.99"."""
+    sign = "-" if cents < 0 else ""
+    units, remainder = divmod(abs(cents), 100)
+    return f"{sign}{units}.{remainder:02d}"
+
+
+async def write_prices(
+    conn: AsyncConnection,
+    result: RepricingResult,
+    batch_size: int = 50_000,
+    owner_id: Optional[int] = None,
+) -> int:
+    """
+    Scrive i prezzi modificati (dei prodotti di `owner_id`, se indicato) con UPDATE a blocchi su array.
+
+    Returns:
+        Il numero di prodotti aggiornati (esclusi quelli modificati nel frattempo)
+    """
+    idx = np.flatnonzero(result.changed)
+    ids = result.catalogue.ids[idx]
+    old = result.catalogue.price[idx]
+    new = result.new_price[idx]
+    updated = 0
+    for start in range(0, len(idx), batch_size):
+        end = start + batch_size
+        # I centesimi viaggiano come testo "12.99" per non passare da float
+        cursor = await conn.execute(BULK_UPDATE_PRICES, {
+            "ids": ids[start:end].tolist(),
+            "old": [cents_to_text(c) for c in old[start:end].tolist()],
+            "new": [cents_to_text(c) for c in new[start:end].tolist()],
+            "owner_id": owner_id,
+        })
+        updated += cursor.rowcount
+    return updated
+
+
+async def reprice_catalogue(
+    conn: AsyncConnection,
+    rules: RepricingRules,
+    dry_run: bool = True,
+    diff_limit: Optional[int] = 100,
+    owner_id: Optional[int] = None,
+) -> RepricingReport:
+    """
+    Ricalcola i prezzi del catalogo.
+
+    Args:
+        conn: Connessione al database
+        rules: Regole di repricing
+        dry_run: Se True calcola solo la differenza senza scrivere
+        diff_limit: Numero massimo di righe di differenza nel report
+        owner_id: Ricalcola solo i prodotti di questo utente (None: tutto il catalogo)
+
+    Returns:
+        Il report con conteggi per regola e, in dry run, le modifiche principali
+    """
+    started = time.perf_counter()
+    catalogue = await load_catalogue(conn, rules, owner_id=owner_id)
+    result = compute_prices(catalogue, rules)
+
+    updated = 0
+    if not dry_run and result.changed_count:
+        updated = await write_prices(conn, result, owner_id=owner_id)
+        await invalidate_tags(conn, [PRODUCTS_TAG])
+        if updated < result.changed_count:
+            logger.info("Repricing: %d prodotti modificati durante il calcolo, saltati", result.changed_count - updated)
+
+    counts = np.bincount(result.reason[result.changed], minlength=len(PriceReason))
+    delta = result.new_price - catalogue.price
+    return RepricingReport(
+        products=len(catalogue),
+        changed=result.changed_count,
+        updated=updated,
+        raised=int((delta > 0).sum()),
+        lowered=int((delta < 0).sum()),
+        by_reason={reason.name.lower(): int(counts[reason]) for reason in PriceReason if reason},
+        dry_run=dry_run,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 1),
+        diff=result.diff(diff_limit) if dry_run else [],
+    )
+
+
+def default_rules() -> RepricingRules:
+    """Regole di default dalle impostazioni."""
+    return RepricingRules(
+        min_margin=settings.REPRICING_MIN_MARGIN,
+        fixed_fee=settings.REPRICING_FIXED_FEE,
+        fee_rates=settings.REPRICING_FEE_RATES,
+    )
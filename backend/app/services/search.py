@@ -0,0 +1,224 @@
+import re
+from collections import Counter
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from psycopg import AsyncConnection
+from pydantic import Field
+
+from app.core.config import settings
+from app.core.errors import ValidationError
+from app.schemas.base import BaseSchema
+from app.services.analytics import AnalyticsCache
+from app.services.inventory import PRODUCT_STOCK
+
+# Filtri opzionali: un parametro NULL non filtra. La disponibilità conta anche
+# le unità in lease ai processi (products.stock è solo la quota non assegnata)
+_PRICE_STOCK_FILTERS = f"""
+    AND (%(min_price)s::numeric IS NULL OR p.price >= %(min_price)s)
+    AND (%(max_price)s::numeric IS NULL OR p.price <= %(max_price)s)
+    AND (NOT %(in_stock)s OR {PRODUCT_STOCK} > 0)
+"""
+_FILTERS = _PRICE_STOCK_FILTERS + """
+    AND (%(category_id)s::int IS NULL OR p.category_id = %(category_id)s)
+"""
+
+# Ricerca: al più `max_candidates` risultati vengono ordinati per rilevanza,
+# così anche i termini molto comuni hanno un costo limitato. Il LIMIT precede
+# l'ordinamento: oltre quella soglia si ordinano le prime righe trovate, non
+# le più rilevanti (la risposta lo segnala con `truncated`)
+SEARCH = f"""
+WITH matches AS (
+    SELECT p.id, p.sku, p.name, p.description, p.price, {PRODUCT_STOCK} AS stock, p.category_id,
+           ts_rank_cd(p.search_vector, q.query, 1) AS rank
+    FROM products p, websearch_to_tsquery('italian', %(q)s) AS q(query)
+    WHERE p.search_vector @@ q.query {_FILTERS}
+    LIMIT %(max_candidates)s
+)
+SELECT * FROM matches ORDER BY rank DESC, id LIMIT %(limit)s OFFSET %(offset)s
+"""
+
+# Facet per categoria su tutti i risultati, senza il filtro di categoria
+FACETS = f"""
+SELECT p.category_id, count(*)
+FROM products p
+WHERE p.search_vector @@ websearch_to_tsquery('italian', %(q)s) {_PRICE_STOCK_FILTERS}
+GROUP BY p.category_id
+ORDER BY count(*) DESC, p.category_id
+"""
+
+# Ripiego per i refusi: somiglianza a trigrammi tra il testo cercato e le parole del nome
+FUZZY_SEARCH = f"""
+SELECT p.id, p.sku, p.name, p.description, p.price, {PRODUCT_STOCK} AS stock, p.category_id,
+       word_similarity(%(q)s, lower(p.name)) AS rank
+FROM products p
+WHERE lower(p.name) %%> %(q)s {_FILTERS}
+ORDER BY rank DESC, p.id
+LIMIT %(limit)s
+"""
+
+# Suggerimenti: contano quasi solo le parole del nome (peso A)
+AUTOCOMPLETE = """
+WITH matches AS (
+    SELECT p.id, p.name, ts_rank('{0, 0, 0.1, 1}', p.search_vector, q.query) AS rank
+    FROM products p, to_tsquery('italian', %(q)s) AS q(query)
+    WHERE p.search_vector @@ q.query
+    LIMIT %(max_candidates)s
+)
+SELECT id, name FROM matches ORDER BY rank DESC, length(name), id LIMIT %(limit)s
+"""
+
+_WORD = re.compile(r"\w+")
+
+cache = AnalyticsCache(settings.SEARCH_CACHE_TTL, settings.SEARCH_CACHE_SIZE)
+
+
+class SearchHit(BaseSchema):
+    """Prodotto trovato, con il punteggio di rilevanza."""
+    id: int
+    sku: Optional[str] = None
+    name: str
+    description: Optional[str] = None
+    price: Decimal
+    stock: int
+    category_id: Optional[int] = None
+    rank: float
+
+
+class CategoryFacet(BaseSchema):
+    """Numero di risultati in una categoria."""
+    category_id: Optional[int] = None
+    count: int
+
+
+class SearchResults(BaseSchema):
+    """Pagina di risultati di una ricerca."""
+    items: List[SearchHit] = []
+    total: int = Field(0, description="Risultati consultabili pagina per pagina (al più SEARCH_MAX_CANDIDATES)")
+    facets: List[CategoryFacet] = []
+    fuzzy: bool = False
+    truncated: bool = Field(
+        False,
+        description="Più corrispondenze di SEARCH_MAX_CANDIDATES: solo le prime trovate sono ordinate per "
+                    "rilevanza, affinare la ricerca per vedere le altre (le facet contano tutte le corrispondenze)",
+    )
+
+
+class Suggestion(BaseSchema):
+    """Suggerimento di completamento."""
+    product_id: int
+    name: str
+
+
+def prefix_query(text: str) -> Optional[str]:
+    """
+    Query tsquery per il completamento: tutte le parole, l'ultima come prefisso.
+
+    Le parole contengono solo caratteri alfanumerici, quindi non possono
+    introdurre operatori di to_tsquery.
+    """
+    words = _WORD.findall(text.lower())
+    if not words:
+        return None
+    return " & ".join([*words[:-1], f"{words[-1]}:*"])
+
+
+def _hits(rows: List[tuple]) -> List[SearchHit]:
+    return [
+        SearchHit(
+            id=row[0], sku=row[1], name=row[2], description=row[3], price=row[4],
+            stock=row[5], category_id=row[6], rank=round(float(row[7]), 4),
+        )
+        for row in rows
+    ]
+
+
+async def search_products(
+    conn: AsyncConnection,
+    q: str,
+    *,
+    category_id: Optional[int] = None,
+    min_price: Optional[Decimal] = None,
+    max_price: Optional[Decimal] = None,
+    in_stock: bool = False,
+    limit: int = 20,
+    offset: int = 0,
+) -> SearchResults:
+    """
+    Ricerca full-text nel catalogo, ordinata per rilevanza.
+
+    Il testo segue la sintassi di websearch_to_tsquery ("frase esatta", or,
+    -escluso). Se non trova nulla ripiega su una ricerca a trigrammi sul nome,
+    che tollera i refusi.
+
+    Args:
+        conn: Connessione al database
+        q: Testo cercato
+        category_id: Limita i risultati a una categoria (le facet la ignorano)
+        min_price: Prezzo minimo
+        max_price: Prezzo massimo
+        in_stock: Solo prodotti disponibili
+        limit: Risultati per pagina
+        offset: Risultati da saltare
+
+    Raises:
+        ValidationError: se il testo cercato è vuoto
+    """
+    q = " ".join(q.split())
+    if not q:
+        raise ValidationError("Il testo da cercare è vuoto")
+    params: Dict[str, Any] = {
+        "q": q, "category_id": category_id, "min_price": min_price, "max_price": max_price,
+        "in_stock": in_stock, "limit": limit, "offset": offset,
+        "max_candidates": settings.SEARCH_MAX_CANDIDATES,
+    }
+    cursor = await conn.execute(SEARCH, params)
+    items = _hits(await cursor.fetchall())
+
+    if not items and offset == 0:
+        params["q"] = q.lower()
+        cursor = await conn.execute(FUZZY_SEARCH, params)
+        items = _hits(await cursor.fetchall())
+        counts = Counter(item.category_id for item in items)
+        return SearchResults(
+            items=items,
+            total=len(items),
+            facets=[CategoryFacet(category_id=c, count=n) for c, n in counts.most_common()],
+            fuzzy=True,
+        )
+
+    # Le facet dipendono solo da testo e filtri di prezzo/stock: in cache tra le pagine
+    key = ("facets", q, min_price, max_price, in_stock)
+    facets = cache.get(key)
+    if facets is None:
+        cursor = await conn.execute(FACETS, params)
+        facets = [CategoryFacet(category_id=c, count=n) for c, n in await cursor.fetchall()]
+        cache.set(key, facets)
+
+    if category_id is None:
+        matches = sum(f.count for f in facets)
+    else:
+        matches = next((f.count for f in facets if f.category_id == category_id), 0)
+    # Oltre max_candidates le righe non entrano nell'ordinamento: il totale non lo supera
+    return SearchResults(
+        items=items,
+        total=min(matches, settings.SEARCH_MAX_CANDIDATES),
+        facets=facets,
+        truncated=matches > settings.SEARCH_MAX_CANDIDATES,
+    )
+
+
+async def autocomplete(conn: AsyncConnection, q: str, limit: int = 10) -> List[Suggestion]:
+    """Suggerisce prodotti il cui testo contiene le parole digitate (l'ultima come prefisso)."""
+    query = prefix_query(q)
+    if query is None:
+        return []
+    key = ("autocomplete", query, limit)
+    suggestions = cache.get(key)
+    if suggestions is None:
+        cursor = await conn.execute(AUTOCOMPLETE, {
+            "q": query, "limit": limit, "max_candidates": settings.SEARCH_MAX_CANDIDATES // 10,
+        })
+        suggestions = [Suggestion(product_id=pid, name=name) for pid, name in await cursor.fetchall()]
+        cache.set(key, suggestions)
+    return suggestions
@@ -0,0 +1,397 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from datetime import date, datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from psycopg import AsyncConnection
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Codifica della disponibilità nei 2 bit bassi del delta temporale
+_STOCK_CODES = {False: 0, True: 1, None: 2}
+_STOCK_VALUES = {0: False, 1: True, 2: None}
+
+UPSERT_HISTORY = """
+INSERT INTO product_price_history AS h
+    (sku, month, last_ts, last_price_cents, last_in_stock, state_hash, points, data)
+SELECT * FROM unnest(
+    %s::text[], %s::date[], %s::bigint[], %s::bigint[],
+    %s::smallint[], %s::bigint[], %s::integer[], %s::bytea[]
+)
+ON CONFLICT (sku, month) DO UPDATE SET
+    data = h.data || EXCLUDED.data,
+    points = h.points + EXCLUDED.points,
+    last_ts = EXCLUDED.last_ts,
+    last_price_cents = EXCLUDED.last_price_cents,
+    last_in_stock = EXCLUDED.last_in_stock,
+    state_hash = EXCLUDED.state_hash
+"""
+
+LOAD_LAST_STATES = """
+SELECT DISTINCT ON (sku) sku, month, last_ts, last_price_cents, last_in_stock, state_hash
+FROM product_price_history
+ORDER BY sku, month DESC
+"""
+
+
+def _write_varint(buffer: bytearray, value: int) -> None:
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _zigzag(value: int) -> int:
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+def month_start(ts: int) -> date:
+    moment = datetime.fromtimestamp(ts, timezone.utc)
+    return date(moment.year, moment.month, 1)
+
+
+def _epoch(day: date) -> int:
+    return int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp())
+
+
+def encode_point(buffer: bytearray, dt: int, d_price: int, in_stock: Optional[bool]) -> None:
+    """Accoda un punto: varint((Δt << 2) | disponibilità), varint zigzag(Δprezzo)."""
+    _write_varint(buffer, (dt << 2) | _STOCK_CODES[in_stock])
+    _write_varint(buffer, _zigzag(d_price))
+
+
+def decode_series(month: date, data: bytes) -> List[Tuple[int, int, Optional[bool]]]:
+    """
+    Decodifica la serie mensile di uno SKU.
+
+    Returns:
+        Lista di (timestamp epoch, prezzo in centesimi, disponibilità)
+    """
+    points: List[Tuple[int, int, Optional[bool]]] = []
+    ts, price, pos = _epoch(month), 0, 0
+    while pos < len(data):
+        header, pos = _read_varint(data, pos)
+        d_price, pos = _read_varint(data, pos)
+        ts += header >> 2
+        price += _unzigzag(d_price)
+        points.append((ts, price, _STOCK_VALUES[header & 0b11]))
+    return points
+
+
+def state_hash(price_cents: int, in_stock: Optional[bool], attributes: Optional[Dict[str, Any]] = None) -> int:
+    """Hash a 64 bit (con segno, come BIGINT) dello stato normalizzato del prodotto."""
+    payload = json.dumps([price_cents, in_stock, attributes or {}], sort_keys=True, separators=(",", ":"))
+    digest = hashlib.blake2b(payload.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+class PriceChangeEvent:
+    """Variazione dello stato di uno SKU, notificata ai sottoscrittori."""
+
+    def __init__(
+        self,
+        sku: str,
+        observed_at: int,
+        old_price_cents: Optional[int],
+        new_price_cents: int,
+        old_in_stock: Optional[bool],
+        new_in_stock: Optional[bool],
+    ):
+        self.sku = sku
+        self.observed_at = observed_at
+        self.old_price_cents = old_price_cents
+        self.new_price_cents = new_price_cents
+        self.old_in_stock = old_in_stock
+        self.new_in_stock = new_in_stock
+
+    @property
+    def price_changed(self) -> bool:
+        return self.old_price_cents != self.new_price_cents
+
+
+Subscriber = Callable[[PriceChangeEvent], Awaitable[None]]
+
+
+class _LastState:
+    __slots__ = ("month", "ts", "price_cents", "in_stock", "hash")
+
+    def __init__(self, month: date, ts: int, price_cents: int, in_stock: Optional[bool], hash_: int):
+        self.month = month
+        self.ts = ts
+        self.price_cents = price_cents
+        self.in_stock = in_stock
+        self.hash = hash_
+
+
+class _Pending:
+    __slots__ = ("data", "points")
+
+    def __init__(self):
+        self.data = bytearray()
+        self.points = 0
+
+
+class SnapshotStore:
+    """
+    Storico compatto di prezzo e disponibilità con change detection.
+
+    Ogni rilevazione viene ridotta a un hash dello stato normalizzato: se
+    coincide con l'ultimo noto non si scrive nulla. Le variazioni vengono
+    accodate alla serie mensile dello SKU (una riga per SKU e mese) con
+    codifica delta + varint, in genere 2-4 byte per punto, scritte a blocchi
+    con un solo upsert. Ogni variazione viene notificata ai sottoscrittori
+    (repricing, alert).
+    """
+
+    def __init__(self, flush_threshold: int = 10_000):
+        """
+        Args:
+            flush_threshold: Punti in attesa oltre i quali `needs_flush` diventa True
+        """
+        self.flush_threshold = flush_threshold
+        self._last: Dict[str, _LastState] = {}
+        self._pending: Dict[Tuple[str, date], _Pending] = {}
+        self._pending_points = 0
+        self._subscribers: List[Subscriber] = []
+        self._task: Optional[asyncio.Task] = None
+
+        self.stats = {"observations": 0, "changes": 0, "flushed_points": 0}
+
+    def subscribe(self, subscriber: Subscriber) -> None:
+        """Registra una coroutine chiamata a ogni variazione."""
+        self._subscribers.append(subscriber)
+
+    @property
+    def needs_flush(self) -> bool:
+        return self._pending_points >= self.flush_threshold
+
+    async def load(self, conn: AsyncConnection) -> None:
+        """Carica l'ultimo stato noto di ogni SKU (all'avvio del processo)."""
+        async with conn.cursor(name="snapshot_last_states") as cursor:
+            await cursor.execute(LOAD_LAST_STATES)
+            async for sku, month, ts, price_cents, in_stock, hash_ in cursor:
+                self._last[sku] = _LastState(month, ts, price_cents, _STOCK_VALUES[in_stock], hash_)
+
+    def observe(
+        self,
+        sku: str,
+        price_cents: int,
+        in_stock: Optional[bool],
+        attributes: Optional[Dict[str, Any]] = None,
+        observed_at: Optional[int] = None,
+    ) -> Optional[PriceChangeEvent]:
+        """
+        Registra una rilevazione senza notificare i sottoscrittori.
+
+        Returns:
+            L'evento di variazione, oppure None se lo stato è invariato
+        """
+        self.stats["observations"] += 1
+        hash_ = state_hash(price_cents, in_stock, attributes)
+        last = self._last.get(sku)
+        if last is not None and last.hash == hash_:
+            return None
+
+        ts = observed_at if observed_at is not None else int(time.time())
+        month = month_start(ts)
+        if last is not None and last.month == month:
+            dt, d_price = max(ts - last.ts, 0), price_cents - last.price_cents
+        else:
+            # Nuovo mese: la serie riparte da inizio mese e da prezzo zero
+            dt, d_price = ts - _epoch(month), price_cents
+
+        pending = self._pending.get((sku, month))
+        if pending is None:
+            pending = self._pending[(sku, month)] = _Pending()
+        encode_point(pending.data, dt, d_price, in_stock)
+        pending.points += 1
+        self._pending_points += 1
+
+        self._last[sku] = _LastState(month, ts, price_cents, in_stock, hash_)
+        self.stats["changes"] += 1
+        return PriceChangeEvent(
+            sku, ts,
+            last.price_cents if last else None, price_cents,
+            last.in_stock if last else None, in_stock,
+        )
+
+    async def record(
+        self,
+        sku: str,
+        price_cents: int,
+        in_stock: Optional[bool],
+        attributes: Optional[Dict[str, Any]] = None,
+        observed_at: Optional[int] = None,
+    ) -> Optional[PriceChangeEvent]:
+        """Registra una rilevazione e, se lo stato è cambiato, notifica i sottoscrittori."""
+        event = self.observe(sku, price_cents, in_stock, attributes, observed_at)
+        if event is not None and self._subscribers:
+            results = await asyncio.gather(
+                *(subscriber(event) for subscriber in self._subscribers), return_exceptions=True,
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.error("Sottoscrittore fallito per %s: %r", sku, result)
+        return event
+
+    def drain(self) -> List[Tuple[str, date, int, int, int, int, int, bytes]]:
+        """Estrae i punti in attesa come righe per l'upsert dello storico."""
+        rows = []
+        for (sku, month), pending in self._pending.items():
+            last = self._last[sku]
+            # Se lo SKU è già passato al mese successivo, l'ultimo punto di questo mese è nel buffer
+            if last.month == month:
+                last_ts, last_price, last_stock, hash_ = last.ts, last.price_cents, last.in_stock, last.hash
+            else:
+                last_ts, last_price, last_stock = decode_series(month, bytes(pending.data))[-1]
+                hash_ = state_hash(last_price, last_stock)
+            rows.append((
+                sku, month, last_ts, last_price, _STOCK_CODES[last_stock],
+                hash_, pending.points, bytes(pending.data),
+            ))
+        self._pending = {}
+        self._pending_points = 0
+        return rows
+
+    async def flush(self, conn: AsyncConnection) -> int:
+        """
+        Scrive i punti in attesa con un unico upsert, in una transazione propria.
+
+        `drain` fa avanzare l'ultimo stato noto, quindi i punti tornano nei
+        buffer per qualunque errore fino al COMMIT compreso: un punto perso
+        renderebbe sbagliati tutti i delta successivi del mese. La connessione
+        non deve avere una transazione aperta (altrimenti il blocco diventa un
+        SAVEPOINT e il COMMIT resta al chiamante).
+
+        Returns:
+            Il numero di serie aggiornate
+        """
+        rows = self.drain()
+        if not rows:
+            return 0
+        try:
+            async with conn.transaction():
+                await conn.execute(UPSERT_HISTORY, [list(column) for column in zip(*rows)])
+        except BaseException:
+            self._restore(rows)
+            raise
+        self.stats["flushed_points"] += sum(row[6] for row in rows)
+        return len(rows)
+
+    def _restore(self, rows: List[Tuple[str, date, int, int, int, int, int, bytes]]) -> None:
+        # Scrittura fallita: i punti tornano in testa ai buffer, prima di quelli arrivati nel frattempo
+        for sku, month, _, _, _, _, points, data in rows:
+            pending = _Pending()
+            pending.data.extend(data)
+            pending.points = points
+            newer = self._pending.get((sku, month))
+            if newer is not None:
+                pending.data.extend(newer.data)
+                pending.points += newer.points
+            self._pending[(sku, month)] = pending
+            self._pending_points += points
+
+    async def run_flusher(self, interval: float) -> None:
+        """Scrive periodicamente (o al superamento della soglia) i punti in attesa."""
+        from app.db.session import db_router
+
+        while True:
+            waited = 0.0
+            while waited < interval and not self.needs_flush:
+                await asyncio.sleep(1.0)
+                waited += 1.0
+            try:
+                async with db_router.connection() as conn:
+                    await self.flush(conn)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Scrittura dello storico prezzi fallita, nuovo tentativo al prossimo giro")
+
+    def start(self, interval: float) -> None:
+        """Avvia la scrittura periodica in un task in background."""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run_flusher(interval))
+
+    async def close(self) -> None:
+        """Ferma la scrittura periodica e scrive i punti ancora in memoria."""
+        from app.db.session import db_router
+
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            async with db_router.connection() as conn:
+                await self.flush(conn)
+        except Exception:
+            logger.exception("Scrittura finale dello storico prezzi fallita: %d punti persi", self._pending_points)
+
+    async def history(self, conn: AsyncConnection, sku: str) -> List[Tuple[int, int, Optional[bool]]]:
+        """Storico completo di uno SKU, punti ancora in memoria inclusi."""
+        cursor = await conn.execute(
+            "SELECT month, data FROM product_price_history WHERE sku = %s ORDER BY month", (sku,),
+        )
+        buffers: Dict[date, bytearray] = {month: bytearray(data) for month, data in await cursor.fetchall()}
+        for (pending_sku, month), pending in self._pending.items():
+            if pending_sku == sku:
+                buffers.setdefault(month, bytearray()).extend(pending.data)
+        points: List[Tuple[int, int, Optional[bool]]] = []
+        for month in sorted(buffers):
+            points.extend(decode_series(month, bytes(buffers[month])))
+        return points
+
+    async def on_monitor_check(self, product, offer) -> None:
+        """Adattatore per `PriceMonitor(on_check=...)`: ogni rilevazione passa dalla change detection."""
+        await self.record(product.sku, int(offer.price * 100), offer.in_stock, {"currency": offer.currency})
+
+
+_store: Optional[SnapshotStore] = None
+
+
+def get_snapshot_store() -> SnapshotStore:
+    """Store condiviso dal processo di monitoraggio."""
+    global _store
+    if _store is None:
+        _store = SnapshotStore(flush_threshold=settings.SNAPSHOT_FLUSH_THRESHOLD)
+    return _store
+
+
+async def start_snapshot_store() -> SnapshotStore:
+    """Carica gli ultimi stati noti e avvia la scrittura ogni SNAPSHOT_FLUSH_INTERVAL secondi."""
+    from app.db.session import db_router
+
+    store = get_snapshot_store()
+    if store._task is None:
+        # Dal primario: una replica in ritardo darebbe un ultimo stato vecchio e delta sbagliati
+        async with db_router.connection() as conn:
+            await store.load(conn)
+        store.start(settings.SNAPSHOT_FLUSH_INTERVAL)
+    return store
+
+
+async def close_snapshot_store() -> None:
+    global _store
+    if _store is not None:
+        await _store.close()
+        _store = None
@@ -0,0 +1,372 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncContextManager, Callable, Dict, List, Optional, Tuple
+
+import stripe
+from psycopg import AsyncConnection
+
+from app.core.config import settings
+from app.core.errors import ServiceUnavailableError, ValidationError
+from app.services.entitlements import publish_entitlement_changes
+
+logger = logging.getLogger(__name__)
+
+ConnectionFactory = Callable[[], AsyncContextManager[AsyncConnection]]
+
+# Eventi già ricevuti (Stripe ritenta le consegne) vengono ignorati
+ENQUEUE_EVENT = """
+INSERT INTO stripe_events (id, type, created, payload)
+VALUES (%s, %s, %s, %s::jsonb)
+ON CONFLICT (id) DO NOTHING
+"""
+
+# SKIP LOCKED: più processi possono consumare la coda senza bloccarsi a vicenda
+CLAIM_EVENTS = """
+SELECT id, type, created, payload FROM stripe_events
+WHERE processed_at IS NULL AND available_at <= now()
+ORDER BY created, id
+LIMIT %s
+FOR UPDATE SKIP LOCKED
+"""
+
+# Un evento più vecchio di quello già applicato (consegne fuori ordine) non sovrascrive
+UPSERT_SUBSCRIPTIONS = """
+INSERT INTO stripe_subscriptions AS s (
+    id, customer_id, user_id, status, price_id, current_period_end, cancel_at_period_end, event_created
+)
+SELECT * FROM unnest(
+    %s::text[], %s::text[], %s::bigint[], %s::text[], %s::text[], %s::timestamptz[], %s::boolean[], %s::bigint[]
+)
+ON CONFLICT (id) DO UPDATE SET
+    customer_id = EXCLUDED.customer_id,
+    user_id = COALESCE(EXCLUDED.user_id, s.user_id),
+    status = EXCLUDED.status,
+    price_id = EXCLUDED.price_id,
+    current_period_end = EXCLUDED.current_period_end,
+    cancel_at_period_end = EXCLUDED.cancel_at_period_end,
+    event_created = EXCLUDED.event_created,
+    updated_at = now()
+WHERE s.event_created <= EXCLUDED.event_created
+"""
+
+MARK_PROCESSED = """
+UPDATE stripe_events AS e
+SET processed_at = now(), outcome = o.outcome, last_error = NULL
+FROM unnest(%s::text[], %s::text[]) AS o(id, outcome)
+WHERE e.id = o.id
+"""
+
+# Backoff esponenziale; oltre `max_attempts` l'evento resta in tabella come fallito
+MARK_FAILED = """
+UPDATE stripe_events
+SET attempts = attempts + 1,
+    last_error = %(error)s,
+    available_at = now() + make_interval(secs => %(backoff)s * power(2, attempts)),
+    processed_at = CASE WHEN attempts + 1 >= %(max_attempts)s THEN now() END,
+    outcome = CASE WHEN attempts + 1 >= %(max_attempts)s THEN 'failed' END
+WHERE id = %(id)s
+"""
+
+# Gli id vanno conservati più a lungo della finestra di ritentativi di Stripe (3 giorni)
+PRUNE_EVENTS = """
+DELETE FROM stripe_events
+WHERE processed_at < now() - make_interval(days => %s)
+"""
+
+SUBSCRIPTION_EVENTS = {
+    "customer.subscription.created": 0,
+    "customer.subscription.updated": 0,
+    "customer.subscription.paused": 0,
+    "customer.subscription.resumed": 0,
+    # A parità di timestamp la cancellazione prevale
+    "customer.subscription.deleted": 1,
+}
+
+
+def sign_payload(payload: bytes, secret: str, timestamp: Optional[int] = None) -> str:
+    """
+    Intestazione Stripe-Signature per un payload, come la calcola Stripe.
+
+    Serve a riprodurre eventi registrati in locale con un secret di prova.
+    """
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signed = f"{timestamp}.".encode() + payload
+    signature = hmac.new(secret.encode(), signed, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def verify_event(
+    payload: bytes,
+    signature: Optional[str],
+    secret: Optional[str] = None,
+    tolerance: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Verifica la firma di un webhook Stripe e ne decodifica l'evento.
+
+    Args:
+        payload: Corpo della richiesta, esattamente come ricevuto
+        signature: Intestazione Stripe-Signature
+        secret: Secret dell'endpoint (default: STRIPE_WEBHOOK_SECRET)
+        tolerance: Età massima della firma in secondi (default: STRIPE_WEBHOOK_TOLERANCE)
+
+    Returns:
+        L'evento decodificato
+
+    Raises:
+        ServiceUnavailableError: se il secret non è configurato
+        ValidationError: se la firma non è valida o l'evento è malformato
+    """
+    secret = secret or settings.STRIPE_WEBHOOK_SECRET
+    if not secret:
+        raise ServiceUnavailableError("Webhook Stripe non configurato")
+    try:
+        text = payload.decode("utf-8")
+        stripe.WebhookSignature.verify_header(
+            text, signature or "", secret,
+            settings.STRIPE_WEBHOOK_TOLERANCE if tolerance is None else tolerance,
+        )
+        event = json.loads(text)
+    except stripe.error.SignatureVerificationError as e:
+        raise ValidationError("Firma del webhook Stripe non valida", details={"reason": str(e)})
+    except ValueError:
+        raise ValidationError("Evento Stripe non decodificabile")
+    if not isinstance(event, dict) or not all(isinstance(event.get(k), t) for k, t in (("id", str), ("type", str), ("created", int))):
+        raise ValidationError("Evento Stripe malformato")
+    return event
+
+
+async def enqueue_event(conn: AsyncConnection, event: Dict[str, Any], payload: bytes) -> bool:
+    """
+    Accoda un evento verificato, salvando il payload originale.
+
+    Returns:
+        False se l'evento era già stato ricevuto
+    """
+    cursor = await conn.execute(ENQUEUE_EVENT, (event["id"], event["type"], event["created"], payload.decode("utf-8")))
+    return cursor.rowcount == 1
+
+
+def _timestamp(value: Optional[int]) -> Optional[datetime]:
+    return datetime.fromtimestamp(value, tz=timezone.utc) if value else None
+
+
+def subscription_row(event: Dict[str, Any]) -> Tuple:
+    """Riga di stripe_subscriptions dall'oggetto di un evento customer.subscription.*."""
+    obj = event["data"]["object"]
+    items = (obj.get("items") or {}).get("data") or []
+    price = (items[0].get("price") or {}) if items else {}
+    user_id = (obj.get("metadata") or {}).get("user_id")
+    customer = obj.get("customer")
+    return (
+        obj["id"],
+        customer["id"] if isinstance(customer, dict) else customer,
+        int(user_id) if user_id and str(user_id).isdigit() else None,
+        obj["status"],
+        price.get("id"),
+        _timestamp(obj.get("current_period_end")),
+        bool(obj.get("cancel_at_period_end")),
+        event["created"],
+    )
+
+
+def plan_batch(events: List[Tuple[str, str, int, Dict[str, Any]]]) -> Tuple[List[Tuple], Dict[str, str]]:
+    """
+    Riduce un lotto di eventi alle scritture necessarie.
+
+    Per ogni abbonamento conta solo l'evento più recente del lotto: gli altri
+    sono superati (es. created + tre updated in pochi secondi diventano una
+    sola scrittura). Gli eventi di tipi non gestiti vengono solo marcati.
+
+    Args:
+        events: Righe (id, type, created, payload) della coda
+
+    Returns:
+        Righe di stripe_subscriptions da scrivere e, per ogni evento, l'esito
+        ('applied', 'coalesced' o 'ignored')
+    """
+    latest: Dict[str, Tuple[Tuple[int, int], str, Dict[str, Any]]] = {}
+    outcomes: Dict[str, str] = {}
+    for event_id, event_type, created, payload in events:
+        if event_type not in SUBSCRIPTION_EVENTS:
+            outcomes[event_id] = "ignored"
+            continue
+        subscription_id = payload["data"]["object"]["id"]
+        key = (created, SUBSCRIPTION_EVENTS[event_type])
+        previous = latest.get(subscription_id)
+        if previous is not None and previous[0] > key:
+            outcomes[event_id] = "coalesced"
+            continue
+        if previous is not None:
+            outcomes[previous[1]] = "coalesced"
+        latest[subscription_id] = (key, event_id, payload)
+
+    rows = []
+    for _, event_id, payload in latest.values():
+        outcomes[event_id] = "applied"
+        rows.append(subscription_row(payload))
+    return rows, outcomes
+
+
+async def apply_events(conn: AsyncConnection, events: List[Tuple[str, str, int, Dict[str, Any]]]) -> Dict[str, str]:
+    """Applica un lotto di eventi e li marca come elaborati; restituisce gli esiti."""
+    rows, outcomes = plan_batch(events)
+    if rows:
+        columns = [list(column) for column in zip(*rows)]
+        await conn.execute(UPSERT_SUBSCRIPTIONS, columns)
+        # I worker aggiornano la cache dei piani al commit
+        await publish_entitlement_changes(conn, columns[0])
+    await conn.execute(MARK_PROCESSED, (list(outcomes), list(outcomes.values())))
+    return outcomes
+
+
+class StripeEventProcessor:
+    """
+    Elabora in background la coda dei webhook Stripe.
+
+    L'endpoint si limita a verificare la firma e ad accodare l'evento; qui gli
+    eventi vengono presi a lotti, ridotti (vedi plan_batch) e applicati con
+    poche query set-based. Se un lotto fallisce, i suoi eventi vengono
+    riprovati uno per uno, così un evento malformato non blocca gli altri.
+    """
+
+    def __init__(
+        self,
+        connection: Optional[ConnectionFactory] = None,
+        batch_size: int = 500,
+        poll_interval: float = 1.0,
+        max_attempts: int = 10,
+        retry_backoff: float = 5.0,
+        retention_days: int = 30,
+    ):
+        """
+        Args:
+            connection: Factory delle connessioni (default: primario del db_router)
+            batch_size: Eventi presi in carico per volta
+            poll_interval: Secondi massimi di attesa tra due controlli della coda
+            max_attempts: Tentativi prima di marcare un evento come fallito
+            retry_backoff: Attesa (secondi) prima del primo nuovo tentativo, poi raddoppia
+            retention_days: Giorni di conservazione degli eventi elaborati
+        """
+        if connection is None:
+            from app.db.session import db_router
+            connection = db_router.connection
+        self._connection = connection
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.retention_days = retention_days
+
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.stats = {"batches": 0, "applied": 0, "coalesced": 0, "ignored": 0, "failed": 0}
+
+    def notify(self) -> None:
+        """Segnala che ci sono nuovi eventi in coda (evita di attendere il polling)."""
+        self._wakeup.set()
+
+    def _count(self, outcomes: Dict[str, str]) -> None:
+        for outcome in outcomes.values():
+            self.stats[outcome] += 1
+
+    async def process_batch(self) -> int:
+        """Elabora un lotto di eventi pronti; restituisce quanti ne ha presi in carico."""
+        async with self._connection() as conn:
+            cursor = await conn.execute(CLAIM_EVENTS, (self.batch_size,))
+            events = await cursor.fetchall()
+            if not events:
+                return 0
+            self.stats["batches"] += 1
+            try:
+                async with conn.transaction():
+                    self._count(await apply_events(conn, events))
+                return len(events)
+            except Exception:
+                logger.exception("Lotto di %d eventi Stripe fallito, riprovo evento per evento", len(events))
+
+            for event in events:
+                try:
+                    async with conn.transaction():
+                        self._count(await apply_events(conn, [event]))
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    logger.warning("Evento Stripe %s (%s) non elaborato: %s", event[0], event[1], e)
+                    await conn.execute(MARK_FAILED, {
+                        "id": event[0], "error": str(e)[:1000],
+                        "backoff": self.retry_backoff, "max_attempts": self.max_attempts,
+                    })
+        return len(events)
+
+    async def drain(self) -> int:
+        """Elabora lotti finché la coda non ha più eventi pronti; restituisce il totale."""
+        total = 0
+        while True:
+            count = await self.process_batch()
+            total += count
+            if count < self.batch_size:
+                return total
+
+    async def prune(self) -> None:
+        """Elimina gli eventi elaborati più vecchi del periodo di conservazione."""
+        async with self._connection() as conn:
+            await conn.execute(PRUNE_EVENTS, (self.retention_days,))
+
+    async def run(self) -> None:
+        """Ciclo di elaborazione: svuota la coda, poi attende una notifica o il polling."""
+        last_prune = 0.0
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.drain()
+                if time.monotonic() - last_prune > 3600:
+                    await self.prune()
+                    last_prune = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Elaborazione degli eventi Stripe fallita, nuovo tentativo al prossimo giro")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+_processor: Optional[StripeEventProcessor] = None
+
+
+def get_stripe_processor() -> StripeEventProcessor:
+    """Processore degli eventi Stripe del processo."""
+    global _processor
+    if _processor is None:
+        _processor = StripeEventProcessor(
+            batch_size=settings.STRIPE_EVENTS_BATCH_SIZE,
+            poll_interval=settings.STRIPE_EVENTS_POLL_INTERVAL,
+            max_attempts=settings.STRIPE_EVENTS_MAX_ATTEMPTS,
+            retry_backoff=settings.STRIPE_EVENTS_RETRY_BACKOFF,
+            retention_days=settings.STRIPE_EVENTS_RETENTION_DAYS,
+        )
+    return _processor
+
+
+async def close_stripe_processor() -> None:
+    global _processor
+    if _processor is not None:
+        await _processor.close()
+        _processor = None
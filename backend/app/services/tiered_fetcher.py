@@ -0,0 +1,330 @@
+import json
+import logging
+import re
+from enum import Enum
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+from urllib.parse import urlsplit
+
+from app.core.config import settings
+from app.services.marketplace import MarketplaceClient, get_marketplace_client, to_price
+from app.utils.selenium_manager import BrowserPool, get_browser_pool
+
+logger = logging.getLogger(__name__)
+
+# Header da browser: alcune pagine prodotto rispondono diversamente ai client "nudi"
+BROWSER_LIKE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "it-IT,it;q=0.9,en;q=0.8",
+}
+
+# Stati per cui la pagina non esiste: il browser non cambierebbe l'esito
+NOT_FOUND_STATUSES = frozenset({404, 410})
+
+_JSON_LD = re.compile(r'<script[^>]+type=["\']application/ld\+json["\'][^>]*>(.*?)</script>', re.S | re.I)
+_META = re.compile(r'<meta\s+[^>]*>', re.I)
+_ATTR = re.compile(r'([\w:-]+)\s*=\s*["\']([^"\']*)["\']')
+_BODY_TEXT = re.compile(r"<(script|style)[^>]*>.*?</\1>|<[^>]+>", re.S | re.I)
+# Tutto ciò che in un prezzo non è cifra o separatore (valuta, spazi, ...)
+_NOT_PRICE_CHARS = re.compile(r"[^\d.,]")
+_SEPARATORS = re.compile(r"[.,]")
+
+# Indizi di una pagina che costruisce il contenuto in JavaScript
+_JS_SHELL_MARKERS = (
+    'id="__next"', 'id="root"></div>', 'id="app"></div>', "enable javascript", "abilita javascript",
+)
+
+
+class Offer:
+    """Prezzo e disponibilità letti da una pagina prodotto."""
+
+    def __init__(self, price: Decimal, in_stock: Optional[bool] = None, currency: Optional[str] = None):
+        self.price = price
+        self.in_stock = in_stock
+        self.currency = currency
+
+
+def parse_price(value: Any) -> Optional[Decimal]:
+    """
+    Interpreta prezzi come 29.99, "29,99", "1.299,00", "1,299.00" o "€ 12,50".
+
+    Il separatore decimale è l'ultimo tra "." e ",", tranne quando compare
+    una sola volta, senza l'altro, seguito da esattamente tre cifre ("1,299",
+    "1.299"): allora separa le migliaia. Simboli di valuta e spazi vengono
+    ignorati; i gruppi delle migliaia devono essere di tre cifre, altrimenti
+    il prezzo non è valido (None).
+    """
+    if not isinstance(value, str):
+        return to_price(value)
+    text = _NOT_PRICE_CHARS.sub("", value)
+    last = max(text.rfind("."), text.rfind(","))
+    integer, fraction = text, ""
+    if last >= 0:
+        separator = text[last]
+        other = "," if separator == "." else "."
+        fraction_digits = text[last + 1:]
+        # "0,299" resta decimale: le migliaia non iniziano con zero
+        thousands = other not in text and len(fraction_digits) == 3 and text[:last].strip("0") != ""
+        if text.count(separator) == 1 and not thousands:
+            integer, fraction = text[:last], fraction_digits
+    if "." in integer and "," in integer:
+        return None
+    groups = _SEPARATORS.split(integer)
+    if not all(len(group) == 3 for group in groups[1:]) or (not groups[0] and len(groups) > 1):
+        return None
+    integer = "".join(groups) or ("0" if fraction else "")
+    if not integer:
+        return None
+    return to_price(f"{integer}.{fraction}" if fraction else integer)
+
+
+def _iter_json_ld(html: str) -> Iterator[Dict[str, Any]]:
+    for block in _JSON_LD.findall(html):
+        try:
+            data = json.loads(block)
+        except ValueError:
+            continue
+        stack = [data]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, list):
+                stack.extend(node)
+            elif isinstance(node, dict):
+                yield node
+                stack.extend(v for v in node.values() if isinstance(v, (dict, list)))
+
+
+def extract_offer(html: str) -> Optional[Offer]:
+    """
+    Estrae prezzo e disponibilità dall'HTML statico.
+
+    Usa i dati strutturati schema.org (JSON-LD) e, in mancanza, i meta tag
+    Open Graph / microdata `price`.
+    """
+    for node in _iter_json_ld(html):
+        if node.get("@type") not in ("Offer", "AggregateOffer"):
+            continue
+        price = parse_price(node.get("price", node.get("lowPrice")))
+        if price is None:
+            continue
+        availability = str(node.get("availability", ""))
+        in_stock = None
+        if availability:
+            in_stock = availability.rsplit("/", 1)[-1] in ("InStock", "LimitedAvailability", "OnlineOnly")
+        return Offer(price, in_stock, node.get("priceCurrency"))
+
+    metas: Dict[str, str] = {}
+    for tag in _META.findall(html):
+        attrs = dict(_ATTR.findall(tag))
+        key = attrs.get("property") or attrs.get("itemprop") or attrs.get("name")
+        if key and "content" in attrs:
+            metas[key.lower()] = attrs["content"]
+
+    price = parse_price(metas.get("product:price:amount") or metas.get("og:price:amount") or metas.get("price"))
+    if price is None:
+        return None
+    availability = metas.get("product:availability") or metas.get("availability")
+    in_stock = None
+    if availability:
+        in_stock = availability.lower().replace(" ", "").rsplit("/", 1)[-1] in ("instock", "in_stock")
+    return Offer(price, in_stock, metas.get("product:price:currency") or metas.get("pricecurrency"))
+
+
+def looks_js_rendered(html: str) -> bool:
+    """Indica se l'HTML è un guscio vuoto da riempire in JavaScript."""
+    lowered = html.lower()
+    if any(marker in lowered for marker in _JS_SHELL_MARKERS):
+        return True
+    return len(" ".join(_BODY_TEXT.sub(" ", html).split())) < 200
+
+
+class Tier(str, Enum):
+    """Livelli di fetch, dal più economico al più costoso."""
+    HTTP = "http"
+    BROWSER = "browser"
+
+
+class TierStats:
+    """Esiti di un livello per un dominio."""
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.attempts = 0
+        self.successes = 0
+        # Media mobile esponenziale: pesa di più gli esiti recenti
+        self.recent_rate = 1.0
+
+    def record(self, ok: bool) -> None:
+        self.attempts += 1
+        self.successes += ok
+        self.recent_rate = self.alpha * ok + (1 - self.alpha) * self.recent_rate
+
+    @property
+    def success_rate(self) -> float:
+        return self.successes / self.attempts if self.attempts else 0.0
+
+
+class DomainProfile:
+    """Quello che il fetcher ha imparato su un dominio."""
+
+    def __init__(self, alpha: float):
+        self.requests = 0
+        self.js_hint = False
+        self.tiers = {tier: TierStats(alpha) for tier in Tier}
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "js_hint": self.js_hint,
+            "tiers": {
+                tier.value: {
+                    "attempts": stats.attempts,
+                    "success_rate": round(stats.success_rate, 3),
+                    "recent_rate": round(stats.recent_rate, 3),
+                }
+                for tier, stats in self.tiers.items()
+            },
+        }
+
+
+class FetchOutcome:
+    """Esito di un fetch a livelli."""
+
+    def __init__(
+        self,
+        url: str,
+        tier: Tier,
+        offer: Optional[Offer],
+        html: Optional[str] = None,
+        status_code: Optional[int] = None,
+    ):
+        self.url = url
+        self.tier = tier
+        self.offer = offer
+        self.html = html
+        self.status_code = status_code
+
+    @property
+    def ok(self) -> bool:
+        return self.offer is not None
+
+
+class TieredFetcher:
+    """
+    Legge prezzo e disponibilità provando prima HTTP semplice, poi il browser.
+
+    Per ogni dominio tiene il tasso di successo di ciascun livello: quando
+    l'HTTP fallisce con costanza (o la pagina risulta un guscio JavaScript) il
+    dominio passa direttamente al browser, ma una richiesta ogni
+    `explore_every` riprova l'HTTP, così i domini tornano al livello più
+    economico se il sito cambia.
+    """
+
+    def __init__(
+        self,
+        client: Optional[MarketplaceClient] = None,
+        browser_pool: Optional[Callable[[], Awaitable[BrowserPool]]] = None,
+        extractor: Callable[[str], Optional[Offer]] = extract_offer,
+        min_samples: int = 5,
+        http_threshold: float = 0.5,
+        explore_every: int = 50,
+        alpha: float = 0.2,
+    ):
+        """
+        Args:
+            client: Client HTTP condiviso (default: quello dei marketplace)
+            browser_pool: Coroutine che restituisce il pool di browser
+            extractor: Funzione che estrae l'offerta dall'HTML
+            min_samples: Tentativi HTTP prima di poter abbandonare il livello
+            http_threshold: Tasso di successo recente sotto cui l'HTTP viene saltato
+            explore_every: Ogni quante richieste riprovare l'HTTP su un dominio "JS"
+            alpha: Peso degli esiti recenti nella media mobile
+        """
+        self._client = client
+        self._browser_pool = browser_pool or get_browser_pool
+        self.extractor = extractor
+        self.min_samples = min_samples
+        self.http_threshold = http_threshold
+        self.explore_every = explore_every
+        self.alpha = alpha
+        self._profiles: Dict[str, DomainProfile] = {}
+
+    @property
+    def client(self) -> MarketplaceClient:
+        return self._client or get_marketplace_client()
+
+    def profile(self, domain: str) -> DomainProfile:
+        profile = self._profiles.get(domain)
+        if profile is None:
+            profile = self._profiles[domain] = DomainProfile(self.alpha)
+        return profile
+
+    def should_try_http(self, profile: DomainProfile) -> bool:
+        """Decide se partire dal livello HTTP per il dominio."""
+        if profile.requests % self.explore_every == 0:
+            return True
+        if profile.js_hint:
+            return False
+        http = profile.tiers[Tier.HTTP]
+        return http.attempts < self.min_samples or http.recent_rate >= self.http_threshold
+
+    async def _fetch_http(self, url: str) -> FetchOutcome:
+        try:
+            result = await self.client.get(url, headers=BROWSER_LIKE_HEADERS)
+        except Exception as e:
+            logger.debug("HTTP fallito per %s: %s", url, e)
+            return FetchOutcome(url, Tier.HTTP, None)
+        if result.status_code != 200:
+            return FetchOutcome(url, Tier.HTTP, None, status_code=result.status_code)
+        html = result.content.decode("utf-8", errors="replace")
+        return FetchOutcome(url, Tier.HTTP, self.extractor(html), html, result.status_code)
+
+    async def _fetch_browser(self, url: str) -> FetchOutcome:
+        try:
+            pool = await self._browser_pool()
+            html = await pool.fetch_html(url)
+        except Exception as e:
+            logger.debug("Browser fallito per %s: %s", url, e)
+            return FetchOutcome(url, Tier.BROWSER, None)
+        return FetchOutcome(url, Tier.BROWSER, self.extractor(html), html)
+
+    async def fetch(self, url: str) -> FetchOutcome:
+        """Legge l'offerta di una pagina prodotto dal livello più economico che funziona."""
+        profile = self.profile(urlsplit(url).hostname or "")
+        profile.requests += 1
+
+        if self.should_try_http(profile):
+            outcome = await self._fetch_http(url)
+            if outcome.status_code in NOT_FOUND_STATUSES:
+                # Pagina inesistente: il browser non cambierebbe l'esito
+                return outcome
+            profile.tiers[Tier.HTTP].record(outcome.ok)
+            if outcome.ok:
+                profile.js_hint = False
+                return outcome
+            if outcome.html and looks_js_rendered(outcome.html):
+                profile.js_hint = True
+
+        outcome = await self._fetch_browser(url)
+        profile.tiers[Tier.BROWSER].record(outcome.ok)
+        return outcome
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Statistiche per dominio e livello, per monitoraggio e debug."""
+        return {domain: profile.as_dict() for domain, profile in self._profiles.items()}
+
+
+_fetcher: Optional[TieredFetcher] = None
+
+
+def get_tiered_fetcher() -> TieredFetcher:
+    """Fetcher condiviso, così i domini imparano dalla cronologia di tutto il processo."""
+    global _fetcher
+    if _fetcher is None:
+        _fetcher = TieredFetcher(
+            min_samples=settings.SCRAPER_MIN_SAMPLES,
+            http_threshold=settings.SCRAPER_HTTP_THRESHOLD,
+            explore_every=settings.SCRAPER_EXPLORE_EVERY,
+        )
+    return _fetcher
@@ -0,0 +1,35 @@
+from typing import Optional
+
+from psycopg import AsyncConnection
+
+# Un solo round trip anche al primo login; il DO UPDATE (e non DO NOTHING) fa
+# restituire l'id anche agli utenti già registrati e tiene aggiornata l'email
+UPSERT_FIREBASE_USER = """
+INSERT INTO users (firebase_uid, email)
+VALUES (%(uid)s, %(email)s)
+ON CONFLICT (firebase_uid) DO UPDATE SET
+    email = COALESCE(EXCLUDED.email, users.email),
+    last_login_at = now()
+RETURNING id
+"""
+
+
+async def resolve_firebase_user(conn: AsyncConnection, firebase_uid: str, email: Optional[str] = None) -> int:
+    """
+    Id interno dell'utente Firebase, registrandolo al primo login.
+
+    L'id numerico è quello di tutte le colonne user_id (ordini, analytics,
+    abbonamenti Stripe via metadata.user_id), quindi è anche il `sub` dei
+    token di sessione.
+
+    Args:
+        conn: Connessione al database (primario)
+        firebase_uid: uid Firebase (claim `sub` dell'ID token)
+        email: Email verificata dal token, se presente
+
+    Returns:
+        L'id dell'utente
+    """
+    cursor = await conn.execute(UPSERT_FIREBASE_USER, {"uid": firebase_uid, "email": email})
+    (user_id,) = await cursor.fetchone()
+    return user_id
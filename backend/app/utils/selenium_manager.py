@@ -0,0 +1,292 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, TypeVar
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from app.core.config import settings
+from app.core.errors import ServiceUnavailableError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Estensioni bloccate per tipo di risorsa (Network.setBlockedURLs di Chrome)
+BLOCKED_RESOURCE_EXTENSIONS: Dict[str, List[str]] = {
+    "image": ["png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico"],
+    "font": ["woff", "woff2", "ttf", "otf", "eot"],
+    "stylesheet": ["css"],
+    "media": ["mp4", "webm", "mp3", "ogg"],
+}
+
+DriverFactory = Callable[[], WebDriver]
+
+
+def blocked_url_patterns(resource_types: Iterable[str]) -> List[str]:
+    """
+    Pattern da bloccare per i tipi di risorsa indicati.
+
+    Per ogni estensione ci sono due pattern: l'URL che finisce con
+    l'estensione e quello con una query string (es. `style.css?v=3`, gli
+    asset delle CDN con cache busting).
+    """
+    patterns: List[str] = []
+    for resource_type in resource_types:
+        for extension in BLOCKED_RESOURCE_EXTENSIONS.get(resource_type, []):
+            patterns.extend((f"*.{extension}", f"*.{extension}?*"))
+    return patterns
+
+
+def build_chrome_options(headless: bool = True, block_resources: Iterable[str] = ()) -> webdriver.ChromeOptions:
+    """Opzioni di Chrome per lo scraping: headless, senza estensioni, caricamento 'eager'."""
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument("--headless=new")
+    for argument in ("--no-sandbox", "--disable-dev-shm-usage", "--disable-gpu", "--disable-extensions"):
+        options.add_argument(argument)
+    if "image" in block_resources:
+        options.add_argument("--blink-settings=imagesEnabled=false")
+    # Non attende immagini e fogli di stile: il DOM basta per leggere prezzo e disponibilità
+    options.page_load_strategy = "eager"
+    return options
+
+
+def chrome_driver_factory(
+    headless: bool = True,
+    block_resources: Iterable[str] = (),
+    page_load_timeout: float = 20.0,
+) -> DriverFactory:
+    """Factory di driver Chrome con il blocco delle risorse già attivo."""
+    block_resources = list(block_resources)
+
+    def factory() -> WebDriver:
+        driver = webdriver.Chrome(options=build_chrome_options(headless, block_resources))
+        driver.set_page_load_timeout(page_load_timeout)
+        patterns = blocked_url_patterns(block_resources)
+        if patterns:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        return driver
+
+    return factory
+
+
+class PooledDriver:
+    """Driver del pool con il numero di pagine già servite."""
+
+    def __init__(self, driver: WebDriver):
+        self.driver = driver
+        self.uses = 0
+        self.created_at = time.monotonic()
+
+
+class BrowserPool:
+    """
+    Pool di browser headless riutilizzabili.
+
+    Mantiene `size` driver sempre avviati: le richieste attendono in coda un
+    driver libero (con timeout), ogni driver viene riciclato dopo `max_uses`
+    pagine e sostituito se il processo del browser risulta morto. Le chiamate
+    Selenium, bloccanti, girano su un executor dedicato.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_uses: int = 50,
+        acquire_timeout: float = 30.0,
+        driver_factory: Optional[DriverFactory] = None,
+    ):
+        """
+        Inizializza il pool (i browser partono con `start`).
+
+        Args:
+            size: Numero di browser sempre attivi
+            max_uses: Pagine servite da un browser prima di riavviarlo
+            acquire_timeout: Attesa massima in coda per un browser libero
+            driver_factory: Funzione che crea un driver (default: Chrome dalle impostazioni)
+        """
+        self.size = size
+        self.max_uses = max_uses
+        self.acquire_timeout = acquire_timeout
+        self._factory = driver_factory or chrome_driver_factory(
+            headless=settings.SELENIUM_HEADLESS,
+            block_resources=settings.SELENIUM_BLOCK_RESOURCES,
+            page_load_timeout=settings.SELENIUM_PAGE_LOAD_TIMEOUT,
+        )
+        # Un thread per browser più uno per avvii e riavvii
+        self._executor = ThreadPoolExecutor(max_workers=size + 1, thread_name_prefix="browser")
+        self._idle: "asyncio.Queue[PooledDriver]" = asyncio.Queue()
+        self._closed = False
+        self._tasks: List[asyncio.Future] = []
+
+        self.stats = {"launched": 0, "recycled": 0, "crashed": 0, "served": 0}
+
+    async def _call(self, fn: Callable[..., T], *args) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def _launch(self) -> PooledDriver:
+        driver = await self._call(self._factory)
+        self.stats["launched"] += 1
+        return PooledDriver(driver)
+
+    async def _launch_into_pool(self) -> None:
+        """Avvia un browser e lo mette in coda, ritentando con backoff se l'avvio fallisce."""
+        delay = 1.0
+        while not self._closed:
+            try:
+                pooled = await self._launch()
+            except Exception as e:
+                logger.error("Avvio del browser fallito, nuovo tentativo tra %.0fs: %s", delay, e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60.0)
+                continue
+            if self._closed:
+                await self._call(self._quit, pooled)
+            else:
+                self._idle.put_nowait(pooled)
+            return
+
+    @staticmethod
+    def _quit(pooled: PooledDriver) -> None:
+        try:
+            pooled.driver.quit()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_alive(pooled: PooledDriver) -> bool:
+        try:
+            pooled.driver.execute_script("return 1")
+            return True
+        except WebDriverException:
+            return False
+
+    @staticmethod
+    def _reset(pooled: PooledDriver) -> bool:
+        """Svuota la pagina corrente; restituisce False se il browser non risponde."""
+        try:
+            pooled.driver.delete_all_cookies()
+            pooled.driver.get("about:blank")
+            return True
+        except WebDriverException:
+            return False
+
+    async def start(self) -> None:
+        """
+        Avvia tutti i browser del pool in parallelo.
+
+        Se un avvio non riesce, i browser già avviati vengono chiusi e
+        l'errore viene rilanciato.
+        """
+        results = await asyncio.gather(*(self._launch() for _ in range(self.size)), return_exceptions=True)
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            for pooled in results:
+                if isinstance(pooled, PooledDriver):
+                    await self._call(self._quit, pooled)
+            raise errors[0]
+        for pooled in results:
+            self._idle.put_nowait(pooled)
+
+    async def close(self) -> None:
+        """Chiude tutti i browser, anche quelli in fase di riavvio."""
+        self._closed = True
+        for task in self._tasks:
+            task.cancel()
+        while not self._idle.empty():
+            await self._call(self._quit, self._idle.get_nowait())
+        self._executor.shutdown(wait=False)
+
+    async def _release(self, pooled: PooledDriver, failed: bool) -> None:
+        pooled.uses += 1
+        self.stats["served"] += 1
+
+        if self._closed:
+            # L'executor è già chiuso: chiusura diretta del browser
+            self._quit(pooled)
+            return
+
+        if failed and not await self._call(self._is_alive, pooled):
+            self.stats["crashed"] += 1
+            logger.warning("Browser non più raggiungibile dopo %d pagine: sostituito", pooled.uses)
+        elif pooled.uses >= self.max_uses:
+            self.stats["recycled"] += 1
+        elif await self._call(self._reset, pooled):
+            self._idle.put_nowait(pooled)
+            return
+        else:
+            self.stats["crashed"] += 1
+
+        await self._call(self._quit, pooled)
+        self._tasks = [task for task in self._tasks if not task.done()]
+        self._tasks.append(asyncio.ensure_future(self._launch_into_pool()))
+
+    async def run(self, fn: Callable[[WebDriver], T], timeout: Optional[float] = None) -> T:
+        """
+        Esegue `fn(driver)` su un browser del pool.
+
+        Args:
+            fn: Funzione sincrona che usa il driver
+            timeout: Attesa massima in coda (default: acquire_timeout)
+
+        Raises:
+            ServiceUnavailableError: se nessun browser si libera entro il timeout
+        """
+        try:
+            pooled = await asyncio.wait_for(self._idle.get(), timeout or self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise ServiceUnavailableError(detail="Nessun browser disponibile per lo scraping. Riprova più tardi.")
+
+        future = asyncio.get_running_loop().run_in_executor(self._executor, fn, pooled.driver)
+        try:
+            result = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # Il thread sta ancora usando il driver: lo si rilascia solo quando ha finito
+            future.add_done_callback(
+                lambda f: asyncio.ensure_future(self._release(pooled, f.cancelled() or f.exception() is not None))
+            )
+            raise
+        except Exception:
+            await self._release(pooled, failed=True)
+            raise
+        await self._release(pooled, failed=False)
+        return result
+
+    async def fetch_html(self, url: str, timeout: Optional[float] = None) -> str:
+        """Carica `url` in un browser del pool e restituisce l'HTML renderizzato."""
+        def load(driver: WebDriver) -> str:
+            driver.get(url)
+            return driver.page_source
+
+        return await self.run(load, timeout)
+
+
+_pool: Optional[BrowserPool] = None
+_pool_lock = asyncio.Lock()
+
+
+async def get_browser_pool() -> BrowserPool:
+    """Pool condiviso, avviato al primo utilizzo con le impostazioni correnti."""
+    global _pool
+    async with _pool_lock:
+        if _pool is None:
+            pool = BrowserPool(
+                size=settings.SELENIUM_POOL_SIZE,
+                max_uses=settings.SELENIUM_MAX_USES,
+                acquire_timeout=settings.SELENIUM_ACQUIRE_TIMEOUT,
+            )
+            await pool.start()
+            _pool = pool
+    return _pool
+
+
+async def close_browser_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
@@ -0,0 +1,140 @@
+"""
+Benchmark della latenza del dashboard analytics (app.services.analytics).
+
+Popola un database PostgreSQL di prova con ordini sintetici (default 10M
+righe d'ordine su un anno), costruisce i rollup e confronta per le query del
+dashboard (totali, serie giornaliera, top prodotti, top categorie):
+  - raw:    aggregazione diretta su orders/order_items
+  - rollup: query sui rollup, cache disattivata
+  - cache:  query sui rollup con la cache di processo
+
+Richiede un database vuoto dedicato (le tabelle vengono create se mancano).
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_analytics --dsn postgresql://localhost/bench --items 10000000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import date, timedelta
+from typing import Awaitable, Callable, List
+
+from psycopg import AsyncConnection
+
+from app.db.schema import create_schema
+from app.services import analytics
+
+POPULATE = [
+    """
+    INSERT INTO products (sku, name, price, stock, category_id, supplier_cost)
+    SELECT 'bench:' || g, 'Prodotto ' || g, 10 + (g %% 190), 100, g %% 40, 6 + (g %% 120)
+    FROM generate_series(1, %(products)s) AS g
+    """,
+    """
+    INSERT INTO orders (user_id, status, shipping_address, created_at)
+    SELECT 1 + (g * 7919) %% %(users)s,
+           (ARRAY['pending', 'processing', 'shipped', 'delivered', 'delivered', 'cancelled'])[1 + g %% 6],
+           'Via di prova ' || g,
+           %(start)s::timestamptz + (g::float / %(orders)s) * (%(days)s * interval '1 day')
+    FROM generate_series(1, %(orders)s) AS g
+    """,
+    """
+    INSERT INTO order_items (order_id, product_id, quantity, unit_price, unit_cost)
+    SELECT o.id, p.id, 1 + (o.id + k) %% 3, p.price, p.supplier_cost
+    FROM orders o
+    CROSS JOIN generate_series(1, %(per_order)s) AS k
+    JOIN products p ON p.sku = 'bench:' || (1 + (o.id * 31 + k * 7717) %% %(products)s)
+    """,
+    "ANALYZE",
+]
+
+RAW_OVERVIEW = """
+SELECT count(DISTINCT o.id), sum(i.unit_price * i.quantity), sum(COALESCE(i.unit_cost, 0) * i.quantity)
+FROM orders o JOIN order_items i ON i.order_id = o.id
+WHERE o.status = ANY(%s) AND o.created_at >= %s AND o.created_at < %s
+"""
+
+RAW_SERIES = """
+SELECT (o.created_at AT TIME ZONE 'UTC')::date, count(DISTINCT o.id), sum(i.unit_price * i.quantity)
+FROM orders o JOIN order_items i ON i.order_id = o.id
+WHERE o.status = ANY(%s) AND o.created_at >= %s AND o.created_at < %s
+GROUP BY 1 ORDER BY 1
+"""
+
+RAW_TOP_PRODUCTS = """
+SELECT i.product_id, sum(i.unit_price * i.quantity) AS revenue
+FROM orders o JOIN order_items i ON i.order_id = o.id
+WHERE o.status = ANY(%s) AND o.created_at >= %s AND o.created_at < %s
+GROUP BY i.product_id ORDER BY revenue DESC LIMIT 5
+"""
+
+
+async def timed(label: str, fn: Callable[[], Awaitable[object]], repeat: int) -> None:
+    latencies: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await fn()
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    print(f"  {label:<7} p50={statistics.median(latencies):9.2f}ms max={latencies[-1]:9.2f}ms")
+
+
+async def run(dsn: str, items: int, per_order: int, products: int, users: int, days: int, repeat: int) -> None:
+    end = date.today()
+    start = end - timedelta(days=days)
+    async with await AsyncConnection.connect(dsn, autocommit=True) as conn:
+        await create_schema(conn)
+        cursor = await conn.execute("SELECT count(*) FROM order_items")
+        if (await cursor.fetchone())[0] == 0:
+            params = {
+                "products": products, "users": users, "orders": items // per_order,
+                "per_order": per_order, "days": days, "start": start,
+            }
+            started = time.perf_counter()
+            for statement in POPULATE:
+                await conn.execute(statement, params)
+            print(f"dati generati in {time.perf_counter() - started:.0f}s")
+
+        started = time.perf_counter()
+        await analytics.rebuild_rollups(conn, start, end)
+        print(f"rollup ricostruiti in {time.perf_counter() - started:.1f}s")
+
+        statuses = [s.value for s in analytics.COUNTED_STATUSES]
+        for window in (30, days):
+            date_from = end - timedelta(days=window)
+            raw_params = (statuses, date_from, end + timedelta(days=1))
+            print(f"intervallo di {window} giorni:")
+            for name, raw_sql, call in (
+                ("totali", RAW_OVERVIEW, lambda: analytics.get_overview(conn, date_from, end)),
+                ("serie", RAW_SERIES, lambda: analytics.get_revenue_series(conn, date_from, end)),
+                ("top prodotti", RAW_TOP_PRODUCTS, lambda: analytics.get_top_products(conn, date_from, end)),
+                ("top categorie", None, lambda: analytics.get_top_categories(conn, date_from, end)),
+            ):
+                print(f" {name}")
+                if raw_sql is not None:
+                    await timed("raw", lambda: conn.execute(raw_sql, raw_params), max(1, repeat // 10))
+
+                async def uncached():
+                    analytics.cache.clear()
+                    return await call()
+
+                await timed("rollup", uncached, repeat)
+                await timed("cache", call, repeat)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", required=True)
+    parser.add_argument("--items", type=int, default=10_000_000)
+    parser.add_argument("--items-per-order", type=int, default=3)
+    parser.add_argument("--products", type=int, default=50_000)
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.dsn, args.items, args.items_per_order, args.products, args.users, args.days, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
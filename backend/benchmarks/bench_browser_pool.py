@@ -0,0 +1,131 @@
+"""
+Benchmark di throughput del pool di browser (app.utils.selenium_manager).
+
+Avvia un sito statico locale con pagine prodotto che caricano immagini, font e
+CSS, poi confronta:
+  - cold:  un Chrome nuovo per ogni pagina (comportamento senza pool)
+  - pool:  pool di browser riutilizzati, nessuna risorsa bloccata
+  - block: pool di browser riutilizzati con immagini/font/CSS bloccati
+
+Richiede Chrome e chromedriver installati.
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_browser_pool --pages 200 --size 4
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+from app.utils.selenium_manager import BrowserPool, chrome_driver_factory
+
+PRODUCT_PAGE = """<!doctype html>
+<html><head>
+<link rel="stylesheet" href="/static/style.css">
+<style>@font-face {{ font-family: shop; src: url(/static/font.woff2); }}</style>
+</head><body>
+<h1 class="title">Prodotto {i}</h1>
+<span class="price">{price}</span>
+<span class="stock">Disponibile</span>
+{images}
+</body></html>
+"""
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def build_site(root: str, pages: int, images_per_page: int = 8) -> None:
+    """Genera le pagine e gli asset del sito di prova."""
+    static = os.path.join(root, "static")
+    os.makedirs(static, exist_ok=True)
+    with open(os.path.join(static, "style.css"), "w") as f:
+        f.write("body { font-family: shop; }\n" * 2000)
+    with open(os.path.join(static, "font.woff2"), "wb") as f:
+        f.write(os.urandom(120_000))
+    for n in range(images_per_page):
+        with open(os.path.join(static, f"img{n}.jpg"), "wb") as f:
+            f.write(os.urandom(200_000))
+
+    images = "".join(f'<img src="/static/img{n}.jpg?v={{i}}">' for n in range(images_per_page))
+    for i in range(pages):
+        with open(os.path.join(root, f"p{i}.html"), "w") as f:
+            f.write(PRODUCT_PAGE.format(i=i, price=f"{10 + i % 90}.99", images=images.format(i=i)))
+
+
+def serve(root: str) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=root))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def report(label: str, latencies: List[float], elapsed: float) -> None:
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{label:<6} pagine={len(latencies):<5} pagine/s={len(latencies) / elapsed:7.2f} "
+        f"media={statistics.mean(latencies) * 1000:7.1f}ms p95={p95 * 1000:7.1f}ms"
+    )
+
+
+def bench_cold(base_url: str, pages: int) -> None:
+    factory = chrome_driver_factory(headless=True)
+    latencies: List[float] = []
+    started = time.perf_counter()
+    for i in range(pages):
+        t0 = time.perf_counter()
+        driver = factory()
+        try:
+            driver.get(f"{base_url}/p{i}.html")
+            driver.page_source
+        finally:
+            driver.quit()
+        latencies.append(time.perf_counter() - t0)
+    report("cold", latencies, time.perf_counter() - started)
+
+
+async def bench_pool(label: str, base_url: str, pages: int, size: int, block: List[str]) -> None:
+    pool = BrowserPool(size=size, max_uses=100, driver_factory=chrome_driver_factory(block_resources=block))
+    await pool.start()
+    latencies: List[float] = []
+
+    async def one(i: int) -> None:
+        t0 = time.perf_counter()
+        await pool.fetch_html(f"{base_url}/p{i}.html")
+        latencies.append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(pages)))
+    elapsed = time.perf_counter() - started
+    await pool.close()
+    report(label, latencies, elapsed)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--size", type=int, default=4, help="browser nel pool")
+    parser.add_argument("--cold-pages", type=int, default=10, help="pagine per la modalità cold (lenta)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        build_site(root, args.pages)
+        server = serve(root)
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        bench_cold(base_url, min(args.cold_pages, args.pages))
+        asyncio.run(bench_pool("pool", base_url, args.pages, args.size, []))
+        asyncio.run(bench_pool("block", base_url, args.pages, args.size, ["image", "font", "stylesheet", "media"]))
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
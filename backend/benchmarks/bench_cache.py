@@ -0,0 +1,127 @@
+"""
+Benchmark della cache dei dati (app.services.cache).
+
+Simula letture "calde" (es. la scheda prodotto) con un loader che costa
+come una query (latenza fissa più una concorrenza massima, come un pool di
+connessioni) e chiavi con distribuzione Zipf. Confronta:
+  - senza cache: ogni richiesta esegue la query
+  - con cache: richieste al loader, hit ratio, latenze
+e misura due casi limite:
+  - stampede: migliaia di richieste concorrenti sulla stessa chiave appena
+    scaduta (single-flight: un solo caricamento)
+  - scadenza sotto carico con stale-while-revalidate: nessuna richiesta
+    attende il ricaricamento
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_cache --requests 200000 --keys 50000
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import List
+
+from app.services.cache import LayeredCache
+
+
+class FakeDatabase:
+    """Query con latenza fissa e al più `pool_size` in esecuzione insieme."""
+
+    def __init__(self, latency: float, pool_size: int):
+        self.latency = latency
+        self.pool = asyncio.Semaphore(pool_size)
+        self.queries = 0
+
+    async def get_product(self, product_id: int) -> dict:
+        async with self.pool:
+            self.queries += 1
+            await asyncio.sleep(self.latency)
+            return {"id": product_id, "name": f"Prodotto {product_id}"}
+
+
+def percentiles(latencies: List[float]) -> str:
+    latencies = sorted(latencies)
+
+    def at(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    return f"p50={at(0.5):7.2f}ms p99={at(0.99):7.2f}ms max={latencies[-1] * 1000:7.2f}ms"
+
+
+async def drive(keys: List[int], concurrency: int, read) -> List[float]:
+    latencies: List[float] = []
+    position = iter(range(len(keys)))
+
+    async def client() -> None:
+        for i in position:
+            started = time.perf_counter()
+            await read(keys[i])
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies
+
+
+async def run(requests: int, keys: int, concurrency: int, latency: float, pool_size: int, max_size: int) -> None:
+    rng = random.Random(0)
+    weights = [1 / (k + 1) ** 1.1 for k in range(keys)]
+    sample = rng.choices(range(keys), weights=weights, k=requests)
+
+    db = FakeDatabase(latency, pool_size)
+    started = time.perf_counter()
+    latencies = await drive(sample, concurrency, db.get_product)
+    elapsed = time.perf_counter() - started
+    print(f"senza cache   {requests / elapsed:8.0f} req/s  query={db.queries:7d}  {percentiles(latencies)}")
+
+    db = FakeDatabase(latency, pool_size)
+    cache = LayeredCache(max_size=max_size, ttl=30, stale_ttl=300)
+
+    def read(product_id: int):
+        return cache.get_or_load(f"product:{product_id}", lambda: db.get_product(product_id), tags=[f"product:{product_id}"])
+
+    started = time.perf_counter()
+    latencies = await drive(sample, concurrency, read)
+    elapsed = time.perf_counter() - started
+    stats = cache.metrics.snapshot()
+    print(
+        f"con cache     {requests / elapsed:8.0f} req/s  query={db.queries:7d}  {percentiles(latencies)}  "
+        f"hit={stats['hit_ratio']} attese={stats['coalesced']} evict={stats['evictions']}"
+    )
+
+    # Stampede: la chiave più richiesta scade e arrivano 5000 richieste insieme
+    clock = [0.0]
+    db = FakeDatabase(latency, pool_size)
+    cache = LayeredCache(ttl=30, stale_ttl=0, clock=lambda: clock[0])
+    await cache.get_or_load("hot", lambda: db.get_product(1))
+    clock[0] += 31
+    await asyncio.gather(*(cache.get_or_load("hot", lambda: db.get_product(1)) for _ in range(5000)))
+    print(f"stampede      5000 richieste su chiave scaduta: query={db.queries - 1} (single-flight)")
+
+    # Scadenza con stale-while-revalidate: le richieste non aspettano il ricaricamento
+    db = FakeDatabase(latency * 20, pool_size)
+    cache = LayeredCache(ttl=30, stale_ttl=300, clock=lambda: clock[0])
+    await cache.get_or_load("hot", lambda: db.get_product(1))
+    clock[0] += 31
+    latencies = await drive([1] * 5000, concurrency, lambda _: cache.get_or_load("hot", lambda: db.get_product(1)))
+    await asyncio.sleep(latency * 25)
+    print(
+        f"stale-while-revalidate (loader {latency * 20 * 1000:.0f}ms): {percentiles(latencies)}  "
+        f"ricaricamenti={cache.metrics.refreshes} query={db.queries - 1}"
+    )
+    await cache.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--keys", type=int, default=50_000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.002, help="Durata di una query (secondi)")
+    parser.add_argument("--pool-size", type=int, default=10, help="Query contemporanee (pool di connessioni)")
+    parser.add_argument("--max-size", type=int, default=10_000, help="Voci nella cache in processo")
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.keys, args.concurrency, args.latency, args.pool_size, args.max_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark della copia immutabile della configurazione (app.core.config_snapshot).
+
+Confronta, per le letture fatte a ogni richiesta o risposta:
+  - Settings() (nuova lettura di ambiente e .env) contro get_config()
+  - lettura di un'impostazione dal singleton pydantic e dalla copia
+  - header di sicurezza codificati a ogni risposta dal dizionario contro
+    la tupla già codificata
+e verifica che un SIGHUP ricarichi la configurazione senza riavvio.
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_config --iterations 1000000
+"""
+import argparse
+import asyncio
+import os
+import signal
+import timeit
+
+from app.core.config import Settings, settings
+from app.core.config_snapshot import get_config, install_reload_handler
+
+
+def report(label: str, seconds: float, iterations: int) -> None:
+    print(f"  {label:<44} {seconds / iterations * 1e9:10.1f}ns")
+
+
+def encode_headers() -> list:
+    return [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in settings.SECURITY_HEADERS.items()]
+
+
+async def check_reload() -> None:
+    install_reload_handler()
+    before = get_config()
+    os.environ["RATE_LIMIT_DEFAULT"] = str(before.RATE_LIMIT_DEFAULT + 1)
+    os.kill(os.getpid(), signal.SIGHUP)
+    await asyncio.sleep(0.1)
+    after = get_config()
+    print(
+        f"  SIGHUP: RATE_LIMIT_DEFAULT {before.RATE_LIMIT_DEFAULT} -> {after.RATE_LIMIT_DEFAULT} "
+        f"(settings: {settings.RATE_LIMIT_DEFAULT}, nuova copia: {after is not before})"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=1_000_000)
+    args = parser.parse_args()
+    n = args.iterations
+
+    print("caricamento")
+    report("Settings()", timeit.timeit(Settings, number=max(1, n // 1000)), max(1, n // 1000))
+    report("get_config()", timeit.timeit(get_config, number=n), n)
+
+    print("lettura per richiesta")
+    report("settings.RATE_LIMIT_ENABLED", timeit.timeit(lambda: settings.RATE_LIMIT_ENABLED, number=n), n)
+    report("get_config().RATE_LIMIT_ENABLED", timeit.timeit(lambda: get_config().RATE_LIMIT_ENABLED, number=n), n)
+
+    print("header di sicurezza per risposta")
+    report("codifica da settings.SECURITY_HEADERS", timeit.timeit(encode_headers, number=n // 10), n // 10)
+    report("get_config().security_headers", timeit.timeit(lambda: list(get_config().security_headers), number=n // 10), n // 10)
+
+    if hasattr(signal, "SIGHUP"):
+        print("ricaricamento")
+        asyncio.run(check_reload())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark della generazione AI di titoli e descrizioni (app.services.content_generation).
+
+Simula l'import di N prodotti, in parte con descrizioni del fornitore
+duplicate, contro un modello finto compatibile con le chat completions di
+OpenAI (latenza fissa + costo per prodotto, qualche 429). Confronta:
+  - una richiesta al modello per prodotto
+  - ContentGenerator: batch, cache per hash del contenuto, dedup delle
+    richieste in corso
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_content_generation --products 2000 --duplicates 0.5
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+
+from app.services.content_generation import ContentGenerator, OpenAIProvider
+
+# Prezzi indicativi per milione di token (input, output)
+PRICE_PER_MTOKEN = (0.15, 0.60)
+
+
+class FakeModel:
+    """Modello finto: risponde con un testo per ogni prodotto del batch."""
+
+    def __init__(self, latency: float, per_item: float, throttle: float, seed: int = 0):
+        self.latency = latency
+        self.per_item = per_item
+        self.throttle = throttle
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.throttled = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        if self.random.random() < self.throttle:
+            self.throttled += 1
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        body = json.loads(request.content)
+        products = json.loads(body["messages"][1]["content"])
+        await asyncio.sleep(self.latency + self.per_item * len(products))
+        items = [
+            {
+                "id": p["id"],
+                "title": f"{p['name']} - spedizione rapida"[:100],
+                "description": f"{p['name']}: {p.get('description', '')} Qualità garantita."[:1000],
+            }
+            for p in products
+        ]
+        content = json.dumps({"items": items})
+        prompt_chars = sum(len(m["content"]) for m in body["messages"])
+        usage = {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(content) // 4}
+        return httpx.Response(200, json={"choices": [{"message": {"content": content}}], "usage": usage})
+
+
+def make_catalogue(count: int, duplicates: float, seed: int = 0):
+    rng = random.Random(seed)
+    unique = max(1, int(count * (1 - duplicates)))
+    sources = [
+        (f"Prodotto {i}", f"Descrizione del fornitore per l'articolo {i}, " + "materiale resistente, " * 8)
+        for i in range(unique)
+    ]
+    return [sources[i] if i < unique else rng.choice(sources) for i in range(count)]
+
+
+def make_provider(model: FakeModel, args) -> OpenAIProvider:
+    return OpenAIProvider(
+        "bench", base_url="http://fake-model.local/v1", concurrency=args.concurrency, rate=args.rate,
+        transport=httpx.MockTransport(model),
+    )
+
+
+def report(label: str, elapsed: float, model: FakeModel, provider: OpenAIProvider) -> None:
+    cost = (
+        provider.stats["prompt_tokens"] * PRICE_PER_MTOKEN[0] + provider.stats["completion_tokens"] * PRICE_PER_MTOKEN[1]
+    ) / 1e6
+    print(
+        f"{label:<28} {elapsed:7.2f}s  richieste={model.requests:<6} (429: {model.throttled})  "
+        f"token in={provider.stats['prompt_tokens']:<8} out={provider.stats['completion_tokens']:<8} costo=${cost:.4f}"
+    )
+
+
+async def run(args) -> None:
+    catalogue = make_catalogue(args.products, args.duplicates)
+    print(f"{len(catalogue)} prodotti, {len(set(catalogue))} descrizioni distinte")
+
+    model = FakeModel(args.latency, args.per_item, args.throttle)
+    provider = make_provider(model, args)
+    naive = ContentGenerator(provider)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        provider.generate([naive.request(name, description)]) for name, description in catalogue
+    ))
+    report("una richiesta per prodotto", time.perf_counter() - started, model, provider)
+    naive_failed = sum(1 for r in results if r[0] is None)
+    await provider.aclose()
+
+    model = FakeModel(args.latency, args.per_item, args.throttle)
+    provider = make_provider(model, args)
+    generator = ContentGenerator(provider, batch_size=args.batch_size, concurrency=args.concurrency)
+    started = time.perf_counter()
+    results, generated = await generator.generate_many(
+        [generator.request(name, description) for name, description in catalogue]
+    )
+    report("ContentGenerator", time.perf_counter() - started, model, provider)
+    print(
+        f"generati={generated} riusati={len(catalogue) - generated - results.count(None)} "
+        f"falliti={results.count(None)} (una richiesta per prodotto: {naive_failed}) batch={generator.stats['batches']}"
+    )
+    await generator.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--duplicates", type=float, default=0.5, help="Frazione di descrizioni duplicate")
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=50.0, help="Richieste al secondo consentite dal provider")
+    parser.add_argument("--latency", type=float, default=0.3, help="Latenza fissa del modello per richiesta")
+    parser.add_argument("--per-item", type=float, default=0.01, help="Tempo di generazione per prodotto")
+    parser.add_argument("--throttle", type=float, default=0.02, help="Frazione di risposte 429")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark del middleware CORS (app.middleware.cors).
+
+Configura centinaia di origini di vetrine dei clienti (esatte) più alcuni
+jolly per i sottodomini e confronta, chiamando l'app ASGI direttamente
+(senza rete), il CORSMiddleware di Starlette (lista di origini più
+allow_origin_regex) con quello dell'app su:
+  - preflight da un'origine esatta e da una con jolly
+  - GET da un'origine consentita
+  - preflight da un'origine non consentita
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_cors --origins 500 --requests 50000
+"""
+import argparse
+import asyncio
+import re
+import time
+from typing import List, Tuple
+
+from fastapi import FastAPI
+from starlette.middleware.cors import CORSMiddleware as StarletteCORSMiddleware
+
+from app.core.config import Settings
+from app.core.config_snapshot import ConfigSnapshot
+from app.middleware.cors import CORSMiddleware
+
+WILDCARDS = ["https://*.myshopify-drop.com", "https://*.stores.dropevolution.com", "https://*.vercel.app"]
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+    for i in range(30):
+        app.add_api_route(f"/api/v1/resource{i}/{{item_id}}", lambda item_id: {"id": item_id}, methods=["GET"])
+    return app
+
+
+def scope(method: str, origin: str, preflight: bool) -> dict:
+    headers = [(b"host", b"api.dropevolution.com"), (b"origin", origin.encode())]
+    if preflight:
+        headers += [(b"access-control-request-method", b"POST"), (b"access-control-request-headers", b"authorization, content-type")]
+    return {
+        "type": "http", "method": method, "path": "/api/v1/resource29/7", "raw_path": b"/api/v1/resource29/7",
+        "query_string": b"", "headers": headers, "http_version": "1.1", "scheme": "https",
+        "server": ("api.dropevolution.com", 443), "client": ("10.0.0.1", 50000), "root_path": "",
+    }
+
+
+async def measure(app, request: dict, n: int) -> Tuple[float, int]:
+    status = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    started = time.perf_counter()
+    for _ in range(n):
+        await app(dict(request), receive, send)
+    return (time.perf_counter() - started) / n * 1e6, status[-1]
+
+
+async def run(origins: int, requests: int) -> None:
+    exact = [f"https://shop{i}.example-store{i % 37}.com" for i in range(origins)]
+    settings = Settings(ALLOWED_ORIGINS=exact + WILDCARDS)
+    regex = "|".join(re.escape(w).replace(r"\*", r"[a-z0-9-]+(?:\.[a-z0-9-]+)*") for w in WILDCARDS)
+
+    starlette = StarletteCORSMiddleware(
+        make_app(), allow_origins=exact, allow_origin_regex=regex, allow_credentials=True,
+        allow_methods=settings.CORS_ALLOW_METHODS, allow_headers=["*"],
+        expose_headers=settings.CORS_EXPOSE_HEADERS, max_age=settings.CORS_MAX_AGE,
+    )
+    ours = CORSMiddleware(make_app(), ConfigSnapshot(settings))
+
+    cases: List[Tuple[str, dict]] = [
+        ("preflight origine esatta", scope("OPTIONS", exact[-1], True)),
+        ("preflight origine con jolly", scope("OPTIONS", "https://acme.eu.myshopify-drop.com", True)),
+        ("GET origine consentita", scope("GET", exact[-1], False)),
+        ("preflight origine rifiutata", scope("OPTIONS", "https://evil.example.org", True)),
+    ]
+    print(f"{origins} origini esatte + {len(WILDCARDS)} jolly, {requests} richieste per caso")
+    for label, request in cases:
+        before, before_status = await measure(starlette, request, requests)
+        after, after_status = await measure(ours, request, requests)
+        print(f"  {label:<30} starlette {before:7.2f}us ({before_status})  app {after:7.2f}us ({after_status})  x{before / after:.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--origins", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=50_000)
+    args = parser.parse_args()
+    asyncio.run(run(args.origins, args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark del rilevamento dei quasi duplicati (app.services.dedup).
+
+Genera un catalogo sintetico di titoli e vi aggiunge varianti degli stessi
+articoli come le scriverebbero fornitori diversi (parole riordinate,
+maiuscole, "128 GB"/"128gb", parole promozionali, refusi). Per dimensioni
+crescenti del catalogo misura:
+  - costruzione dell'indice
+  - latenza di una lookup (deve crescere molto meno del catalogo), singola e a lotti
+  - richiamo sulle varianti e falsi positivi sugli articoli distinti
+  - clustering dell'intero catalogo
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_dedup --sizes 10000 100000 500000
+"""
+import argparse
+import random
+import string
+import time
+
+from app.services.dedup import DedupIndex
+
+EXTRA_WORDS = ["offerta", "spedizione gratuita", "originale", "nuovo", "garanzia italia", "-", "|", "2024"]
+UNITS = ["gb", "tb", "ml", "kg", "cm", "w"]
+
+
+def make_vocabulary(rng: random.Random, size: int):
+    return ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10))) for _ in range(size)]
+
+
+def make_title(rng: random.Random, brands, words) -> str:
+    parts = [rng.choice(brands).capitalize(), *rng.sample(words, rng.randint(3, 6))]
+    parts.append(f"{rng.choice([8, 16, 32, 64, 128, 256, 500])} {rng.choice(UNITS).upper()}")
+    return " ".join(parts)
+
+
+def make_variant(rng: random.Random, title: str) -> str:
+    words = title.split()
+    quantity = " ".join(words[-2:])
+    words = words[:-2]
+    if rng.random() < 0.5:
+        rng.shuffle(words)
+    if rng.random() < 0.3:
+        i = rng.randrange(len(words))
+        if len(words[i]) > 4:
+            j = rng.randrange(1, len(words[i]) - 1)
+            words[i] = words[i][:j] + words[i][j + 1:]
+    if rng.random() < 0.5:
+        quantity = quantity.replace(" ", "").lower()
+    variant = " ".join([*words, quantity, *rng.sample(EXTRA_WORDS, rng.randint(0, 2))])
+    return variant.upper() if rng.random() < 0.3 else variant
+
+
+def run(size: int, duplicates: int, queries: int, threshold: float, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    brands = make_vocabulary(rng, 300)
+    words = make_vocabulary(rng, 20000)
+    titles = [make_title(rng, brands, words) for _ in range(size)]
+    variants = [(src, make_variant(rng, titles[src])) for src in rng.sample(range(size), duplicates)]
+
+    index = DedupIndex(threshold=threshold)
+    started = time.perf_counter()
+    index.add_many((i, title, None) for i, title in enumerate(titles))
+    index.add_many((size + k, variant, None) for k, (_, variant) in enumerate(variants))
+    build = time.perf_counter() - started
+
+    sample = variants[:queries]
+    found = false_positives = 0
+    latencies = []
+    for k, (src, variant) in enumerate(sample):
+        started = time.perf_counter()
+        matches = index.query(variant, exclude=size + k)
+        latencies.append(time.perf_counter() - started)
+        ids = {product_id for product_id, _ in matches}
+        found += src in ids
+        false_positives += len(ids - {src} - {size + j for j, (s, _) in enumerate(variants) if s == src})
+    latencies.sort()
+
+    started = time.perf_counter()
+    index.query_many([(variant, None) for _, variant in sample])
+    batch = (time.perf_counter() - started) / len(sample)
+
+    started = time.perf_counter()
+    clusters = index.clusters()
+    clustering = time.perf_counter() - started
+
+    print(
+        f"{size + duplicates:>8} prodotti  indice {build:6.2f}s  "
+        f"lookup p50={latencies[len(latencies) // 2] * 1e6:6.0f}us p99={latencies[int(len(latencies) * 0.99)] * 1e6:6.0f}us "
+        f"(a lotti: {batch * 1e6:4.0f}us)  "
+        f"richiamo={found / len(sample):.3f} falsi positivi={false_positives}  "
+        f"clustering {clustering:5.2f}s ({len(clusters)} cluster)"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--duplicates", type=int, default=5000, help="Varianti aggiunte al catalogo")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--threshold", type=float, default=0.6)
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, min(args.duplicates, size), args.queries, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
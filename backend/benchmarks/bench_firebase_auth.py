@@ -0,0 +1,143 @@
+"""
+Benchmark della verifica degli ID token Firebase (app.core.firebase_auth).
+
+Genera in locale una chiave RSA e un certificato x509 autofirmato, li serve
+come l'endpoint dei certificati di Google (con Cache-Control: max-age) e
+firma ID token RS256 con i claim di Firebase Auth. Confronta:
+  - google-auth (id_token.verify_token, il percorso di firebase-admin senza
+    cache HTTP): scarica e analizza i certificati a ogni verifica
+  - FirebaseCertificates + verify_firebase_token: chiavi in memoria,
+    nessuna richiesta di rete per token
+e verifica che il rinnovo in background (max-age breve) non blocchi le
+verifiche in corso.
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_firebase_auth --tokens 20000
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import time
+from typing import Dict, List, Tuple
+
+import httpx
+import jwt
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from app.core.firebase_auth import FirebaseCertificates, verify_firebase_token
+
+PROJECT_ID = "dropevolution-bench"
+CERTS_URL = "https://certs.bench.local/x509/securetoken"
+
+
+def make_key(kid: str) -> Tuple[rsa.RSAPrivateKey, str]:
+    """Chiave privata e certificato PEM autofirmato, come quelli pubblicati da Google."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, kid)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1)).not_valid_after(now + datetime.timedelta(days=7))
+        .sign(key, hashes.SHA256())
+    )
+    return key, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+def make_token(key: rsa.RSAPrivateKey, kid: str, uid: str) -> str:
+    now = int(time.time())
+    claims = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}", "aud": PROJECT_ID,
+        "auth_time": now - 60, "user_id": uid, "sub": uid, "iat": now, "exp": now + 3600,
+        "email": f"{uid}@example.com", "firebase": {"sign_in_provider": "password"},
+    }
+    return jwt.encode(claims, key, algorithm="RS256", headers={"kid": kid})
+
+
+class CertServer:
+    """Endpoint dei certificati: conta le richieste e può ruotare le chiavi."""
+
+    def __init__(self, certs: Dict[str, str], max_age: int):
+        self.certs = certs
+        self.max_age = max_age
+        self.hits = 0
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.hits += 1
+        return httpx.Response(200, json=self.certs, headers={"Cache-Control": f"public, max-age={self.max_age}, must-revalidate"})
+
+
+def bench_google_auth(tokens: List[str], server: CertServer) -> None:
+    from google.oauth2 import id_token
+
+    class Response:
+        def __init__(self, response: httpx.Response):
+            self.status, self.headers, self.data = response.status_code, dict(response.headers), response.content
+
+    def request(url, method="GET", body=None, headers=None, timeout=None, **kwargs):
+        return Response(server.handler(httpx.Request(method, url)))
+
+    hits = server.hits
+    started = time.perf_counter()
+    for token in tokens:
+        id_token.verify_token(token, request, audience=PROJECT_ID, certs_url=CERTS_URL)
+    elapsed = time.perf_counter() - started
+    print(f"  google-auth        {elapsed / len(tokens) * 1e6:8.1f}us/token  richieste ai certificati: {server.hits - hits}")
+
+
+async def bench_cached(tokens: List[str], server: CertServer) -> None:
+    certificates = FirebaseCertificates(CERTS_URL, min_refresh=0.2, transport=httpx.MockTransport(server.handler))
+    await certificates.fetch()
+    hits = server.hits
+    started = time.perf_counter()
+    for token in tokens:
+        verify_firebase_token(token, certificates, PROJECT_ID)
+    elapsed = time.perf_counter() - started
+    print(f"  chiavi in memoria  {elapsed / len(tokens) * 1e6:8.1f}us/token  richieste ai certificati: {server.hits - hits}")
+
+    # Rinnovo in background con max-age di 1s: le verifiche continuano senza attese
+    server.max_age = 1
+    await certificates.fetch()
+    certificates.start()
+    latencies = []
+    deadline = time.monotonic() + 3.0
+    i = 0
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        verify_firebase_token(tokens[i % len(tokens)], certificates, PROJECT_ID)
+        latencies.append(time.perf_counter() - started)
+        i += 1
+        if i % 200 == 0:
+            await asyncio.sleep(0)
+    latencies.sort()
+    print(
+        f"  con rinnovo (3s)   p50={latencies[len(latencies) // 2] * 1e6:.1f}us "
+        f"max={latencies[-1] * 1e6:.1f}us  download in background: {certificates.stats['fetches']}"
+    )
+    await certificates.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=20000)
+    parser.add_argument("--baseline-tokens", type=int, default=500, help="Token verificati con google-auth (lento)")
+    args = parser.parse_args()
+
+    keys = {kid: make_key(kid) for kid in ("bench-key-1", "bench-key-2")}
+    server = CertServer({kid: pem for kid, (_, pem) in keys.items()}, max_age=21600)
+    tokens = [
+        make_token(keys[kid][0], kid, f"uid{i:06d}")
+        for i, kid in zip(range(args.tokens), [*keys] * args.tokens)
+    ]
+    print(f"{len(tokens)} ID token RS256 ({json.dumps(list(keys))})")
+    bench_google_auth(tokens[:args.baseline_tokens], server)
+    asyncio.run(bench_cached(tokens, server))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark di contesa sullo stock di un singolo SKU (app.services.inventory).
+
+Centinaia di acquirenti concorrenti comprano lo stesso prodotto, confrontando:
+  - naive:  ogni checkout esegue UPDATE products SET stock = stock - 1
+            WHERE stock >= 1 nella propria transazione (la riga è un collo di bottiglia)
+  - engine: prenotazione + conferma con InventoryEngine (lease a blocchi, hold
+            su righe proprie, flush in blocco), con più motori a simulare più worker
+
+Per entrambe le modalità verifica che le unità vendute non superino lo stock.
+Richiede un database PostgreSQL di prova (le tabelle vengono create se mancano).
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_inventory --dsn postgresql://localhost/bench --buyers 500 --stock 2000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from contextlib import asynccontextmanager
+from typing import List
+
+from psycopg_pool import AsyncConnectionPool
+
+from app.core.errors import InsufficientStockError
+from app.db.schema import create_schema
+from app.services.inventory import InventoryEngine
+
+
+def report(label: str, latencies: List[float], elapsed: float, sold: int, stock: int, left: int) -> None:
+    latencies.sort()
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)] if latencies else 0.0
+    status = "OK" if sold + left == stock and sold <= stock else "ERRORE: stock incoerente"
+    print(
+        f"{label:<7} venduti={sold:<6} checkout/s={sold / elapsed:9.1f} "
+        f"p50={statistics.median(latencies) * 1000 if latencies else 0:7.2f}ms p99={p99 * 1000:7.2f}ms "
+        f"rimasti={left:<6} {status}"
+    )
+
+
+async def reset_product(pool: AsyncConnectionPool, stock: int) -> int:
+    async with pool.connection() as conn:
+        await create_schema(conn)
+        await conn.execute("DELETE FROM stock_holds")
+        await conn.execute("DELETE FROM stock_leases")
+        cursor = await conn.execute(
+            "INSERT INTO products (sku, name, price, stock) VALUES ('bench:hot', 'SKU conteso', 9.99, %s) "
+            "ON CONFLICT (sku) DO UPDATE SET stock = EXCLUDED.stock RETURNING id",
+            (stock,),
+        )
+        return (await cursor.fetchone())[0]
+
+
+async def remaining(pool: AsyncConnectionPool, product_id: int) -> int:
+    async with pool.connection() as conn:
+        cursor = await conn.execute("SELECT stock FROM products WHERE id = %s", (product_id,))
+        return (await cursor.fetchone())[0]
+
+
+async def bench_naive(pool: AsyncConnectionPool, buyers: int, stock: int) -> None:
+    product_id = await reset_product(pool, stock)
+    latencies: List[float] = []
+    sold = 0
+
+    async def buyer() -> None:
+        nonlocal sold
+        while True:
+            t0 = time.perf_counter()
+            async with pool.connection() as conn:
+                cursor = await conn.execute(
+                    "UPDATE products SET stock = stock - 1 WHERE id = %s AND stock >= 1", (product_id,),
+                )
+            if not cursor.rowcount:
+                return
+            latencies.append(time.perf_counter() - t0)
+            sold += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(buyer() for _ in range(buyers)))
+    report("naive", latencies, time.perf_counter() - started, sold, stock, await remaining(pool, product_id))
+
+
+async def bench_engine(pool: AsyncConnectionPool, buyers: int, stock: int, workers: int) -> None:
+    product_id = await reset_product(pool, stock)
+
+    @asynccontextmanager
+    async def connection():
+        async with pool.connection() as conn:
+            yield conn
+
+    engines = [InventoryEngine(connection=connection, worker_id=f"bench-{i}", flush_interval=0.2) for i in range(workers)]
+    for engine in engines:
+        engine.start()
+    latencies: List[float] = []
+    sold = 0
+
+    async def buyer(n: int) -> None:
+        nonlocal sold
+        engine = engines[n % workers]
+        while True:
+            t0 = time.perf_counter()
+            try:
+                reservation = await engine.reserve({product_id: 1})
+            except InsufficientStockError:
+                # Esaurito per questo worker: riprova solo finché altri possono restituire quota
+                if sum(e.available(product_id) for e in engines) == 0 and await remaining(pool, product_id) == 0:
+                    return
+                await asyncio.sleep(0.05)
+                continue
+            # La conferma arriva a un worker qualsiasi, come dietro un load balancer
+            await engines[(n + 1) % workers].confirm(reservation.id)
+            latencies.append(time.perf_counter() - t0)
+            sold += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(buyer(n) for n in range(buyers)))
+    elapsed = time.perf_counter() - started
+    for engine in engines:
+        await engine.close()
+    leases = sum(engine.stats["leases"] for engine in engines)
+    report("engine", latencies, elapsed, sold, stock, await remaining(pool, product_id))
+    print(f"        lease sulla riga del prodotto: {leases} (una ogni {sold / max(leases, 1):.0f} vendite)")
+
+
+async def run(dsn: str, buyers: int, stock: int, workers: int, pool_size: int) -> None:
+    async with AsyncConnectionPool(dsn, min_size=pool_size, max_size=pool_size, kwargs={"autocommit": True}) as pool:
+        await bench_naive(pool, buyers, stock)
+        await bench_engine(pool, buyers, stock, workers)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", required=True)
+    parser.add_argument("--buyers", type=int, default=500)
+    parser.add_argument("--stock", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=4, help="motori di inventario (worker simulati)")
+    parser.add_argument("--pool-size", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.dsn, args.buyers, args.stock, args.workers, args.pool_size))
+
+
+if __name__ == "__main__":
+    main()
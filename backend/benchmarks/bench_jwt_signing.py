@@ -0,0 +1,81 @@
+"""
+Benchmark della firma e verifica dei JWT per algoritmo.
+
+Usa gli stessi claim di create_token (exp, sub, iat, nbf, jti, con date
+datetime come nel codice di riferimento) e misura, per HS256 (la firma
+usata oggi da JWTMiddleware e create_access_token), RS256 (RSA 2048),
+ES256 (P-256) ed EdDSA (Ed25519):
+  - token firmati al secondo
+  - token verificati al secondo (decode con verifica di firma e scadenza)
+  - lunghezza del token
+Serve a decidere il costo del passaggio a una firma asimmetrica (chiave
+pubblica distribuibile ai servizi che verificano soltanto).
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_jwt_signing --tokens 5000
+"""
+import argparse
+import secrets
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Tuple
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+
+def make_claims(subject: int) -> Dict[str, Any]:
+    """Claim di create_token (reviews-claude/secure-jwt.py)."""
+    now = datetime.utcnow()
+    return {
+        "exp": now + timedelta(minutes=30),
+        "sub": str(subject),
+        "iat": now,
+        "nbf": now,
+        "jti": str(uuid.uuid4()),
+    }
+
+
+def keys() -> List[Tuple[str, Any, Any]]:
+    """(algoritmo, chiave di firma, chiave di verifica)."""
+    secret = secrets.token_urlsafe(64)
+    rsa_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    ec_key = ec.generate_private_key(ec.SECP256R1())
+    ed_key = ed25519.Ed25519PrivateKey.generate()
+    return [
+        ("HS256", secret, secret),
+        ("RS256", rsa_key, rsa_key.public_key()),
+        ("ES256", ec_key, ec_key.public_key()),
+        ("EdDSA", ed_key, ed_key.public_key()),
+    ]
+
+
+def rate(count: int, fn: Callable[[], None]) -> float:
+    started = time.perf_counter()
+    fn()
+    return count / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=5000)
+    args = parser.parse_args()
+
+    claims = [make_claims(i) for i in range(args.tokens)]
+    print(f"{args.tokens} token con i claim di create_token")
+    print(f"  {'algoritmo':<8} {'firma/s':>10} {'verifica/s':>11} {'byte':>6}")
+    baseline = None
+    for algorithm, signing_key, verifying_key in keys():
+        tokens: List[str] = []
+        signed = rate(args.tokens, lambda: tokens.extend(jwt.encode(c, signing_key, algorithm=algorithm) for c in claims))
+        verified = rate(args.tokens, lambda: [jwt.decode(t, verifying_key, algorithms=[algorithm]) for t in tokens])
+        baseline = baseline or (signed, verified)
+        print(
+            f"  {algorithm:<8} {signed:10.0f} {verified:11.0f} {len(tokens[0]):6d}"
+            f"   (x{baseline[0] / signed:.1f} firma, x{baseline[1] / verified:.1f} verifica rispetto a HS256)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Benchmark dello stream SSE degli eventi ordine (app.services.order_events).
+
+Avvia un worker uvicorn con l'endpoint /orders/events (eventi pubblicati
+direttamente sul broadcaster, senza database), apre N connessioni SSE
+inattive e misura:
+  - memoria del worker (RSS) per connessione aperta
+  - tempo di fan-out: da una raffica di eventi (uno per utente) all'arrivo
+    dell'ultimo messaggio a tutti i client
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_order_events --connections 10000 --users 1000
+"""
+import argparse
+import asyncio
+import json
+import resource
+import socket
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+from app.core.auth import create_access_token
+
+
+def build_app():
+    from fastapi import FastAPI
+
+    from app.api.api_v1.endpoints import orders
+    from app.services.order_events import get_order_broadcaster
+
+    app = FastAPI()
+    app.include_router(orders.router, prefix="/orders")
+
+    @app.post("/bench/publish")
+    async def publish(events: List[dict]):
+        get_order_broadcaster().dispatch(events)
+        return {"subscribers": len(get_order_broadcaster())}
+
+    @app.get("/bench/subscribers")
+    async def subscribers():
+        return {"subscribers": len(get_order_broadcaster())}
+
+    return app
+
+
+def serve(port: int) -> None:
+    import uvicorn
+
+    raise_fd_limit()
+    uvicorn.run(build_app(), host="127.0.0.1", port=port, log_level="warning", backlog=4096)
+
+
+def raise_fd_limit() -> None:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_kib(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+async def http(port: int, method: str, path: str, body: bytes = b"") -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+    )
+    data = await reader.read()
+    writer.close()
+    return data.split(b"\r\n\r\n", 1)[1]
+
+
+async def open_stream(port: int, user_id: int, token: str) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"GET /orders/events?user_id={user_id} HTTP/1.1\r\nHost: bench\r\n"
+        f"Authorization: Bearer {token}\r\nAccept: text/event-stream\r\n\r\n".encode()
+    )
+    await writer.drain()
+    # Intestazioni + primo blocco ("retry:")
+    await reader.readuntil(b"retry: 5000\n\n")
+    return reader, writer
+
+
+async def wait_event(reader: asyncio.StreamReader) -> float:
+    while True:
+        line = await reader.readline()
+        if line.startswith(b"event: order_status"):
+            return time.perf_counter()
+
+
+async def run(connections: int, users: int, port: int) -> None:
+    raise_fd_limit()
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.bench_order_events", "--serve", "--port", str(port)])
+    try:
+        for _ in range(100):
+            if server.poll() is not None:
+                raise SystemExit(f"il worker di benchmark non è partito (porta {port} occupata?)")
+            try:
+                await http(port, "GET", "/bench/subscribers")
+                break
+            except OSError:
+                await asyncio.sleep(0.1)
+        # Ogni client segue i propri ordini: un token per utente
+        tokens = [create_access_token(user_id, expires_in=3600) for user_id in range(users)]
+
+        base = rss_kib(server.pid)
+        streams: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        started = time.perf_counter()
+        for offset in range(0, connections, 500):
+            streams.extend(await asyncio.gather(*(
+                open_stream(port, n % users, tokens[n % users]) for n in range(offset, min(offset + 500, connections))
+            )))
+        opened = time.perf_counter() - started
+        await asyncio.sleep(2)
+        loaded = rss_kib(server.pid)
+        subscribers = json.loads(await http(port, "GET", "/bench/subscribers"))["subscribers"]
+        print(f"connessioni aperte: {len(streams)} in {opened:.1f}s, iscritti lato server: {subscribers}")
+        print(f"RSS worker: {base / 1024:.1f} MiB a vuoto, {loaded / 1024:.1f} MiB con le connessioni "
+              f"({(loaded - base) / len(streams):.1f} KiB per connessione)")
+
+        waiters = [asyncio.create_task(wait_event(reader)) for reader, _ in streams]
+        events = [{"order_id": u, "user_id": u, "status": "shipped", "previous_status": "processing"} for u in range(users)]
+        published = time.perf_counter()
+        await http(port, "POST", "/bench/publish", json.dumps(events).encode())
+        arrivals = sorted(t - published for t in await asyncio.gather(*waiters))
+        print(f"fan-out di {users} eventi a {len(streams)} client: "
+              f"p50={arrivals[len(arrivals) // 2] * 1000:.1f}ms ultimo={arrivals[-1] * 1000:.1f}ms")
+
+        for _, writer in streams:
+            writer.close()
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=3)
+        except subprocess.TimeoutExpired:
+            # Lo shutdown di uvicorn attende la chiusura degli stream SSE ancora aperti
+            server.kill()
+            server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=10_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--port", type=int, default=None, help="Porta del worker (default: una libera)")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.port)
+    else:
+        asyncio.run(run(args.connections, args.users, args.port or free_port()))
+
+
+if __name__ == "__main__":
+    main()
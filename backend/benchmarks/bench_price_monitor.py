@@ -0,0 +1,78 @@
+"""
+Benchmark dello scheduler di monitoraggio prezzi (app.services.price_monitor).
+
+Misura la memoria per SKU monitorato e il throughput di scheduling con un
+checker finto (nessuna rete), che cambia prezzo a una frazione dei prodotti.
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_price_monitor --skus 500000 --seconds 20
+"""
+import argparse
+import asyncio
+import random
+import time
+import tracemalloc
+from decimal import Decimal
+
+from app.services.price_monitor import PriceMonitor, TrackedProduct
+from app.services.tiered_fetcher import Offer
+
+
+async def run(skus: int, seconds: float, volatile: float, concurrency: int) -> None:
+    async def checker(product: TrackedProduct) -> Offer:
+        await asyncio.sleep(0)
+        cents = product.price_cents if product.price_cents >= 0 else 1999
+        # Una parte dei prodotti è volatile e cambia prezzo spesso
+        if hash(product.sku) % 100 < volatile * 100 and random.random() < 0.5:
+            cents += random.choice((-100, 100))
+        return Offer(Decimal(cents) / 100, True)
+
+    # Intervalli compressi (1-60 s) per vedere l'adattamento in pochi secondi
+    monitor = PriceMonitor(
+        checker=checker,
+        min_interval=1.0,
+        max_interval=60.0,
+        concurrency=concurrency,
+        default_source_concurrency=concurrency // 2,
+    )
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    for i in range(skus):
+        source = "amazon" if i % 2 else "ebay"
+        monitor.track(f"{source}:{i:010d}", source, f"https://shop.example/{source}/{i}", sales_per_day=i % 7)
+    load_time = time.perf_counter() - started
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print(f"SKU monitorati: {len(monitor)} caricati in {load_time:.1f}s")
+    print(f"memoria: {used / 2**20:.1f} MiB, {used / skus:.0f} byte per SKU")
+
+    task = asyncio.create_task(monitor.run())
+    started = time.perf_counter()
+    await asyncio.sleep(seconds)
+    elapsed = time.perf_counter() - started
+    await monitor.stop()
+    task.cancel()
+
+    stats = monitor.stats
+    print(f"controlli: {stats['checks']} in {elapsed:.1f}s ({stats['checks'] / elapsed:.0f}/s), "
+          f"variazioni: {stats['changes']}, errori: {stats['failures']}")
+
+    intervals = sorted(monitor.next_interval(p) for p in list(monitor._products.values())[:10000])
+    print(f"intervallo adattivo (campione): min={intervals[0]:.1f}s "
+          f"mediana={intervals[len(intervals) // 2]:.1f}s max={intervals[-1]:.1f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--skus", type=int, default=500_000)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--volatile", type=float, default=0.1, help="frazione di prodotti volatili")
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.skus, args.seconds, args.volatile, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark del motore di repricing vettoriale (app.services.repricing).
+
+Genera un catalogo sintetico (costi, prezzi attuali, prezzi dei concorrenti
+per una parte dei prodotti) e misura il tempo del calcolo vettoriale rispetto
+a un ciclo Python prodotto per prodotto con le stesse regole, verificando che
+i risultati coincidano. Nessun database.
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_repricing --skus 1000000
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+
+from app.services.repricing import CatalogueArrays, RepricingRules, compute_prices
+
+
+def reprice_one(price: int, cost: float, competitor: float, fee_rate: float, rules: RepricingRules) -> int:
+    """Le stesse regole di compute_prices, un prodotto alla volta."""
+    if math.isnan(cost):
+        return price
+    floor = (cost + rules.fixed_fee * 100) / (1 - fee_rate - rules.min_margin)
+    has_competitor = not math.isnan(competitor)
+    target = competitor * (1 - rules.undercut_percent) - rules.undercut * 100 if has_competitor else price
+    target = max(target, floor)
+    if rules.max_markup is not None:
+        target = min(target, max(cost * rules.max_markup, floor))
+    charm = math.ceil((target - 99) / 100 - 1e-9) * 100 + 99
+    if has_competitor and charm >= competitor and charm - 100 >= floor:
+        charm -= 100
+    return int(charm)
+
+
+def synthetic_catalogue(skus: int, seed: int = 42) -> CatalogueArrays:
+    rng = np.random.default_rng(seed)
+    cost = rng.integers(200, 20_000, skus).astype(np.float64)
+    price = (cost * rng.uniform(1.1, 2.0, skus)).astype(np.int64)
+    competitor = np.where(rng.random(skus) < 0.6, cost * rng.uniform(0.9, 1.8, skus), np.nan).round()
+    cost[rng.random(skus) < 0.05] = np.nan
+    fee_rate = np.where(rng.random(skus) < 0.5, 0.15, 0.12)
+    return CatalogueArrays(np.arange(1, skus + 1, dtype=np.int64), price, cost, competitor, fee_rate)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--skus", type=int, default=1_000_000)
+    parser.add_argument("--loop-skus", type=int, default=200_000, help="prodotti per il confronto col ciclo Python")
+    args = parser.parse_args()
+
+    catalogue = synthetic_catalogue(args.skus)
+    rules = RepricingRules(min_margin=0.15, fixed_fee=0.5, max_markup=3.0)
+
+    started = time.perf_counter()
+    result = compute_prices(catalogue, rules)
+    elapsed = time.perf_counter() - started
+    print(f"vettoriale: {args.skus:,} SKU in {elapsed * 1000:.0f} ms "
+          f"({args.skus / elapsed:,.0f} SKU/s), modificati: {result.changed_count:,}")
+
+    started = time.perf_counter()
+    diff = result.diff(100)
+    print(f"diff (100 righe più rilevanti): {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    n = min(args.loop_skus, args.skus)
+    started = time.perf_counter()
+    expected = [
+        reprice_one(int(catalogue.price[i]), catalogue.cost[i], catalogue.competitor[i], catalogue.fee_rate[i], rules)
+        for i in range(n)
+    ]
+    loop = time.perf_counter() - started
+    print(f"ciclo Python: {n:,} SKU in {loop * 1000:.0f} ms ({n / loop:,.0f} SKU/s), "
+          f"stima su {args.skus:,}: {loop * args.skus / n:.1f} s")
+
+    mismatches = int((np.array(expected) != result.new_price[:n]).sum())
+    print(f"risultati diversi dal ciclo: {mismatches}")
+    print("esempio:", diff[:3])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Benchmark della ricerca full-text sul catalogo (app.services.search).
+
+Popola un database PostgreSQL di prova con un catalogo sintetico (default
+1M prodotti, titoli composti da tipo di prodotto, marca, aggettivo, colore e
+misura) e misura p50/p95/p99 per:
+  - ricerca di una parola, di più parole, di una frase e con filtro di categoria
+  - ricerca con refuso (ripiego a trigrammi)
+  - completamento su prefissi di 2-5 caratteri
+La cache di processo viene svuotata prima di ogni richiesta, così si misura
+il database; l'ultima riga ripete il mix con la cache attiva.
+
+Richiede un database vuoto dedicato (le tabelle vengono create se mancano).
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_search --dsn postgresql://localhost/bench --products 1000000
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Dict, List
+
+from psycopg import AsyncConnection
+
+from app.db.schema import create_schema
+from app.services import search
+
+NOUNS = [
+    "scarpe", "zaino", "borraccia", "lampada", "cuffie", "tastiera", "mouse", "monitor", "giacca", "felpa",
+    "tenda", "sedia", "tavolo", "orologio", "occhiali", "valigia", "padella", "frullatore", "trapano", "bicicletta",
+    "casco", "guanti", "cuscino", "materasso", "coperta", "smartphone", "tablet", "caricatore", "cavo", "altoparlante",
+]
+BRANDS = [f"{a}{b}" for a in ("neo", "top", "eco", "pro", "max", "ultra", "smart", "urban") for b in ("tech", "line", "home", "fit", "lab")]
+ADJECTIVES = ["impermeabile", "leggero", "ergonomico", "pieghevole", "wireless", "professionale", "compatto", "robusto", "elegante", "sportivo"]
+COLORS = ["nero", "bianco", "rosso", "blu", "verde", "grigio", "giallo", "rosa"]
+
+POPULATE = [
+    "SELECT setseed(0.42)",
+    """
+    INSERT INTO products (sku, name, description, price, stock, category_id)
+    SELECT 'bench:' || g,
+           initcap(n[1 + floor(random() * array_length(n, 1))::int]) || ' ' ||
+           initcap(b[1 + floor(random() * array_length(b, 1))::int]) || ' ' ||
+           a[1 + floor(random() * array_length(a, 1))::int] || ' ' ||
+           c[1 + floor(random() * array_length(c, 1))::int] || ' ' || (10 + g %% 90) || ' cm',
+           'Prodotto ' || a[1 + floor(random() * array_length(a, 1))::int] || ' e ' ||
+           a[1 + floor(random() * array_length(a, 1))::int] || ', ideale per casa, ufficio e viaggio. Codice ' || g,
+           round((5 + random() * 495)::numeric, 2),
+           (random() * 50)::int,
+           g %% 60
+    FROM generate_series(1, %(products)s) AS g,
+         (SELECT %(nouns)s::text[] AS n, %(brands)s::text[] AS b, %(adjectives)s::text[] AS a, %(colors)s::text[] AS c) AS v
+    """,
+    "ANALYZE products",
+]
+
+
+def typo(rng: random.Random, word: str) -> str:
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1:]
+
+
+def make_queries(rng: random.Random) -> Dict[str, Callable[[AsyncConnection], Awaitable[object]]]:
+    def one_word(conn):
+        return search.search_products(conn, rng.choice(NOUNS))
+
+    def words(conn):
+        return search.search_products(conn, f"{rng.choice(NOUNS)} {rng.choice(BRANDS)} {rng.choice(COLORS)}")
+
+    def phrase(conn):
+        return search.search_products(conn, f'"{rng.choice(NOUNS)} {rng.choice(BRANDS)}" {rng.choice(ADJECTIVES)}')
+
+    def filtered(conn):
+        return search.search_products(conn, f"{rng.choice(NOUNS)} {rng.choice(COLORS)}", category_id=rng.randrange(60), in_stock=True)
+
+    def fuzzy(conn):
+        return search.search_products(conn, f"{typo(rng, rng.choice(NOUNS))} {typo(rng, rng.choice(BRANDS))}")
+
+    def prefix(conn):
+        word = rng.choice(NOUNS + BRANDS)
+        return search.autocomplete(conn, word[:rng.randint(2, 5)])
+
+    return {
+        "una parola": one_word, "più parole": words, "frase": phrase, "con filtri": filtered,
+        "refuso": fuzzy, "completamento": prefix,
+    }
+
+
+def percentiles(latencies: List[float]) -> str:
+    latencies = sorted(latencies)
+
+    def at(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+    return f"p50={at(0.5):8.2f}ms p95={at(0.95):8.2f}ms p99={at(0.99):8.2f}ms"
+
+
+async def run(dsn: str, products: int, repeat: int) -> None:
+    rng = random.Random(0)
+    async with await AsyncConnection.connect(dsn, autocommit=True) as conn:
+        await create_schema(conn)
+        cursor = await conn.execute("SELECT count(*) FROM products")
+        if (await cursor.fetchone())[0] == 0:
+            params = {"products": products, "nouns": NOUNS, "brands": BRANDS, "adjectives": ADJECTIVES, "colors": COLORS}
+            started = time.perf_counter()
+            for statement in POPULATE:
+                await conn.execute(statement, params)
+            print(f"catalogo generato in {time.perf_counter() - started:.0f}s")
+
+        cursor = await conn.execute("SELECT count(*) FROM products")
+        print(f"{(await cursor.fetchone())[0]} prodotti")
+        queries = make_queries(rng)
+        everything: List[float] = []
+        for label, query in queries.items():
+            latencies = []
+            for _ in range(repeat):
+                search.cache.clear()
+                started = time.perf_counter()
+                await query(conn)
+                latencies.append((time.perf_counter() - started) * 1000)
+            everything.extend(latencies)
+            print(f"  {label:<14} {percentiles(latencies)}")
+        print(f"  {'tutte':<14} {percentiles(everything)}")
+
+        cached = []
+        for _ in range(repeat):
+            for query in queries.values():
+                started = time.perf_counter()
+                await query(conn)
+                cached.append((time.perf_counter() - started) * 1000)
+        print(f"  {'con cache':<14} {percentiles(cached)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", required=True)
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.dsn, args.products, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
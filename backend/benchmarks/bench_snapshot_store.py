@@ -0,0 +1,79 @@
+"""
+Benchmark dello storico prezzi con change detection (app.services.snapshot_store).
+
+Simula un mese di rilevazioni per N SKU (tempo virtuale, nessun database):
+ogni poll cambia prezzo o disponibilità con probabilità --change-rate. Misura
+la velocità di ingestione e lo spazio per SKU al mese, confrontato con lo
+schema "una riga per poll" (sku, timestamp, prezzo, disponibilità + indice).
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_snapshot_store --skus 5000 --poll-minutes 30
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, timezone
+
+from app.services.snapshot_store import SnapshotStore, decode_series
+
+# Stima dello spazio su disco in PostgreSQL
+TUPLE_OVERHEAD = 24 + 4          # header della tupla + puntatore nella pagina
+NAIVE_ROW = TUPLE_OVERHEAD + 21 + 8 + 8 + 1   # sku VARCHAR(~20) + timestamptz + bigint + boolean
+NAIVE_INDEX_ENTRY = 8 + 21 + 8 + 8            # btree su (sku, timestamp)
+HISTORY_ROW = TUPLE_OVERHEAD + 21 + 4 + 8 + 8 + 2 + 8 + 4 + 4   # colonne fisse + header bytea
+HISTORY_INDEX_ENTRY = 8 + 21 + 4               # chiave primaria (sku, month)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--skus", type=int, default=5_000)
+    parser.add_argument("--poll-minutes", type=float, default=30.0, help="intervallo tra due poll dello stesso SKU")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--change-rate", type=float, default=0.02, help="probabilità di variazione per poll")
+    args = parser.parse_args()
+
+    random.seed(42)
+    store = SnapshotStore()
+    month_epoch = int(datetime(2024, 3, 1, tzinfo=timezone.utc).timestamp())
+    step = int(args.poll_minutes * 60)
+    polls_per_sku = args.days * 86400 // step
+
+    skus = [f"amazon:B{i:09d}" for i in range(args.skus)]
+    prices = [random.randint(500, 50_000) for _ in skus]
+    stock = [True] * len(skus)
+
+    observations = 0
+    started = time.perf_counter()
+    for n in range(polls_per_sku):
+        ts = month_epoch + n * step
+        for i, sku in enumerate(skus):
+            if n and random.random() < args.change_rate:
+                if random.random() < 0.8:
+                    prices[i] += random.choice((-1, 1)) * random.randint(1, 500)
+                else:
+                    stock[i] = not stock[i]
+            store.observe(sku, prices[i], stock[i], observed_at=ts + i % step)
+            observations += 1
+    elapsed = time.perf_counter() - started
+    rows = store.drain()
+
+    payload = sum(len(row[7]) for row in rows)
+    points = sum(row[6] for row in rows)
+    compact = payload + len(rows) * (HISTORY_ROW + HISTORY_INDEX_ENTRY)
+    naive = observations * (NAIVE_ROW + NAIVE_INDEX_ENTRY)
+
+    # Verifica: la serie decodificata termina con lo stato corrente
+    last = decode_series(date(2024, 3, 1), rows[0][7])[-1]
+    assert last[1:] == (prices[0], stock[0]), "serie decodificata incoerente"
+
+    print(f"SKU: {args.skus}, poll per SKU: {polls_per_sku}, rilevazioni: {observations}")
+    print(f"ingestione: {observations / elapsed:,.0f} rilevazioni/s ({elapsed:.1f}s)")
+    print(f"variazioni scritte: {points} ({points / observations:.1%} delle rilevazioni), "
+          f"{payload / points:.2f} byte per punto")
+    print(f"storico compatto:   {compact / args.skus:10,.0f} byte per SKU al mese")
+    print(f"una riga per poll:  {naive / args.skus:10,.0f} byte per SKU al mese "
+          f"({naive / compact:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
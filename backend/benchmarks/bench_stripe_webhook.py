@@ -0,0 +1,150 @@
+"""
+Benchmark della ricezione dei webhook Stripe (app.services.stripe_events).
+
+Dagli eventi registrati in benchmarks/fixtures/stripe_events.json genera il
+ciclo di vita di molti abbonamenti (created, più updated, invoice.paid e per
+una parte deleted), li firma con un secret locale e li consegna all'endpoint
+come in una tempesta di ritentativi: ordine mescolato e una quota di eventi
+consegnata più volte. Misura:
+  - latenza della risposta dell'endpoint (verifica della firma + accodamento)
+  - tempo di elaborazione della coda, eventi per secondo e scritture risparmiate
+  - correttezza: ogni abbonamento deve finire nello stato del suo ultimo evento
+
+Richiede un database vuoto dedicato (le tabelle vengono create se mancano).
+
+Uso (dalla cartella backend):
+    python -m benchmarks.bench_stripe_webhook --dsn postgresql://localhost/bench --subscriptions 5000
+"""
+import argparse
+import asyncio
+import copy
+import json
+import os
+import random
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import httpx
+
+FIXTURES = Path(__file__).parent / "fixtures" / "stripe_events.json"
+SECRET = "whsec_bench_local"
+
+
+def make_events(rng: random.Random, subscriptions: int, updates: int) -> Tuple[List[dict], Dict[str, str]]:
+    """Eventi dal ciclo di vita degli abbonamenti e stato finale atteso per ognuno."""
+    templates = {event["type"]: event for event in json.loads(FIXTURES.read_text())}
+    events, expected = [], {}
+    for s in range(subscriptions):
+        sub_id, start = f"sub_bench{s:07d}", 1_700_000_000 + s
+        lifecycle = [("customer.subscription.created", "incomplete")]
+        lifecycle += [("customer.subscription.updated", "active")] * updates
+        lifecycle.append(("invoice.paid", None))
+        if rng.random() < 0.2:
+            lifecycle.append(("customer.subscription.deleted", "canceled"))
+        for k, (event_type, status) in enumerate(lifecycle):
+            event = copy.deepcopy(templates[event_type])
+            event["id"] = f"evt_bench{s:07d}_{k}"
+            event["created"] = start + k * 60
+            obj = event["data"]["object"]
+            if event_type == "invoice.paid":
+                obj["subscription"] = sub_id
+            else:
+                obj["id"], obj["status"] = sub_id, status
+                obj["metadata"] = {"user_id": str(s)}
+                expected[sub_id] = status
+            events.append(event)
+    return events, expected
+
+
+def percentiles(latencies: List[float]) -> str:
+    latencies = sorted(latencies)
+
+    def at(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+    return f"p50={at(0.5):6.2f}ms p95={at(0.95):6.2f}ms p99={at(0.99):6.2f}ms"
+
+
+async def run(subscriptions: int, updates: int, duplicates: float, concurrency: int, batch_size: int) -> None:
+    from fastapi import FastAPI
+
+    from app.api.api_v1.endpoints import webhooks
+    from app.db.session import close_db, db_router, init_db
+    from app.services.stripe_events import get_stripe_processor, sign_payload
+
+    rng = random.Random(0)
+    events, expected = make_events(rng, subscriptions, updates)
+    deliveries = events + rng.sample(events, int(len(events) * duplicates))
+    rng.shuffle(deliveries)
+    bodies = [json.dumps(event).encode() for event in deliveries]
+
+    await init_db()
+    async with db_router.connection() as conn:
+        await conn.execute("TRUNCATE stripe_events, stripe_subscriptions")
+
+    app = FastAPI()
+    app.include_router(webhooks.router, prefix="/webhooks")
+    processor = get_stripe_processor()
+    processor.batch_size = batch_size
+    latencies: List[float] = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for body in bodies:
+        queue.put_nowait(body)
+
+    async def deliver(client: httpx.AsyncClient) -> None:
+        while not queue.empty():
+            body = queue.get_nowait()
+            started = time.perf_counter()
+            response = await client.post(
+                "/webhooks/stripe", content=body,
+                headers={"Stripe-Signature": sign_payload(body, SECRET), "Content-Type": "application/json"},
+            )
+            latencies.append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+
+    # Prima fase: solo ricezione (il worker non è avviato), come durante un picco
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(deliver(client) for _ in range(concurrency)))
+        received = time.perf_counter() - started
+    print(
+        f"{len(bodies)} consegne ({len(events)} eventi distinti) in {received:.1f}s "
+        f"({len(bodies) / received:.0f}/s), risposta {percentiles(latencies)}"
+    )
+
+    started = time.perf_counter()
+    processed = await processor.drain()
+    elapsed = time.perf_counter() - started
+    stats = processor.stats
+    print(
+        f"elaborati {processed} eventi in {elapsed:.2f}s ({processed / elapsed:.0f}/s, {stats['batches']} lotti): "
+        f"applicati {stats['applied']}, assorbiti {stats['coalesced']}, ignorati {stats['ignored']}, falliti {stats['failed']}"
+    )
+
+    async with db_router.connection() as conn:
+        cursor = await conn.execute("SELECT id, status FROM stripe_subscriptions")
+        actual = dict(await cursor.fetchall())
+    wrong = sum(actual.get(sub_id) != status for sub_id, status in expected.items())
+    print(f"abbonamenti: {len(actual)}/{len(expected)}, stato finale errato: {wrong}")
+    await close_db()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", required=True)
+    parser.add_argument("--subscriptions", type=int, default=5000)
+    parser.add_argument("--updates", type=int, default=3, help="Eventi updated per abbonamento")
+    parser.add_argument("--duplicates", type=float, default=0.3, help="Quota di eventi consegnati due volte")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    # Le impostazioni vengono lette all'import dei moduli dell'app
+    os.environ["DATABASE_URI"] = args.dsn
+    os.environ["STRIPE_WEBHOOK_SECRET"] = SECRET
+    asyncio.run(run(args.subscriptions, args.updates, args.duplicates, args.concurrency, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
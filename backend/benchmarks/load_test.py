@@ -0,0 +1,358 @@
+"""
+Load test dell'API: backend.main:app sotto uvicorn con N worker.
+
+Avvia l'app (benchmarks.load_test_app, cioè backend.main con Google Drive
+finto) in un processo uvicorn, con i servizi esterni sostituiti in locale:
+  - Firebase Auth: chiave RSA generata al momento, certificati serviti da
+    un server HTTP locale (FIREBASE_CERTS_URL), ID token firmati qui
+  - Google Drive: servizio in memoria con latenza fissa (--drive-latency)
+  - PostgreSQL: il database di prova indicato con --dsn; il catalogo viene
+    generato se vuoto (come in bench_search)
+Il rate limiting è disattivato, altrimenti misurerebbe i 429.
+
+Ogni scenario gira per --duration secondi con --concurrency client
+concorrenti (dopo --warmup secondi non misurati):
+  - login:   POST /auth/firebase (verifica dell'ID token e token di sessione)
+  - browse:  scheda prodotto (chiavi Zipf), ricerca e autocompletamento
+  - order:   POST /orders/bulk con un ordine da un prodotto
+  - backup:  POST /backup verso il Drive finto
+Per aggiungere un router basta una funzione in SCENARIOS.
+
+I risultati (richieste al secondo, p50/p95/p99, errori) vanno in JSON con
+--output; con --baseline vengono confrontati con un'esecuzione precedente
+e il processo esce con codice 1 se uno scenario perde più di --tolerance
+di throughput o di p95, o se aumentano gli errori.
+
+Richiede un database vuoto dedicato (le tabelle vengono create se mancano).
+
+Uso (dalla cartella backend):
+    python -m benchmarks.load_test --dsn postgresql://localhost/bench --workers 4 --output load.json
+    python -m benchmarks.load_test --dsn postgresql://localhost/bench --baseline load.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import jwt
+from psycopg import AsyncConnection
+
+from app.core.config import settings
+from app.db.schema import create_schema
+from benchmarks.bench_firebase_auth import PROJECT_ID, make_key, make_token
+from benchmarks.bench_search import ADJECTIVES, BRANDS, COLORS, NOUNS, POPULATE
+from benchmarks.mock_marketplace_server import make_handler
+
+BACKEND = Path(__file__).resolve().parent.parent
+REPO_ROOT = BACKEND.parent
+API = settings.API_V1_STR
+SECRET = "loadtest-secret"
+
+
+class LoadContext:
+    """Dati condivisi dagli scenari: token, prodotti e contatore degli ordini."""
+
+    __slots__ = ("session_token", "id_tokens", "product_ids", "cum_weights", "run_id", "sequence")
+
+    def __init__(self, session_token: str, id_tokens: List[str], product_ids: List[int]):
+        self.session_token = session_token
+        self.id_tokens = id_tokens
+        self.product_ids = product_ids
+        # Pochi prodotti molto visti e una coda lunga, come il traffico reale
+        self.cum_weights = list(itertools.accumulate(1 / (k + 1) ** 1.1 for k in range(len(product_ids))))
+        self.run_id = uuid.uuid4().hex[:8]
+        self.sequence = itertools.count()
+
+    def hot_product(self, rng: random.Random) -> int:
+        return rng.choices(self.product_ids, cum_weights=self.cum_weights)[0]
+
+
+Scenario = Callable[[httpx.AsyncClient, LoadContext, random.Random], Awaitable[httpx.Response]]
+
+
+async def login(client: httpx.AsyncClient, ctx: LoadContext, rng: random.Random) -> httpx.Response:
+    return await client.post(f"{API}/auth/firebase", json={"id_token": rng.choice(ctx.id_tokens)})
+
+
+async def browse(client: httpx.AsyncClient, ctx: LoadContext, rng: random.Random) -> httpx.Response:
+    roll = rng.random()
+    if roll < 0.5:
+        return await client.get(f"{API}/products/{ctx.hot_product(rng)}")
+    if roll < 0.8:
+        return await client.get(f"{API}/products/search", params={"q": f"{rng.choice(NOUNS)} {rng.choice(COLORS)}"})
+    return await client.get(f"{API}/products/autocomplete", params={"q": rng.choice(NOUNS)[:rng.randint(2, 5)]})
+
+
+async def order(client: httpx.AsyncClient, ctx: LoadContext, rng: random.Random) -> httpx.Response:
+    body = {
+        "orders": [{
+            "user_id": rng.randint(1, 1000),
+            "external_ref": f"loadtest-{ctx.run_id}-{next(ctx.sequence)}",
+            "shipping_address": "Via del Carico 1, Milano",
+            "items": [{"product_id": ctx.hot_product(rng), "quantity": 1, "unit_price": "19.90"}],
+        }],
+    }
+    return await client.post(f"{API}/orders/bulk", json=body)
+
+
+async def backup(client: httpx.AsyncClient, ctx: LoadContext, rng: random.Random) -> httpx.Response:
+    return await client.post("/backup")
+
+
+SCENARIOS: Dict[str, Scenario] = {"login": login, "browse": browse, "order": order, "backup": backup}
+
+
+def percentile(latencies: List[float], p: float) -> float:
+    if not latencies:
+        return 0.0
+    return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 3)
+
+
+async def run_scenario(
+    base_url: str,
+    scenario: Scenario,
+    ctx: LoadContext,
+    concurrency: int,
+    duration: float,
+    warmup: float,
+) -> dict:
+    """Esegue uno scenario a concorrenza fissa e ne restituisce le metriche."""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    headers = {"Authorization": f"Bearer {ctx.session_token}"}
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    measure_from = time.monotonic() + warmup
+    stop_at = measure_from + duration
+
+    async def client_loop(client: httpx.AsyncClient, rng: random.Random) -> None:
+        while True:
+            started = time.monotonic()
+            if started >= stop_at:
+                return
+            try:
+                response = await scenario(client, ctx, rng)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            if started < measure_from:
+                continue
+            statuses[status] += 1
+            if status.startswith("2"):
+                latencies.append(time.monotonic() - started)
+
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=30.0) as client:
+        await asyncio.gather(*(client_loop(client, random.Random(i)) for i in range(concurrency)))
+
+    latencies.sort()
+    total = sum(statuses.values())
+    errors = total - len(latencies)
+    return {
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 1.0,
+        "rps": round(len(latencies) / duration, 1),
+        "p50_ms": percentile(latencies, 0.5),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "status_codes": dict(statuses),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Regressioni rispetto alla baseline: throughput, p95 ed errori per scenario."""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+        if current["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: {current['rps']} req/s contro {base['rps']} della baseline")
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {current['p95_ms']}ms contro {base['p95_ms']}ms della baseline")
+        if current["error_rate"] > base["error_rate"] + 0.01:
+            regressions.append(f"{name}: errori {current['error_rate']:.2%} contro {base['error_rate']:.2%} della baseline")
+    return regressions
+
+
+async def prepare_database(dsn: str, products: int, sample: int) -> List[int]:
+    """Crea lo schema, genera il catalogo se vuoto e restituisce gli id dei prodotti usati dagli scenari."""
+    async with await AsyncConnection.connect(dsn, autocommit=True) as conn:
+        await create_schema(conn)
+        cursor = await conn.execute("SELECT count(*) FROM products")
+        if (await cursor.fetchone())[0] == 0:
+            params = {"products": products, "nouns": NOUNS, "brands": BRANDS, "adjectives": ADJECTIVES, "colors": COLORS}
+            for statement in POPULATE:
+                await conn.execute(statement, params)
+        cursor = await conn.execute("SELECT id FROM products ORDER BY random() LIMIT %s", (sample,))
+        product_ids = [row[0] for row in await cursor.fetchall()]
+        # Scorte abbondanti: lo scenario order deve creare ordini, non scartarli
+        await conn.execute("UPDATE products SET stock = greatest(stock, 1000000) WHERE id = ANY(%s)", (product_ids,))
+    return product_ids
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class AppServer:
+    """Processo uvicorn con l'app del load test."""
+
+    def __init__(self, workers: int, env: Dict[str, str]):
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self._workers = workers
+        self._env = env
+        self._process: Optional[subprocess.Popen] = None
+
+    def start(self) -> None:
+        self._process = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "benchmarks.load_test_app:app",
+                "--host", "127.0.0.1", "--port", str(self.port), "--workers", str(self._workers),
+                "--no-access-log", "--log-level", "warning",
+            ],
+            cwd=REPO_ROOT,
+            env=self._env,
+        )
+
+    async def wait_ready(self, timeout: float = 60.0) -> None:
+        deadline = time.monotonic() + timeout
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=2.0) as client:
+            while time.monotonic() < deadline:
+                if self._process.poll() is not None:
+                    raise RuntimeError(f"uvicorn terminato con codice {self._process.returncode}")
+                try:
+                    if (await client.get("/openapi.json")).status_code == 200:
+                        return
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.2)
+        raise RuntimeError(f"l'app non risponde dopo {timeout:.0f}s")
+
+    def stop(self) -> None:
+        if self._process is None or self._process.poll() is not None:
+            return
+        self._process.terminate()
+        try:
+            self._process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace) -> dict:
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"scenari sconosciuti: {', '.join(sorted(unknown))} (disponibili: {', '.join(SCENARIOS)})")
+
+    product_ids = await prepare_database(args.dsn, args.products, args.sample)
+
+    kid = "loadtest-key"
+    key, certificate = make_key(kid)
+    certs = ThreadingHTTPServer(("127.0.0.1", 0), make_handler({("GET", "/certs"): (200, json.dumps({kid: certificate}).encode())}))
+    threading.Thread(target=certs.serve_forever, daemon=True).start()
+
+    now = int(time.time())
+    ctx = LoadContext(
+        jwt.encode({"sub": "loadtest", "iat": now, "exp": now + 86400}, SECRET, algorithm="HS256"),
+        [make_token(key, kid, f"loadtest{i:04d}") for i in range(200)],
+        product_ids,
+    )
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(BACKEND), str(REPO_ROOT), os.environ.get("PYTHONPATH")])),
+        "DATABASE_URI": args.dsn,
+        "SECRET_KEY": SECRET,
+        "FIREBASE_PROJECT_ID": PROJECT_ID,
+        "FIREBASE_CERTS_URL": f"http://127.0.0.1:{certs.server_address[1]}/certs",
+        "RATE_LIMIT_ENABLED": "false",
+        "LOADTEST_DRIVE_LATENCY": str(args.drive_latency),
+    }
+    server = AppServer(args.workers, env)
+    server.start()
+    scenarios = {}
+    try:
+        await server.wait_ready()
+        for name in names:
+            result = await run_scenario(server.base_url, SCENARIOS[name], ctx, args.concurrency, args.duration, args.warmup)
+            scenarios[name] = result
+            print(
+                f"{name:<8} {result['rps']:9.1f} req/s  p50={result['p50_ms']:8.2f}ms p95={result['p95_ms']:8.2f}ms "
+                f"p99={result['p99_ms']:8.2f}ms  errori={result['errors']} ({result['error_rate']:.2%})"
+            )
+    finally:
+        server.stop()
+        certs.shutdown()
+
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": int(time.time()),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "workers": args.workers,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "products": len(product_ids),
+            "drive_latency": args.drive_latency,
+        },
+        "scenarios": scenarios,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", required=True)
+    parser.add_argument("--workers", type=int, default=4, help="Worker uvicorn")
+    parser.add_argument("--concurrency", type=int, default=64, help="Client concorrenti per scenario")
+    parser.add_argument("--duration", type=float, default=30.0, help="Secondi misurati per scenario")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Secondi non misurati prima di ogni scenario")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--products", type=int, default=100_000, help="Prodotti generati se il catalogo è vuoto")
+    parser.add_argument("--sample", type=int, default=10_000, help="Prodotti letti e ordinati dagli scenari")
+    parser.add_argument("--drive-latency", type=float, default=0.05, help="Durata di un upload sul Drive finto (secondi)")
+    parser.add_argument("--output", help="File JSON dei risultati")
+    parser.add_argument("--baseline", help="Risultati JSON di riferimento")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Peggioramento ammesso rispetto alla baseline")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text(encoding="utf-8")), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSIONE {regression}")
+        if regressions:
+            sys.exit(1)
+        print("nessuna regressione rispetto alla baseline")
+
+
+if __name__ == "__main__":
+    main()
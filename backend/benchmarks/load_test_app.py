@@ -0,0 +1,52 @@
+"""
+App servita da uvicorn durante il load test (benchmarks.load_test).
+
+È backend.main:app con Google Drive sostituito da un servizio finto in
+memoria: il backup esegue lo stesso codice (upload_file, MediaFileUpload
+sul file reale) ma la chiamata a Drive attende LOADTEST_DRIVE_LATENCY
+secondi invece di uscire dalla macchina. Gli altri servizi esterni si
+configurano con le variabili d'ambiente impostate dal load test
+(certificati Firebase locali, DATABASE_URI di prova).
+
+Uso (dalla radice del repository, di solito tramite benchmarks.load_test):
+    PYTHONPATH=backend:. uvicorn benchmarks.load_test_app:app --workers 4
+"""
+import os
+import time
+import uuid
+
+from backend.services import drive_backup
+
+
+class FakeDriveRequest:
+    def __init__(self, latency: float, name: str):
+        self._latency = latency
+        self._name = name
+
+    def execute(self) -> dict:
+        time.sleep(self._latency)
+        return {"id": uuid.uuid4().hex, "name": self._name}
+
+
+class FakeDriveFiles:
+    def __init__(self, latency: float):
+        self._latency = latency
+
+    def create(self, body: dict, media_body=None, fields: str = "id") -> FakeDriveRequest:
+        return FakeDriveRequest(self._latency, body.get("name", ""))
+
+
+class FakeDriveService:
+    """Sottoinsieme di googleapiclient usato da drive_backup.upload_file."""
+
+    def __init__(self, latency: float):
+        self._files = FakeDriveFiles(latency)
+
+    def files(self) -> FakeDriveFiles:
+        return self._files
+
+
+_drive = FakeDriveService(float(os.getenv("LOADTEST_DRIVE_LATENCY", "0.05")))
+drive_backup.get_drive_service = lambda: _drive
+
+from backend.main import app  # noqa: E402,F401
@@ -0,0 +1,113 @@
+"""
+Server HTTP locale che riproduce risposte registrate dei marketplace.
+
+Le risposte sono lette da un file JSON (lista di {method, path, status, body}).
+Ogni risposta riporta un ETag calcolato sul corpo e il server rispetta
+If-None-Match, così da verificare anche le richieste condizionali.
+
+Uso (dalla cartella backend):
+    python -m benchmarks.mock_marketplace_server --port 8900
+    python -m benchmarks.mock_marketplace_server --port 8900 --check
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "marketplace_responses.json")
+
+
+def load_fixtures(path: str) -> Dict[Tuple[str, str], Tuple[int, bytes]]:
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    return {
+        (entry["method"], entry["path"]): (entry.get("status", 200), json.dumps(entry["body"]).encode("utf-8"))
+        for entry in entries
+    }
+
+
+def make_handler(fixtures: Dict[Tuple[str, str], Tuple[int, bytes]]):
+    class ReplayHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _replay(self) -> None:
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                self.rfile.read(length)
+
+            path = self.path.split("?", 1)[0]
+            entry = fixtures.get((self.command, path))
+            if entry is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            status, body = entry
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = _replay
+        do_POST = _replay
+
+        def log_message(self, format, *args):
+            pass
+
+    return ReplayHandler
+
+
+def serve(port: int, fixtures_path: str = DEFAULT_FIXTURES) -> ThreadingHTTPServer:
+    """Avvia il server in un thread e lo restituisce."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(load_fixtures(fixtures_path)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def check(port: int) -> None:
+    """Esegue le ricerche Amazon ed eBay contro il server di replay."""
+    from app.services.amazon_service import AmazonService
+    from app.services.ebay_service import EbayService
+    from app.services.marketplace import MarketplaceClient
+
+    async with MarketplaceClient() as client:
+        amazon = AmazonService(client, base_url=f"http://127.0.0.1:{port}/paapi5")
+        ebay = EbayService(client, base_url=f"http://127.0.0.1:{port}/buy/browse/v1")
+        for service in (amazon, ebay):
+            for product in await service.search("lampada"):
+                print(service.name, product.json())
+
+        first = await client.get(f"http://127.0.0.1:{port}/buy/browse/v1/item_summary/search", params={"q": "x"})
+        second = await client.get(f"http://127.0.0.1:{port}/buy/browse/v1/item_summary/search", params={"q": "x"})
+        print("richiesta condizionale: prima dalla cache =", first.from_cache, "seconda =", second.from_cache)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    parser.add_argument("--check", action="store_true", help="esegue le ricerche dei servizi ed esce")
+    args = parser.parse_args()
+
+    server = serve(args.port, args.fixtures)
+    if args.check:
+        asyncio.run(check(args.port))
+        server.shutdown()
+    else:
+        print(f"Replay marketplace su http://127.0.0.1:{args.port}")
+        threading.Event().wait()
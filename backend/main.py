@@ -1,19 +1,81 @@
 from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
 from api_routes.backup_endpoint import backup_bp  # Assicurati che questa importazione sia presente
+from app.api.api_v1.api import api_router
+from app.core.config import settings
+from app.core.config_snapshot import install_reload_handler
+from app.core.firebase_auth import close_firebase_certificates, get_firebase_certificates
+from app.db.session import init_db, close_db
+from app.middleware.cors import CORSMiddleware
+from app.middleware.db_commit import DatabaseCommitMiddleware
+from app.middleware.rate_limit import RateLimitMiddleware
+from app.middleware.security_headers import SecurityHeadersMiddleware
+from app.services.cache import close_cache, get_cache
+from app.services.content_generation import close_content_generator
+from app.services.entitlements import close_entitlements, get_entitlements
+from app.services.inventory import close_inventory, get_inventory
+from app.services.marketplace import close_marketplace_client
+from app.services.order_events import close_order_broadcaster, get_order_broadcaster
+from app.services.price_monitor import close_price_monitor, start_price_monitor
+from app.services.snapshot_store import close_snapshot_store, start_snapshot_store
+from app.services.stripe_events import close_stripe_processor, get_stripe_processor
+from app.utils.selenium_manager import close_browser_pool
 
 app = FastAPI()
 
-# Middleware CORS (opzionale)
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Puoi restringere in produzione
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# COMMIT delle transazioni di get_db prima dell'invio della risposta (il più interno)
+app.add_middleware(DatabaseCommitMiddleware)
+
+# Rate limiting per piano dell'utente; aggiunto prima del CORS, che lo avvolge:
+# anche le risposte 429 hanno gli header CORS
+app.add_middleware(RateLimitMiddleware)
+
+# Header di sicurezza (CSP, HSTS, ...) solo in produzione: la CSP bloccherebbe
+# gli script della documentazione interattiva in sviluppo
+if settings.PRODUCTION:
+    app.add_middleware(SecurityHeadersMiddleware)
+
+# CORS per le origini di ALLOWED_ORIGINS (anche con jolly); aggiunto per ultimo,
+# quindi è il più esterno e risponde ai preflight prima di tutto il resto
+app.add_middleware(CORSMiddleware)
 
 # Includi solo il router di backup per il test
 app.include_router(backup_bp)  # Questa è la linea critica per rendere funzionante il backup
 
+# Router delle API v1
+app.include_router(api_router, prefix=settings.API_V1_STR)
+
+
+@app.on_event("startup")
+async def on_startup():
+    # `kill -HUP` rilegge .env e variabili d'ambiente senza riavviare
+    install_reload_handler()
+    await init_db()
+    get_inventory().start()
+    get_order_broadcaster().start()
+    get_stripe_processor().start()
+    get_entitlements().start()
+    get_cache().start()
+    if settings.FIREBASE_PROJECT_ID:
+        get_firebase_certificates().start()
+    if settings.MONITOR_ENABLED:
+        # Ogni controllo riuscito passa dalla change detection dello storico prezzi
+        snapshot_store = await start_snapshot_store()
+        await start_price_monitor(on_check=snapshot_store.on_monitor_check)
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await close_price_monitor()
+    await close_snapshot_store()
+    await close_marketplace_client()
+    await close_content_generator()
+    await close_browser_pool()
+    await close_inventory()
+    await close_order_broadcaster()
+    await close_stripe_processor()
+    await close_entitlements()
+    await close_cache()
+    await close_firebase_certificates()
+    await close_db()
+
 # Altri import/commenti non necessari per questo test
@@ -0,0 +1,55 @@
+import pytest
+
+from app.core.auth import CurrentUser
+from app.core.config import settings
+from app.core.errors import PermissionDeniedError
+from app.services.analytics import AnalyticsCache, status_sign
+from app.services.entitlements import PlanLimits
+
+
+def make_user(user_id: str, is_admin: bool = False) -> CurrentUser:
+    return CurrentUser(user_id, {"sub": user_id}, PlanLimits("free", 100, 3600, 60), is_admin)
+
+
+def test_status_sign():
+    assert status_sign(None, "processing") == 1
+    assert status_sign("processing", "shipped") == 0
+    assert status_sign("shipped", "cancelled") == -1
+    assert status_sign(None, "pending") == 0
+
+
+def test_cache_expires_and_evicts():
+    now = [0.0]
+    cache = AnalyticsCache(ttl=10, max_size=2, clock=lambda: now[0])
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+    assert cache.get("a") is None
+    assert cache.get("c") == 3
+    now[0] = 11
+    assert cache.get("c") is None
+
+
+def test_users_only_see_their_own_analytics():
+    user = make_user("42")
+    assert user.scope(None) == 42
+    assert user.scope(42) == 42
+    with pytest.raises(PermissionDeniedError):
+        user.scope(7)
+    with pytest.raises(PermissionDeniedError):
+        make_user("firebase-uid").scope(None)
+
+
+def test_admins_choose_the_user():
+    admin = make_user("1", is_admin=True)
+    assert admin.scope(None) is None
+    assert admin.scope(7) == 7
+
+
+@pytest.mark.anyio
+async def test_overview_of_another_user_is_forbidden(app_client, user_headers):
+    url = f"{settings.API_V1_STR}/analytics/overview"
+    response = await app_client.get(url, params={"user_id": 7}, headers=user_headers)
+    anonymous = await app_client.get(url)
+    assert response.status_code == 403
+    assert anonymous.status_code == 401
@@ -0,0 +1,26 @@
+import pytest
+
+from app.api.api_v1.endpoints import auth as auth_endpoint
+from app.core.auth import decode_token
+from app.core.config import settings
+
+
+@pytest.mark.anyio
+async def test_session_token_carries_the_internal_user_id(monkeypatch, client, db):
+    monkeypatch.setattr(auth_endpoint, "get_firebase_certificates", lambda: None)
+    monkeypatch.setattr(auth_endpoint, "verify_firebase_token", lambda token, certificates: {
+        "sub": f"uid-{token}", "email": "mario@example.com",
+    })
+    url = f"{settings.API_V1_STR}/auth/firebase"
+    first = await client.post(url, json={"id_token": "a"})
+    again = await client.post(url, json={"id_token": "a"})
+    other = await client.post(url, json={"id_token": "b"})
+    assert first.status_code == 200
+    session = first.json()["data"]
+    claims = decode_token(session["access_token"])
+    cursor = await db.execute("SELECT id FROM users WHERE firebase_uid = 'uid-a'")
+    assert await cursor.fetchone() == (session["user_id"],)
+    assert claims["sub"] == str(session["user_id"])
+    assert claims["firebase_uid"] == "uid-a"
+    assert decode_token(again.json()["data"]["access_token"])["sub"] == claims["sub"]
+    assert other.json()["data"]["user_id"] != session["user_id"]
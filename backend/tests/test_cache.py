@@ -0,0 +1,123 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.services.cache import LayeredCache, SharedTier, cached
+
+
+def test_shared_tier_is_abstract():
+    with pytest.raises(TypeError):
+        SharedTier()
+
+
+@pytest.mark.anyio
+async def test_cached_fills_from_its_own_connection():
+    used = []
+
+    @asynccontextmanager
+    async def primary():
+        yield "primario"
+
+    @cached(cache=LayeredCache(), connection=primary, tags=lambda item_id, conn: [f"item:{item_id}"])
+    async def load_item(item_id, conn=None):
+        used.append(conn)
+        return {"id": item_id}
+
+    assert await load_item(1, "replica") == {"id": 1}
+    assert await load_item(1) == {"id": 1}
+    assert used == ["primario"]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class MemoryTier(SharedTier):
+    def __init__(self):
+        self.entries = {}
+
+    async def get(self, key):
+        return self.entries.get(key)
+
+    async def set(self, key, value, ttl, stale_ttl, tags):
+        self.entries[key] = (value, ttl, ttl + stale_ttl, tags)
+
+    async def delete_tags(self, conn, tags):
+        self.entries = {k: v for k, v in self.entries.items() if not set(v[3]) & set(tags)}
+
+
+@pytest.mark.anyio
+async def test_concurrent_misses_share_one_load():
+    cache = LayeredCache()
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return "valore"
+
+    assert await asyncio.gather(*(cache.get_or_load("k", loader) for _ in range(10))) == ["valore"] * 10
+    assert len(loads) == 1
+    assert cache.metrics.coalesced == 9
+
+
+@pytest.mark.anyio
+async def test_stale_value_is_served_while_it_reloads():
+    clock = Clock()
+    cache = LayeredCache(ttl=10, stale_ttl=60, clock=clock)
+    versions = iter(["v1", "v2"])
+
+    async def loader():
+        return next(versions)
+
+    assert await cache.get_or_load("k", loader) == "v1"
+    clock.now = 11
+    assert await cache.get_or_load("k", loader) == "v1"
+    await asyncio.sleep(0)
+    assert await cache.get_or_load("k", loader) == "v2"
+    await cache.close()
+    assert cache.metrics.stale_hits == 1 and cache.metrics.refreshes == 1
+
+
+@pytest.mark.anyio
+async def test_load_invalidated_meanwhile_is_not_stored():
+    cache = LayeredCache()
+
+    async def loader():
+        cache.invalidate_local(["product:1"])
+        return "vecchio"
+
+    assert await cache.get_or_load("k", loader, tags=["product:1"]) == "vecchio"
+    assert len(cache) == 0
+
+
+def test_lru_evicts_the_least_recently_used():
+    cache = LayeredCache(max_size=2)
+    for key in ("a", "b", "c"):
+        cache._store(key, key, 10, 20, (f"tag:{key}",))
+    assert list(cache._entries) == ["b", "c"]
+    assert cache.invalidate_local(["tag:c"]) == 1
+    assert cache.metrics.evictions == 1
+
+
+@pytest.mark.anyio
+async def test_shared_tier_is_checked_before_loading():
+    shared = MemoryTier()
+    first, second = LayeredCache(shared=shared), LayeredCache(shared=shared)
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        return "valore"
+
+    assert await first.get_or_load("k", loader, tags=["t"]) == "valore"
+    await asyncio.sleep(0)
+    assert await second.get_or_load("k", loader, tags=["t"]) == "valore"
+    assert len(loads) == 1
+    assert second.metrics.shared_hits == 1
+    await first.close()
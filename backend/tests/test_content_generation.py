@@ -0,0 +1,83 @@
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.services import content_generation
+from app.services.content_generation import APPLY_CONTENT, LOAD_PRODUCTS, GeneratedContent, generate_product_content
+
+
+class FakeCursor:
+    def __init__(self, rows=(), rowcount=0):
+        self.rows = list(rows)
+        self.rowcount = rowcount
+
+    async def fetchall(self):
+        return self.rows
+
+
+class FakeDatabase:
+    """Factory di connessioni finte che conta le transazioni aperte (prodotti: id, nome, descrizione, utente)."""
+
+    def __init__(self, products):
+        self.products = products
+        self.open = 0
+        self.transactions = 0
+
+    @asynccontextmanager
+    async def connection(self):
+        self.open += 1
+        self.transactions += 1
+        try:
+            yield self
+        finally:
+            self.open -= 1
+
+    async def execute(self, query, params=None):
+        if query == LOAD_PRODUCTS:
+            return FakeCursor([
+                p[:3] for p in self.products
+                if p[0] in params["ids"] and params["owner_id"] in (None, p[3])
+            ])
+        if query == APPLY_CONTENT:
+            return FakeCursor(rowcount=len(params["ids"]))
+        return FakeCursor()
+
+
+class FakeGenerator:
+    def __init__(self, database):
+        self.database = database
+
+    def request(self, name, description):
+        return name
+
+    async def generate_many(self, requests, connection=None):
+        # La chiamata al modello non deve trovare transazioni aperte
+        assert self.database.open == 0
+        return [GeneratedContent(title=f"{name}!", description="testo") for name in requests], len(requests)
+
+
+@pytest.mark.anyio
+async def test_no_transaction_is_held_while_the_model_runs(monkeypatch):
+    async def no_invalidation(conn, tags):
+        pass
+
+    monkeypatch.setattr(content_generation, "invalidate_tags", no_invalidation)
+    database = FakeDatabase([(1, "Tazza", "in ceramica", 7)])
+    report = await generate_product_content(
+        FakeGenerator(database), [1, 2], apply=True, connection=database.connection,
+    )
+    assert [item.title for item in report.items] == ["Tazza!"]
+    assert report.not_found == [2]
+    assert report.applied == 1
+    # Lettura e scrittura in due transazioni brevi separate
+    assert database.transactions == 2
+
+
+@pytest.mark.anyio
+async def test_users_rewrite_only_their_products():
+    database = FakeDatabase([(1, "Tazza", "in ceramica", 7), (2, "Piatto", "in vetro", 8)])
+    report = await generate_product_content(
+        FakeGenerator(database), [1, 2], connection=database.connection, owner_id=7,
+    )
+    assert [item.product_id for item in report.items] == [1]
+    assert report.not_found == [2]
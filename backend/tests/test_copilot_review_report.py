@@ -0,0 +1,118 @@
+import importlib.util
+import os
+from pathlib import Path
+
+import pytest
+
+SCRIPT = Path(__file__).resolve().parents[2] / "github" / "scripts" / "generate_copilot_review_report.py"
+
+
+@pytest.fixture(scope="module")
+def report():
+    spec = importlib.util.spec_from_file_location("generate_copilot_review_report", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def project(tmp_path):
+    root = tmp_path / "progetto"
+    (root / "app").mkdir(parents=True)
+    (root / "scripts").mkdir()
+    (root / "app" / "main.py").write_text("print('main')\n")
+    (root / "app" / "util.py").write_text("VALORE = 1\n")
+    (root / "scripts" / "tool.py").write_text("import sys\n")
+    (root / "venv").mkdir()
+    (root / "venv" / "lib.py").write_text("")
+    (root / ".gitignore").write_text("*.log\nbuild/\n")
+    (root / "build").mkdir()
+    (root / "build" / "gen.py").write_text("")
+    return root
+
+
+def touch(path: Path) -> None:
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def write_analysis(output: Path, relative: str, text: str) -> None:
+    content = output.read_text()
+    start = content.index(f"FILE: {relative}\n")
+    marker = content.index("(scrivi qui sotto)\n\n", start) + len("(scrivi qui sotto)\n\n")
+    output.write_text(content[:marker] + text + "\n" + content[marker:])
+
+
+def test_files_follow_gitignore(report, project):
+    assert report.list_python_files(project) == ["app/main.py", "app/util.py", "scripts/tool.py"]
+
+
+def test_unchanged_tree_is_not_rewritten(report, project, tmp_path):
+    output = tmp_path / "report.txt"
+    stats, written = report.generate_report(project, output, [], workers=2)
+    assert written and stats["rigenerati"] == 3
+    before = output.read_text()
+
+    stats, written = report.generate_report(project, output, [], workers=2)
+    assert not written
+    assert stats["invariati"] == 3
+    assert output.read_text() == before
+
+
+def test_analysis_survives_until_the_file_changes(report, project, tmp_path):
+    output = tmp_path / "report.txt"
+    report.generate_report(project, output, [], workers=2)
+    write_analysis(output, "app/util.py", "Nessun problema.")
+
+    # Stesso contenuto con un altro mtime: il file viene riletto, l'analisi resta
+    touch(project / "app" / "util.py")
+    stats, _ = report.generate_report(project, output, [], workers=2)
+    assert (stats["riletti"], stats["invariati"]) == (1, 2)
+    assert "Nessun problema." in output.read_text()
+
+    (project / "app" / "util.py").write_text("VALORE = 2\n")
+    touch(project / "app" / "util.py")
+    stats, _ = report.generate_report(project, output, [], workers=2)
+    assert stats["rigenerati"] == 1
+    assert "Nessun problema." not in output.read_text()
+    assert "VALORE = 2" in output.read_text()
+
+
+def test_targeted_run_keeps_other_sections(report, project, tmp_path):
+    output = tmp_path / "report.txt"
+    report.generate_report(project, output, [], workers=2)
+    write_analysis(output, "scripts/tool.py", "Analisi dello script.")
+    (project / "scripts" / "tool.py").write_text("import os\n")
+    touch(project / "scripts" / "tool.py")
+    (project / "app" / "main.py").write_text("print('nuovo')\n")
+    touch(project / "app" / "main.py")
+
+    stats, written = report.generate_report(project, output, ["app/"], workers=2)
+    text = output.read_text()
+    assert written
+    assert (stats["rigenerati"], stats["invariati"], stats["conservati"]) == (1, 1, 1)
+    # La sezione fuori dai target è quella precedente, anche se il file è cambiato
+    assert "Analisi dello script." in text and "import os" not in text
+    assert "print('nuovo')" in text
+    assert [line for line in text.splitlines() if line.startswith("FILE: ")] == [
+        "FILE: app/main.py", "FILE: app/util.py", "FILE: scripts/tool.py",
+    ]
+
+    stats, written = report.generate_report(project, output, ["app"], workers=2)
+    assert not written and stats["conservati"] == 1
+
+
+def test_removed_files_leave_the_report(report, project, tmp_path):
+    output = tmp_path / "report.txt"
+    report.generate_report(project, output, [], workers=2)
+    (project / "app" / "util.py").unlink()
+    stats, written = report.generate_report(project, output, [], workers=2)
+    assert written and stats["rimossi"] == 1
+    assert "FILE: app/util.py" not in output.read_text()
+
+
+def test_standard_output_has_every_selected_file(report, project, capsys):
+    stats, written = report.generate_report(project, None, ["scripts"], workers=1)
+    out = capsys.readouterr().out
+    assert written and stats["rigenerati"] == 1
+    assert "FILE: scripts/tool.py" in out and "FILE: app/main.py" not in out
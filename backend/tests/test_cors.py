@@ -0,0 +1,73 @@
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.core.config_snapshot import ConfigSnapshot, OriginMatcher
+from app.middleware.cors import CORSMiddleware, CORSPolicy
+
+
+def test_origin_matcher_exact_and_wildcards():
+    matcher = OriginMatcher(["https://shop.example.com/", "https://*.example.it"])
+    assert matcher("https://SHOP.example.com")
+    assert matcher("https://a.b.example.it")
+    assert not matcher("https://example.it")
+    assert not matcher("https://evil-example.it")
+    assert not matcher("https://shop.example.com.evil.com")
+    assert OriginMatcher(["*"])("https://chiunque.com")
+
+
+def make_config(**overrides) -> ConfigSnapshot:
+    return ConfigSnapshot(settings.copy(update={
+        "ALLOWED_ORIGINS": ["https://shop.example.com"],
+        "CORS_ALLOW_HEADERS": ["Authorization"],
+        **overrides,
+    }))
+
+
+def test_policy_checks_requested_headers():
+    policy = CORSPolicy(make_config())
+    assert policy.allowed(b"https://shop.example.com")
+    assert not policy.allowed(b"https://altro.com")
+    assert policy.headers_allowed(b"Authorization, Content-Type")
+    assert not policy.headers_allowed(b"authorization, x-custom")
+    assert CORSPolicy(make_config(CORS_ALLOW_HEADERS=["*"])).headers_allowed(b"x-custom")
+
+
+def test_policy_forgets_origins_beyond_the_limit():
+    policy = CORSPolicy(make_config(), max_origins=2)
+    for i in range(3):
+        policy.allowed(f"https://{i}.com".encode())
+    assert len(policy._origins) == 1
+
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"vary", b"Accept-Encoding")]})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+@pytest.mark.anyio
+async def test_middleware_answers_preflight_and_decorates_responses():
+    app = CORSMiddleware(ok_app, config=make_config())
+    origin = "https://shop.example.com"
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        preflight = await client.options("/", headers={
+            "Origin": origin, "Access-Control-Request-Method": "PATCH",
+            "Access-Control-Request-Headers": "authorization",
+        })
+        refused = await client.options("/", headers={
+            "Origin": "https://altro.com", "Access-Control-Request-Method": "GET",
+        })
+        bad_method = await client.options("/", headers={
+            "Origin": origin, "Access-Control-Request-Method": "TRACE",
+        })
+        simple = await client.get("/", headers={"Origin": origin})
+        foreign = await client.get("/", headers={"Origin": "https://altro.com"})
+    assert preflight.status_code == 204
+    assert preflight.headers["access-control-allow-origin"] == origin
+    # I preflight rifiutati non ripetono l'origine né annunciano la policy
+    for response in (refused, bad_method):
+        assert response.status_code == 400
+        assert not [name for name in response.headers if name.startswith("access-control-") or name == "vary"]
+    assert simple.headers["access-control-allow-origin"] == origin
+    assert simple.headers["vary"] == "Accept-Encoding, Origin"
+    assert "access-control-allow-origin" not in foreign.headers
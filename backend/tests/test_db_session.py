@@ -0,0 +1,158 @@
+from contextlib import asynccontextmanager
+from typing import List
+
+import httpx
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+
+from app.db import session
+from app.db.session import STICKY_COOKIE, DatabaseRouter, get_db, get_read_db
+from app.middleware.db_commit import DatabaseCommitMiddleware
+
+
+class FakePool:
+    def __init__(self, dsn: str, min_size: int, max_size: int):
+        self.dsn = dsn
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeConnection:
+    def __init__(self, events: List[str], fail_commit: bool = False):
+        self.events = events
+        self.fail_commit = fail_commit
+
+    async def commit(self) -> None:
+        if self.fail_commit:
+            raise RuntimeError("commit fallito")
+        self.events.append("commit")
+
+    async def rollback(self) -> None:
+        self.events.append("rollback")
+
+
+def make_router(clock: FakeClock, secret: str = "") -> DatabaseRouter:
+    return DatabaseRouter(
+        "postgresql://primary", ["postgresql://replica"], pool_factory=FakePool, clock=clock,
+        sticky_secret=secret, wall_clock=clock,
+    )
+
+
+def test_read_your_writes_window_expires():
+    clock = FakeClock()
+    router = make_router(clock)
+    router.mark_write("user:1")
+    assert router.is_sticky("user:1")
+    assert not router.is_sticky("user:2")
+    clock.now += router.sticky_seconds
+    assert not router.is_sticky("user:1")
+
+
+def test_expired_windows_are_pruned_outside_writes():
+    clock = FakeClock()
+    router = make_router(clock)
+    router.mark_write("user:1")
+    clock.now += router.sticky_seconds
+    router.mark_write("user:2")
+    assert router.prune_sticky() == 1
+    assert router.is_sticky("user:2")
+
+
+def test_sticky_token_is_honoured_by_other_workers():
+    clock = FakeClock()
+    writer, reader = make_router(clock, "segreto"), make_router(clock, "segreto")
+    token = writer.sticky_token()
+    assert reader.token_is_sticky(token)
+    assert not make_router(clock, "altro").token_is_sticky(token)
+    until, _, signature = token.rpartition(".")
+    assert not reader.token_is_sticky(f"{float(until) + 60:.3f}.{signature}")
+    clock.now += writer.sticky_seconds
+    assert not reader.token_is_sticky(token)
+    assert make_router(clock).sticky_token() is None
+
+
+def test_lagging_replica_is_not_chosen():
+    router = make_router(FakeClock())
+    assert router.choose_replica() is router.replicas[0]
+    router.replicas[0].lag = router.max_lag + 1
+    assert router.choose_replica() is None
+
+
+def make_app(events: List[str], monkeypatch, fail_commit: bool = False) -> FastAPI:
+    @asynccontextmanager
+    async def connection(read_only=False, sticky_key=None):
+        events.append("replica" if read_only else "primario")
+        yield FakeConnection(events, fail_commit)
+
+    monkeypatch.setattr(session.db_router, "connection", connection)
+    monkeypatch.setattr(session.db_router, "mark_write", lambda key: events.append(f"sticky {key}"))
+    monkeypatch.setattr(session.db_router, "replicas", ["replica"])
+
+    app = FastAPI()
+    app.add_middleware(DatabaseCommitMiddleware)
+
+    @app.post("/items")
+    async def create_item(conn=Depends(get_db)):
+        return {"ok": True}
+
+    @app.get("/items")
+    async def read_items(conn=Depends(get_read_db)):
+        return {"ok": True}
+
+    @app.post("/fail")
+    async def fail(conn=Depends(get_db)):
+        raise HTTPException(status_code=409, detail="conflitto")
+
+    return app
+
+
+@pytest.mark.anyio
+async def test_commit_and_stickiness_before_response(monkeypatch):
+    events: List[str] = []
+    app = make_app(events, monkeypatch)
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/items")
+        events.append("response")
+    assert response.status_code == 200
+    assert events == ["primario", "commit", "sticky ip:127.0.0.1", "response"]
+
+
+@pytest.mark.anyio
+async def test_write_cookie_sends_reads_to_the_primary(monkeypatch):
+    events: List[str] = []
+    app = make_app(events, monkeypatch)
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        await client.get("/items")
+        response = await client.post("/items")
+        # Un altro worker non ha la finestra nel processo: basta il cookie
+        monkeypatch.setattr(session.db_router, "_sticky_until", {})
+        await client.get("/items")
+    assert STICKY_COOKIE in response.cookies
+    assert [e for e in events if e in ("replica", "primario")] == ["replica", "primario", "primario"]
+
+
+@pytest.mark.anyio
+async def test_error_response_rolls_back(monkeypatch):
+    events: List[str] = []
+    app = make_app(events, monkeypatch)
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/fail")
+    assert response.status_code == 409
+    assert events == ["primario", "rollback"]
+
+
+@pytest.mark.anyio
+async def test_failed_commit_returns_500(monkeypatch):
+    events: List[str] = []
+    app = make_app(events, monkeypatch, fail_commit=True)
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/items")
+    assert response.status_code == 500
+    assert response.json()["error_code"] == "database_error"
+    assert events == ["primario", "rollback"]
@@ -0,0 +1,73 @@
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import pytest
+
+from app.services import dedup
+from app.services.dedup import LOAD_CHANGED_PRODUCTS, ClusterCache, DedupIndex, cluster_catalogue
+
+
+class FakeCursor:
+    def __init__(self, catalogue):
+        self.catalogue = catalogue
+        self.rows = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params=None):
+        if query == LOAD_CHANGED_PRODUCTS:
+            self.rows = [(pid, name, updated_at) for pid, (name, updated_at) in self.catalogue.products.items()]
+        else:
+            self.rows = [(pid,) for pid in self.catalogue.products]
+
+    async def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+
+class FakeCatalogue:
+    def __init__(self, products):
+        now = datetime.now(timezone.utc)
+        self.products = {pid: (name, now) for pid, name in products.items()}
+        self.connections = 0
+
+    def cursor(self, name=None):
+        return FakeCursor(self)
+
+    @asynccontextmanager
+    async def connection(self):
+        self.connections += 1
+        yield self
+
+
+PHONES = {1: "Apple iPhone 13 128GB nero", 2: "iPhone 13 128 GB Apple nero offerta", 3: "Tazza in ceramica"}
+
+
+@pytest.mark.anyio
+async def test_sync_drops_deleted_products():
+    catalogue = FakeCatalogue(PHONES)
+    index = DedupIndex()
+    await index.sync(catalogue, reconcile_interval=0)
+    assert index.clusters() == [[1, 2]]
+
+    del catalogue.products[2]
+    await index.sync(catalogue, reconcile_interval=0)
+    assert len(index) == 2
+    assert index.clusters() == []
+    assert [pid for pid, _ in index.query("Apple iPhone 13 128GB nero")] == [1]
+
+
+@pytest.mark.anyio
+async def test_clusters_are_served_from_cache(monkeypatch):
+    catalogue = FakeCatalogue(PHONES)
+    monkeypatch.setattr(dedup, "_index", DedupIndex())
+    monkeypatch.setattr(dedup, "_clusters", ClusterCache(ttl=60))
+    first = await cluster_catalogue(connection=catalogue.connection)
+    second = await cluster_catalogue(connection=catalogue.connection)
+    assert first.clusters == [[1, 2]]
+    assert second is first
+    assert catalogue.connections == 1
@@ -0,0 +1,52 @@
+import csv
+import io
+import json
+
+import jwt
+import pytest
+
+from generate_token import TokenIssuer, issue_tokens, read_users
+
+SECRET = "segreto-di-prova"
+
+
+def test_claims_take_the_first_subject_and_keep_extra_fields():
+    issuer = TokenIssuer(SECRET, 600)
+    claims = issuer.claims({"sub": "", "user_id": 42, "id": 7, "email": "mario@example.com", "ruolo": ""}, now=1000)
+    assert claims["sub"] == "42"
+    assert (claims["iat"], claims["nbf"], claims["exp"]) == (1000, 1000, 1600)
+    assert claims["email"] == "mario@example.com"
+    # Le colonne vuote e le altre chiavi del soggetto non diventano claim
+    assert "ruolo" not in claims and "id" not in claims and "user_id" not in claims
+    assert claims["jti"] != issuer.claims({"id": 7}, now=1000)["jti"]
+    with pytest.raises(ValueError):
+        issuer.claims({"email": "anonimo@example.com"}, now=1000)
+
+
+def test_csv_output_quotes_awkward_subjects():
+    issuer = TokenIssuer(SECRET, 600, "csv")
+    subjects = ['rossi, mario', 'il "capo"', "a capo\nqui"]
+    out = io.StringIO()
+    assert issue_tokens(iter([{"sub": s} for s in subjects]), issuer, out) == 3
+    rows = list(csv.reader(io.StringIO(out.getvalue())))
+    assert rows[0] == ["sub", "access_token", "expires_at"]
+    assert [row[0] for row in rows[1:]] == subjects
+    for subject, token, expires_at in rows[1:]:
+        claims = jwt.decode(token, SECRET, algorithms=["HS256"])
+        assert claims["sub"] == subject and claims["exp"] == int(expires_at)
+
+
+def test_users_are_read_from_csv_and_ndjson():
+    assert list(read_users(io.StringIO("id,email\n1,a@example.com\n"), "csv")) == [{"id": "1", "email": "a@example.com"}]
+    assert list(read_users(io.StringIO('{"sub": "u1"}\n\n{"sub": "u2"}\n'), "ndjson")) == [{"sub": "u1"}, {"sub": "u2"}]
+
+
+@pytest.mark.parametrize("processes", [1, 3])
+def test_tokens_keep_the_input_order(processes):
+    out = io.StringIO()
+    users = ({"sub": f"utente-{i}"} for i in range(50))
+    count = issue_tokens(users, TokenIssuer(SECRET, 600), out, processes=processes, batch_size=7)
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert count == len(lines) == 50
+    assert [line["sub"] for line in lines] == [f"utente-{i}" for i in range(50)]
+    assert jwt.decode(lines[-1]["access_token"], SECRET, algorithms=["HS256"])["sub"] == "utente-49"
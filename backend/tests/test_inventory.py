@@ -0,0 +1,65 @@
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.core.config import settings
+from app.services.inventory import INSERT_BATCH_HOLDS, LEASE_STOCK, InventoryEngine
+
+
+class FakeCursor:
+    def __init__(self, row=None):
+        self.row = row
+        self.rowcount = 1
+
+    async def fetchone(self):
+        return self.row
+
+
+class FakeCatalogue:
+    """Connessioni finte: la lease concede fino allo stock residuo del prodotto."""
+
+    def __init__(self, stock):
+        self.stock = dict(stock)
+        self.holds = []
+
+    async def execute(self, query, params=None):
+        if query == LEASE_STOCK:
+            granted = min(self.stock.get(params["product_id"], 0), params["want"])
+            self.stock[params["product_id"]] -= granted
+            return FakeCursor((granted,) if granted else None)
+        if query == INSERT_BATCH_HOLDS:
+            self.holds.append(params)
+        return FakeCursor()
+
+    @asynccontextmanager
+    async def connection(self):
+        yield self
+
+
+@pytest.mark.anyio
+async def test_reserve_many_is_all_or_nothing_per_cart():
+    catalogue = FakeCatalogue({1: 3, 2: 10})
+    engine = InventoryEngine(connection=catalogue.connection, worker_id="w", min_lease=1)
+    first, second, third = await engine.reserve_many([{1: 2, 2: 1}, {1: 2}, {1: 1, 2: 5}])
+    assert first.items == {1: 2, 2: 1}
+    assert second is None
+    assert third.items == {1: 1, 2: 5}
+    # Un solo INSERT per tutte le prenotazioni del batch
+    assert len(catalogue.holds) == 1
+    _, _, reservation_ids, product_ids, quantities = catalogue.holds[0]
+    assert sorted(set(reservation_ids)) == sorted({first.id, third.id})
+    assert sum(quantities) == 9
+
+
+@pytest.mark.anyio
+async def test_lease_covers_carts_larger_than_max_lease():
+    catalogue = FakeCatalogue({1: 2000})
+    engine = InventoryEngine(connection=catalogue.connection, worker_id="w", max_lease=500)
+    reservation = await engine.reserve({1: 1200})
+    assert reservation.items == {1: 1200}
+
+
+@pytest.mark.anyio
+async def test_malformed_reservation_id_is_rejected_before_the_database(app_client, user_headers):
+    response = await app_client.delete(f"{settings.API_V1_STR}/inventory/reservations/not-a-uuid", headers=user_headers)
+    assert response.status_code == 422
@@ -0,0 +1,36 @@
+import pytest
+from pydantic import ValidationError
+
+from app.core.config import Settings
+from app.services import marketplace
+
+
+def test_host_limits_are_validated():
+    limits = Settings(MARKETPLACE_HOST_LIMITS={"api.ebay.com": {"concurrency": 16, "rate": 20}}).MARKETPLACE_HOST_LIMITS
+    assert limits["api.ebay.com"].concurrency == 16
+    for bad in ({"concurrency": 16.5}, {"concurrency": 0}, {"rate": 0}):
+        with pytest.raises(ValidationError):
+            Settings(MARKETPLACE_HOST_LIMITS={"api.ebay.com": bad})
+
+
+def test_missing_host_limits_use_global_defaults(monkeypatch):
+    configured = Settings(MARKETPLACE_HOST_LIMITS={"api.ebay.com": {"rate": 20}})
+    monkeypatch.setattr(marketplace.settings, "MARKETPLACE_HOST_LIMITS", configured.MARKETPLACE_HOST_LIMITS)
+    monkeypatch.setattr(marketplace, "_client", None)
+    client = marketplace.get_marketplace_client()
+    limits = client.host_limits["api.ebay.com"]
+    assert limits.concurrency == marketplace.settings.MARKETPLACE_HOST_CONCURRENCY
+    assert isinstance(limits.concurrency, int)
+    assert limits.rate == 20
+    monkeypatch.setattr(marketplace, "_client", None)
+
+
+def test_token_bucket_allows_burst_then_waits():
+    now = [0.0]
+    bucket = marketplace.TokenBucket(rate=2.0, capacity=2.0, clock=lambda: now[0])
+    bucket._refill()
+    assert bucket.tokens == 2.0
+    bucket.tokens -= 2
+    now[0] = 0.25
+    bucket._refill()
+    assert bucket.tokens == pytest.approx(0.5)
@@ -0,0 +1,22 @@
+import pytest
+
+from app.core.config import settings
+from app.services.order_events import OrderEventBroadcaster
+
+
+def test_events_reach_only_the_owner_and_unfiltered_subscribers():
+    broadcaster = OrderEventBroadcaster()
+    owner, other, everyone = broadcaster.subscribe(1), broadcaster.subscribe(2), broadcaster.subscribe(None)
+    broadcaster.dispatch([{"order_id": 10, "user_id": 1, "status": "shipped", "previous_status": "processing"}])
+    assert len(owner._buffer) == 1
+    assert len(everyone._buffer) == 1
+    assert not other._buffer
+
+
+@pytest.mark.anyio
+async def test_stream_of_another_user_is_forbidden(app_client, user_headers):
+    url = f"{settings.API_V1_STR}/orders/events"
+    other = await app_client.get(url, params={"user_id": 7}, headers=user_headers)
+    anonymous = await app_client.get(url)
+    assert other.status_code == 403
+    assert anonymous.status_code == 401
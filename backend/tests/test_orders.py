@@ -0,0 +1,54 @@
+import pytest
+
+from app.api.api_v1.endpoints import orders as orders_endpoint
+from app.core.config import settings
+from app.db.session import get_db
+from app.schemas.order import OrderBatchReport
+
+
+async def insert_order(db, user_id: int) -> int:
+    cursor = await db.execute(
+        "INSERT INTO orders (user_id, status, shipping_address) VALUES (%s, 'pending', 'Via Roma 1, Milano') RETURNING id",
+        (user_id,),
+    )
+    (order_id,) = await cursor.fetchone()
+    return order_id
+
+
+@pytest.mark.anyio
+async def test_status_update_skips_other_users_orders(client, db, test_user_db, user_headers):
+    own = await insert_order(db, test_user_db["user_id"])
+    foreign = await insert_order(db, test_user_db["user_id"] + 1)
+    response = await client.patch(
+        f"{settings.API_V1_STR}/orders/status",
+        json={"order_ids": [own, foreign], "status": "shipped"},
+        headers=user_headers,
+    )
+    assert response.status_code == 200
+    assert response.json()["data"] == {"updated": [own], "not_found": [foreign]}
+    cursor = await db.execute("SELECT status FROM orders WHERE id = %s", (foreign,))
+    assert await cursor.fetchone() == ("pending",)
+
+
+@pytest.mark.anyio
+async def test_bulk_orders_belong_to_the_caller(monkeypatch, app_client, user_headers, test_user_id):
+    from main import app
+
+    owners = []
+
+    async def fake_create_orders(conn, orders, status):
+        owners.extend(order.user_id for order in orders)
+        return OrderBatchReport()
+
+    async def fake_db():
+        yield None
+
+    monkeypatch.setattr(orders_endpoint, "create_orders", fake_create_orders)
+    app.dependency_overrides[get_db] = fake_db
+    order = {
+        "user_id": 7, "external_ref": "amazon:1", "shipping_address": "Via Roma 1, Milano",
+        "items": [{"product_id": 1, "quantity": 1, "unit_price": "9.90"}],
+    }
+    response = await app_client.post(f"{settings.API_V1_STR}/orders/bulk", json={"orders": [order]}, headers=user_headers)
+    assert response.status_code == 200
+    assert owners == [test_user_id]
@@ -0,0 +1,120 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+
+from app.services.entitlements import PlanLimits
+from app.services.price_monitor import PriceMonitor, load_tracked_products
+from app.services.tiered_fetcher import Offer
+
+
+def test_interval_shrinks_for_volatile_and_selling_products():
+    monitor = PriceMonitor(min_interval=300, max_interval=86400)
+    stable = monitor.track("ebay:1", "ebay", "https://www.ebay.it/itm/1")
+    volatile = monitor.track("ebay:2", "ebay", "https://www.ebay.it/itm/2", sales_per_day=50)
+    stable.change_rate = 0.0
+    volatile.change_rate = 1.0
+    assert monitor.next_interval(stable) == 86400
+    assert monitor.next_interval(volatile) == 300
+    stable.failures = 3
+    assert monitor.next_interval(stable) == 86400
+
+
+def test_untrack_removes_product():
+    monitor = PriceMonitor()
+    monitor.track("ebay:1", "ebay", "https://www.ebay.it/itm/1")
+    monitor.untrack("ebay:1")
+    assert len(monitor) == 0
+    assert monitor.skus() == []
+
+
+@pytest.mark.anyio
+async def test_started_monitor_checks_and_reports_changes():
+    prices = iter([Decimal("10.00"), Decimal("12.00")])
+    changes = []
+
+    async def checker(product):
+        return Offer(next(prices, Decimal("12.00")), True)
+
+    async def on_change(product, offer):
+        changes.append((product.sku, offer.price))
+
+    monitor = PriceMonitor(checker=checker, on_change=on_change, min_interval=0.01, max_interval=0.01, jitter=0)
+    monitor.track("ebay:1", "ebay", "https://www.ebay.it/itm/1")
+    monitor.start()
+    try:
+        for _ in range(100):
+            if changes:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await monitor.stop()
+    assert changes[0] == ("ebay:1", Decimal("12.00"))
+    assert monitor.stats["checks"] >= 2
+
+
+@pytest.mark.anyio
+async def test_load_tracked_products_follows_catalogue(db):
+    await db.execute(
+        "INSERT INTO products (sku, name, price, stock) VALUES "
+        "('ebay:111', 'Articolo eBay', 19.90, 1), ('amazon:B00TEST', 'Articolo Amazon', 5.00, 1)"
+    )
+    monitor = PriceMonitor()
+    monitor.track("ebay:rimosso", "ebay", "https://www.ebay.it/itm/rimosso")
+    assert await load_tracked_products(db, monitor) == 2
+    assert sorted(monitor.skus()) == ["amazon:B00TEST", "ebay:111"]
+
+
+def test_plan_interval_overrides_the_monitor_bounds():
+    monitor = PriceMonitor(min_interval=300, max_interval=3600)
+    product = monitor.track("ebay:1", "ebay", "https://www.ebay.it/itm/1", min_interval=7200)
+    product.change_rate = 1.0
+    assert monitor.next_interval(product) == 7200
+    monitor.track("ebay:1", "ebay", "https://www.ebay.it/itm/1", min_interval=0)
+    assert monitor.next_interval(product) == 300
+
+
+class FakeCatalogueCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params=None):
+        pass
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for row in self.rows:
+            yield row
+
+
+class FakeCatalogue:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self, name=None):
+        return FakeCatalogueCursor(self.rows)
+
+
+class FakeEntitlements:
+    def get(self, user_id):
+        return PlanLimits("free", 2, 3600, 60)
+
+
+@pytest.mark.anyio
+async def test_owner_plan_limits_skus_and_interval():
+    catalogue = FakeCatalogue([
+        ("ebay:1", 1000, 7), ("ebay:2", 1000, 7), ("ebay:3", 1000, 7), ("ebay:4", 1000, None),
+    ])
+    monitor = PriceMonitor(min_interval=300, max_interval=1800)
+    assert await load_tracked_products(catalogue, monitor, FakeEntitlements()) == 3
+    assert sorted(monitor.skus()) == ["ebay:1", "ebay:2", "ebay:4"]
+    assert monitor._products["ebay:1"].min_interval == 3600
+    assert monitor._products["ebay:4"].min_interval == 0
@@ -0,0 +1,84 @@
+import json
+from typing import AsyncIterator, List
+
+import pytest
+
+from app.services.product_import import ImportFormat, import_products, iter_records, parse_batch
+from app.services.products import GET_PRODUCT
+
+HEADER = ["sku", "name", "price", "stock"]
+
+
+async def stream(*chunks: str) -> AsyncIterator[bytes]:
+    for chunk in chunks:
+        yield chunk.encode()
+
+
+async def records(*chunks: str, **kwargs) -> List:
+    return [record async for record in iter_records(stream(*chunks), quoted=True, **kwargs)]
+
+
+@pytest.mark.anyio
+async def test_quoted_field_spans_lines_and_chunks():
+    result = await records('sku,name\nA1,"Lampada\nda ta', 'volo"\r\nA2,Zaino\n')
+    assert result == [(1, "sku,name"), (2, 'A1,"Lampada\nda tavolo"'), (4, "A2,Zaino")]
+
+
+@pytest.mark.anyio
+async def test_stray_quote_does_not_swallow_the_file():
+    lines = ['A1,Monitor 27",10'] + [f"A{i},Zaino,5" for i in range(2, 40)]
+    result = await records("\n".join(lines) + "\n", max_record_chars=100)
+    # La riga con la virgoletta spaiata resta da sola, le altre vengono rilette
+    assert result == [(i, line) for i, line in enumerate(lines, 1)]
+
+
+@pytest.mark.anyio
+async def test_unbalanced_quote_at_end_of_file():
+    result = await records('A1,"Lampada,10\nA2,Zaino,5')
+    assert result == [(1, 'A1,"Lampada,10'), (2, "A2,Zaino,5")]
+
+
+def test_malformed_csv_record_is_rejected_alone():
+    batch = [(2, "A1,Lampada,9.90,3"), (3, "A2,Zaino\nA3,Borraccia,1,1"), (5, "A4,Tenda,5")]
+    parsed = parse_batch(batch, ImportFormat.CSV, HEADER)
+    assert parsed[0][2] == {"sku": "A1", "name": "Lampada", "price": "9.90", "stock": "3"}
+    assert parsed[1][2].startswith("CSV non valido")
+    assert parsed[2][2] == "Attese 4 colonne, trovate 3"
+
+
+def test_ndjson_records_must_be_objects():
+    batch = [(1, '{"sku": "A1"}'), (2, "[1, 2]"), (3, "{")]
+    data = [item for _, _, item in parse_batch(batch, ImportFormat.NDJSON, None)]
+    assert data[0] == {"sku": "A1"}
+    assert data[1] == "Ogni riga deve essere un oggetto JSON"
+    assert data[2].startswith("JSON non valido")
+
+
+@pytest.mark.anyio
+async def test_foreign_skus_are_rejected(db, tmp_path):
+    await db.execute("UPDATE products SET owner_id = 1 WHERE sku = 'test:001'")
+    await db.execute("UPDATE products SET owner_id = 2 WHERE sku = 'test:002'")
+    body = "sku,name,price,stock\ntest:001,Lampada nuova,5,1\ntest:002,Zaino rubato,1,1\nnuovo:1,Tenda,3,3\n"
+    report = await import_products(db, stream(body), reject_dir=str(tmp_path), owner_id=1, max_skus=10)
+    assert (report.inserted, report.updated, report.rejected_rows) == (1, 1, 1)
+    cursor = await db.execute("SELECT sku, name, owner_id FROM products WHERE sku IN ('test:002', 'nuovo:1') ORDER BY sku")
+    assert await cursor.fetchall() == [("nuovo:1", "Tenda", 1), ("test:002", "Zaino di prova 2", 2)]
+    with open(tmp_path / f"{report.reject_file}.ndjson") as f:
+        assert json.loads(f.readline())["line"] == 3
+
+
+@pytest.mark.anyio
+async def test_import_keeps_leased_units_out_of_the_quota(db, tmp_path):
+    cursor = await db.execute("SELECT id FROM products WHERE sku = 'test:003'")
+    (product_id,) = await cursor.fetchone()
+    await db.execute(
+        "INSERT INTO stock_leases (worker_id, product_id, quantity) VALUES ('w1', %s, 4), ('w2', %s, 2)",
+        (product_id, product_id),
+    )
+    body = "sku,name,price,stock\ntest:003,Borraccia di prova 3,12.90,10\n"
+    await import_products(db, stream(body), reject_dir=str(tmp_path))
+    cursor = await db.execute("SELECT stock FROM products WHERE id = %s", (product_id,))
+    assert await cursor.fetchone() == (4,)
+    # Le letture mostrano la giacenza del file, lease comprese
+    cursor = await db.execute(GET_PRODUCT, (product_id,))
+    assert (await cursor.fetchone())[4] == 10
@@ -0,0 +1,41 @@
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.middleware.rate_limit import RateLimiter, RateLimitMiddleware
+
+
+def test_bucket_allows_bursts_then_refills():
+    limiter = RateLimiter()
+    assert [limiter.hit("ip:1", 3, now=0.0)[0] for _ in range(4)] == [True, True, True, False]
+    allowed, remaining, reset_in = limiter.hit("ip:1", 3, now=0.0)
+    assert (allowed, remaining, reset_in) == (False, 0, 20)
+    # 3 richieste al minuto: un gettone ogni 20 secondi
+    assert limiter.hit("ip:1", 3, now=20.0)[0]
+    assert not limiter.hit("ip:1", 3, now=20.0)[0]
+    assert limiter.hit("ip:2", 3, now=20.0)[0]
+
+
+def test_full_buckets_are_forgotten_first():
+    limiter = RateLimiter(max_clients=2)
+    limiter.hit("ip:1", 60, now=0.0)
+    limiter.hit("ip:2", 60, now=50.0)
+    limiter.hit("ip:3", 60, now=61.0)
+    assert sorted(limiter._buckets) == ["ip:2", "ip:3"]
+
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+@pytest.mark.anyio
+async def test_login_endpoint_has_its_own_limit():
+    app = RateLimitMiddleware(ok_app, default_limit=100, login_limit=2)
+    login = f"{settings.API_V1_STR}/auth/firebase"
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        logins = [(await client.post(login, json={})).status_code for _ in range(3)]
+        other = await client.get(f"{settings.API_V1_STR}/products/")
+    assert logins == [200, 200, 429]
+    assert other.status_code == 200
+    assert other.headers["x-ratelimit-limit"] == "100"
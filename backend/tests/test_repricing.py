@@ -0,0 +1,58 @@
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from app.api.api_v1.endpoints import products as products_endpoint
+from app.core.config import settings
+from app.db.session import get_db
+from app.services.repricing import (
+    CatalogueArrays,
+    PriceReason,
+    RepricingReport,
+    RepricingRules,
+    cents_to_text,
+    compute_prices,
+)
+
+
+@pytest.mark.parametrize("cents, text", [(1299, "12.99"), (5, "0.05"), (0, "0.00"), (10 ** 17 + 1, "1000000000000000.01")])
+def test_cents_to_text_is_exact(cents, text):
+    assert cents_to_text(cents) == text
+    assert Decimal(text) * 100 == cents
+
+
+def test_compute_prices_respects_margin_floor_and_undercut():
+    # id, prezzo, costo, concorrente, commissione (centesimi; -1 = assente)
+    catalogue = CatalogueArrays.from_rows(np.array([
+        [1, 2000, 1000, 1200, 0.0],   # il concorrente è sotto il margine minimo
+        [2, 5000, 1000, 4000, 0.0],   # sotto il concorrente, arrotondato al .99
+        [3, 5000, -1, 4000, 0.0],     # senza costo: invariato
+    ]))
+    result = compute_prices(catalogue, RepricingRules(min_margin=0.2))
+    assert result.new_price.tolist() == [1299, 3999, 5000]
+    assert result.reason[0] == PriceReason.MARGIN_FLOOR
+    assert result.reason[1] == PriceReason.UNDERCUT
+    assert result.reason[2] == PriceReason.UNCHANGED
+
+
+@pytest.mark.anyio
+async def test_users_reprice_only_their_products_with_default_rules(monkeypatch, app_client, user_headers, test_user_id):
+    from main import app
+
+    calls = []
+
+    async def fake_reprice(conn, rules, dry_run, diff_limit, owner_id):
+        calls.append(owner_id)
+        return RepricingReport(products=0, changed=0, raised=0, lowered=0, by_reason={}, dry_run=dry_run, elapsed_ms=0)
+
+    async def fake_db():
+        yield None
+
+    monkeypatch.setattr(products_endpoint, "reprice_catalogue", fake_reprice)
+    app.dependency_overrides[get_db] = fake_db
+    url = f"{settings.API_V1_STR}/products/reprice"
+    own = await app_client.post(url, headers=user_headers)
+    custom = await app_client.post(url, headers=user_headers, json={"min_margin": 0.01})
+    assert own.status_code == 200 and calls == [test_user_id]
+    assert custom.status_code == 403
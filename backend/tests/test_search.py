@@ -0,0 +1,60 @@
+from decimal import Decimal
+
+import pytest
+
+from app.core.config import settings
+from app.services import search
+from app.services.search import FACETS, SEARCH, prefix_query, search_products
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self, matches):
+        self.matches = matches
+
+    async def execute(self, query, params):
+        if query == SEARCH:
+            return FakeCursor([(1, "sku", "Tazza", None, Decimal("9.90"), 3, 5, 0.5)])
+        assert query == FACETS
+        return FakeCursor([(5, self.matches)])
+
+
+@pytest.mark.anyio
+async def test_total_is_capped_at_the_ranked_candidates(monkeypatch):
+    monkeypatch.setattr(settings, "SEARCH_MAX_CANDIDATES", 100)
+    monkeypatch.setattr(search, "cache", search.AnalyticsCache(30, 10))
+    results = await search_products(FakeConnection(250), "tazza")
+    assert (results.total, results.truncated) == (100, True)
+    assert results.facets[0].count == 250
+
+    monkeypatch.setattr(search, "cache", search.AnalyticsCache(30, 10))
+    results = await search_products(FakeConnection(40), "tazza")
+    assert (results.total, results.truncated) == (40, False)
+
+
+def test_prefix_query_completes_the_last_word():
+    assert prefix_query("Lampada da tav") == "lampada & da & tav:*"
+    assert prefix_query("zaino") == "zaino:*"
+    # La punteggiatura non può diventare un operatore di to_tsquery
+    assert prefix_query("cuffie | !(bt) & ") == "cuffie & bt:*"
+    assert prefix_query(" &|! ") is None
+
+
+@pytest.mark.anyio
+async def test_leased_units_count_as_stock(client, db, test_products, user_headers):
+    lamp = test_products[0]
+    await db.execute("UPDATE products SET stock = 0 WHERE id = %s", (lamp,))
+    await db.execute("INSERT INTO stock_leases (worker_id, product_id, quantity) VALUES ('w1', %s, 3)", (lamp,))
+    response = await client.get(
+        f"{settings.API_V1_STR}/products/search", params={"q": "lampada", "in_stock": True}, headers=user_headers,
+    )
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert [(item["id"], item["stock"]) for item in items] == [(lamp, 3)]
@@ -0,0 +1,58 @@
+import re
+
+import pytest
+
+from app.utils.selenium_manager import BrowserPool, blocked_url_patterns
+
+
+def chrome_matches(pattern: str, url: str) -> bool:
+    """Confronto di Network.setBlockedURLs: solo `*` è un jolly."""
+    return re.fullmatch(".*".join(map(re.escape, pattern.split("*"))), url) is not None
+
+
+@pytest.mark.parametrize("url", [
+    "https://cdn.example.com/style.css",
+    "https://cdn.example.com/style.css?v=3",
+    "https://cdn.example.com/img.jpg?v=12&w=300",
+    "https://cdn.example.com/font.woff2",
+])
+def test_blocked_patterns_match_cache_busted_assets(url):
+    patterns = blocked_url_patterns(["image", "font", "stylesheet"])
+    assert any(chrome_matches(p, url) for p in patterns)
+
+
+@pytest.mark.parametrize("url", [
+    "https://shop.example.com/product/123",
+    "https://shop.example.com/api/price?sku=css",
+    "https://shop.example.com/app.js?v=3",
+])
+def test_blocked_patterns_keep_pages_and_scripts(url):
+    patterns = blocked_url_patterns(["image", "font", "stylesheet", "media"])
+    assert not any(chrome_matches(p, url) for p in patterns)
+
+
+class FakeDriver:
+    def __init__(self, quit_log):
+        self.quit_log = quit_log
+
+    def quit(self):
+        self.quit_log.append(self)
+
+
+@pytest.mark.anyio
+async def test_failed_start_quits_launched_drivers():
+    quit_log = []
+    launches = []
+
+    def factory():
+        launches.append(None)
+        if len(launches) == 3:
+            raise RuntimeError("chrome non avviato")
+        return FakeDriver(quit_log)
+
+    pool = BrowserPool(size=3, driver_factory=factory)
+    with pytest.raises(RuntimeError):
+        await pool.start()
+    assert len(quit_log) == 2
+    assert pool._idle.empty()
+    await pool.close()
@@ -0,0 +1,74 @@
+from contextlib import asynccontextmanager
+from datetime import date
+
+import pytest
+
+from app.services.snapshot_store import (
+    SnapshotStore, _read_varint, _write_varint, decode_series, encode_point, month_start,
+)
+
+MARCH = 1_709_251_200  # 2024-03-01 00:00 UTC
+
+
+@pytest.mark.parametrize("value", [0, 1, 127, 128, 300, 2 ** 35 + 7])
+def test_varint_round_trip(value):
+    buffer = bytearray()
+    _write_varint(buffer, value)
+    assert _read_varint(bytes(buffer), 0) == (value, len(buffer))
+
+
+def test_series_round_trip_with_negative_deltas():
+    buffer = bytearray()
+    encode_point(buffer, 60, 1999, True)
+    encode_point(buffer, 3600, -500, False)
+    encode_point(buffer, 5, 0, None)
+    assert decode_series(date(2024, 3, 1), bytes(buffer)) == [
+        (MARCH + 60, 1999, True),
+        (MARCH + 3660, 1499, False),
+        (MARCH + 3665, 1499, None),
+    ]
+
+
+def test_unchanged_state_is_not_recorded():
+    store = SnapshotStore()
+    assert store.observe("ebay:1", 1999, True, observed_at=MARCH + 10) is not None
+    assert store.observe("ebay:1", 1999, True, observed_at=MARCH + 20) is None
+    event = store.observe("ebay:1", 1899, True, observed_at=MARCH + 30)
+    assert event.price_changed and event.old_price_cents == 1999
+    assert month_start(MARCH + 30) == date(2024, 3, 1)
+
+
+class FailingCommitConnection:
+    """Connessione il cui COMMIT fallisce dopo un upsert riuscito."""
+
+    def __init__(self):
+        self.executed = 0
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+        raise RuntimeError("commit fallito")
+
+    async def execute(self, query, params=None):
+        self.executed += 1
+
+
+@pytest.mark.anyio
+async def test_failed_commit_keeps_points_for_next_flush():
+    store = SnapshotStore()
+    store.observe("ebay:1", 1999, True, observed_at=MARCH + 10)
+    store.observe("ebay:1", 1899, True, observed_at=MARCH + 20)
+    conn = FailingCommitConnection()
+    with pytest.raises(RuntimeError):
+        await store.flush(conn)
+    assert conn.executed == 1
+    store.observe("ebay:1", 1799, False, observed_at=MARCH + 30)
+
+    rows = store.drain()
+    assert len(rows) == 1
+    sku, month, last_ts, last_price, _, _, points, data = rows[0]
+    assert points == 3
+    assert decode_series(month, data) == [
+        (MARCH + 10, 1999, True), (MARCH + 20, 1899, True), (MARCH + 30, 1799, False),
+    ]
+    assert (last_ts, last_price) == (MARCH + 30, 1799)
@@ -0,0 +1,43 @@
+from app.services.stripe_events import plan_batch
+
+
+def subscription_event(event_id, event_type, created, subscription_id="sub_1", status="active", user_id="42"):
+    payload = {
+        "id": event_id,
+        "type": event_type,
+        "created": created,
+        "data": {"object": {
+            "id": subscription_id,
+            "customer": "cus_1",
+            "status": status,
+            "metadata": {"user_id": user_id},
+            "items": {"data": [{"price": {"id": "price_pro"}}]},
+        }},
+    }
+    return event_id, event_type, created, payload
+
+
+def test_latest_event_per_subscription_wins():
+    rows, outcomes = plan_batch([
+        subscription_event("evt_1", "customer.subscription.created", 100, status="incomplete"),
+        subscription_event("evt_2", "customer.subscription.updated", 102, status="active"),
+        subscription_event("evt_3", "customer.subscription.updated", 101, status="past_due"),
+        subscription_event("evt_4", "customer.subscription.created", 100, subscription_id="sub_2", user_id="firebase-uid"),
+        ("evt_5", "invoice.paid", 103, {}),
+    ])
+    assert outcomes == {
+        "evt_1": "coalesced", "evt_2": "applied", "evt_3": "coalesced", "evt_4": "applied", "evt_5": "ignored",
+    }
+    by_subscription = {row[0]: row for row in rows}
+    assert by_subscription["sub_1"][2:5] == (42, "active", "price_pro")
+    # Solo gli id numerici sono utenti interni
+    assert by_subscription["sub_2"][2] is None
+
+
+def test_deletion_wins_at_the_same_timestamp():
+    rows, outcomes = plan_batch([
+        subscription_event("evt_1", "customer.subscription.deleted", 100, status="canceled"),
+        subscription_event("evt_2", "customer.subscription.updated", 100, status="active"),
+    ])
+    assert outcomes == {"evt_1": "applied", "evt_2": "coalesced"}
+    assert rows[0][3] == "canceled"
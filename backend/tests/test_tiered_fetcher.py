@@ -0,0 +1,42 @@
+from decimal import Decimal
+
+import pytest
+
+from app.services.tiered_fetcher import extract_offer, parse_price
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("29.99", "29.99"),
+    ("29,99", "29.99"),
+    ("1.299,00", "1299.00"),
+    ("1,299.00", "1299.00"),
+    ("1,299", "1299.00"),
+    ("1.299", "1299.00"),
+    ("1.299.000", "1299000.00"),
+    ("1,234,567.89", "1234567.89"),
+    ("€ 12,50", "12.50"),
+    ("1 299,00 €", "1299.00"),
+    ("$1,299.99", "1299.99"),
+    ("0,299", "0.30"),
+    (29.99, "29.99"),
+    (12, "12.00"),
+])
+def test_parse_price(value, expected):
+    assert parse_price(value) == Decimal(expected)
+
+
+@pytest.mark.parametrize("value", [None, "", "abc", "12,5015,00", "12.345.67", "1.299,0.0"])
+def test_parse_price_rejects_malformed(value):
+    assert parse_price(value) is None
+
+
+def test_extract_offer_reads_us_formatted_json_ld():
+    html = """
+    <html><head><script type="application/ld+json">
+    {"@type": "Product", "offers": {"@type": "Offer", "price": "1,299.00", "priceCurrency": "USD",
+     "availability": "https://schema.org/InStock"}}
+    </script></head><body></body></html>
+    """
+    offer = extract_offer(html)
+    assert offer is not None
+    assert offer.price == Decimal("1299.00")
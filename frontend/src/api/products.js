@@ -11,3 +11,37 @@ export const getProducts = async () => {
     throw error;
   }
 };
+
+export const searchProducts = async (q, { categoryId, minPrice, maxPrice, inStock, limit = 20, offset = 0 } = {}) => {
+  try {
+    const response = await axios.get(`${API_BASE_URL}/products/search`, {
+      params: {
+        q,
+        category_id: categoryId,
+        min_price: minPrice,
+        max_price: maxPrice,
+        in_stock: inStock,
+        limit,
+        offset,
+      },
+    });
+    return response.data;
+  } catch (error) {
+    console.error("Errore nella ricerca dei prodotti:", error.response?.data || error.message);
+    throw error;
+  }
+};
+
+export const autocompleteProducts = async (q, limit = 10) => {
+  // Sotto i due caratteri il backend non suggerisce nulla
+  if (q.trim().length < 2) {
+    return [];
+  }
+  try {
+    const response = await axios.get(`${API_BASE_URL}/products/autocomplete`, { params: { q, limit } });
+    return response.data;
+  } catch (error) {
+    console.error("Errore nei suggerimenti dei prodotti:", error.response?.data || error.message);
+    throw error;
+  }
+};
@@ -1,31 +1,208 @@
-import jwt
-from datetime import datetime, timedelta
+"""
+Emette token JWT di accesso per l'API, uno o migliaia alla volta.
+
+Senza --users si comporta come prima: un token per `testuser`, stampato e
+salvato in generated_token.txt nella radice del progetto. Con --users legge
+gli utenti da un file CSV (intestazione con `sub`, `user_id` o `id`) o NDJSON
+(un oggetto per riga) e scrive un token per utente man mano che li legge,
+anche su più processi. Le altre colonne/chiavi dell'utente diventano claim
+aggiuntivi (es. email). I token hanno gli stessi claim di create_token
+(sub, iat, nbf, exp, jti), firmati HS256 con SECRET_KEY come li verifica
+JWTMiddleware.
+
+Uso:
+    python generate_token.py
+    python generate_token.py --users utenti.csv --output token.ndjson
+    python generate_token.py --users utenti.ndjson --processes 4 --format csv > token.csv
+    cat utenti.ndjson | python generate_token.py --users - --input-format ndjson
+"""
+import argparse
+import csv
+import io
+import itertools
+import json
 import os
+import sys
+import time
+import uuid
+from multiprocessing import Pool
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+import jwt
+
+# Stessa chiave di backend/jwt_middleware.py (variabile d'ambiente SECRET_KEY)
+SECRET_KEY = os.getenv("SECRET_KEY", "VQV8519S8srKFF6iOBAqgJgxUAbbqWUfd0psC19nSi_K-0uAl3_Do-195v4_iKeQs9Q8GXXrDMrr8cacMIqUsw")
+
+SUBJECT_KEYS = ("sub", "user_id", "id")
+OUTPUT_FORMATS = ("ndjson", "csv", "text")
+CSV_HEADER = ("sub", "access_token", "expires_at")
+
+
+class TokenIssuer:
+    """Firma i token di un lotto di utenti con la stessa chiave e durata."""
+
+    __slots__ = ("secret", "expires_in", "output_format")
+
+    def __init__(self, secret: str, expires_in: int, output_format: str = "ndjson"):
+        self.secret = secret
+        self.expires_in = expires_in
+        self.output_format = output_format
+
+    def claims(self, user: Dict[str, Any], now: int) -> Dict[str, Any]:
+        subject = next((user[k] for k in SUBJECT_KEYS if user.get(k) not in (None, "")), None)
+        if subject is None:
+            raise ValueError(f"utente senza {'/'.join(SUBJECT_KEYS)}: {user}")
+        extra = {k: v for k, v in user.items() if k not in SUBJECT_KEYS and v not in (None, "")}
+        return {
+            **extra,
+            "sub": str(subject),
+            "iat": now,
+            "nbf": now,
+            "exp": now + self.expires_in,
+            "jti": uuid.uuid4().hex,
+        }
+
+    def header(self) -> str:
+        """Intestazione dell'output (solo CSV)."""
+        if self.output_format != "csv":
+            return ""
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerow(CSV_HEADER)
+        return buffer.getvalue()
+
+    def issue(self, users: Iterable[Dict[str, Any]]) -> str:
+        """Righe di output (già unite) per un lotto di utenti."""
+        now = int(time.time())
+        if self.output_format == "csv":
+            # csv.writer mette tra virgolette i sub con virgole, virgolette o a capo
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, lineterminator="\n")
+            for user in users:
+                claims = self.claims(user, now)
+                writer.writerow((claims["sub"], jwt.encode(claims, self.secret, algorithm="HS256"), claims["exp"]))
+            return buffer.getvalue()
+        lines = []
+        for user in users:
+            claims = self.claims(user, now)
+            token = jwt.encode(claims, self.secret, algorithm="HS256")
+            if self.output_format == "ndjson":
+                lines.append(json.dumps({"sub": claims["sub"], "access_token": token, "expires_at": claims["exp"]}))
+            else:
+                lines.append(token)
+        return "".join(line + "\n" for line in lines)
+
+
+def read_users(stream: TextIO, input_format: str) -> Iterator[Dict[str, Any]]:
+    if input_format == "csv":
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def batches(users: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    while True:
+        batch = list(itertools.islice(users, size))
+        if not batch:
+            return
+        yield batch
+
+
+_issuer: Optional[TokenIssuer] = None
+
+
+def _init_worker(issuer: TokenIssuer) -> None:
+    global _issuer
+    _issuer = issuer
+
+
+def _issue_batch(batch: List[Dict[str, Any]]) -> Tuple[int, str]:
+    return len(batch), _issuer.issue(batch)
+
+
+def issue_tokens(
+    users: Iterator[Dict[str, Any]],
+    issuer: TokenIssuer,
+    out: TextIO,
+    processes: int = 1,
+    batch_size: int = 500,
+) -> int:
+    """
+    Scrive un token per utente, nell'ordine di lettura, senza tenere tutto in memoria.
+
+    Il CSV ha l'intestazione sub,access_token,expires_at.
+
+    Args:
+        users: Utenti letti dall'input
+        issuer: Chiave, durata e formato di output
+        out: Destinazione delle righe
+        processes: Processi di firma (1: nel processo corrente)
+        batch_size: Utenti per lotto inviato a un processo
+
+    Returns:
+        Numero di token emessi
+    """
+    count = 0
+    out.write(issuer.header())
+    if processes <= 1:
+        for batch in batches(users, batch_size):
+            out.write(issuer.issue(batch))
+            count += len(batch)
+        return count
+    with Pool(processes, initializer=_init_worker, initargs=(issuer,)) as pool:
+        # I lotti vengono letti man mano; imap restituisce i risultati in ordine
+        for issued, lines in pool.imap(_issue_batch, batches(users, batch_size)):
+            out.write(lines)
+            count += issued
+    return count
+
 
-# Inserisci qui la tua secret key
-SECRET_KEY = "VQV8519S8srKFF6iOBAqgJgxUAbbqWUfd0psC19nSi_K-0uAl3_Do-195v4_iKeQs9Q8GXXrDMrr8cacMIqUsw"
+def issue_single(subject: str, expires_in: int) -> None:
+    """Comportamento originale: un token, stampato e salvato in generated_token.txt."""
+    token = TokenIssuer(SECRET_KEY, expires_in, "text").issue([{"sub": subject}]).strip()
+    print("Il tuo token JWT è:")
+    print(token)
+    file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "generated_token.txt")
+    with open(file_path, "w") as file:
+        file.write(token)
+    print(f"Token salvato in {file_path}")
 
-# Payload del token
-payload = {
-    "sub": "testuser",
-    "exp": datetime.utcnow() + timedelta(hours=1)
-}
 
-# Generazione del token
-token = jwt.encode(payload, SECRET_KEY, algorithm="HS256")
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", help="File CSV o NDJSON degli utenti ('-' per lo standard input)")
+    parser.add_argument("--input-format", choices=("csv", "ndjson"), help="Default: dall'estensione del file")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="ndjson", help="Formato delle righe di output")
+    parser.add_argument("--output", help="File di output (default: standard output)")
+    parser.add_argument("--subject", default="testuser", help="Utente del token singolo (senza --users)")
+    parser.add_argument("--expires-in", type=int, default=3600, help="Durata dei token in secondi")
+    parser.add_argument("--processes", type=int, default=1, help="Processi di firma")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
 
-# Converte il token in stringa se necessario (compatibilità versioni PyJWT)
-if isinstance(token, bytes):
-    token = token.decode('utf-8')
+    if not args.users:
+        issue_single(args.subject, args.expires_in)
+        return
 
-# Stampa il token generato
-print("Il tuo token JWT è:")
-print(token)
+    input_format = args.input_format or ("csv" if args.users.lower().endswith(".csv") else "ndjson")
+    source = sys.stdin if args.users == "-" else open(args.users, encoding="utf-8", newline="")
+    out = sys.stdout if args.output is None else open(args.output, "w", encoding="utf-8")
+    started = time.perf_counter()
+    try:
+        count = issue_tokens(
+            read_users(source, input_format), TokenIssuer(SECRET_KEY, args.expires_in, args.format),
+            out, args.processes, args.batch_size,
+        )
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - started
+    print(f"{count} token emessi in {elapsed:.2f}s ({count / elapsed if elapsed else 0:.0f}/s)", file=sys.stderr)
 
-# Salva il token in un file txt nella root principale del progetto
-root_path = os.path.dirname(os.path.abspath(__file__))
-file_path = os.path.join(root_path, "generated_token.txt")
-with open(file_path, "w") as file:
-    file.write(token)
 
-print(f"Token salvato in {file_path}")
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,275 @@
+"""
+Genera il report per la code review con Copilot: una sezione per ogni file Python.
+
+Roadmap integrata secondo le indicazioni di Claude:
+1. Analizza il seguente file Python come parte di un progetto SaaS di automazione dropshipping.
+2. Per ciascun file, fornisci: errori, bug logici, suggerimenti di refactoring, ottimizzazione performance, controlli di sicurezza e test consigliati.
+3. Punti critici da segnalare: sicurezza JWT (revoca token, claims mancanti), gestione segreti, endpoint mancanti, logging avanzato, testing integrato.
+4. Suggerisci se applicare Service/Repository Pattern, dependency injection, alerting con Prometheus e Grafana, scaling Redis e fallback resilienza.
+
+Il report è incrementale. Ogni sezione riporta l'hash SHA-256 del file
+(insieme al prompt) e un indice accanto al report (<report>.index.json)
+ricorda dimensione, mtime e hash di ogni file:
+  - i file con dimensione e mtime invariati non vengono nemmeno letti
+  - le sezioni con lo stesso hash vengono copiate dal report precedente,
+    compresa l'analisi scritta sotto "Risultato dell'analisi"
+  - solo i file nuovi o modificati vengono letti (in parallelo)
+  - se nulla è cambiato il report non viene riscritto
+Con dei target il report su file aggiorna solo quei file: le sezioni (e le
+voci dell'indice) degli altri file già analizzati restano quelle del
+report precedente, senza rileggerli.
+I file seguono il .gitignore (tramite `git ls-files`, o leggendo il
+.gitignore se il repository non è un clone git). Il report viene scritto
+sezione per sezione in un file temporaneo che sostituisce il precedente
+solo alla fine; con `--output -` va sullo standard output.
+
+Uso (dalla radice del repository, anche come hook di pre-commit):
+    python github/scripts/generate_copilot_review_report.py
+    python github/scripts/generate_copilot_review_report.py backend --output -
+"""
+import argparse
+import fnmatch
+import hashlib
+import json
 import os
+import re
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+PROMPT_HEADER = ("Analizza il seguente file Python come parte di un progetto SaaS di automazione dropshipping. "
+                 "Per ciascun file, fornisci: errori, bug logici, suggerimenti di refactoring, "
+                 "ottimizzazione performance, controlli di sicurezza e test consigliati. "
+                 "Verifica se occorre migliorare JWT security (revoca token, claims), gestione segreti, completare endpoint, logging avanzato e test. "
+                 "Suggerisci se introdurre pattern architetturali, Prometheus/Grafana, caching Redis e strategie di resilienza.")
+
+SEPARATOR = "=" * 80
+ANALYSIS_MARKER = "\n\nRisultato dell'analisi: (scrivi qui sotto)\n\n"
+SECTION_HEADER = re.compile(rf"^{SEPARATOR}\nFILE: (.+)\nSHA256: ([0-9a-f]{{64}})\n{SEPARATOR}\n", re.MULTILINE)
+
+# Cartelle mai analizzate, anche senza .gitignore
+ALWAYS_IGNORED = {".git", "__pycache__", "node_modules", ".venv", "venv"}
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_OUTPUT = Path(__file__).resolve().parent / "copilot_code_review_report.txt"
+
+
+def list_python_files(root: Path) -> List[str]:
+    """File .py sotto `root` non esclusi dal .gitignore, come percorsi relativi ordinati."""
+    try:
+        result = subprocess.run(
+            ["git", "ls-files", "-z", "--cached", "--others", "--exclude-standard", "--", "*.py"],
+            cwd=root, capture_output=True, check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return sorted(walk_python_files(root))
+    paths = (p for p in result.stdout.decode("utf-8", "surrogateescape").split("\0") if p)
+    # --cached elenca anche i file cancellati e non ancora committati
+    return sorted(p for p in paths if not ALWAYS_IGNORED.intersection(Path(p).parts) and (root / p).is_file())
+
+
+def gitignore_patterns(root: Path) -> List[str]:
+    path = root / ".gitignore"
+    if not path.is_file():
+        return []
+    lines = (line.strip() for line in path.read_text(encoding="utf-8", errors="replace").splitlines())
+    # Le negazioni ("!pattern") non sono supportate in questo ripiego
+    return [line for line in lines if line and not line.startswith(("#", "!"))]
+
+
+def is_ignored(relative: str, is_dir: bool, patterns: List[str]) -> bool:
+    name = relative.rsplit("/", 1)[-1]
+    for pattern in patterns:
+        if pattern.endswith("/"):
+            if not is_dir:
+                continue
+            pattern = pattern.rstrip("/")
+        if pattern.startswith("/") or "/" in pattern:
+            if fnmatch.fnmatch(relative, pattern.lstrip("/")):
+                return True
+        elif fnmatch.fnmatch(name, pattern):
+            return True
+    return False
+
+
+def walk_python_files(root: Path) -> Iterator[str]:
+    """Ripiego senza git: os.walk con i pattern del .gitignore alla radice."""
+    patterns = gitignore_patterns(root)
+    for current, dirs, files in os.walk(root):
+        base = Path(current).relative_to(root).as_posix()
+        prefix = "" if base == "." else base + "/"
+        dirs[:] = [d for d in dirs if d not in ALWAYS_IGNORED and not is_ignored(prefix + d, True, patterns)]
+        for name in files:
+            if name.endswith(".py") and not is_ignored(prefix + name, False, patterns):
+                yield prefix + name
+
+
+def content_hash(content: bytes) -> str:
+    """Hash della sezione: cambia con il file o con il prompt."""
+    return hashlib.sha256(PROMPT_HEADER.encode("utf-8") + b"\0" + content).hexdigest()
+
+
+def section_header(relative: str, digest: str) -> str:
+    return f"{SEPARATOR}\nFILE: {relative}\nSHA256: {digest}\n{SEPARATOR}\n"
+
+
+def build_body(content: bytes) -> str:
+    return f"{PROMPT_HEADER}\nCodice sorgente:\n{content.decode('utf-8', errors='replace')}{ANALYSIS_MARKER}"
+
+
+def parse_report(path: Path) -> Dict[str, str]:
+    """
+    Corpi delle sezioni del report precedente per hash, senza intestazione.
+
+    L'intestazione viene riscritta a ogni uso: file identici (es. __init__.py
+    vuoti) o spostati riusano il corpo con il proprio percorso. Le sezioni
+    senza hash (report nel vecchio formato) vengono ignorate.
+    """
+    if not path.is_file():
+        return {}
+    text = path.read_text(encoding="utf-8", errors="replace")
+    matches = list(SECTION_HEADER.finditer(text))
+    return {
+        match.group(2): text[match.end():matches[i + 1].start() if i + 1 < len(matches) else len(text)]
+        for i, match in enumerate(matches)
+    }
+
+
+def load_index(path: Path) -> Dict[str, List]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+class ReportBuilder:
+    """Costruisce le sezioni riusando quelle del report precedente quando l'hash coincide."""
+
+    def __init__(self, root: Path, index: Dict[str, List], previous: Dict[str, str], force: bool = False):
+        self.root = root
+        self.index = index
+        self.previous = previous
+        self.force = force
+        self.new_index: Dict[str, List] = {}
+
+    def section(self, relative: str) -> Tuple[str, str]:
+        """Sezione del file e come è stata ottenuta (invariati, riletti o rigenerati)."""
+        stat = (self.root / relative).stat()
+        known = None if self.force else self.index.get(relative)
+        if known is not None and known[:2] == [stat.st_size, stat.st_mtime_ns] and known[2] in self.previous:
+            self.new_index[relative] = known
+            return "invariati", section_header(relative, known[2]) + self.previous[known[2]]
+
+        content = (self.root / relative).read_bytes()
+        digest = content_hash(content)
+        self.new_index[relative] = [stat.st_size, stat.st_mtime_ns, digest]
+        body = self.previous.get(digest)
+        if body is not None:
+            # Contenuto uguale con un altro mtime (es. checkout) o file spostato: si tiene l'analisi
+            return "riletti", section_header(relative, digest) + body
+        return "rigenerati", section_header(relative, digest) + build_body(content)
+
+    def kept(self, relative: str) -> Optional[Tuple[str, str]]:
+        """Sezione precedente di un file fuori dai target, senza leggerlo (None se non c'era)."""
+        known = self.index.get(relative)
+        if known is None or known[2] not in self.previous:
+            return None
+        self.new_index[relative] = known
+        return "conservati", section_header(relative, known[2]) + self.previous[known[2]]
+
+
+def write_sections(sections: Iterator[Optional[Tuple[str, str]]], out: TextIO) -> Dict[str, int]:
+    stats = {"invariati": 0, "riletti": 0, "rigenerati": 0, "conservati": 0}
+    for entry in sections:
+        if entry is None:
+            continue
+        kind, section = entry
+        stats[kind] += 1
+        out.write(section)
+    return stats
+
+
+def generate_report(
+    root: Path,
+    output: Optional[Path],
+    targets: List[str],
+    workers: int,
+    force: bool = False,
+) -> Tuple[Dict[str, int], bool]:
+    """
+    Aggiorna il report per i file .py sotto `targets` (relativi a `root`).
+
+    Args:
+        root: Radice del repository (dove stanno .gitignore e i percorsi del report)
+        output: File del report (None: standard output, senza indice)
+        targets: Sottocartelle o file da aggiornare (vuoto: tutto il repository); nel
+            report su file gli altri file già presenti mantengono la sezione precedente
+        workers: Thread che leggono i file modificati
+        force: Rilegge tutti i file dei target ignorando l'indice (le analisi già scritte restano)
+
+    Returns:
+        Tupla (statistiche, report riscritto)
+    """
+    files = list_python_files(root)
+    selected = files
+    if targets:
+        prefixes = tuple(t.rstrip("/") for t in targets)
+        selected = [f for f in files if f in prefixes or f.startswith(tuple(p + "/" for p in prefixes))]
+    selected_set = set(selected)
+
+    index_path = output.with_name(output.name + ".index.json") if output is not None else None
+    index = {} if index_path is None else load_index(index_path)
+    # Fuori dai target si tengono le sezioni già nel report (su standard output non ce ne sono)
+    report_files = [f for f in files if f in selected_set or f in index]
+    if output is not None and not force and output.is_file() and set(index) == set(report_files):
+        # Percorso veloce (pre-commit): solo stat, nessuna lettura se nulla è cambiato
+        if all(index[f][:2] == [s.st_size, s.st_mtime_ns] for f in selected for s in [(root / f).stat()]):
+            stats = {"invariati": len(selected), "riletti": 0, "rigenerati": 0}
+            return {**stats, "conservati": len(report_files) - len(selected), "rimossi": 0}, False
+
+    builder = ReportBuilder(root, index, {} if output is None else parse_report(output), force)
+
+    def build(relative: str) -> Optional[Tuple[str, str]]:
+        return builder.section(relative) if relative in selected_set else builder.kept(relative)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # map mantiene l'ordine dei file mentre i thread leggono in anticipo
+        sections = pool.map(build, report_files)
+        if output is None:
+            stats = write_sections(sections, sys.stdout)
+        else:
+            fd, tmp = tempfile.mkstemp(dir=output.parent, prefix=f".{output.name}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8", newline="\n") as out:
+                    stats = write_sections(sections, out)
+                os.replace(tmp, output)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+            index_path.write_text(json.dumps(builder.new_index, sort_keys=True) + "\n", encoding="utf-8")
+    stats["rimossi"] = len(set(index) - set(files))
+    return stats, True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("targets", nargs="*", help="Cartelle o file da includere, relativi alla radice (default: tutto)")
+    parser.add_argument("--root", type=Path, default=REPO_ROOT, help="Radice del repository")
+    parser.add_argument("--output", default=str(DEFAULT_OUTPUT), help="File del report, '-' per lo standard output")
+    parser.add_argument("--workers", type=int, default=min(32, (os.cpu_count() or 1) * 4), help="Thread di lettura")
+    parser.add_argument("--force", action="store_true", help="Rilegge tutti i file anche se l'indice li dà invariati")
+    args = parser.parse_args()
+
+    root = args.root.resolve()
+    output = None if args.output == "-" else Path(args.output).resolve()
+    stats, written = generate_report(root, output, args.targets, args.workers, args.force)
+    if output is not None:
+        summary = ", ".join(f"{value} {key}" for key, value in stats.items())
+        print(f"Report {'generato' if written else 'già aggiornato'} in {output} ({summary})", file=sys.stderr)
+
 
-# Roadmap integrata secondo le indicazioni di Claude:
-# 1. Analizza il seguente file Python come parte di un progetto SaaS di automazione dropshipping.
-# 2. Per ciascun file, fornisci: errori, bug logici, suggerimenti di refactoring, ottimizzazione performance, controlli di sicurezza e test consigliati.
-# 3. Punti critici da segnalare: sicurezza JWT (revoca token, claims mancanti), gestione segreti, endpoint mancanti, logging avanzato, testing integrato.
-# 4. Suggerisci se applicare Service/Repository Pattern, dependency injection, alerting con Prometheus e Grafana, scaling Redis e fallback resilienza.
-
-
-def generate_copilot_review_prompt(repo_path, output_file):
-    prompt_header = ("Analizza il seguente file Python come parte di un progetto SaaS di automazione dropshipping. "
-                     "Per ciascun file, fornisci: errori, bug logici, suggerimenti di refactoring, "
-                     "ottimizzazione performance, controlli di sicurezza e test consigliati. "
-                     "Verifica se occorre migliorare JWT security (revoca token, claims), gestione segreti, completare endpoint, logging avanzato e test. "
-                     "Suggerisci se introdurre pattern architetturali, Prometheus/Grafana, caching Redis e strategie di resilienza.")
-
-    with open(output_file, "w", encoding="utf-8") as out_file:
-        for root, _, files in os.walk(repo_path):
-            for file in files:
-                if file.endswith(".py"):
-                    file_path = os.path.join(root, file)
-                    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                        content = f.read()
-                    out_file.write(f"{'='*80}\n")
-                    out_file.write(f"FILE: {file_path}\n")
-                    out_file.write(f"{'='*80}\n")
-                    out_file.write(prompt_header)
-                    out_file.write("\nCodice sorgente:\n")
-                    out_file.write(content)
-                    out_file.write("\n\nRisultato dell'analisi: (scrivi qui sotto)\n\n")
-
-    print(f"Report generato in {output_file}")
-
-# Imposta i percorsi
-repo_directory = "/Users/macbook/Desktop/dropevolution_repo"
-report_output = "/Users/macbook/Desktop/dropevolution_repo/github/scripts/copilot_code_review_report.txt"
-
-generate_copilot_review_prompt(repo_directory, report_output)
+if __name__ == "__main__":
+    main()